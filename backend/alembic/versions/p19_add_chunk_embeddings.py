@@ -0,0 +1,74 @@
+"""add content-addressed chunk embeddings
+
+Revision ID: p19_chunk_embeddings
+Revises: p18_event_sequence_counters
+Create Date: 2026-01-18 12:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+from app.utils.migration_helpers import column_exists, get_inspector, index_exists, table_exists
+
+# revision identifiers, used by Alembic.
+revision: str = 'p19_chunk_embeddings'
+down_revision: Union[str, None] = 'p18_event_sequence_counters'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create shared chunk_embeddings store and link document_chunks to it."""
+    inspector = get_inspector()
+
+    if not table_exists(inspector, "chunk_embeddings"):
+        op.create_table(
+            'chunk_embeddings',
+            sa.Column('content_hash', sa.String(length=64), nullable=False),
+            sa.Column('embedding_model', sa.String(length=100), nullable=False),
+            sa.Column('embedding', Vector(dim=1536), nullable=False),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+            sa.PrimaryKeyConstraint('content_hash')
+        )
+
+    if not column_exists(inspector, "document_chunks", "content_hash"):
+        op.add_column('document_chunks', sa.Column('content_hash', sa.String(length=64), nullable=True))
+        op.create_foreign_key(
+            'fk_document_chunks_content_hash', 'document_chunks', 'chunk_embeddings',
+            ['content_hash'], ['content_hash']
+        )
+    if not index_exists(inspector, "document_chunks", "ix_document_chunks_content_hash"):
+        op.create_index('ix_document_chunks_content_hash', 'document_chunks', ['content_hash'], unique=False)
+
+    # Reprocessing stages new chunks with deleted_at set until the quality gate passes,
+    # so chunk_index only needs to be unique among live rows.
+    if index_exists(inspector, "document_chunks", "idx_document_chunks_chunk_index"):
+        op.drop_index('idx_document_chunks_chunk_index', table_name='document_chunks')
+    op.create_index(
+        'idx_document_chunks_chunk_index', 'document_chunks', ['file_id', 'chunk_index'],
+        unique=True, postgresql_where=sa.text('deleted_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    """Drop chunk_embeddings and restore the full unique chunk index."""
+    inspector = get_inspector()
+
+    if index_exists(inspector, "document_chunks", "idx_document_chunks_chunk_index"):
+        op.drop_index('idx_document_chunks_chunk_index', table_name='document_chunks')
+    # Staged rows left by an interrupted run would collide with live ones
+    op.execute(
+        "DELETE FROM document_chunks d WHERE d.deleted_at IS NOT NULL AND EXISTS ("
+        "SELECT 1 FROM document_chunks l WHERE l.file_id = d.file_id "
+        "AND l.chunk_index = d.chunk_index AND l.id <> d.id AND l.deleted_at IS NULL)"
+    )
+    op.create_index('idx_document_chunks_chunk_index', 'document_chunks', ['file_id', 'chunk_index'], unique=True)
+
+    if index_exists(inspector, "document_chunks", "ix_document_chunks_content_hash"):
+        op.drop_index('ix_document_chunks_content_hash', table_name='document_chunks')
+    if column_exists(inspector, "document_chunks", "content_hash"):
+        op.drop_constraint('fk_document_chunks_content_hash', 'document_chunks', type_='foreignkey')
+        op.drop_column('document_chunks', 'content_hash')
+    if table_exists(inspector, "chunk_embeddings"):
+        op.drop_table('chunk_embeddings')
@@ -0,0 +1,96 @@
+"""add galaxy tile spatial index and status sync revisions
+
+Revision ID: p20_galaxy_tiles
+Revises: p19_chunk_embeddings
+Create Date: 2026-01-20 12:00:00.000000
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from app.utils.migration_helpers import column_exists, get_inspector, index_exists
+
+# revision identifiers, used by Alembic.
+revision: str = 'p20_galaxy_tiles'
+down_revision: Union[str, None] = 'p19_chunk_embeddings'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """GiST index for tile queries; per-user sync_revision trigger for delta sync."""
+    inspector = get_inspector()
+
+    if not index_exists(inspector, "knowledge_nodes", "ix_knowledge_nodes_position_gist"):
+        op.execute(
+            "CREATE INDEX ix_knowledge_nodes_position_gist ON knowledge_nodes "
+            "USING gist (point(position_x, position_y))"
+        )
+
+    # revision stays the per-node conflict token; sync_revision is the per-user delta cursor
+    if not column_exists(inspector, "user_node_status", "sync_revision"):
+        op.add_column(
+            'user_node_status',
+            sa.Column('sync_revision', sa.BigInteger(), nullable=False, server_default='0')
+        )
+        op.execute("""
+            UPDATE user_node_status s SET sync_revision = r.rn
+            FROM (
+                SELECT user_id, node_id,
+                       row_number() OVER (PARTITION BY user_id ORDER BY updated_at, node_id) AS rn
+                FROM user_node_status
+            ) r
+            WHERE s.user_id = r.user_id AND s.node_id = r.node_id
+        """)
+    if not index_exists(inspector, "user_node_status", "ix_user_node_status_user_sync_revision"):
+        op.create_index('ix_user_node_status_user_sync_revision', 'user_node_status', ['user_id', 'sync_revision'])
+
+    # Start each user's counter after the sync revisions already handed out
+    op.execute(
+        "INSERT INTO event_sequence_counters (aggregate_type, aggregate_id, next_sequence) "
+        "SELECT 'user_node_status', user_id, MAX(sync_revision) FROM user_node_status GROUP BY user_id "
+        "ON CONFLICT (aggregate_type, aggregate_id) DO UPDATE SET "
+        "next_sequence = GREATEST(event_sequence_counters.next_sequence, EXCLUDED.next_sequence)"
+    )
+
+    # Every status write takes the user's next sync_revision. The counter row
+    # lock serialises a user's writers, so sync revisions become visible in
+    # order and "sync_revision > since_revision" never skips a committed change.
+    # The lock is held until the writing transaction commits, so batch writers
+    # (daily decay) commit each chunk straight after its UPDATE.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION user_node_status_next_revision() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW IS NOT DISTINCT FROM OLD THEN
+                RETURN NEW;
+            END IF;
+            INSERT INTO event_sequence_counters (aggregate_type, aggregate_id, next_sequence)
+            VALUES ('user_node_status', NEW.user_id, 1)
+            ON CONFLICT (aggregate_type, aggregate_id)
+            DO UPDATE SET next_sequence = event_sequence_counters.next_sequence + 1
+            RETURNING next_sequence INTO NEW.sync_revision;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trg_user_node_status_revision ON user_node_status")
+    op.execute(
+        "CREATE TRIGGER trg_user_node_status_revision BEFORE INSERT OR UPDATE ON user_node_status "
+        "FOR EACH ROW EXECUTE FUNCTION user_node_status_next_revision()"
+    )
+
+
+def downgrade() -> None:
+    """Drop the sync_revision trigger, column and tile indexes."""
+    inspector = get_inspector()
+
+    op.execute("DROP TRIGGER IF EXISTS trg_user_node_status_revision ON user_node_status")
+    op.execute("DROP FUNCTION IF EXISTS user_node_status_next_revision()")
+    op.execute("DELETE FROM event_sequence_counters WHERE aggregate_type = 'user_node_status'")
+
+    if index_exists(inspector, "user_node_status", "ix_user_node_status_user_sync_revision"):
+        op.drop_index('ix_user_node_status_user_sync_revision', table_name='user_node_status')
+    if column_exists(inspector, "user_node_status", "sync_revision"):
+        op.drop_column('user_node_status', 'sync_revision')
+    if index_exists(inspector, "knowledge_nodes", "ix_knowledge_nodes_position_gist"):
+        op.drop_index('ix_knowledge_nodes_position_gist', table_name='knowledge_nodes')
@@ -0,0 +1,80 @@
+"""add CJK-aware full-text search vectors to messages
+
+Revision ID: p21_message_search
+Revises: p20_galaxy_tiles
+Create Date: 2026-01-22 12:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from app.utils.migration_helpers import column_exists, get_inspector, index_exists
+
+# revision identifiers, used by Alembic.
+revision: str = 'p21_message_search'
+down_revision: Union[str, None] = 'p20_galaxy_tiles'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MESSAGE_TABLES = ("group_messages", "private_messages")
+
+# Character ranges must match CJK_CHARS in app/services/message_search_index.py
+CJK = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+
+
+def upgrade() -> None:
+    """Generated search_vector columns (CJK bigrams) with GIN indexes."""
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION message_search_text(content text) RETURNS text
+        LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+        DECLARE
+            run text;
+            n int;
+            tokens text[] := ARRAY[]::text[];
+        BEGIN
+            IF content IS NULL THEN
+                RETURN '';
+            END IF;
+            FOR run IN
+                SELECT m[1] FROM regexp_matches(
+                    lower(normalize(content, NFKC)), '([{CJK}]+|[^{CJK}]+)', 'g'
+                ) AS m
+            LOOP
+                IF run ~ '^[{CJK}]' THEN
+                    -- overlapping bigrams plus the trailing character, e.g. 学习小 -> 学习 习小 小
+                    n := char_length(run);
+                    FOR i IN 1..n - 1 LOOP
+                        tokens := tokens || substr(run, i, 2);
+                    END LOOP;
+                    tokens := tokens || substr(run, n, 1);
+                ELSE
+                    tokens := tokens || run;
+                END IF;
+            END LOOP;
+            RETURN array_to_string(tokens, ' ');
+        END;
+        $$
+    """)
+
+    inspector = get_inspector()
+    for table in MESSAGE_TABLES:
+        if not column_exists(inspector, table, "search_vector"):
+            # Adding a stored generated column rewrites the table and backfills existing rows
+            op.execute(
+                f"ALTER TABLE {table} ADD COLUMN search_vector tsvector "
+                f"GENERATED ALWAYS AS (to_tsvector('simple', message_search_text(content))) STORED"
+            )
+        index_name = f"idx_{table}_search"
+        if not index_exists(inspector, table, index_name):
+            op.create_index(index_name, table, ['search_vector'], postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Drop message search vectors."""
+    inspector = get_inspector()
+    for table in MESSAGE_TABLES:
+        index_name = f"idx_{table}_search"
+        if index_exists(inspector, table, index_name):
+            op.drop_index(index_name, table_name=table)
+        if column_exists(inspector, table, "search_vector"):
+            op.drop_column(table, 'search_vector')
+    op.execute("DROP FUNCTION IF EXISTS message_search_text(text)")
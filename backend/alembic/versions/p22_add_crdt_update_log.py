@@ -0,0 +1,54 @@
+"""add append-only CRDT update log
+
+Revision ID: p22_crdt_update_log
+Revises: p21_message_search
+Create Date: 2026-01-24 12:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from app.utils.migration_helpers import column_exists, get_inspector, table_exists
+
+# revision identifiers, used by Alembic.
+revision: str = 'p22_crdt_update_log'
+down_revision: Union[str, None] = 'p21_message_search'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create crdt_update_log and track the last folded update on snapshots."""
+    inspector = get_inspector()
+
+    if not table_exists(inspector, "crdt_update_log"):
+        op.create_table(
+            'crdt_update_log',
+            sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+            sa.Column('galaxy_id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.Column('update_data', sa.LargeBinary(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('now()')),
+            sa.ForeignKeyConstraint(['galaxy_id'], ['collaborative_galaxies.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('idx_crdt_update_log_galaxy_id', 'crdt_update_log', ['galaxy_id', 'id'])
+
+    if not column_exists(inspector, "crdt_snapshots", "last_update_id"):
+        op.add_column(
+            'crdt_snapshots',
+            sa.Column('last_update_id', sa.BigInteger(), nullable=False, server_default='0')
+        )
+
+
+def downgrade() -> None:
+    """Drop crdt_update_log."""
+    inspector = get_inspector()
+
+    if column_exists(inspector, "crdt_snapshots", "last_update_id"):
+        op.drop_column('crdt_snapshots', 'last_update_id')
+    if table_exists(inspector, "crdt_update_log"):
+        op.drop_index('idx_crdt_update_log_galaxy_id', table_name='crdt_update_log')
+        op.drop_table('crdt_update_log')
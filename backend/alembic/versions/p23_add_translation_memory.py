@@ -0,0 +1,64 @@
+"""add versioned translation glossaries and translation memory
+
+Revision ID: p23_translation_memory
+Revises: p22_crdt_update_log
+Create Date: 2026-01-26 12:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from app.models.base import GUID
+from app.utils.migration_helpers import get_inspector, table_exists
+
+# revision identifiers, used by Alembic.
+revision: str = 'p23_translation_memory'
+down_revision: Union[str, None] = 'p22_crdt_update_log'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create translation_glossaries and translation_memory."""
+    inspector = get_inspector()
+
+    if not table_exists(inspector, "translation_glossaries"):
+        op.create_table(
+            'translation_glossaries',
+            sa.Column('id', GUID(), nullable=False),
+            sa.Column('subject', sa.String(length=50), nullable=False),
+            sa.Column('version', sa.Integer(), nullable=False),
+            sa.Column('terms', sa.JSON(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.Column('deleted_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('subject', 'version', name='uq_translation_glossary_subject_version')
+        )
+        op.create_index('ix_translation_glossaries_subject', 'translation_glossaries', ['subject'])
+        op.create_index('ix_translation_glossaries_deleted_at', 'translation_glossaries', ['deleted_at'])
+
+    if not table_exists(inspector, "translation_memory"):
+        op.create_table(
+            'translation_memory',
+            sa.Column('key', sa.String(length=64), nullable=False),
+            sa.Column('source_lang', sa.String(length=20), nullable=False),
+            sa.Column('target_lang', sa.String(length=20), nullable=False),
+            sa.Column('glossary_version', sa.String(length=80), nullable=False, server_default=''),
+            sa.Column('source_text', sa.Text(), nullable=False),
+            sa.Column('translation', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+            sa.PrimaryKeyConstraint('key')
+        )
+
+
+def downgrade() -> None:
+    """Drop translation_memory and translation_glossaries."""
+    inspector = get_inspector()
+
+    if table_exists(inspector, "translation_memory"):
+        op.drop_table('translation_memory')
+    if table_exists(inspector, "translation_glossaries"):
+        op.drop_index('ix_translation_glossaries_deleted_at', table_name='translation_glossaries')
+        op.drop_index('ix_translation_glossaries_subject', table_name='translation_glossaries')
+        op.drop_table('translation_glossaries')
@@ -3,7 +3,7 @@
 Community API - 好友、群组、消息、打卡、任务相关接口
 """
 import json
-from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List, Optional
@@ -68,6 +68,7 @@ from app.services.community_service import (
     CheckinService, GroupTaskService, PrivateMessageService
 )
 from app.services.group_file_service import GroupFileService
+from app.services.message_search_index import decode_cursor, decode_time_cursor, encode_time_cursor
 from app.services.collaboration_service import collaboration_service
 from app.services.community_advanced_service import (
     EncryptionService, ModerationService, ReportService, FavoriteService,
@@ -78,6 +79,13 @@ from app.db.session import AsyncSessionLocal
 
 router = APIRouter()
 
+def _set_history_cursor(response: Response, messages: list, limit: int) -> None:
+    """满页时把最后一条消息的 (created_at, id) 作为下一页游标"""
+    if messages and len(messages) >= limit:
+        last = messages[-1]
+        response.headers["X-Next-Cursor"] = encode_time_cursor(last.created_at, last.id)
+
+
 def _build_message_info(msg: GroupMessage) -> MessageInfo:
     sender = None
     if msg.sender:
@@ -759,16 +767,24 @@ async def send_message(
 @router.get("/groups/{group_id}/messages", response_model=List[MessageInfo], summary="获取群消息")
 async def get_messages(
     group_id: UUID,
+    response: Response,
     before_id: Optional[UUID] = None,
     limit: int = Query(default=50, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, max_length=512, description="上一页响应头 X-Next-Cursor"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取群消息（分页）"""
+    """获取群消息（分页；更早一页的游标见响应头 X-Next-Cursor）"""
+    if cursor:
+        try:
+            decode_time_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     try:
-        messages = await GroupMessageService.get_messages(db, group_id, current_user.id, before_id, limit)
+        messages = await GroupMessageService.get_messages(db, group_id, current_user.id, before_id, limit, cursor)
     except ValueError as e:
         raise HTTPException(status_code=403, detail=str(e))
+    _set_history_cursor(response, messages, limit)
 
     result = []
     for msg in messages:
@@ -989,17 +1005,27 @@ async def get_group_thread_messages(
 @router.get("/groups/{group_id}/messages/search", response_model=List[MessageInfo], summary="搜索群消息")
 async def search_group_messages(
     group_id: UUID,
+    response: Response,
     keyword: str = Query(min_length=1, max_length=120),
     limit: int = Query(default=50, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, max_length=512, description="上一页响应头 X-Next-Cursor"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """搜索群消息"""
+    """搜索群消息（按相关度排序；下一页游标见响应头 X-Next-Cursor）"""
+    # 游标无效是请求错误 (400)，与非成员的 403 区分
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     try:
-        messages = await GroupMessageService.search_messages(db, group_id, current_user.id, keyword, limit)
+        page = await GroupMessageService.search_messages(db, group_id, current_user.id, keyword, limit, cursor)
     except ValueError as e:
         raise HTTPException(status_code=403, detail=str(e))
-    return [_build_message_info(msg) for msg in messages]
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return [_build_message_info(msg) for msg in page.messages]
 
 
 # ============ 私聊消息 ============
@@ -1042,17 +1068,23 @@ async def send_private_message(
 @router.get("/friends/{friend_id}/messages", response_model=List[PrivateMessageInfo], summary="获取私信记录")
 async def get_private_messages(
     friend_id: UUID,
+    response: Response,
     before_id: Optional[UUID] = None,
     limit: int = Query(default=50, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, max_length=512, description="上一页响应头 X-Next-Cursor"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """获取与某位好友的私信记录"""
+    """获取与某位好友的私信记录（更早一页的游标见响应头 X-Next-Cursor）"""
     # 标记已读
     await PrivateMessageService.mark_as_read(db, current_user.id, friend_id)
     await db.commit()
 
-    messages = await PrivateMessageService.get_messages(db, current_user.id, friend_id, before_id, limit)
+    try:
+        messages = await PrivateMessageService.get_messages(db, current_user.id, friend_id, before_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _set_history_cursor(response, messages, limit)
 
     result = []
     for msg in messages:
@@ -1150,14 +1182,21 @@ async def update_private_message_reaction(
 @router.get("/friends/{friend_id}/messages/search", response_model=List[PrivateMessageInfo], summary="搜索私信")
 async def search_private_messages(
     friend_id: UUID,
+    response: Response,
     keyword: str = Query(min_length=1, max_length=120),
     limit: int = Query(default=50, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, max_length=512, description="上一页响应头 X-Next-Cursor"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """搜索私聊消息"""
-    messages = await PrivateMessageService.search_messages(db, current_user.id, friend_id, keyword, limit)
-    return [_build_private_message_info(msg) for msg in messages]
+    """搜索私聊消息（按相关度排序；下一页游标见响应头 X-Next-Cursor）"""
+    try:
+        page = await PrivateMessageService.search_messages(db, current_user.id, friend_id, keyword, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return [_build_private_message_info(msg) for msg in page.messages]
 
 
 async def _update_user_status(user_id: str, status: UserStatus):
@@ -2083,9 +2122,11 @@ async def advanced_search_group_messages(
         return MessageSearchResult(
             messages=messages,
             total=result["total"],
+            total_is_estimate=result["total_is_estimate"],
             page=result["page"],
             page_size=result["page_size"],
-            has_more=result["has_more"]
+            has_more=result["has_more"],
+            next_cursor=result["next_cursor"]
         )
     except ValueError as e:
         raise HTTPException(status_code=403, detail=str(e))
@@ -2,20 +2,24 @@
 Knowledge Galaxy API
 知识星图相关接口
 """
+import hashlib
 from typing import Optional, List
 from uuid import UUID
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, Query, HTTPException, status, Request
+from fastapi import APIRouter, Depends, Query, Path, HTTPException, status, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field
 
 from app.api.deps import get_current_user_id, get_db
+from app.config import settings
 from app.services.galaxy_service import GalaxyService
 from app.services.decay_service import DecayService
 from app.services.knowledge_integration_service import KnowledgeIntegrationService
 from app.schemas.galaxy import (
     GalaxyGraphResponse,
+    GalaxyTileResponse,
+    GalaxyStatusDeltaResponse,
     SparkRequest,
     SparkResult,
     SearchRequest,
@@ -112,6 +116,64 @@ async def get_galaxy_graph(
     )
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison: W/"x" matches "x"
+    return "*" in candidates or etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in candidates]
+
+
+@router.get("/tiles/{z}/{x}/{y}", response_model=GalaxyTileResponse)
+async def get_galaxy_tile(
+    request: Request,
+    z: int = Path(..., ge=0, le=settings.GALAXY_TILE_MAX_ZOOM, description="缩放层级"),
+    x: int = Path(..., description="瓦片列号"),
+    y: int = Path(..., description="瓦片行号"),
+    include_locked: bool = Query(True, description="是否包含未解锁节点"),
+    user_id: str = Depends(get_current_user_id),
+    galaxy_service: GalaxyService = Depends(get_galaxy_service)
+):
+    """
+    获取星图瓦片 (四叉树 z/x/y)
+
+    z 级瓦片边长为 GALAXY_TILE_BASE_SIZE / 2^z，低层级按重要性做 LOD 过滤。
+    响应带 ETag，客户端携带 If-None-Match 且瓦片未变化时返回 304。
+    """
+    tile = await galaxy_service.get_galaxy_tile(
+        user_id=UUID(user_id),
+        z=z,
+        x=x,
+        y=y,
+        include_locked=include_locked
+    )
+    body = tile.model_dump_json()
+    etag = f'W/"{hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/status/delta", response_model=GalaxyStatusDeltaResponse)
+async def get_status_delta(
+    since_revision: int = Query(0, ge=0, description="上次同步返回的 sync_revision"),
+    limit: int = Query(settings.GALAXY_STATUS_DELTA_LIMIT, ge=1, le=settings.GALAXY_STATUS_DELTA_LIMIT),
+    user_id: str = Depends(get_current_user_id),
+    galaxy_service: GalaxyService = Depends(get_galaxy_service)
+):
+    """
+    增量同步节点状态
+
+    仅返回 sync_revision > since_revision 的状态；has_more 为 true 时以返回的 sync_revision 继续拉取。
+    """
+    return await galaxy_service.get_status_delta(
+        user_id=UUID(user_id),
+        since_revision=since_revision,
+        limit=limit
+    )
+
+
 @router.post("/node/{node_id}/spark", response_model=SparkResult)
 async def spark_node(
     node_id: UUID,
@@ -64,8 +64,9 @@ async def transcribe_audio(
 async def websocket_endpoint(websocket: WebSocket):
     """
     WebSocket for audio streaming.
-    Client sends binary audio chunks.
-    Server returns JSON: {"type": "transcription", "text": "...", "is_final": bool}
+    Client sends binary 16-bit mono PCM chunks (STT_SAMPLE_RATE), then "STOP".
+    Server returns JSON: {"type": "transcription", "segment": n, "text": "...", "is_final": bool}
+    Optional query param: language (e.g. "zh")
     """
     token = websocket.query_params.get("token")
     if not token:
@@ -76,4 +77,4 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
-    await stt_service.handle_websocket_stream(websocket)
+    await stt_service.handle_websocket_stream(websocket, language=websocket.query_params.get("language"))
@@ -1,77 +1,275 @@
+import hashlib
 import json
-from typing import Optional, Any, Dict
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Any, Dict, List, Tuple
 from loguru import logger
+from redis.exceptions import WatchError
 from app.orchestration.statechart_engine import WorkflowState
 
+# Runtime dependencies injected by the orchestrator, never persisted
+EXCLUDED_CONTEXT_KEYS = frozenset({"db_session", "stream_callback", "tools_schema", "redis_client"})
+
+
+@dataclass
+class Checkpoint:
+    """A resumable point of a StateGraph execution."""
+    state: WorkflowState
+    node_id: str  # node to execute next ("__end__" once the graph finished)
+    step: int = 0
+
+
+@dataclass
+class _Written:
+    """What this process last wrote for a session, used to compute deltas."""
+    message_count: int
+    last_message: Optional[str]
+    context: Dict[str, str] = field(default_factory=dict)  # key -> digest of serialized value
+    saves: int = 0
+    generation: int = 0  # meta generation after our last write; deltas only apply on top of it
+
+
+def _digest(serialized: str) -> str:
+    return hashlib.blake2b(serialized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _text(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
 class RedisCheckpointer:
     """
     Persists StateGraph checkpoints to Redis.
+
+    Append-only layout per session:
+        checkpoint:{session_id}:messages  list - one JSON entry per message, RPUSH'd as history grows
+        checkpoint:{session_id}:context   hash - context key -> JSON value, only changed keys written
+        checkpoint:{session_id}:meta      hash - next node, step, errors, flags, message count,
+                                             generation (HINCRBY'd by every write)
+
+    A save costs O(new messages + changed context) instead of re-serializing the
+    whole state. The session is rewritten in full (compaction) when this process
+    has not written it before, when already-saved history was modified (e.g. by
+    context pruning), and every `compact_every` saves.
+
+    Deltas are only valid on top of what this process last wrote, so they are
+    applied under WATCH on the meta hash and only if its generation still matches;
+    if another writer got there first, the save falls back to compaction.
     """
-    def __init__(self, redis_client: Any, ttl: int = 3600 * 24):
+    def __init__(self, redis_client: Any, ttl: int = 3600 * 24, compact_every: int = 50,
+                 max_tracked_sessions: int = 1024):
         self.redis = redis_client
         self.ttl = ttl
+        self.compact_every = compact_every
+        self.max_tracked_sessions = max_tracked_sessions
+        self._written: "OrderedDict[str, _Written]" = OrderedDict()
+
+    @staticmethod
+    def _keys(session_id: str) -> Tuple[str, str, str]:
+        prefix = f"checkpoint:{session_id}"
+        return f"{prefix}:messages", f"{prefix}:context", f"{prefix}:meta"
+
+    @staticmethod
+    def _serialize_context(context: Dict[str, Any]) -> Dict[str, str]:
+        serialized = {}
+        for k, v in context.items():
+            if k in EXCLUDED_CONTEXT_KEYS:
+                continue
+            try:
+                serialized[k] = json.dumps(v)
+            except (TypeError, ValueError, OverflowError):
+                logger.debug(f"Skipping non-serializable context key: {k}")
+        return serialized
+
+    @staticmethod
+    def _serialize_message(message: Any) -> str:
+        return json.dumps(message, default=str)
+
+    def _remember(self, session_id: str, written: _Written):
+        self._written[session_id] = written
+        self._written.move_to_end(session_id)
+        while len(self._written) > self.max_tracked_sessions:
+            self._written.popitem(last=False)
 
-    async def save(self, state: WorkflowState, node_id: str):
-        """Save state checkpoint."""
+    def _history_intact(self, written: _Written, messages: List[Any]) -> bool:
+        count = written.message_count
+        if len(messages) < count:
+            return False
+        return count == 0 or self._serialize_message(messages[count - 1]) == written.last_message
+
+    async def save(self, state: WorkflowState, node_id: str, step: int = 0):
+        """Save state checkpoint; node_id is the node that runs next."""
         if not self.redis:
             return
 
         session_id = state.context_data.get("session_id")
         if not session_id:
             return
+        session_id = str(session_id)
+        messages_key, context_key, meta_key = self._keys(session_id)
 
-        key = f"checkpoint:{session_id}"
-        
-        # Serialize state
-        # Filter out non-serializable objects from context
-        safe_context = {}
-        for k, v in state.context_data.items():
-            if k in ["db_session", "stream_callback", "tools_schema"]:
-                continue
-            try:
-                json.dumps(v)
-                safe_context[k] = v
-            except (TypeError, OverflowError):
-                logger.warning(f"Skipping non-serializable context key: {k}")
+        messages = state.messages
+        context = self._serialize_context(state.context_data)
+        written = self._written.get(session_id)
+        compact = (
+            written is None
+            or written.saves + 1 >= self.compact_every
+            or not self._history_intact(written, messages)
+        )
 
-        data = {
+        if compact:
+            new_messages, changed, removed = messages, context, []
+        else:
+            new_messages = messages[written.message_count:]
+            changed = {k: v for k, v in context.items() if written.context.get(k) != _digest(v)}
+            removed = [k for k in written.context if k not in context]
+        meta = {
             "node_id": node_id,
-            "messages": state.messages,
-            "context_data": safe_context,
-            "next_step": state.next_step,
-            "errors": state.errors,
-            "is_finished": state.is_finished,
-            "trace_id": state.trace_id
+            "step": step,
+            "message_count": len(messages),
+            "next_step": json.dumps(state.next_step),
+            "errors": json.dumps(state.errors, default=str),
+            "is_finished": int(state.is_finished),
+            "trace_id": state.trace_id,
         }
-        
+
+        keys = (messages_key, context_key, meta_key)
         try:
-            await self.redis.set(key, json.dumps(data), ex=self.ttl)
-            logger.debug(f"Saved checkpoint for session {session_id} at node {node_id}")
+            generation = None
+            if not compact:
+                generation = await self._append(keys, written.generation, new_messages, changed, removed, meta)
+            if generation is None:
+                if not compact:
+                    logger.debug(f"Checkpoint for session {session_id} changed concurrently, compacting")
+                    compact = True
+                    new_messages, changed, removed = messages, context, []
+                generation = await self._rewrite(session_id, keys, messages, context, meta)
         except Exception as e:
+            # Unknown remote state: the next save rewrites the session
+            self._written.pop(session_id, None)
             logger.error(f"Failed to save checkpoint: {e}")
+            return
 
-    async def load(self, session_id: str) -> Optional[WorkflowState]:
-        """Load state from checkpoint."""
+        if compact:
+            digests = {k: _digest(v) for k, v in context.items()}
+            saves = 0
+        else:
+            digests = dict(written.context)
+            digests.update((k, _digest(v)) for k, v in changed.items())
+            for k in removed:
+                digests.pop(k, None)
+            saves = written.saves + 1
+        self._remember(session_id, _Written(
+            message_count=len(messages),
+            last_message=self._serialize_message(messages[-1]) if messages else None,
+            context=digests,
+            saves=saves,
+            generation=generation,
+        ))
+        logger.debug(
+            f"Saved checkpoint for session {session_id} at node {node_id} "
+            f"({'full' if compact else f'+{len(new_messages)} messages, {len(changed)} context keys'})"
+        )
+
+    def _queue_write(self, pipe, keys: Tuple[str, str, str], new_messages: List[Any],
+                     changed: Dict[str, str], removed: List[str], meta: Dict[str, Any]):
+        messages_key, context_key, meta_key = keys
+        if new_messages:
+            pipe.rpush(messages_key, *[self._serialize_message(m) for m in new_messages])
+        if changed:
+            pipe.hset(context_key, mapping=changed)
+        if removed:
+            pipe.hdel(context_key, *removed)
+        pipe.hset(meta_key, mapping=meta)
+        for key in keys:
+            pipe.expire(key, self.ttl)
+        pipe.hincrby(meta_key, "generation", 1)  # last: its reply is the new generation
+
+    async def _append(self, keys: Tuple[str, str, str], generation: int, new_messages: List[Any],
+                      changed: Dict[str, str], removed: List[str], meta: Dict[str, Any]) -> Optional[int]:
+        """Apply a delta if the stored generation is still ours; None if another writer intervened."""
+        meta_key = keys[2]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(meta_key)
+                if int(await pipe.hget(meta_key, "generation") or 0) != generation:
+                    return None
+                pipe.multi()
+                self._queue_write(pipe, keys, new_messages, changed, removed, meta)
+                results = await pipe.execute()
+            except WatchError:
+                return None
+        return int(results[-1])
+
+    async def _rewrite(self, session_id: str, keys: Tuple[str, str, str], messages: List[Any],
+                       context: Dict[str, str], meta: Dict[str, Any]) -> int:
+        """Full write (compaction). Meta is overwritten in place so the generation keeps counting up."""
+        messages_key, context_key, _ = keys
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(messages_key, context_key, f"checkpoint:{session_id}")
+        self._queue_write(pipe, keys, messages, context, [], meta)
+        return int((await pipe.execute())[-1])
+
+    async def load_checkpoint(self, session_id: str) -> Optional[Checkpoint]:
+        """Load the latest checkpoint, including the node to resume from."""
         if not self.redis:
             return None
 
-        key = f"checkpoint:{session_id}"
+        session_id = str(session_id)
+        messages_key, context_key, meta_key = self._keys(session_id)
         try:
-            data_str = await self.redis.get(key)
-            if not data_str:
-                return None
-            
-            data = json.loads(data_str)
-            
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.hgetall(meta_key)
+            pipe.lrange(messages_key, 0, -1)
+            pipe.hgetall(context_key)
+            meta, raw_messages, raw_context = await pipe.execute()
+            if not meta:
+                return await self._load_legacy(session_id)
+
+            meta = {_text(k): _text(v) for k, v in meta.items()}
+            message_count = int(meta.get("message_count", len(raw_messages)))
+            messages = [json.loads(m) for m in raw_messages[:message_count]]
+            context = {_text(k): json.loads(v) for k, v in raw_context.items()}
+
             state = WorkflowState(
-                messages=data.get("messages", []),
-                context_data=data.get("context_data", {}),
-                next_step=data.get("next_step"),
-                errors=data.get("errors", []),
-                is_finished=data.get("is_finished", False),
-                trace_id=data.get("trace_id", "")
+                messages=messages,
+                context_data=context,
+                next_step=json.loads(meta.get("next_step", "null")),
+                errors=json.loads(meta.get("errors", "[]")),
+                is_finished=meta.get("is_finished") == "1",
+                trace_id=meta.get("trace_id", "")
             )
-            return state
         except Exception as e:
             logger.error(f"Failed to load checkpoint: {e}")
             return None
+
+        # Continue with deltas against what is stored
+        self._remember(session_id, _Written(
+            message_count=len(messages),
+            last_message=_text(raw_messages[message_count - 1]) if messages else None,
+            context={_text(k): _digest(_text(v)) for k, v in raw_context.items()},
+            generation=int(meta.get("generation", 0)),
+        ))
+        return Checkpoint(state=state, node_id=meta.get("node_id", ""), step=int(meta.get("step", 0)))
+
+    async def _load_legacy(self, session_id: str) -> Optional[Checkpoint]:
+        """Single JSON blob written by earlier versions at checkpoint:{session_id}."""
+        data_str = await self.redis.get(f"checkpoint:{session_id}")
+        if not data_str:
+            return None
+
+        data = json.loads(data_str)
+        state = WorkflowState(
+            messages=data.get("messages", []),
+            context_data=data.get("context_data", {}),
+            next_step=data.get("next_step"),
+            errors=data.get("errors", []),
+            is_finished=data.get("is_finished", False),
+            trace_id=data.get("trace_id", "")
+        )
+        return Checkpoint(state=state, node_id=data.get("node_id", ""))
+
+    async def load(self, session_id: str) -> Optional[WorkflowState]:
+        """Load state from checkpoint."""
+        checkpoint = await self.load_checkpoint(session_id)
+        return checkpoint.state if checkpoint else None
@@ -3,7 +3,7 @@ Application Configuration Management
 使用 pydantic-settings 管理配置
 """
 import os
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator, model_validator
 from dotenv import load_dotenv
@@ -80,14 +80,56 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL: str = "text-embedding-v2"  # 向量模型
     EMBEDDING_DIM: int = 1536  # 向量维度
     RERANK_MODEL: str = "BAAI/bge-reranker-base"  # 重排序模型
+    EMBEDDING_COALESCE_WINDOW_MS: float = 5.0  # 合并并发请求的等待窗口
+    EMBEDDING_MAX_BATCH_SIZE: int = 64  # 单次 /v1/embeddings 请求的最大文本数
+    EMBEDDING_LOCAL_CACHE_SIZE: int = 2048  # 进程内 LRU 容量
+    EMBEDDING_CACHE_TTL: int = 7 * 24 * 3600  # Redis 缓存过期时间（秒）
+    EMBEDDING_HTTP_MAX_CONNECTIONS: int = 20
 
     # Semantic Cache
     SEMANTIC_CACHE_ENABLED: bool = True
     SEMANTIC_CACHE_SIM_THRESHOLD: float = 0.9
-    SEMANTIC_CACHE_MAX_CANDIDATES: int = 200
+    SEMANTIC_CACHE_MAX_CANDIDATES: int = 200  # 仅用于无 RediSearch 时的线性扫描降级
+    SEMANTIC_CACHE_INDEX_ENABLED: bool = True
+    SEMANTIC_CACHE_INDEX_NAME: str = "idx:semantic_cache"
+    SEMANTIC_CACHE_INDEX_ALGORITHM: str = "HNSW"  # 'HNSW' | 'FLAT'
+
+    # Chat Context Assembly (并行装配首 token 前的上下文)
+    CHAT_CONTEXT_DEADLINE_SECONDS: float = 2.0
+    CHAT_CONTEXT_SOURCE_BUDGETS: Dict[str, float] = {
+        "conversation": 0.5,
+        "user_context": 0.5,
+        "tool_preferences": 0.3,
+        "graphrag": 1.5,
+        "vector": 1.0,
+        "keyword": 0.5,
+    }
 
     # Reranker
     RERANKER_ENABLED: bool = True
+    RERANK_BACKEND: str = "torch"  # 'torch' | 'onnx'（CPU 节点可用 int8 量化的 ONNX 模型；onnx 需安装 rerank_onnx 可选依赖）
+    RERANK_ONNX_FILE: str = ""  # 例如 onnx/model_qint8_avx512_vnni.onnx，空则使用默认 onnx/model.onnx
+    RERANK_PROCESS_WORKERS: int = 0  # >0 时在独立进程池中推理，0 表示进程内单线程
+    RERANK_BATCH_WINDOW_MS: float = 5.0  # 合并并发请求 (query, doc) 对的等待窗口
+    RERANK_MAX_BATCH_SIZE: int = 32  # 单次 predict 的最大 pair 数
+    RERANK_SCORE_CACHE_SIZE: int = 50000  # (query, chunk, model) 分数 LRU 容量
+    RERANK_LATENCY_BUDGET_MS: float = 400.0  # 超出预算回退 RRF 顺序，0 表示不限
+
+    # Knowledge retrieval (idx:knowledge)
+    RAG_CANDIDATE_MULTIPLIER: int = 4  # 预过滤后每路召回 limit * N 个候选
+    RAG_VECTOR_EF_RUNTIME: int = 0  # HNSW 查询期 EF_RUNTIME，0 表示使用索引默认值
+
+    # Galaxy tiles (z/x/y 四叉树瓦片 + LOD)
+    GALAXY_TILE_BASE_SIZE: float = 4096.0  # z=0 瓦片边长（布局坐标单位），每级减半
+    GALAXY_TILE_MAX_ZOOM: int = 10
+    GALAXY_TILE_MAX_NODES: int = 500  # 单瓦片节点上限，按重要性保留
+    GALAXY_TILE_LOD_MIN_IMPORTANCE: Dict[int, int] = {0: 4, 1: 4, 2: 3, 3: 2}  # zoom -> 最低重要性，未列出的层级不过滤
+    GALAXY_STATUS_DELTA_LIMIT: int = 1000  # since_revision 增量单页上限
+    CRDT_COMPACT_MIN_UPDATES: int = 200  # 协作星图增量日志达到该条数后由定时任务折叠进快照
+    CRDT_SESSION_MAX_DOCS: int = 256  # 每个进程内存中最多保留的协作文档数（LRU）
+    CRDT_SESSION_IDLE_SECONDS: int = 600  # 文档空闲超过该时长即释放并交还所有权
+    CRDT_OWNER_LEASE_SECONDS: int = 30  # Redis 所有权租约，每次同步续期
+    CRDT_FORWARD_TIMEOUT_SECONDS: float = 5.0  # 非 owner 转发同步请求的等待上限
 
     # Expansion Feedback Loop
     EXPANSION_AB_TEST_ENABLED: bool = True
@@ -106,6 +148,12 @@ class Settings(BaseSettings):
 
     # Translation Service
     TRANSLATION_DAILY_CARD_LIMIT: int = 10
+    TRANSLATION_MEMORY_TTL_SECONDS: int = 2592000  # 段落级翻译记忆在 Redis 中保留 30 天
+    TRANSLATION_MEMORY_PERSIST: bool = False  # 同时写入 PostgreSQL translation_memory 表，Redis 未命中时回源
+    TRANSLATION_BATCH_MAX_TOKENS: int = 1200  # 每次 LLM 调用打包的原文 token 预算
+    TRANSLATION_BATCH_MAX_SEGMENTS: int = 16  # 每次 LLM 调用最多打包的段落数
+    TRANSLATION_LLM_CONCURRENCY: int = 4  # 单次翻译请求内并发的 LLM 调用数
+    TRANSLATION_GLOSSARY_REFRESH_SECONDS: float = 60.0  # "{subject}_terms" 最新版本指针的进程内缓存时长
 
     # Event Retention
     EVENT_RETENTION_DAYS: int = 30
@@ -131,6 +179,66 @@ class Settings(BaseSettings):
     # Optional Graph Sync Worker
     ENABLE_GRAPH_SYNC_WORKER: bool = False
 
+    # Prerequisite Graph Store (进程级前置依赖图，跟随 stream:graph_sync 增量更新)
+    GRAPH_STORE_REFRESH_SECONDS: int = 600  # 超时后整体重建，兜底未发事件的变更
+
+    # PG → AGE 批量同步
+    AGE_SYNC_PAGE_SIZE: int = 5000  # keyset 分页每页行数
+    AGE_SYNC_BATCH_SIZE: int = 500  # 每条 UNWIND 语句包含的行数
+    AGE_SYNC_CONCURRENCY: int = 4  # 并发写入语句数（不超过 AGE 连接池大小）
+
+    # Token Tracker
+    TOKEN_TRACKER_FLUSH_INTERVAL_MS: int = 0  # >0 时启用进程内累加器，按周期批量写入 Redis
+
+    # Billing Worker
+    BILLING_BATCH_SIZE: int = 1000  # 单次从 queue:billing 拉取/写库的最大记录数
+    BILLING_FLUSH_INTERVAL: float = 1.0  # 未满批时的最长等待（秒）
+    BILLING_WORKER_HEARTBEAT_TTL: int = 30  # Worker 心跳过期后其处理中记录被回收
+    BILLING_MAX_ATTEMPTS: int = 3  # 整批写入失败次数达到后逐条隔离，坏记录进入死信队列
+
+    # Event Bus (Redis Streams consumer groups)
+    EVENT_BUS_BATCH_SIZE: int = 64  # 单次 XREADGROUP 拉取条数，同时是单个消费者的在途上限
+    EVENT_BUS_CONCURRENCY: int = 8  # 支持并发处理的消费者的回调并发度
+    EVENT_BUS_ACK_INTERVAL: float = 0.2  # 批量 XACK 周期（秒）
+    EVENT_BUS_CLAIM_IDLE_MS: int = 60000  # 挂起超过该时长的消息由 XAUTOCLAIM 接管重试
+    EVENT_BUS_CLAIM_INTERVAL: float = 15.0  # 回收挂起消息与上报积压指标的周期（秒）
+    EVENT_BUS_MAX_DELIVERIES: int = 5  # 超过投递次数的消息转入 <stream>:dead 并确认
+    EVENT_BUS_STREAM_MAXLEN: int = 100000  # 发布时近似 MAXLEN 裁剪，0 表示不裁剪
+    EVENT_BUS_STREAM_RETENTION_SECONDS: int = 0  # >0 时改用近似 MINID 按时间裁剪
+
+    # WebSocket fan-out (每连接发送队列 + 独立写协程)
+    WS_SEND_QUEUE_SIZE: int = 256  # 单连接待发送消息上限
+    WS_SEND_TIMEOUT: float = 10.0  # 单条消息发送超时（秒），超时视为死连接并驱逐
+    WS_SLOW_CONSUMER_POLICY: str = "coalesce"  # 队列满时: drop | coalesce | disconnect
+
+    # Document Ingestion Pipeline
+    INGEST_PAGE_WORKERS: int = 0  # PDF 页面提取/OCR 并行度，0 表示 CPU 核数
+    INGEST_EMBED_BATCH_SIZE: int = 32  # 每次向量化请求的切片数
+    INGEST_EMBED_CONCURRENCY: int = 4  # 并发向量化请求数
+    INGEST_QUEUE_SIZE: int = 8  # 流水线阶段间队列容量（批），提供背压
+
+    # Message search (消息全文检索)
+    MESSAGE_SEARCH_MAX_CANDIDATES: int = 1000  # 只在最近 N 条命中内排序，总数超过即为估计值
+
+    # Group moderation (敏感词自动机缓存)
+    MODERATION_FILTER_RECHECK_SECONDS: float = 2.0  # 进程内自动机最多每 N 秒与 Redis 版本号核对一次
+
+    # Streaming STT (接收 -> VAD 分句 -> ASR 工作池)
+    STT_ASR_BACKEND: str = "whisper"  # 'whisper' | 'local'（确定性本地替身，用于离线测量延迟与 CPU）
+    STT_SAMPLE_RATE: int = 16000  # 流式输入为 16-bit 小端单声道 PCM
+    STT_VAD_MODE: str = "energy"  # 'energy' | 'webrtc'（需要 webrtcvad，缺失时回退 energy）
+    STT_VAD_FRAME_MS: int = 30  # VAD 帧长，webrtc 模式只支持 10/20/30
+    STT_VAD_THRESHOLD_DB: float = 12.0  # 高于自适应噪声底多少 dB 视为语音
+    STT_VAD_SILENCE_MS: int = 600  # 语音后静音超过该时长即结束一句
+    STT_MAX_SEGMENT_SECONDS: float = 15.0  # 单句最长时长，超过强制切分
+    STT_PARTIAL_INTERVAL_MS: int = 1500  # 句中每积累这么多新语音发送一次中间结果，0 关闭
+    STT_ASR_WORKERS: int = 2  # 每连接并发转写数
+    STT_MAX_PENDING_SEGMENTS: int = 4  # 待转写队列容量，满时停止读取 socket（背压）
+
+    # Persona crypto-erase (用户级 DEK 缓存)
+    PERSONA_DEK_CACHE_TTL_SECONDS: int = 300  # 解包后的 DEK 在进程内缓存的时长
+    PERSONA_DEK_CACHE_MAX_ENTRIES: int = 10000  # 进程内最多缓存的用户 DEK 数（LRU），约 1KB/条
+
     # Idempotency Store
     IDEMPOTENCY_STORE: str = "memory"  # 'memory' | 'redis' | 'database'
 
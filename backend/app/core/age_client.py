@@ -5,6 +5,8 @@ Apache AGE 客户端封装
 """
 
 import asyncio
+import json
+import math
 from typing import List, Dict, Any, Optional
 from urllib.parse import urlparse
 from dataclasses import dataclass
@@ -65,6 +67,8 @@ class AgeClient:
         """关闭连接池"""
         if self.pool:
             await self.pool.close()
+            # 连接池绑定在创建它的事件循环上，关闭后下次使用时重新创建
+            self.pool = None
             logger.info("AGE 连接池已关闭")
 
     async def execute_cypher(self, cypher: str, params: Dict[str, Any] = None) -> List[Dict[str, Any]]:
@@ -104,7 +108,6 @@ class AgeClient:
                 for row in rows:
                     if row['result']:
                         # agtype 是 JSON 格式，直接解析
-                        import json
                         results.append(json.loads(row['result']))
 
                 logger.debug(f"AGE 查询执行成功: {len(results)} 条结果")
@@ -177,6 +180,108 @@ class AgeClient:
 
         await self.execute_cypher(cypher)
 
+    # ==================== 批量写入 ====================
+
+    @staticmethod
+    def _literal(value: Any) -> str:
+        """将 Python 值编码为 Cypher 字面量（字符串做转义）"""
+        if value is None:
+            return "null"
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, (int, float)) and not (isinstance(value, float) and not math.isfinite(value)):
+            return repr(value)
+        if isinstance(value, dict):
+            return "{" + ", ".join(f"{k}: {AgeClient._literal(v)}" for k, v in value.items()) + "}"
+        if isinstance(value, (list, tuple)):
+            return "[" + ", ".join(AgeClient._literal(v) for v in value) + "]"
+        text = str(value).replace("\\", "\\\\").replace("'", "\\'")
+        # 查询体包在 $$ 中，数据里的 $ 需转义以免提前结束
+        text = text.replace("$", "\\u0024")
+        return f"'{text}'"
+
+    @classmethod
+    def build_merge_vertices(cls, label: str, rows: List[Dict[str, Any]], key: str = "id") -> str:
+        """UNWIND 批量 MERGE 顶点，一条语句写入整批"""
+        props = [k for k in rows[0] if k != key]
+        set_clause = ", ".join(f"v.{k} = row.{k}" for k in props)
+        return (
+            f"UNWIND {cls._literal(rows)} AS row\n"
+            f"MERGE (v:{label} {{{key}: row.{key}}})\n"
+            + (f"SET {set_clause}\n" if set_clause else "")
+            + "RETURN count(v)"
+        )
+
+    @classmethod
+    def build_merge_edges(cls, from_label: str, to_label: str, edge_label: str,
+                          rows: List[Dict[str, Any]], key: str = "id") -> str:
+        """UNWIND 批量 MERGE 边，rows 需包含 source/target 及边属性"""
+        props = [k for k in rows[0] if k not in ("source", "target")]
+        set_clause = ", ".join(f"r.{k} = row.{k}" for k in props)
+        return (
+            f"UNWIND {cls._literal(rows)} AS row\n"
+            f"MATCH (v:{from_label} {{{key}: row.source}}), (u:{to_label} {{{key}: row.target}})\n"
+            f"MERGE (v)-[r:{edge_label}]->(u)\n"
+            + (f"SET {set_clause}\n" if set_clause else "")
+            + "RETURN count(r)"
+        )
+
+    @classmethod
+    def build_delete_vertices(cls, label: str, ids: List[str], key: str = "id") -> str:
+        return (
+            f"UNWIND {cls._literal(ids)} AS vid\n"
+            f"MATCH (v:{label} {{{key}: vid}})\n"
+            "DETACH DELETE v"
+        )
+
+    @classmethod
+    def build_delete_edges(cls, from_label: str, to_label: str, edge_label: str,
+                           rows: List[Dict[str, Any]], key: str = "id") -> str:
+        return (
+            f"UNWIND {cls._literal(rows)} AS row\n"
+            f"MATCH (v:{from_label} {{{key}: row.source}})-[r:{edge_label}]->(u:{to_label} {{{key}: row.target}})\n"
+            "DELETE r"
+        )
+
+    async def ensure_property_index(self, label: str):
+        """
+        为标签的 properties 建 GIN 索引
+
+        MERGE/MATCH (v:Label {id: ...}) 在没有索引时每行都是整表扫描，
+        批量同步前调用可把查找降到索引探测
+        """
+        if not self.pool:
+            await self.init_pool()
+        graph = self.config.graph_name
+        index_name = f"idx_{graph}_{label.lower()}_props"
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS {index_name} ON {graph}."{label}" USING gin (properties)'
+                )
+        except Exception as e:
+            # 标签尚未创建时表不存在，首批写入后再建即可
+            logger.warning(f"创建 AGE 属性索引失败 {label}: {e}")
+
+    async def execute_cypher_many(self, statements: List[str], concurrency: Optional[int] = None) -> int:
+        """
+        在连接池上有界并发执行多条 Cypher
+
+        并发度不超过连接池大小，避免批量同步占满连接影响在线查询。
+
+        Returns:
+            成功执行的语句数
+        """
+        limit = max(1, min(concurrency or self.config.pool_size, self.config.pool_size))
+        semaphore = asyncio.Semaphore(limit)
+
+        async def _run(statement: str):
+            async with semaphore:
+                await self.execute_cypher(statement)
+
+        await asyncio.gather(*(_run(statement) for statement in statements))
+        return len(statements)
+
     async def get_neighbors(self, label: str, properties: Dict[str, Any],
                            depth: int = 1, edge_filter: Optional[str] = None) -> List[Dict[str, Any]]:
         """
@@ -336,6 +336,20 @@ celery_app.conf.beat_schedule = {
         "options": {"queue": "low_priority"}
     },
 
+    # 每5分钟压缩协作星图 CRDT 增量日志
+    "crdt-compaction": {
+        "task": "compact_crdt_update_logs",
+        "schedule": 300.0,
+        "options": {"queue": "low_priority"}
+    },
+
+    # 每5分钟把 PG 中变化的知识节点/关系增量同步到 AGE
+    "age-incremental-sync": {
+        "task": "sync_graph_to_age",
+        "schedule": 300.0,
+        "options": {"queue": "low_priority", "expires": 300},
+    },
+
     # 每天凌晨3点运行信号学习分析
     "signals-learning-daily": {
         "task": "signals_learning_daily",
@@ -298,6 +298,62 @@ def cleanup_pending_actions(self):
         raise self.retry(exc=exc, countdown=60)
 
 
+@celery_app.task(bind=True, max_retries=2, name="compact_crdt_update_logs")
+def compact_crdt_update_logs(self):
+    """
+    协作星图日志压缩 (定时)
+
+    把 crdt_update_log 折叠进 crdt_snapshots，让恢复与追赶只需读取快照之后的少量增量
+    """
+    import asyncio
+    from app.config import settings
+    from app.core.cache import cache_service
+    from app.db.session import AsyncSessionLocal
+    from app.services.galaxy.crdt_persistence import CRDTPersistenceManager
+
+    async def _compact():
+        min_updates = settings.CRDT_COMPACT_MIN_UPDATES
+        async with AsyncSessionLocal() as session:
+            manager = CRDTPersistenceManager(cache_service.redis, session)
+            galaxy_ids = await manager.galaxies_to_compact(min_updates)
+            folded = 0
+            for galaxy_id in galaxy_ids:
+                folded += await manager.compact(galaxy_id, min_updates)
+            return {"status": "success", "galaxies": len(galaxy_ids), "folded": folded}
+
+    try:
+        return asyncio.run(_compact())
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=60)
+
+
+@celery_app.task(bind=True, max_retries=2, name="sync_graph_to_age")
+def sync_graph_to_age(self):
+    """
+    PG → AGE 增量同步 (定时)
+
+    以 Redis 中的 (updated_at, id) 水位为游标，只同步上次之后变化的节点和关系
+    """
+    import asyncio
+    from app.db.session import AsyncSessionLocal
+    from services.graph_knowledge_service import GraphKnowledgeService
+
+    async def _sync():
+        async with AsyncSessionLocal() as session:
+            service = GraphKnowledgeService(session)
+            try:
+                stats = await service.sync_incremental_to_age()
+            finally:
+                # 每次 asyncio.run 都是新的事件循环，连接池不能跨任务复用
+                await service.age_client.close()
+            return {"status": "success", **stats}
+
+    try:
+        return asyncio.run(_sync())
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=60)
+
+
 @celery_app.task(bind=True, max_retries=2, name="rerank_documents")
 def rerank_documents(self, query: str, doc_ids: list, user_id: str):
     """
@@ -1,15 +1,19 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, Callable, List
+from typing import Dict, Any, Optional, Callable, Iterable, List, Union
 import json
 import os
 import asyncio
+import time
 from datetime import datetime
 from loguru import logger
 import redis.asyncio as redis
 from redis.exceptions import ResponseError
 from app.config import settings
+from app.core.metrics import EVENT_BUS_LAG, EVENT_BUS_MESSAGES, EVENT_BUS_PENDING
 from app.core.redis_utils import resolve_redis_password, format_redis_url_for_log
 
+KeyFn = Callable[[Dict[str, Any]], Union[None, str, Iterable[str]]]
+
 class Event(ABC):
     """Event base class"""
     @abstractmethod
@@ -68,6 +72,294 @@ class ErrorCreated(Event):
             "timestamp": self.timestamp.isoformat()
         }
 
+def parse_stream_message(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode a stream entry written by EventBus.publish (JSON-encoded values where possible)"""
+    parsed = {}
+    for k, v in data.items():
+        if isinstance(k, bytes):
+            k = k.decode()
+        if isinstance(v, bytes):
+            v = v.decode()
+        try:
+            parsed[k] = json.loads(v)
+        except (json.JSONDecodeError, TypeError):
+            parsed[k] = v
+    return parsed
+
+
+def _decode(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class StreamConsumer:
+    """
+    Batched consumer-group reader for one stream.
+
+    - XREADGROUP fetches up to ``batch_size`` entries, bounded by free in-flight slots
+    - callbacks run concurrently (at most ``concurrency``); entries whose ``key_fn``
+      keys overlap run in stream order, unrelated keys do not wait for each other
+    - successful entries are XACKed in batches every ``ack_interval`` seconds
+    - failed entries stay pending; every ``claim_interval`` seconds entries idle for
+      longer than ``claim_idle_ms`` are taken over with XAUTOCLAIM and retried, and
+      entries delivered more than ``max_deliveries`` times go to ``<stream>:dead``
+    - pending count and group lag are exported as gauges on the same schedule
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        stream: str,
+        group_name: str,
+        consumer_name: str,
+        callback: Callable[[Dict], Any],
+        batch_size: Optional[int] = None,
+        concurrency: int = 1,
+        key_fn: Optional[KeyFn] = None,
+        parse: Callable[[Dict[str, Any]], Dict[str, Any]] = parse_stream_message,
+        block_ms: int = 2000,
+        ack_interval: Optional[float] = None,
+        claim_idle_ms: Optional[int] = None,
+        claim_interval: Optional[float] = None,
+        max_deliveries: Optional[int] = None,
+    ):
+        self.redis = redis_client
+        self.stream = stream
+        self.group_name = group_name
+        self.consumer_name = consumer_name
+        self.callback = callback
+        self.batch_size = max(1, batch_size or settings.EVENT_BUS_BATCH_SIZE)
+        self.concurrency = max(1, concurrency)
+        self.key_fn = key_fn
+        self.parse = parse
+        self.block_ms = block_ms
+        self.ack_interval = ack_interval if ack_interval is not None else settings.EVENT_BUS_ACK_INTERVAL
+        self.claim_idle_ms = claim_idle_ms if claim_idle_ms is not None else settings.EVENT_BUS_CLAIM_IDLE_MS
+        self.claim_interval = claim_interval if claim_interval is not None else settings.EVENT_BUS_CLAIM_INTERVAL
+        self.max_deliveries = max_deliveries if max_deliveries is not None else settings.EVENT_BUS_MAX_DELIVERIES
+        self.dead_letter_stream = f"{stream}:dead"
+
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._tails: Dict[str, asyncio.Task] = {}
+        self._ack_buffer: List[str] = []
+        self._claim_cursor = "0-0"
+        self._last_claim = float("-inf")
+        self._running = False
+
+    @property
+    def capacity(self) -> int:
+        return max(self.batch_size, self.concurrency)
+
+    async def run(self) -> None:
+        logger.info(
+            f"Starting consumer loop: {self.group_name}:{self.consumer_name} on {self.stream} "
+            f"(batch={self.batch_size}, concurrency={self.concurrency})"
+        )
+        self._running = True
+        acker = asyncio.create_task(self._ack_loop())
+        try:
+            while self._running:
+                try:
+                    await self.poll()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error in consumer loop: {e}")
+                    await asyncio.sleep(1)  # Backoff
+        finally:
+            acker.cancel()
+            await asyncio.gather(acker, return_exceptions=True)
+            await self.drain()
+
+    def stop(self) -> None:
+        self._running = False
+
+    async def poll(self) -> None:
+        """One scheduling step: reclaim when due, then fetch into free slots"""
+        if len(self._in_flight) >= self.capacity:
+            await asyncio.wait(list(self._in_flight.values()), return_when=asyncio.FIRST_COMPLETED)
+            return
+
+        if time.monotonic() - self._last_claim >= self.claim_interval:
+            self._last_claim = time.monotonic()
+            await self.reclaim()
+            await self.record_backlog()
+
+        free = self.capacity - len(self._in_flight)
+        if free <= 0:
+            return
+        entries = await self.redis.xreadgroup(
+            groupname=self.group_name,
+            consumername=self.consumer_name,
+            streams={self.stream: ">"},
+            count=free,
+            block=self.block_ms,
+        )
+        for _, messages in entries or []:
+            for message_id, data in messages:
+                self.dispatch(_decode(message_id), data)
+
+    def dispatch(self, message_id: str, data: Dict[str, Any]) -> None:
+        if message_id in self._in_flight:
+            return
+        try:
+            parsed = self.parse(data)
+        except Exception as e:
+            # 无法解析的条目重试也不会成功，直接确认丢弃
+            logger.error(f"Dropping malformed message {message_id} on {self.stream}: {e}")
+            EVENT_BUS_MESSAGES.labels(stream=self.stream, group=self.group_name, result="malformed").inc()
+            self._ack_buffer.append(message_id)
+            return
+        keys = self._keys(parsed)
+        predecessors = [self._tails[k] for k in keys if k in self._tails]
+        task = asyncio.create_task(self._handle(message_id, parsed, predecessors))
+        self._in_flight[message_id] = task
+        for key in keys:
+            self._tails[key] = task
+        task.add_done_callback(lambda t, mid=message_id, ks=keys: self._finished(mid, ks, t))
+
+    def _keys(self, parsed: Dict[str, Any]) -> List[str]:
+        if self.key_fn is None:
+            return []
+        try:
+            keys = self.key_fn(parsed)
+        except Exception:
+            return []
+        if keys is None:
+            return []
+        if isinstance(keys, str):
+            return [keys]
+        return [str(k) for k in keys if k is not None]
+
+    def _finished(self, message_id: str, keys: List[str], task: asyncio.Task) -> None:
+        self._in_flight.pop(message_id, None)
+        for key in keys:
+            if self._tails.get(key) is task:
+                del self._tails[key]
+
+    async def _handle(self, message_id: str, parsed: Dict[str, Any], predecessors: List[asyncio.Task]) -> None:
+        if predecessors:
+            await asyncio.wait(predecessors)
+        async with self._semaphore:
+            try:
+                await self.callback(parsed)
+            except Exception as e:
+                # 不确认：消息保持挂起，空闲超时后由 reclaim 重新投递
+                logger.error(f"Error processing message {message_id}: {e}")
+                EVENT_BUS_MESSAGES.labels(stream=self.stream, group=self.group_name, result="failed").inc()
+                return
+        self._ack_buffer.append(message_id)
+
+    async def _ack_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.ack_interval)
+            await self.flush_acks()
+
+    async def flush_acks(self) -> None:
+        if not self._ack_buffer:
+            return
+        ids, self._ack_buffer = self._ack_buffer, []
+        try:
+            await self.redis.xack(self.stream, self.group_name, *ids)
+            EVENT_BUS_MESSAGES.labels(stream=self.stream, group=self.group_name, result="acked").inc(len(ids))
+        except Exception as e:
+            logger.warning(f"Failed to ack {len(ids)} messages on {self.stream}: {e}")
+            self._ack_buffer[:0] = ids
+
+    async def drain(self) -> None:
+        """Wait for in-flight callbacks and flush their acks"""
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+        await self.flush_acks()
+
+    async def reclaim(self) -> int:
+        """Take over entries left pending by crashed or stuck consumers"""
+        free = self.capacity - len(self._in_flight)
+        if free <= 0:
+            return 0
+        try:
+            result = await self.redis.xautoclaim(
+                self.stream,
+                self.group_name,
+                self.consumer_name,
+                min_idle_time=self.claim_idle_ms,
+                start_id=self._claim_cursor,
+                count=free,
+            )
+        except ResponseError as e:
+            logger.warning(f"XAUTOCLAIM failed on {self.stream}: {e}")
+            return 0
+
+        self._claim_cursor = _decode(result[0]) or "0-0"
+        messages = [(_decode(mid), data) for mid, data in result[1] if _decode(mid) not in self._in_flight]
+        if not messages:
+            return 0
+
+        deliveries = await self._delivery_counts([mid for mid, _ in messages])
+        claimed = 0
+        for message_id, data in messages:
+            if not data:
+                # 条目已被裁剪，只剩挂起记录
+                self._ack_buffer.append(message_id)
+                continue
+            if deliveries.get(message_id, 0) > self.max_deliveries:
+                await self._dead_letter(message_id, data, deliveries[message_id])
+                continue
+            self.dispatch(message_id, data)
+            claimed += 1
+        if claimed:
+            logger.info(f"Reclaimed {claimed} pending messages on {self.stream} for {self.consumer_name}")
+            EVENT_BUS_MESSAGES.labels(stream=self.stream, group=self.group_name, result="reclaimed").inc(claimed)
+        return claimed
+
+    async def _delivery_counts(self, message_ids: List[str]) -> Dict[str, int]:
+        try:
+            rows = await self.redis.xpending_range(
+                self.stream, self.group_name, min=min(message_ids, key=_stream_id_key),
+                max=max(message_ids, key=_stream_id_key), count=len(message_ids),
+                consumername=self.consumer_name,
+            )
+        except Exception as e:
+            logger.debug(f"XPENDING failed on {self.stream}: {e}")
+            return {}
+        return {_decode(row["message_id"]): int(row["times_delivered"]) for row in rows}
+
+    async def _dead_letter(self, message_id: str, data: Dict[str, Any], deliveries: int) -> None:
+        body = {_decode(k): _decode(v) for k, v in data.items()}
+        body.update({
+            "dead_message_id": message_id,
+            "dead_group": self.group_name,
+            "dead_deliveries": str(deliveries),
+        })
+        try:
+            await self.redis.xadd(self.dead_letter_stream, body)
+        except Exception as e:
+            logger.error(f"Failed to dead-letter {message_id} from {self.stream}: {e}")
+            return
+        logger.error(f"Message {message_id} on {self.stream} exceeded {self.max_deliveries} deliveries; dead-lettered")
+        EVENT_BUS_MESSAGES.labels(stream=self.stream, group=self.group_name, result="dead_letter").inc()
+        self._ack_buffer.append(message_id)
+
+    async def record_backlog(self) -> None:
+        try:
+            groups = await self.redis.xinfo_groups(self.stream)
+        except Exception as e:
+            logger.debug(f"XINFO GROUPS failed on {self.stream}: {e}")
+            return
+        for group in groups:
+            if _decode(group.get("name")) != self.group_name:
+                continue
+            EVENT_BUS_PENDING.labels(stream=self.stream, group=self.group_name).set(group.get("pending") or 0)
+            # lag 需要 Redis >= 7；裁剪导致无法计算时为 None
+            if group.get("lag") is not None:
+                EVENT_BUS_LAG.labels(stream=self.stream, group=self.group_name).set(group["lag"])
+
+
+def _stream_id_key(message_id: str):
+    ms, _, seq = message_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
 class EventBus:
     """
     Event Bus - Redis Streams Implementation
@@ -77,7 +369,8 @@ class EventBus:
         # We delay connection until needed or explicitly initialized
         self.redis_url = redis_url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
         self.redis: Optional[redis.Redis] = None
-        self._consumers = []
+        self._consumers: List[StreamConsumer] = []
+        self._consumer_tasks: List[asyncio.Task] = []
         self._running = False
 
     async def connect(self):
@@ -111,12 +404,35 @@ class EventBus:
     async def close(self):
         """Close connection and stop consumers"""
         self._running = False
+        for consumer in self._consumers:
+            consumer.stop()
+        if self._consumer_tasks:
+            await asyncio.gather(*self._consumer_tasks, return_exceptions=True)
+        self._consumers, self._consumer_tasks = [], []
         if self.redis:
             await self.redis.close()
             self.redis = None
             logger.info("Redis Event Bus connection closed")
 
-    async def publish(self, event_type: str, payload: dict, stream: str = "sparkle_events") -> Optional[str]:
+    @staticmethod
+    def _trim_kwargs(maxlen: Optional[int] = None, retention_seconds: Optional[int] = None) -> Dict[str, Any]:
+        """Approximate (~) trimming arguments for XADD: MINID by age when retention is set, else MAXLEN"""
+        retention = settings.EVENT_BUS_STREAM_RETENTION_SECONDS if retention_seconds is None else retention_seconds
+        if retention and retention > 0:
+            return {"minid": f"{int((time.time() - retention) * 1000)}-0", "approximate": True}
+        limit = settings.EVENT_BUS_STREAM_MAXLEN if maxlen is None else maxlen
+        if limit and limit > 0:
+            return {"maxlen": limit, "approximate": True}
+        return {}
+
+    async def publish(
+        self,
+        event_type: str,
+        payload: dict,
+        stream: str = "sparkle_events",
+        maxlen: Optional[int] = None,
+        retention_seconds: Optional[int] = None,
+    ) -> Optional[str]:
         """
         Publish event to Redis Stream
         
@@ -124,6 +440,8 @@ class EventBus:
             event_type: Type of the event (used as key in payload usually, but here just for logging/logic)
             payload: Dictionary data to send
             stream: Redis Stream key name
+            maxlen: Approximate MAXLEN cap (defaults to EVENT_BUS_STREAM_MAXLEN, 0 disables)
+            retention_seconds: Approximate MINID trim by age; takes precedence over maxlen
             
         Returns:
             Message ID if successful, None otherwise
@@ -155,7 +473,7 @@ class EventBus:
                     msg_body[k] = str(v)
 
             # XADD
-            msg_id = await self.redis.xadd(stream, msg_body)
+            msg_id = await self.redis.xadd(stream, msg_body, **self._trim_kwargs(maxlen, retention_seconds))
             logger.debug(f"Published event {event_type} to {stream} with ID {msg_id}")
             return msg_id
 
@@ -163,7 +481,16 @@ class EventBus:
             logger.error(f"Failed to publish event {event_type}: {e}")
             return None
 
-    async def subscribe(self, stream: str, group_name: str, consumer_name: str, callback: Callable[[Dict], Any]):
+    async def subscribe(
+        self,
+        stream: str,
+        group_name: str,
+        consumer_name: str,
+        callback: Callable[[Dict], Any],
+        batch_size: Optional[int] = None,
+        concurrency: int = 1,
+        key_fn: Optional[KeyFn] = None,
+    ) -> Optional[StreamConsumer]:
         """
         Start a background consumer for a consumer group.
         
@@ -172,6 +499,9 @@ class EventBus:
             group_name: Consumer Group name
             consumer_name: Unique consumer name instance
             callback: Async function to handle message payload (dict)
+            batch_size: Entries fetched per XREADGROUP (defaults to EVENT_BUS_BATCH_SIZE)
+            concurrency: Callbacks running at once; >1 requires a callback safe for concurrent use
+            key_fn: Maps a payload to ordering key(s); payloads sharing a key are handled in stream order
         """
         if not self.redis:
             await self.connect()
@@ -185,58 +515,17 @@ class EventBus:
                 logger.debug(f"Consumer group {group_name} already exists")
             else:
                 logger.error(f"Error creating consumer group: {e}")
-                return
+                return None
 
         # 2. Start Consumption Loop
         self._running = True
-        asyncio.create_task(self._consume_loop(stream, group_name, consumer_name, callback))
-
-    async def _consume_loop(self, stream: str, group_name: str, consumer_name: str, callback: Callable):
-        logger.info(f"Starting consumer loop: {group_name}:{consumer_name} on {stream}")
-        
-        while self._running:
-            try:
-                if not self.redis:
-                    await asyncio.sleep(1)
-                    continue
-
-                # Read from group
-                # count=1 for processing one by one, block=5000ms
-                entries = await self.redis.xreadgroup(
-                    groupname=group_name,
-                    consumername=consumer_name,
-                    streams={stream: ">"},
-                    count=1,
-                    block=2000
-                )
-
-                if not entries:
-                    continue
-
-                for stream_name, messages in entries:
-                    for message_id, data in messages:
-                        try:
-                            # Parse data (handling json strings if we did that)
-                            parsed_data = {}
-                            for k, v in data.items():
-                                try:
-                                    parsed_data[k] = json.loads(v)
-                                except (json.JSONDecodeError, TypeError):
-                                    parsed_data[k] = v
-                            
-                            # Invoke callback
-                            await callback(parsed_data)
-                            
-                            # ACK
-                            await self.redis.xack(stream, group_name, message_id)
-                            
-                        except Exception as e:
-                            logger.error(f"Error processing message {message_id}: {e}")
-                            # TODO: Implement Dead Letter Queue or Retry logic here
-                            
-            except Exception as e:
-                logger.error(f"Error in consumer loop: {e}")
-                await asyncio.sleep(1) # Backoff
+        consumer = StreamConsumer(
+            self.redis, stream, group_name, consumer_name, callback,
+            batch_size=batch_size, concurrency=concurrency, key_fn=key_fn,
+        )
+        self._consumers.append(consumer)
+        self._consumer_tasks.append(asyncio.create_task(consumer.run()))
+        return consumer
 
 # Global instance
 event_bus = EventBus()
@@ -1,10 +1,16 @@
+import multiprocessing
 import os
 import re
-from typing import List, Dict, Optional
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterator, List, Dict, NamedTuple, Optional
 from fastapi import HTTPException
 from loguru import logger
 from pydantic import BaseModel
 
+from app.config import settings
+
 try:
     import pdfplumber
     HAS_PDFPLUMBER = True
@@ -39,6 +45,61 @@ class ExtractedChunk(BaseModel):
     metadata: Dict = {}  # bold, header, color, etc.
     ocr_confidence: Optional[float] = None  # 0.0-1.0, None if not from OCR
 
+class PageResult(NamedTuple):
+    """Progress unit of the streaming extractor: one page (or paragraph/slide)."""
+    index: int  # 0-based position in the document
+    total: int
+    chunk: Optional[ExtractedChunk]  # None if the page was empty/noise
+
+
+# Per-thread cache of opened PDFs: each pool worker parses the file once, and
+# thread workers (daemonic Celery fallback) never share a pdfplumber handle,
+# which is not thread-safe
+_LOCAL_PDFS = threading.local()
+_OPENED_PDFS: Dict[str, List["pdfplumber.PDF"]] = {}
+_OPENED_PDFS_LOCK = threading.Lock()
+
+
+def _open_pdf(path: str):
+    handles = getattr(_LOCAL_PDFS, "handles", None)
+    if handles is None:
+        handles = _LOCAL_PDFS.handles = {}
+    pdf = handles.get(path)
+    if pdf is None:
+        pdf = pdfplumber.open(path)
+        handles[path] = pdf
+        with _OPENED_PDFS_LOCK:
+            _OPENED_PDFS.setdefault(path, []).append(pdf)
+    return pdf
+
+
+def _extract_pdf_page(path: str, index: int) -> Optional[ExtractedChunk]:
+    """Pool task: extract (and OCR if needed) a single PDF page. Must stay module-level to be picklable."""
+    return ingestion_service._extract_page(_open_pdf(path).pages[index], index)
+
+
+def _release_pdf(path: str) -> None:
+    """Close every handle this process opened for path. Call only after the pool has shut down."""
+    with _OPENED_PDFS_LOCK:
+        pdfs = _OPENED_PDFS.pop(path, [])
+    for pdf in pdfs:
+        pdf.close()
+
+
+def iter_ordered(executor: Executor, fn: Callable, args: List[tuple], window: int) -> Iterator:
+    """
+    Submit fn(*a) for every a in args with at most `window` tasks in flight,
+    yielding results in submission order as soon as each prefix completes.
+    """
+    pending = deque()
+    next_arg = 0
+    while pending or next_arg < len(args):
+        while next_arg < len(args) and len(pending) < window:
+            pending.append(executor.submit(fn, *args[next_arg]))
+            next_arg += 1
+        yield pending.popleft().result()
+
+
 class IngestionService:
     """
     Robust Document Ingestion Service for Exam Savior.
@@ -89,51 +150,108 @@ class IngestionService:
             if header != b"PK\x03\x04":
                 raise ValueError(f"Invalid ZIP/Office header: {header}")
 
+    def iter_pages(self, file_path: str, max_workers: Optional[int] = None) -> Iterator[PageResult]:
+        """
+        Streaming entry point. Yields pages in document order as soon as they
+        are extracted, so downstream splitting/embedding can start before the
+        whole document is done. PDFs are extracted in a worker pool.
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+
+        self._validate_magic_bytes(file_path)
+
+        _, ext = os.path.splitext(file_path)
+        ext = ext.lower()
+
+        if ext == ".pdf":
+            yield from self._iter_pdf_pages(file_path, max_workers)
+            return
+
+        if ext == ".docx":
+            chunks = self._process_docx(file_path)
+        elif ext == ".pptx":
+            chunks = self._process_pptx(file_path)
+        else:
+            logger.warning(f"Unsupported file type: {ext}")
+            return
+        for i, chunk in enumerate(chunks):
+            yield PageResult(i, len(chunks), chunk)
+
     def _process_pdf(self, path: str) -> List[ExtractedChunk]:
+        return [page.chunk for page in self._iter_pdf_pages(path) if page.chunk is not None]
+
+    def _iter_pdf_pages(self, path: str, max_workers: Optional[int] = None) -> Iterator[PageResult]:
         if not HAS_PDFPLUMBER:
             raise HTTPException(
                 status_code=501,
                 detail="PDF processing requires pdfplumber, which is not installed."
             )
-        chunks = []
         # Use pdfplumber for better layout analysis
         with pdfplumber.open(path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                text = page.extract_text() or ""
-                ocr_confidence = None
-
-                # --- OCR Fallback Strategy ---
-                # If text is empty or suspiciously short (scanned page), try OCR
-                if len(text.strip()) < 50:
-                    logger.info(f"Page {i+1} has low text content ({len(text.strip())} chars). Attempting OCR...")
-                    ocr_text, ocr_confidence = self._attempt_ocr(page)
-                    if ocr_text:
-                        text = ocr_text
-                        logger.info(
-                            f"OCR recovered {len(text)} chars from Page {i+1} "
-                            f"(confidence: {ocr_confidence:.2f})" if ocr_confidence else
-                            f"OCR recovered {len(text)} chars from Page {i+1}"
-                        )
-                    else:
-                        logger.warning(f"OCR failed or produced no text for Page {i+1}")
-
-                if not text:
-                    continue
-
-                # Cleaning
-                clean_text = self._clean_text(text)
-
-                if len(clean_text) < 20:  # Skip empty/noise pages
-                    continue
-
-                chunks.append(ExtractedChunk(
-                    text=clean_text,
-                    page_num=i + 1,
-                    source="pdf",
-                    metadata={"raw_len": len(text)},
-                    ocr_confidence=ocr_confidence
-                ))
-        return chunks
+            total = len(pdf.pages)
+            workers = min(max_workers or settings.INGEST_PAGE_WORKERS or os.cpu_count() or 1, total)
+            if workers <= 1:
+                for i, page in enumerate(pdf.pages):
+                    yield PageResult(i, total, self._extract_page(page, i))
+                return
+
+        executor = self._make_page_executor(workers)
+        try:
+            args = [(path, i) for i in range(total)]
+            for i, chunk in enumerate(iter_ordered(executor, _extract_pdf_page, args, window=workers * 2)):
+                yield PageResult(i, total, chunk)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            # Thread workers' handles live in this process; pool processes release theirs on exit
+            _release_pdf(path)
+
+    @staticmethod
+    def _make_page_executor(workers: int) -> Executor:
+        """
+        Process pool for CPU-bound layout analysis/OCR preprocessing. Daemonic
+        processes (e.g. Celery prefork workers) cannot fork children, so fall
+        back to threads there; Tesseract still runs in parallel subprocesses.
+        """
+        if multiprocessing.current_process().daemon:
+            return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-page")
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _extract_page(self, page, i: int) -> Optional[ExtractedChunk]:
+        text = page.extract_text() or ""
+        ocr_confidence = None
+
+        # --- OCR Fallback Strategy ---
+        # If text is empty or suspiciously short (scanned page), try OCR
+        if len(text.strip()) < 50:
+            logger.info(f"Page {i+1} has low text content ({len(text.strip())} chars). Attempting OCR...")
+            ocr_text, ocr_confidence = self._attempt_ocr(page)
+            if ocr_text:
+                text = ocr_text
+                logger.info(
+                    f"OCR recovered {len(text)} chars from Page {i+1} "
+                    f"(confidence: {ocr_confidence:.2f})" if ocr_confidence else
+                    f"OCR recovered {len(text)} chars from Page {i+1}"
+                )
+            else:
+                logger.warning(f"OCR failed or produced no text for Page {i+1}")
+
+        if not text:
+            return None
+
+        # Cleaning
+        clean_text = self._clean_text(text)
+
+        if len(clean_text) < 20:  # Skip empty/noise pages
+            return None
+
+        return ExtractedChunk(
+            text=clean_text,
+            page_num=i + 1,
+            source="pdf",
+            metadata={"raw_len": len(text)},
+            ocr_confidence=ocr_confidence
+        )
 
     def _attempt_ocr(self, page) -> tuple[str, Optional[float]]:
         """
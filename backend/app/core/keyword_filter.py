@@ -0,0 +1,213 @@
+"""
+Keyword Filter (群敏感词多模式匹配)
+
+Aho-Corasick automaton compiled once per keyword list:
+- one pass over the message finds every occurrence of every keyword,
+  O(len(text) + matches) regardless of how many keywords are configured
+- text and keywords are folded per character (NFKC + casefold), so
+  full-width / half-width forms and Latin case match each other
+- match offsets refer to the original, unnormalized message
+
+KeywordFilterCache keeps compiled automata per group in-process and
+validates them against a keyword fingerprint in Redis, so sending a
+message neither reloads the group row nor rebuilds the automaton.
+"""
+import hashlib
+import time
+import unicodedata
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+
+@lru_cache(maxsize=65536)
+def _fold_char(ch: str) -> str:
+    return unicodedata.normalize("NFKC", ch).casefold()
+
+
+def fold_text(text: str) -> Tuple[str, Optional[List[int]]]:
+    """
+    Normalize text for matching.
+
+    Returns the folded text and, when folding changed lengths or
+    non-ASCII characters were involved, a map from folded index to
+    original index (None means the indexes are identical).
+    """
+    if text.isascii():
+        return text.lower(), None
+    chars = []
+    offsets = []
+    for i, ch in enumerate(text):
+        folded = _fold_char(ch)
+        chars.append(folded)
+        offsets.extend([i] * len(folded))
+    return "".join(chars), offsets
+
+
+def keyword_fingerprint(keywords: Optional[Sequence[str]]) -> str:
+    """Stable version key of a keyword list"""
+    return hashlib.sha256("\0".join(keywords or []).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class KeywordMatch:
+    keyword: str  # as configured by the group admin
+    start: int    # offsets into the original message, end exclusive
+    end: int
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over folded keywords"""
+
+    __slots__ = ("keywords", "_goto", "_fail", "_out")
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: (keyword index, folded length) of every keyword ending there
+        self._out: List[Tuple[Tuple[int, int], ...]] = [()]
+
+        seen = set()
+        for keyword in keywords:
+            folded = fold_text(keyword.strip())[0] if keyword else ""
+            if not folded or folded in seen:
+                continue
+            seen.add(folded)
+            self._insert(folded, len(self.keywords))
+            self.keywords.append(keyword)
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def _insert(self, folded: str, index: int) -> None:
+        state = 0
+        for ch in folded:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + ((index, len(folded)),)
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                # Inherit matches of the longest proper suffix
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+                queue.append(nxt)
+
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """All (possibly overlapping) keyword occurrences, in order of their end offset"""
+        if not text or not self.keywords:
+            return []
+        folded, offsets = fold_text(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        state = 0
+        for i, ch in enumerate(folded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index, length in out[state]:
+                start = i - length + 1
+                if offsets is None:
+                    matches.append(KeywordMatch(self.keywords[index], start, i + 1))
+                else:
+                    matches.append(KeywordMatch(self.keywords[index], offsets[start], offsets[i] + 1))
+        return matches
+
+
+@dataclass
+class _CacheEntry:
+    version: str
+    automaton: Optional[KeywordAutomaton]
+    checked_at: float
+
+
+class KeywordFilterCache:
+    """
+    In-process cache: group_id -> compiled automaton.
+
+    The version key in Redis holds the fingerprint of the group's current
+    keyword list. It is rewritten by ModerationService.update_moderation_settings;
+    an entry built from a different list (including one read before that
+    update committed) never matches it and is rebuilt on the next check.
+    Redis is consulted at most once per recheck_seconds per group.
+    """
+
+    VERSION_PREFIX = "moderation:keywords:version:"
+    VERSION_TTL = 7 * 24 * 3600
+
+    def __init__(self, recheck_seconds: float = 2.0):
+        self.recheck_seconds = recheck_seconds
+        self._entries: Dict[str, _CacheEntry] = {}
+
+    def _get_redis(self):
+        from app.core.cache import cache_service
+        return cache_service.redis
+
+    async def _remote_version(self, group_id: str) -> Optional[str]:
+        redis = self._get_redis()
+        if not redis:
+            return None
+        try:
+            return await redis.get(f"{self.VERSION_PREFIX}{group_id}")
+        except Exception as e:
+            logger.warning(f"Keyword filter version lookup failed: {e}")
+            return None
+
+    async def get(self, group_id, loader) -> Optional[KeywordAutomaton]:
+        """
+        Compiled automaton for a group, or None when it has no keywords.
+
+        loader: async callable returning the group's keyword list from the database.
+        """
+        key = str(group_id)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry and now - entry.checked_at < self.recheck_seconds:
+            return entry.automaton
+
+        remote = await self._remote_version(key)
+        if entry and remote == entry.version:
+            entry.checked_at = now
+            return entry.automaton
+
+        keywords = await loader() or []
+        version = keyword_fingerprint(keywords)
+        automaton = KeywordAutomaton(keywords) if keywords else None
+        self._entries[key] = _CacheEntry(version, automaton, now)
+        if remote is None:
+            await self._publish(key, version, only_if_missing=True)
+        return automaton
+
+    async def _publish(self, group_id: str, version: str, only_if_missing: bool = False) -> None:
+        redis = self._get_redis()
+        if not redis:
+            return
+        try:
+            await redis.set(
+                f"{self.VERSION_PREFIX}{group_id}", version, ex=self.VERSION_TTL, nx=only_if_missing
+            )
+        except Exception as e:
+            logger.warning(f"Keyword filter version publish failed: {e}")
+
+    async def invalidate(self, group_id, keywords: Optional[Sequence[str]]) -> None:
+        """Record a new keyword list for a group (local entry dropped, Redis version rewritten)"""
+        key = str(group_id)
+        self._entries.pop(key, None)
+        await self._publish(key, keyword_fingerprint(keywords))
@@ -46,6 +46,14 @@ CACHE_HIT_COUNT = get_or_create_metric(
     ['cache_name', 'result']  # result: hit, miss
 )
 
+SEMANTIC_CACHE_LOOKUP_LATENCY = get_or_create_metric(
+    Histogram,
+    'sparkle_semantic_cache_lookup_seconds',
+    'Semantic cache nearest-neighbour lookup latency',
+    ['mode'],  # mode: index, scan
+    buckets=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+)
+
 # 4. 工具执行指标
 TOOL_EXECUTION_COUNT = get_or_create_metric(
     Counter,
@@ -81,6 +89,33 @@ ACTIVE_WEBSOCKET_CONNECTIONS = get_or_create_metric(
     'Number of active WebSocket connections'
 )
 
+WS_SEND_QUEUE_DEPTH = get_or_create_metric(
+    Gauge,
+    'sparkle_websocket_send_queue_depth',
+    'Messages waiting in per-connection WebSocket outbound queues'
+)
+
+WS_SEND_LATENCY = get_or_create_metric(
+    Histogram,
+    'sparkle_websocket_send_latency_seconds',
+    'Time from enqueue to completed send on a WebSocket',
+    buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+)
+
+WS_DROPPED_MESSAGES = get_or_create_metric(
+    Counter,
+    'sparkle_websocket_dropped_messages_total',
+    'WebSocket messages not delivered because of slow consumers',
+    ['reason']  # overflow, coalesced, disconnected
+)
+
+WS_EVICTIONS = get_or_create_metric(
+    Counter,
+    'sparkle_websocket_evictions_total',
+    'WebSocket connections closed by the server-side writer',
+    ['reason']  # slow_consumer, send_error
+)
+
 OUTBOX_PENDING_EVENTS = get_or_create_metric(
     Gauge,
     'sparkle_outbox_pending_events',
@@ -125,6 +160,144 @@ DOC_QUALITY_ISSUES = get_or_create_metric(
     ['issue_type']  # garbled, too_short, low_chinese_ratio, repeated_headers, etc.
 )
 
+# 6. 计费 Worker 指标
+BILLING_QUEUE_DEPTH = get_or_create_metric(
+    Gauge,
+    'sparkle_billing_queue_depth',
+    'Pending records in queue:billing'
+)
+
+BILLING_LAG_SECONDS = get_or_create_metric(
+    Gauge,
+    'sparkle_billing_lag_seconds',
+    'Age of the oldest record in the last persisted billing batch'
+)
+
+BILLING_RECORDS = get_or_create_metric(
+    Counter,
+    'sparkle_billing_records_total',
+    'Billing records processed by the worker',
+    ['result']  # inserted, duplicate, dead_letter, malformed
+)
+
+BILLING_FLUSH_LATENCY = get_or_create_metric(
+    Histogram,
+    'sparkle_billing_flush_seconds',
+    'Billing batch persistence latency',
+    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+)
+
+EVENT_BUS_PENDING = get_or_create_metric(
+    Gauge,
+    'sparkle_event_bus_pending_messages',
+    'Delivered but unacknowledged entries of a stream consumer group',
+    ['stream', 'group']
+)
+
+EVENT_BUS_LAG = get_or_create_metric(
+    Gauge,
+    'sparkle_event_bus_consumer_lag',
+    'Stream entries not yet delivered to a consumer group',
+    ['stream', 'group']
+)
+
+EVENT_BUS_MESSAGES = get_or_create_metric(
+    Counter,
+    'sparkle_event_bus_messages_total',
+    'Stream entries handled by event bus consumers',
+    ['stream', 'group', 'result']  # acked, failed, reclaimed, dead_letter, malformed
+)
+
+RERANK_BATCH_SIZE = get_or_create_metric(
+    Histogram,
+    'sparkle_rerank_batch_size',
+    'Query-document pairs scored per cross-encoder batch',
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128]
+)
+
+RERANK_BATCH_LATENCY = get_or_create_metric(
+    Histogram,
+    'sparkle_rerank_batch_seconds',
+    'Cross-encoder inference latency per batch',
+    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+)
+
+RERANK_PAIRS = get_or_create_metric(
+    Counter,
+    'sparkle_rerank_pairs_total',
+    'Query-document pairs handled by the reranker',
+    ['result']  # scored, cache_hit
+)
+
+RERANK_FALLBACKS = get_or_create_metric(
+    Counter,
+    'sparkle_rerank_fallbacks_total',
+    'Rerank calls that returned fused (RRF) order instead of model scores',
+    ['reason']  # budget, error, not_ready
+)
+
+COLLAB_DOCS_CACHED = get_or_create_metric(
+    Gauge,
+    'sparkle_collab_docs_cached',
+    'Collaborative galaxy YDocs held in memory by this process'
+)
+
+COLLAB_SYNC_REQUESTS = get_or_create_metric(
+    Counter,
+    'sparkle_collab_sync_requests_total',
+    'Collaborative galaxy sync requests by route',
+    ['route']  # local, forwarded, served, owner_lost
+)
+
+PERSONA_DEK_CACHE_LOOKUPS = get_or_create_metric(
+    Counter,
+    'sparkle_persona_dek_cache_lookups_total',
+    'Unwrapped user DEK lookups by result',
+    ['result']  # hit, miss, bypass
+)
+
+PERSONA_DEK_INVALIDATIONS = get_or_create_metric(
+    Counter,
+    'sparkle_persona_dek_invalidations_total',
+    'Cached user DEKs dropped after crypto-erase, by source',
+    ['source']  # local, remote
+)
+
+TRANSLATION_MEMORY_LOOKUPS = get_or_create_metric(
+    Counter,
+    'sparkle_translation_memory_lookups_total',
+    'Translation memory segment lookups by result',
+    ['result']  # hit, miss
+)
+
+TRANSLATION_LLM_BATCHES = get_or_create_metric(
+    Histogram,
+    'sparkle_translation_llm_batch_segments',
+    'Segments packed into one translation LLM call',
+    buckets=[1, 2, 4, 8, 16, 32]
+)
+
+STT_FIRST_RESULT_LATENCY = get_or_create_metric(
+    Histogram,
+    'sparkle_stt_first_result_seconds',
+    'Time from the first speech audio of a stream to its first transcription message',
+    buckets=[0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0]
+)
+
+STT_ASR_LATENCY = get_or_create_metric(
+    Histogram,
+    'sparkle_stt_asr_seconds',
+    'ASR backend latency per speech segment',
+    ['kind'],  # partial, final
+    buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+)
+
+STT_PARTIALS_DROPPED = get_or_create_metric(
+    Counter,
+    'sparkle_stt_partials_dropped_total',
+    'Partial hypotheses skipped because the ASR stage was behind'
+)
+
 # 装饰器：用于测量函数执行时间并记录指标
 def track_latency(module, method):
     def decorator(func):
@@ -1,11 +1,69 @@
 import struct
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Sequence
 from redis.asyncio import Redis
 from redis.commands.search.query import Query
 from loguru import logger
 from app.config import settings
 from app.core.redis_utils import resolve_redis_password
 
+PUBLIC_OWNER = "public"
+
+# RediSearch TAG 查询中需要转义的字符
+_TAG_SPECIAL = set(",.<>{}[]\"':;!@#$%^&*()-+=~|/ \\")
+
+
+def escape_tag(value: Any) -> str:
+    return "".join(f"\\{ch}" if ch in _TAG_SPECIAL else ch for ch in str(value))
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """
+    idx:knowledge 的预过滤条件，编译为 KNN 之前的过滤表达式
+
+    字段之间为 AND，同一字段的多个取值为 OR；None 表示不限制。
+    visible_to: 只返回公共知识 (owner_id=public) 与该用户自己的知识
+    """
+    subject_ids: Optional[Sequence[int]] = None
+    sectors: Optional[Sequence[str]] = None
+    visible_to: Optional[str] = None
+    statuses: Optional[Sequence[str]] = None
+    min_importance: Optional[int] = None
+    max_importance: Optional[int] = None
+
+    def compile(self) -> str:
+        clauses: List[str] = []
+        if self.subject_ids:
+            ranges = [f"@subject_id:[{int(sid)} {int(sid)}]" for sid in self.subject_ids]
+            clauses.append(ranges[0] if len(ranges) == 1 else f"({' | '.join(ranges)})")
+        if self.sectors:
+            clauses.append(self._tags("sector", self.sectors))
+        if self.visible_to:
+            clauses.append(self._tags("owner_id", [PUBLIC_OWNER, self.visible_to]))
+        if self.statuses:
+            clauses.append(self._tags("status", self.statuses))
+        if self.min_importance is not None or self.max_importance is not None:
+            low = self.min_importance if self.min_importance is not None else "-inf"
+            high = self.max_importance if self.max_importance is not None else "+inf"
+            clauses.append(f"@importance:[{low} {high}]")
+        return " ".join(clauses)
+
+    @staticmethod
+    def _tags(field: str, values: Sequence[Any]) -> str:
+        return f"@{field}:{{{' | '.join(escape_tag(v) for v in values)}}}"
+
+    def apply(self, text_query: str) -> str:
+        """把过滤条件与全文查询组合（全文为空或 * 时只保留过滤条件）"""
+        compiled = self.compile()
+        text = text_query.strip() if text_query else ""
+        if not compiled:
+            return text or "*"
+        if not text or text == "*":
+            return compiled
+        return f"({text}) {compiled}"
+
+
 class RedisSearchClient:
     """
     Wrapper for Redis Search (RediSearch)
@@ -29,11 +87,16 @@ class RedisSearchClient:
         text_query: str,
         vector: List[float],
         top_k: int = 10,
-        vector_field: str = "vector"
+        vector_field: str = "vector",
+        filters: Optional[SearchFilter] = None,
+        ef_runtime: Optional[int] = None,
     ):
         """
         Perform Hybrid Search (Text Filter + Vector Similarity)
-        Syntax: (<text_query>) => [KNN <k> @vector $vec_param AS vector_score]
+        Syntax: (<text_query> <filters>) => [KNN <k> @vector $vec_param EF_RUNTIME $ef AS vector_score]
+
+        filters 在 KNN 之前生效，KNN 只在范围内的文档中排序；
+        ef_runtime 按查询调整 HNSW 搜索宽度（越大召回越高、越慢）
         """
         # 1. Prepare Vector Blob
         # Convert list of floats to binary string (Little Endian Float32)
@@ -41,12 +104,17 @@ class RedisSearchClient:
         
         # 2. Construct Query
         # If text_query is empty, use wildcard
-        actual_text = text_query if text_query.strip() else "*"
+        actual_text = (filters or SearchFilter()).apply(text_query)
         
         # RediSearch Query Syntax for Hybrid
-        # We want to pre-filter by text, then run KNN on the result.
-        # Format: "text_query=>[KNN k @vector $vec AS score]"
-        q_str = f"({actual_text})=>[KNN {top_k} @{vector_field} $vec AS vector_score]"
+        # We want to pre-filter by text/tags, then run KNN on the result.
+        # Format: "(pre_filter)=>[KNN k @vector $vec EF_RUNTIME $ef AS score]"
+        params: Dict[str, Any] = {"vec": vector_blob}
+        ef_clause = ""
+        if ef_runtime:
+            params["ef"] = int(ef_runtime)
+            ef_clause = " EF_RUNTIME $ef"
+        q_str = f"({actual_text})=>[KNN {top_k} @{vector_field} $vec{ef_clause} AS vector_score]"
         
         q = (
             Query(q_str)
@@ -56,8 +124,6 @@ class RedisSearchClient:
             .dialect(2)
         )
         
-        params = {"vec": vector_blob}
-        
         return await self.search(q, params)
 
     async def close(self):
@@ -2,11 +2,17 @@
 Server-Sent Events (SSE) Manager
 用于实时推送事件到前端
 支持断点续传和事件重放
+
+每个用户的事件历史保存在 Redis Stream (sse:stream:{user_id}) 中：
+- 事件 ID 即 Stream ID（单调递增，同一毫秒内也不会冲突）
+- 写入为一次往返：XADD MAXLEN ~ + EXPIRE（非事务 pipeline）
+- 续传使用 XRANGE (<Last-Event-ID> + COUNT n，只读取缺失的事件
 """
 import asyncio
 import json
+import re
 import time
-from typing import Dict, Set, Optional
+from typing import Any, Dict, List, Set, Optional, Tuple
 from uuid import UUID
 from fastapi import Request
 from fastapi.responses import StreamingResponse
@@ -15,16 +21,37 @@ from app.core.cache import cache_service
 from app.config.phase5_config import phase5_config
 
 
+_STREAM_ID_RE = re.compile(r"^(\d+)(?:-(\d+))?$")
+
+
+def _parse_event_id(event_id: str) -> Optional[Tuple[int, int]]:
+    """Stream ID ("ms-seq") 或旧版毫秒时间戳 seq"""
+    match = _STREAM_ID_RE.match(event_id.strip()) if event_id else None
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2) or 0)
+
+
 class SSEManager:
     """
     SSE 连接管理器
     管理所有活跃的 SSE 连接，支持向特定用户推送事件
-    支持断点续传 (Last-Event-ID) 和 Redis 缓冲
+    支持断点续传 (Last-Event-ID) 和 Redis Stream 缓冲
     """
 
+    HISTORY_KEY = "sse:stream:{user_id}"
+
     def __init__(self):
         # {user_id: Set[queue]}
         self.connections: Dict[str, Set[asyncio.Queue]] = {}
+        # Redis 不可用时的本地事件 ID（与 Stream ID 同格式，保证单调）
+        self._last_local_id: Tuple[int, int] = (0, 0)
+
+    def _next_local_id(self) -> str:
+        ms = int(time.time() * 1000)
+        last_ms, last_seq = self._last_local_id
+        self._last_local_id = (ms, 0) if ms > last_ms else (last_ms, last_seq + 1)
+        return f"{self._last_local_id[0]}-{self._last_local_id[1]}"
 
     async def connect(self, user_id: str, last_event_id: Optional[str] = None) -> asyncio.Queue:
         """
@@ -48,34 +75,7 @@ class SSEManager:
         # Replay logic
         if last_event_id and cache_service.redis:
             try:
-                history_key = f"sse:history:{user_id}"
-                # Get last N events (simple approach: get all and filter)
-                # In production with large lists, use LRANGE carefully or Redis Stream
-                events = await cache_service.redis.lrange(history_key, 0, -1)
-
-                last_seq_int = int(last_event_id)
-                replayed_count = 0
-
-                # Events are stored in order. We need to find where last_seq is.
-                # NOTE: lrange returns list, we assume appending order.
-                for event_raw in events:
-                    try:
-                        event = json.loads(event_raw)
-                        seq = event.get("seq", 0)
-                        if seq > last_seq_int:
-                            # This is a missed event
-                            await queue.put(event)
-                            replayed_count += 1
-                            # 限制重放数量，防止过大的重放
-                            if replayed_count >= phase5_config.SSE_REPLAY_MAX_EVENTS:
-                                logger.warning(
-                                    f"Replay limit reached ({phase5_config.SSE_REPLAY_MAX_EVENTS}) "
-                                    f"for user {user_id}"
-                                )
-                                break
-                    except Exception:
-                        continue
-
+                replayed_count = await self._replay(user_id, queue, last_event_id)
                 if replayed_count > 0:
                     logger.info(f"Replayed {replayed_count} events for user {user_id} since {last_event_id}")
             except Exception as e:
@@ -83,6 +83,51 @@ class SSEManager:
 
         return queue
 
+    async def _replay(self, user_id: str, queue: asyncio.Queue, last_event_id: str) -> int:
+        """
+        XRANGE (<last_event_id> + 读取缺失事件，O(log n + 重放条数)
+
+        队列在读取前已注册，读取期间到达的实时事件先取出，按事件 ID 与重放事件合并，
+        避免新事件排在旧事件之前或重复投递。
+        """
+        parsed = _parse_event_id(last_event_id)
+        if parsed is None:
+            logger.warning(f"Ignoring malformed Last-Event-ID for user {user_id}: {last_event_id!r}")
+            return 0
+
+        entries = await cache_service.redis.xrange(
+            self.HISTORY_KEY.format(user_id=user_id),
+            min=f"({parsed[0]}-{parsed[1]}",
+            max="+",
+            count=phase5_config.SSE_REPLAY_MAX_EVENTS,
+        )
+        if len(entries) >= phase5_config.SSE_REPLAY_MAX_EVENTS:
+            logger.warning(
+                f"Replay limit reached ({phase5_config.SSE_REPLAY_MAX_EVENTS}) for user {user_id}"
+            )
+
+        live: List[Dict[str, Any]] = []
+        while not queue.empty():
+            live.append(queue.get_nowait())
+
+        replayed = 0
+        last_replayed: Tuple[int, int] = parsed
+        for entry_id, fields in entries:
+            try:
+                event = json.loads(fields["event"])
+            except Exception:
+                continue
+            event["seq"] = entry_id
+            queue.put_nowait(event)
+            last_replayed = _parse_event_id(entry_id) or last_replayed
+            replayed += 1
+
+        for event in live:
+            seq = _parse_event_id(str(event.get("seq", "")))
+            if seq is None or seq > last_replayed:
+                queue.put_nowait(event)
+        return replayed
+
     async def disconnect(self, user_id: str, queue: asyncio.Queue):
         """
         断开 SSE 连接
@@ -105,33 +150,32 @@ class SSEManager:
         """
         user_id_str = str(user_id) if isinstance(user_id, UUID) else user_id
         
-        # Generate Sequence ID (Timestamp in ms for simplicity)
-        seq = int(time.time() * 1000)
-        
         event_data = {
             "type": event_type,
             "data": data,
-            "seq": seq,
             "trace_id": trace_id,
             "done": is_done
         }
-        
-        # 1. Store in Redis for Replay (使用配置的缓冲区大小和 TTL)
+
+        # 1. Store in Redis Stream for Replay；Stream ID 即事件 ID
+        seq = None
         if cache_service.redis:
             try:
-                history_key = f"sse:history:{user_id_str}"
-                raw = json.dumps(event_data, ensure_ascii=False)
-                await cache_service.redis.rpush(history_key, raw)
-                # 保留最近 N 条事件
-                await cache_service.redis.ltrim(
+                history_key = self.HISTORY_KEY.format(user_id=user_id_str)
+                pipe = cache_service.redis.pipeline(transaction=False)
+                pipe.xadd(
                     history_key,
-                    -phase5_config.SSE_BUFFER_SIZE,
-                    -1
+                    {"event": json.dumps(event_data, ensure_ascii=False)},
+                    maxlen=phase5_config.SSE_BUFFER_SIZE,
+                    approximate=True,
                 )
-                # 设置 TTL
-                await cache_service.redis.expire(history_key, phase5_config.SSE_BUFFER_TTL)
+                pipe.expire(history_key, phase5_config.SSE_BUFFER_TTL)
+                seq, _ = await pipe.execute()
+                if isinstance(seq, bytes):
+                    seq = seq.decode()
             except Exception as e:
                 logger.error(f"Failed to buffer SSE event: {e}")
+        event_data["seq"] = seq or self._next_local_id()
 
         if user_id_str not in self.connections:
             logger.debug(f"No active SSE connections for user {user_id_str}")
@@ -144,18 +188,20 @@ class SSEManager:
             except Exception as e:
                 logger.error(f"Error sending SSE event to user {user_id_str}: {e}")
 
-        logger.debug(f"Sent SSE event '{event_type}' (seq={seq}, done={is_done}) to user {user_id_str}")
+        logger.debug(f"Sent SSE event '{event_type}' (seq={event_data['seq']}, done={is_done}) to user {user_id_str}")
 
     async def broadcast(self, event_type: str, data: dict):
         """
         向所有连接的用户广播事件
         (Broadcast typically doesn't support replay per user easily unless we duplicate, 
          skipping replay for broadcast for now or using a global channel)
+
+        广播事件不进入用户 Stream，也不携带 id，浏览器保留上一个 Last-Event-ID
         """
         event_data = {
             "type": event_type,
             "data": data,
-            "seq": int(time.time() * 1000)
+            "seq": None
         }
 
         for user_id, queues in self.connections.items():
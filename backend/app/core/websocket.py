@@ -1,16 +1,192 @@
 """
 WebSocket Connection Manager
 Distributed support via Redis Pub/Sub with optimized fan-out for presence.
+
+Every local socket owns a bounded outbound queue drained by its own writer task,
+so a broadcast serializes the payload once and only enqueues it per socket; a slow
+client never delays delivery to the rest of its group.
 """
-from typing import Dict, List, Optional, Set
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set
 from fastapi import WebSocket
 import json
 import asyncio
+import time
 from loguru import logger
 import redis.asyncio as redis
 from app.config import settings
+from app.core.metrics import (
+    ACTIVE_WEBSOCKET_CONNECTIONS,
+    WS_DROPPED_MESSAGES,
+    WS_EVICTIONS,
+    WS_SEND_LATENCY,
+    WS_SEND_QUEUE_DEPTH,
+)
 from app.core.redis_utils import resolve_redis_password, format_redis_url_for_log
 
+SLOW_CONSUMER_POLICIES = ("drop", "coalesce", "disconnect")
+# Close code for sockets evicted because they could not keep up (RFC 6455 "Try Again Later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class _Outbound:
+    """Queued outbound frame; text is replaced in place when a newer frame coalesces into it"""
+    __slots__ = ("text", "key", "enqueued_at", "close_code")
+
+    def __init__(self, text: Optional[str], key: Optional[str] = None, close_code: Optional[int] = None):
+        self.text = text
+        self.key = key
+        self.enqueued_at = time.perf_counter()
+        self.close_code = close_code
+
+
+class ConnectionWriter:
+    """
+    Per-connection outbound queue with a dedicated writer task.
+
+    Slow consumer policies when the queue is full:
+    - drop: discard the oldest queued message
+    - coalesce: messages with a coalesce key (typing, presence) replace their queued
+      predecessor in place; otherwise discard the oldest queued message
+    - disconnect: close the socket with 1013 and evict it
+    A send that fails or exceeds WS_SEND_TIMEOUT evicts the socket as dead.
+    """
+
+    # Strong references to in-flight evict closes: the event loop only keeps weak
+    # ones, and the evicted writer itself is dropped right away
+    _closing: Set[asyncio.Task] = set()
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        on_evict: Callable[[WebSocket], None],
+        max_queue: Optional[int] = None,
+        policy: Optional[str] = None,
+        send_timeout: Optional[float] = None,
+    ):
+        self.websocket = websocket
+        self.on_evict = on_evict
+        self.max_queue = max(1, max_queue or settings.WS_SEND_QUEUE_SIZE)
+        self.policy = policy or settings.WS_SLOW_CONSUMER_POLICY
+        if self.policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {self.policy}")
+        self.send_timeout = send_timeout or settings.WS_SEND_TIMEOUT
+
+        self._queue: Deque[_Outbound] = deque()
+        self._by_key: Dict[str, _Outbound] = {}
+        self._wakeup = asyncio.Event()
+        self.closed = False
+        self._task = asyncio.create_task(self._run())
+        ACTIVE_WEBSOCKET_CONNECTIONS.inc()
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def enqueue(self, text: str, coalesce_key: Optional[str] = None) -> bool:
+        """O(1) hand-off; returns False if the message was not queued"""
+        if self.closed:
+            return False
+
+        if coalesce_key is not None and self.policy == "coalesce":
+            queued = self._by_key.get(coalesce_key)
+            if queued is not None:
+                queued.text = text
+                WS_DROPPED_MESSAGES.labels(reason="coalesced").inc()
+                return True
+
+        if len(self._queue) >= self.max_queue:
+            if self.policy == "disconnect":
+                self.evict("slow_consumer", close_code=SLOW_CONSUMER_CLOSE_CODE)
+                return False
+            self._pop()
+            WS_DROPPED_MESSAGES.labels(reason="overflow").inc()
+
+        entry = _Outbound(text, coalesce_key)
+        self._queue.append(entry)
+        if coalesce_key is not None:
+            self._by_key[coalesce_key] = entry
+        WS_SEND_QUEUE_DEPTH.inc()
+        self._wakeup.set()
+        return True
+
+    def enqueue_close(self, code: int) -> None:
+        """Close the socket after everything queued before it has been sent"""
+        if self.closed:
+            return
+        self._queue.append(_Outbound(None, close_code=code))
+        WS_SEND_QUEUE_DEPTH.inc()
+        self._wakeup.set()
+
+    def _pop(self) -> _Outbound:
+        entry = self._queue.popleft()
+        WS_SEND_QUEUE_DEPTH.dec()
+        if entry.key is not None and self._by_key.get(entry.key) is entry:
+            del self._by_key[entry.key]
+        return entry
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                while not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                entry = self._pop()
+                if entry.close_code is not None:
+                    await asyncio.wait_for(self.websocket.close(code=entry.close_code), timeout=self.send_timeout)
+                    self.evict(None)
+                    return
+                await asyncio.wait_for(self.websocket.send_text(entry.text), timeout=self.send_timeout)
+                WS_SEND_LATENCY.observe(time.perf_counter() - entry.enqueued_at)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"Evicting websocket after failed send: {e!r}")
+            self.evict("send_error")
+
+    def evict(self, reason: Optional[str], close_code: Optional[int] = None) -> None:
+        """Stop the writer, drop queued messages and unregister the socket"""
+        if self.closed:
+            return
+        self.close()
+        if reason:
+            WS_EVICTIONS.labels(reason=reason).inc()
+        if close_code is not None:
+            task = asyncio.create_task(self._close_quietly(close_code))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+        self.on_evict(self.websocket)
+
+    async def _close_quietly(self, code: int) -> None:
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self._queue:
+            WS_DROPPED_MESSAGES.labels(reason="disconnected").inc(len(self._queue))
+            WS_SEND_QUEUE_DEPTH.dec(len(self._queue))
+        self._queue.clear()
+        self._by_key.clear()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        ACTIVE_WEBSOCKET_CONNECTIONS.dec()
+
+
+def _coalesce_key(message) -> Optional[str]:
+    """Only ephemeral state (typing indicators, presence) may be collapsed to its latest value"""
+    if not isinstance(message, dict):
+        return None
+    msg_type = message.get("type")
+    if msg_type in ("typing", "status_update") and message.get("user_id"):
+        return f"{msg_type}:{message['user_id']}"
+    return None
+
+
 class ConnectionManager:
     def __init__(self):
         # Local group connections: group_id -> List[WebSocket]
@@ -107,8 +283,12 @@ class ConnectionManager:
                 user_id = channel.split(":")[1]
                 if user_id in self.friend_map:
                     local_friends = self.friend_map[user_id]
+                    json_msg = json.dumps(data, default=str)
+                    key = _coalesce_key(data)
                     for fid in list(local_friends):
-                        await self._send_personal_local(data, fid)
+                        ws = self.user_connections.get(fid)
+                        if ws is not None:
+                            self._attach_writer(ws).enqueue(json_msg, key)
             
             # 2. Group Messages / Control
             elif channel.startswith("group:"):
@@ -142,6 +322,8 @@ class ConnectionManager:
         """Connect to a group chat channel"""
         await websocket.accept()
         websocket.user_id = user_id
+        websocket.group_id = group_id
+        self._attach_writer(websocket)
         if group_id not in self.active_connections:
             self.active_connections[group_id] = []
         self.active_connections[group_id].append(websocket)
@@ -151,6 +333,8 @@ class ConnectionManager:
         """Connect to visualization stream"""
         await websocket.accept()
         group_id = f"visualize:{session_id}"
+        websocket.group_id = group_id
+        self._attach_writer(websocket)
         if group_id not in self.active_connections:
             self.active_connections[group_id] = []
         self.active_connections[group_id].append(websocket)
@@ -160,6 +344,10 @@ class ConnectionManager:
         """Connect to personal channel and register friend map for presence"""
         await websocket.accept()
         websocket.user_id = user_id
+        self._attach_writer(websocket)
+        previous = self.user_connections.get(user_id)
+        if previous is not None and previous is not websocket:
+            self._release_writer(previous)
         self.user_connections[user_id] = websocket
         
         # Register friends to friend_map so we know who to notify locally
@@ -171,29 +359,56 @@ class ConnectionManager:
                 
         logger.info(f"User {user_id} connected to personal channel. Registered {len(friend_ids or [])} friends.")
 
+    def _attach_writer(self, websocket: WebSocket) -> "ConnectionWriter":
+        writer = getattr(websocket, "outbound", None)
+        if writer is None or writer.closed:
+            writer = ConnectionWriter(websocket, on_evict=self._evict)
+            websocket.outbound = writer
+        return writer
+
+    @staticmethod
+    def _release_writer(websocket: WebSocket) -> None:
+        writer = getattr(websocket, "outbound", None)
+        if writer is not None:
+            writer.close()
+
+    def _remove_from_group(self, websocket: WebSocket, group_id: str) -> None:
+        connections = self.active_connections.get(group_id)
+        if connections is None:
+            return
+        # Identity match: Starlette WebSocket compares equal by scope contents
+        remaining = [ws for ws in connections if ws is not websocket]
+        if remaining:
+            self.active_connections[group_id] = remaining
+        else:
+            del self.active_connections[group_id]
+
+    def _evict(self, websocket: WebSocket) -> None:
+        """Unregister a socket whose writer gave up (dead or too slow)"""
+        group_id = getattr(websocket, "group_id", None)
+        if group_id:
+            self._remove_from_group(websocket, group_id)
+        user_id = getattr(websocket, "user_id", None)
+        if user_id and self.user_connections.get(user_id) is websocket:
+            self.disconnect_user(user_id)
+        logger.info(f"Evicted websocket (user={user_id}, group={group_id})")
+
     def disconnect(self, websocket: WebSocket, group_id: str, user_id: str):
         """Disconnect from group"""
-        if group_id in self.active_connections:
-            if websocket in self.active_connections[group_id]:
-                self.active_connections[group_id].remove(websocket)
-                if not self.active_connections[group_id]:
-                    del self.active_connections[group_id]
+        self._remove_from_group(websocket, group_id)
+        self._release_writer(websocket)
         logger.info(f"User {user_id} disconnected from group {group_id}")
 
     def disconnect_visualization(self, websocket: WebSocket, session_id: str):
         """Disconnect from visualization stream"""
-        group_id = f"visualize:{session_id}"
-        if group_id in self.active_connections:
-            if websocket in self.active_connections[group_id]:
-                self.active_connections[group_id].remove(websocket)
-                if not self.active_connections[group_id]:
-                    del self.active_connections[group_id]
+        self._remove_from_group(websocket, f"visualize:{session_id}")
+        self._release_writer(websocket)
         logger.info(f"Client disconnected from visualization for session {session_id}")
 
     def disconnect_user(self, user_id: str):
         """Disconnect from personal channel and cleanup friend map"""
         if user_id in self.user_connections:
-            del self.user_connections[user_id]
+            self._release_writer(self.user_connections.pop(user_id))
             
         # Cleanup friend_map (reverse lookup is expensive, but we only do it on disconnect)
         # To optimize, we could store a local_user_friends_map[user_id] -> List[friend_ids]
@@ -219,12 +434,13 @@ class ConnectionManager:
 
     async def _kick_local(self, group_id: str, user_id: str, reason: str):
         if group_id in self.active_connections:
+            notice = json.dumps({"type": "error", "message": f"Kicked: {reason}"})
             for ws in list(self.active_connections[group_id]):
                 if hasattr(ws, 'user_id') and ws.user_id == user_id:
-                    try:
-                        await ws.send_json({"type": "error", "message": f"Kicked: {reason}"})
-                        await ws.close(code=4001)
-                    except: pass
+                    # 通过写协程发送，保证踢出通知排在已入队消息之后
+                    writer = self._attach_writer(ws)
+                    writer.enqueue(notice)
+                    writer.enqueue_close(4001)
 
     async def broadcast(self, message: dict, group_id: str):
         """Broadcast to group (Distributed)"""
@@ -235,15 +451,14 @@ class ConnectionManager:
 
     async def _broadcast_local(self, message: dict, group_id: str, exclude_user_id: str = None):
         if group_id in self.active_connections:
+            # Serialize once; each socket's writer task sends the shared string
             json_msg = json.dumps(message, default=str)
+            key = _coalesce_key(message)
             for ws in list(self.active_connections[group_id]):
                 # Skip if it's the excluded user
                 if exclude_user_id and hasattr(ws, 'user_id') and ws.user_id == exclude_user_id:
                     continue
-                try:
-                    await ws.send_text(json_msg)
-                except Exception as e:
-                    logger.error(f"Local broadcast error: {e}")
+                self._attach_writer(ws).enqueue(json_msg, key)
 
     async def send_personal_message(self, message: dict, user_id: str):
         """Send message to specific user (Distributed)"""
@@ -263,10 +478,8 @@ class ConnectionManager:
 
     async def _send_personal_local(self, message: dict, user_id: str):
         if user_id in self.user_connections:
-            try:
-                await self.user_connections[user_id].send_text(json.dumps(message, default=str))
-            except Exception as e:
-                logger.error(f"Local personal send error: {e}")
+            ws = self.user_connections[user_id]
+            self._attach_writer(ws).enqueue(json.dumps(message, default=str), _coalesce_key(message))
         else:
             # User not on THIS instance. 
             # In single-instance mode, this is where we trigger Push.
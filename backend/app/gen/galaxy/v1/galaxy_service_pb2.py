@@ -25,7 +25,7 @@ _sym_db = _symbol_database.Default()
 from google.protobuf import timestamp_pb2 as google_dot_protobuf_dot_timestamp__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x14galaxy_service.proto\x12\tgalaxy.v1\x1a\x1fgoogle/protobuf/timestamp.proto\"f\n\x19\x43ollaborativeGalaxyUpdate\x12\x11\n\tgalaxy_id\x18\x01 \x01(\t\x12\x12\n\nyjs_update\x18\x02 \x01(\x0c\x12\x0f\n\x07user_id\x18\x03 \x01(\t\x12\x11\n\ttimestamp\x18\x04 \x01(\x03\"\\\n\x1eSyncCollaborativeGalaxyRequest\x12\x11\n\tgalaxy_id\x18\x01 \x01(\t\x12\x16\n\x0epartial_update\x18\x02 \x01(\x0c\x12\x0f\n\x07user_id\x18\x03 \x01(\t\"I\n\x1fSyncCollaborativeGalaxyResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x15\n\rserver_update\x18\x02 \x01(\x0c\"\xb0\x01\n\x18UpdateNodeMasteryRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x0f\n\x07node_id\x18\x02 \x01(\t\x12\x0f\n\x07mastery\x18\x03 \x01(\x05\x12+\n\x07version\x18\x04 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x0e\n\x06reason\x18\x05 \x01(\t\x12\x12\n\nrequest_id\x18\x06 \x01(\t\x12\x10\n\x08revision\x18\x07 \x01(\x03\"\x94\x01\n\x19UpdateNodeMasteryResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x13\n\x0bold_mastery\x18\x02 \x01(\x05\x12\x13\n\x0bnew_mastery\x18\x03 \x01(\x05\x12\x0e\n\x06reason\x18\x04 \x01(\t\x12\x12\n\nrequest_id\x18\x05 \x01(\t\x12\x18\n\x10\x63urrent_revision\x18\x06 \x01(\x03\x32\xe1\x01\n\rGalaxyService\x12^\n\x11UpdateNodeMastery\x12#.galaxy.v1.UpdateNodeMasteryRequest\x1a$.galaxy.v1.UpdateNodeMasteryResponse\x12p\n\x17SyncCollaborativeGalaxy\x12).galaxy.v1.SyncCollaborativeGalaxyRequest\x1a*.galaxy.v1.SyncCollaborativeGalaxyResponseB3Z1github.com/sparkle/gateway/gen/galaxy/v1;galaxyv1b\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x14galaxy_service.proto\x12\tgalaxy.v1\x1a\x1fgoogle/protobuf/timestamp.proto\"f\n\x19\x43ollaborativeGalaxyUpdate\x12\x11\n\tgalaxy_id\x18\x01 \x01(\t\x12\x12\n\nyjs_update\x18\x02 \x01(\x0c\x12\x0f\n\x07user_id\x18\x03 \x01(\t\x12\x11\n\ttimestamp\x18\x04 \x01(\x03\"r\n\x1eSyncCollaborativeGalaxyRequest\x12\x11\n\tgalaxy_id\x18\x01 \x01(\t\x12\x16\n\x0epartial_update\x18\x02 \x01(\x0c\x12\x0f\n\x07user_id\x18\x03 \x01(\t\x12\x14\n\x0cstate_vector\x18\x04 \x01(\x0c\"_\n\x1fSyncCollaborativeGalaxyResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x15\n\rserver_update\x18\x02 \x01(\x0c\x12\x14\n\x0cstate_vector\x18\x03 \x01(\x0c\"\xb0\x01\n\x18UpdateNodeMasteryRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x0f\n\x07node_id\x18\x02 \x01(\t\x12\x0f\n\x07mastery\x18\x03 \x01(\x05\x12+\n\x07version\x18\x04 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x0e\n\x06reason\x18\x05 \x01(\t\x12\x12\n\nrequest_id\x18\x06 \x01(\t\x12\x10\n\x08revision\x18\x07 \x01(\x03\"\x94\x01\n\x19UpdateNodeMasteryResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x13\n\x0bold_mastery\x18\x02 \x01(\x05\x12\x13\n\x0bnew_mastery\x18\x03 \x01(\x05\x12\x0e\n\x06reason\x18\x04 \x01(\t\x12\x12\n\nrequest_id\x18\x05 \x01(\t\x12\x18\n\x10\x63urrent_revision\x18\x06 \x01(\x03\x32\xe1\x01\n\rGalaxyService\x12^\n\x11UpdateNodeMastery\x12#.galaxy.v1.UpdateNodeMasteryRequest\x1a$.galaxy.v1.UpdateNodeMasteryResponse\x12p\n\x17SyncCollaborativeGalaxy\x12).galaxy.v1.SyncCollaborativeGalaxyRequest\x1a*.galaxy.v1.SyncCollaborativeGalaxyResponseB3Z1github.com/sparkle/gateway/gen/galaxy/v1;galaxyv1b\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -36,13 +36,13 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_COLLABORATIVEGALAXYUPDATE']._serialized_start=68
   _globals['_COLLABORATIVEGALAXYUPDATE']._serialized_end=170
   _globals['_SYNCCOLLABORATIVEGALAXYREQUEST']._serialized_start=172
-  _globals['_SYNCCOLLABORATIVEGALAXYREQUEST']._serialized_end=264
-  _globals['_SYNCCOLLABORATIVEGALAXYRESPONSE']._serialized_start=266
-  _globals['_SYNCCOLLABORATIVEGALAXYRESPONSE']._serialized_end=339
-  _globals['_UPDATENODEMASTERYREQUEST']._serialized_start=342
-  _globals['_UPDATENODEMASTERYREQUEST']._serialized_end=518
-  _globals['_UPDATENODEMASTERYRESPONSE']._serialized_start=521
-  _globals['_UPDATENODEMASTERYRESPONSE']._serialized_end=669
-  _globals['_GALAXYSERVICE']._serialized_start=672
-  _globals['_GALAXYSERVICE']._serialized_end=897
+  _globals['_SYNCCOLLABORATIVEGALAXYREQUEST']._serialized_end=286
+  _globals['_SYNCCOLLABORATIVEGALAXYRESPONSE']._serialized_start=288
+  _globals['_SYNCCOLLABORATIVEGALAXYRESPONSE']._serialized_end=383
+  _globals['_UPDATENODEMASTERYREQUEST']._serialized_start=386
+  _globals['_UPDATENODEMASTERYREQUEST']._serialized_end=562
+  _globals['_UPDATENODEMASTERYRESPONSE']._serialized_start=565
+  _globals['_UPDATENODEMASTERYRESPONSE']._serialized_end=713
+  _globals['_GALAXYSERVICE']._serialized_start=716
+  _globals['_GALAXYSERVICE']._serialized_end=941
 # @@protoc_insertion_point(module_scope)
@@ -21,22 +21,26 @@ class CollaborativeGalaxyUpdate(_message.Message):
     def __init__(self, galaxy_id: _Optional[str] = ..., yjs_update: _Optional[bytes] = ..., user_id: _Optional[str] = ..., timestamp: _Optional[int] = ...) -> None: ...
 
 class SyncCollaborativeGalaxyRequest(_message.Message):
-    __slots__ = ("galaxy_id", "partial_update", "user_id")
+    __slots__ = ("galaxy_id", "partial_update", "user_id", "state_vector")
     GALAXY_ID_FIELD_NUMBER: _ClassVar[int]
     PARTIAL_UPDATE_FIELD_NUMBER: _ClassVar[int]
     USER_ID_FIELD_NUMBER: _ClassVar[int]
+    STATE_VECTOR_FIELD_NUMBER: _ClassVar[int]
     galaxy_id: str
     partial_update: bytes
     user_id: str
-    def __init__(self, galaxy_id: _Optional[str] = ..., partial_update: _Optional[bytes] = ..., user_id: _Optional[str] = ...) -> None: ...
+    state_vector: bytes
+    def __init__(self, galaxy_id: _Optional[str] = ..., partial_update: _Optional[bytes] = ..., user_id: _Optional[str] = ..., state_vector: _Optional[bytes] = ...) -> None: ...
 
 class SyncCollaborativeGalaxyResponse(_message.Message):
-    __slots__ = ("success", "server_update")
+    __slots__ = ("success", "server_update", "state_vector")
     SUCCESS_FIELD_NUMBER: _ClassVar[int]
     SERVER_UPDATE_FIELD_NUMBER: _ClassVar[int]
+    STATE_VECTOR_FIELD_NUMBER: _ClassVar[int]
     success: bool
     server_update: bytes
-    def __init__(self, success: bool = ..., server_update: _Optional[bytes] = ...) -> None: ...
+    state_vector: bytes
+    def __init__(self, success: bool = ..., server_update: _Optional[bytes] = ..., state_vector: _Optional[bytes] = ...) -> None: ...
 
 class UpdateNodeMasteryRequest(_message.Message):
     __slots__ = ("user_id", "node_id", "mastery", "version", "reason", "request_id", "revision")
@@ -15,6 +15,8 @@ from app.services.job_service import JobService
 from app.services.subject_service import SubjectService
 from app.services.scheduler_service import scheduler_service
 from app.core.cache import cache_service
+from app.services.embedding_service import embedding_service
+from app.services.prerequisite_graph_store import prerequisite_graph_store
 from app.core.access_control import verify_token
 from app.core.idempotency import get_idempotency_store
 from app.api.middleware import IdempotencyMiddleware
@@ -111,6 +113,10 @@ async def lifespan(app: FastAPI):
     # 停止知识拓展后台任务
     await stop_expansion_worker()
     
+    # Close shared embedding HTTP client
+    await embedding_service.close()
+    await prerequisite_graph_store.close()
+
     # Close Cache
     await cache_service.close()
     # Close WebSocket Redis
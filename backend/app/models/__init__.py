@@ -34,7 +34,7 @@ from app.models.curiosity_capsule import CuriosityCapsule
 from app.models.focus import FocusSession, FocusType, FocusStatus
 from app.models.vocabulary import WordBook, DictionaryEntry
 from app.models.file_storage import StoredFile
-from app.models.document_chunks import DocumentChunk
+from app.models.document_chunks import ChunkEmbedding, DocumentChunk
 from app.models.group_files import GroupFile
 from app.models.irt import IRTItemParameter, UserIRTAbility
 from app.models.event import TrackingEvent
@@ -47,6 +47,7 @@ from app.models.intervention import (
     InterventionFeedback,
     UserInterventionSettings,
 )
+from app.models.translation import TranslationGlossary, TranslationMemoryEntry
 from app.models.learning_assets import (
     LearningAsset,
     AssetSuggestionLog,
@@ -116,6 +117,7 @@ __all__ = [
     "DictionaryEntry",
     "StoredFile",
     "DocumentChunk",
+    "ChunkEmbedding",
     "GroupFile",
     "IRTItemParameter",
     "UserIRTAbility",
@@ -128,6 +130,9 @@ __all__ = [
     "InterventionAuditLog",
     "InterventionFeedback",
     "UserInterventionSettings",
+    # Translation
+    "TranslationGlossary",
+    "TranslationMemoryEntry",
     # Learning Assets
     "LearningAsset",
     "AssetSuggestionLog",
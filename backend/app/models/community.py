@@ -21,9 +21,10 @@ from typing import Optional, List
 
 from sqlalchemy import (
     Column, String, Text, DateTime, Boolean, Integer, Float,
-    ForeignKey, Enum, UniqueConstraint, Index, JSON
+    ForeignKey, Enum, UniqueConstraint, Index, JSON, Computed
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 
 from app.models.base import BaseModel, GUID
 
@@ -326,6 +327,11 @@ class GroupMessage(BaseModel):
     forwarded_from_id = Column(GUID(), ForeignKey("group_messages.id"), nullable=True)
     forward_count = Column(Integer, default=0, nullable=False)
 
+    # 全文检索（数据库生成列，中文二元切分，见 app/services/message_search_index.py）
+    search_vector = deferred(Column(
+        TSVECTOR, Computed("to_tsvector('simple', message_search_text(content))", persisted=True)
+    ))
+
     # 关系
     group = relationship("Group", back_populates="messages")
     sender = relationship("User")
@@ -336,6 +342,7 @@ class GroupMessage(BaseModel):
     __table_args__ = (
         Index('idx_message_group_time', 'group_id', 'created_at'),
         Index('idx_message_group_thread', 'group_id', 'thread_root_id', 'created_at'),
+        Index('idx_group_messages_search', 'search_vector', postgresql_using='gin'),
     )
 
 
@@ -527,6 +534,11 @@ class PrivateMessage(BaseModel):
     forwarded_from_id = Column(GUID(), ForeignKey("private_messages.id"), nullable=True)
     forward_count = Column(Integer, default=0, nullable=False)
 
+    # 全文检索（数据库生成列，中文二元切分，见 app/services/message_search_index.py）
+    search_vector = deferred(Column(
+        TSVECTOR, Computed("to_tsvector('simple', message_search_text(content))", persisted=True)
+    ))
+
     # 关系
     sender = relationship("User", foreign_keys=[sender_id])
     receiver = relationship("User", foreign_keys=[receiver_id])
@@ -538,6 +550,7 @@ class PrivateMessage(BaseModel):
         Index('idx_private_message_conversation', 'sender_id', 'receiver_id', 'created_at'),
         Index('idx_private_message_receiver_unread', 'receiver_id', 'is_read'),
         Index('idx_private_message_thread', 'sender_id', 'receiver_id', 'thread_root_id', 'created_at'),
+        Index('idx_private_messages_search', 'search_vector', postgresql_using='gin'),
     )
 
 
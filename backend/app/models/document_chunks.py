@@ -2,13 +2,32 @@
 Document chunk models
 文档分块模型
 """
-from sqlalchemy import Column, String, Integer, Text, ForeignKey, JSON, Float
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, String, Integer, Text, ForeignKey, JSON, Float
 from sqlalchemy.orm import relationship
 from pgvector.sqlalchemy import Vector
 
+from app.db.session import Base
 from app.models.base import BaseModel, GUID
 
 
+class ChunkEmbedding(Base):
+    """
+    Content-addressed embedding store shared across files and users.
+
+    content_hash = sha256(embedding model + splitter params + normalized text),
+    so re-uploads and identical course materials reuse vectors instead of
+    calling the embedding API again.
+    """
+    __tablename__ = "chunk_embeddings"
+
+    content_hash = Column(String(64), primary_key=True)
+    embedding_model = Column(String(100), nullable=False)
+    embedding = Column(Vector(1536), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class DocumentChunk(BaseModel):
     """
     Document chunks for vector search.
@@ -31,6 +50,8 @@ class DocumentChunk(BaseModel):
     pipeline_version = Column(String(50), nullable=True) # e.g. "v1.0", "deepseek-v2"
 
     content = Column(Text, nullable=False)
+    # Shared vector reference; embedding below is a copy kept for the ANN index used by retrieval
+    content_hash = Column(String(64), ForeignKey("chunk_embeddings.content_hash"), nullable=True, index=True)
     embedding = Column(Vector(1536), nullable=True)
 
     file = relationship("StoredFile")
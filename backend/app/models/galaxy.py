@@ -4,7 +4,7 @@ Knowledge Galaxy Models
 """
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Integer, ForeignKey, Text, Boolean, DateTime, Float, JSON, LargeBinary, BigInteger
+from sqlalchemy import Column, String, Integer, ForeignKey, Text, Boolean, DateTime, Float, JSON, LargeBinary, BigInteger, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from pgvector.sqlalchemy import Vector
@@ -65,12 +65,32 @@ class CRDTSnapshot(Base):
 
     galaxy_id = Column(GUID(), ForeignKey("collaborative_galaxies.id"), primary_key=True)
     state_data = Column(LargeBinary, nullable=False)  # Yjs 二进制更新
-    operation_count = Column(Integer, default=0)
+    operation_count = Column(Integer, default=0)  # 已折叠进快照的增量更新数
+    last_update_id = Column(BigInteger, default=0, nullable=False)  # 已折叠的最大 crdt_update_log.id
     
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
 
+class CRDTUpdateLog(Base):
+    """
+    CRDT 增量更新日志表 (append-only)
+    每行是一条 Yjs 增量更新；文档 = 快照 + 快照之后的日志，后台任务定期折叠进 crdt_snapshots
+    """
+    __tablename__ = "crdt_update_log"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    galaxy_id = Column(GUID(), ForeignKey("collaborative_galaxies.id"), nullable=False)
+    user_id = Column(GUID(), ForeignKey("users.id"), nullable=True)
+    update_data = Column(LargeBinary, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_crdt_update_log_galaxy_id', 'galaxy_id', 'id'),
+    )
+
+
 class CRDTOperationLog(Base):
     """
     协作操作日志表
@@ -203,6 +223,8 @@ class UserNodeStatus(Base):
     
     # Logical clock for conflict resolution
     revision = Column(Integer, default=0, nullable=False)
+    # 增量同步游标：按用户递增，由触发器在每次状态写入时分配 (见 p20_galaxy_tiles)
+    sync_revision = Column(BigInteger, default=0, server_default="0", nullable=False)
     
     # 元数据
     first_unlock_at = Column(DateTime, nullable=True)
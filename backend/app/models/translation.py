@@ -0,0 +1,46 @@
+"""
+翻译术语表与翻译记忆模型
+Translation Glossary & Translation Memory Models
+"""
+from sqlalchemy import Column, String, Text, Integer, DateTime, JSON, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.db.session import Base
+from app.models.base import BaseModel
+
+
+class TranslationGlossary(BaseModel):
+    """
+    按学科划分的版本化术语表
+    每次修改写入新版本 (version 递增)，已发布版本不可变，
+    翻译记忆以 "{subject}_terms_v{version}" 作为键的一部分，术语更新后旧译文自然失效。
+    """
+    __tablename__ = "translation_glossaries"
+
+    subject = Column(String(50), nullable=False, index=True)  # 例如: "cs", "math"
+    version = Column(Integer, nullable=False)
+    terms = Column(JSON, nullable=False)  # [{"source": "cache", "target": "缓存"}, ...]
+
+    __table_args__ = (
+        UniqueConstraint('subject', 'version', name='uq_translation_glossary_subject_version'),
+    )
+
+
+class TranslationMemoryEntry(Base):
+    """
+    段落级翻译记忆 (Redis 之后的可选持久层)
+    key = sha256(规范化原文, 源语言, 目标语言, 术语表版本, 翻译配置)
+    """
+    __tablename__ = "translation_memory"
+
+    key = Column(String(64), primary_key=True)
+    source_lang = Column(String(20), nullable=False)
+    target_lang = Column(String(20), nullable=False)
+    glossary_version = Column(String(80), nullable=False, default="")
+    source_text = Column(Text, nullable=False)
+    translation = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<TranslationMemoryEntry(key={self.key})>"
+
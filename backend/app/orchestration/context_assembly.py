@@ -0,0 +1,128 @@
+"""
+ContextAssembler - 并行上下文装配
+
+在首个 token 之前需要准备的上下文（用户画像、对话历史、工具偏好、知识检索）
+彼此独立。本模块将它们并发启动，每个来源拥有独立的时间预算和降级值，
+在整体截止时间到达时合并已完成的结果，未完成的来源使用降级值。
+
+首 token 延迟 (TTFT) 因此由最慢来源的预算上限决定，而不是所有来源之和。
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+
+@dataclass
+class ContextSource:
+    """单个上下文来源"""
+    name: str
+    loader: Callable[[], Awaitable[Any]]
+    timeout: float  # 该来源的时间预算（秒）
+    fallback: Any = None
+
+
+@dataclass
+class SourceOutcome:
+    """来源的执行结果"""
+    name: str
+    value: Any
+    status: str  # ok | timeout | error | deadline
+    latency: float
+
+
+@dataclass
+class AssembledContext:
+    """装配结果"""
+    values: Dict[str, Any] = field(default_factory=dict)
+    outcomes: Dict[str, SourceOutcome] = field(default_factory=dict)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.values.get(name, default)
+
+    def ok(self, name: str) -> bool:
+        outcome = self.outcomes.get(name)
+        return bool(outcome and outcome.status == "ok")
+
+
+class ContextAssembler:
+    """
+    并发执行上下文来源，按截止时间合并
+
+    Args:
+        deadline: 整体截止时间（秒），超过后仍未完成的来源被取消并使用降级值
+        histogram: 可选的 Prometheus Histogram（需有 operation 标签），
+                   每个来源的耗时以 operation="context.<name>" 上报
+    """
+
+    def __init__(self, deadline: float, histogram=None):
+        self.deadline = deadline
+        self.histogram = histogram
+
+    async def _run_source(self, source: ContextSource) -> SourceOutcome:
+        start = time.perf_counter()
+        try:
+            value = await asyncio.wait_for(source.loader(), timeout=source.timeout)
+            status = "ok"
+        except asyncio.TimeoutError:
+            logger.warning(f"Context source '{source.name}' exceeded budget {source.timeout:.2f}s")
+            value, status = source.fallback, "timeout"
+        except Exception as e:
+            logger.warning(f"Context source '{source.name}' failed: {e}")
+            value, status = source.fallback, "error"
+
+        outcome = SourceOutcome(source.name, value, status, time.perf_counter() - start)
+        self._observe(outcome)
+        return outcome
+
+    def _observe(self, outcome: SourceOutcome) -> None:
+        if self.histogram is None:
+            return
+        try:
+            self.histogram.labels(operation=f"context.{outcome.name}").observe(outcome.latency)
+        except Exception as e:
+            logger.debug(f"Failed to record context source latency: {e}")
+
+    async def assemble(self, sources: List[ContextSource]) -> AssembledContext:
+        """并发启动所有来源，返回截止时间前到达的结果"""
+        result = AssembledContext()
+        if not sources:
+            return result
+
+        start = time.perf_counter()
+        tasks = {
+            asyncio.create_task(self._run_source(source), name=f"context.{source.name}"): source
+            for source in sources
+        }
+        done, pending = await asyncio.wait(tasks.keys(), timeout=self.deadline)
+
+        for task in done:
+            outcome = task.result()
+            result.outcomes[outcome.name] = outcome
+            result.values[outcome.name] = outcome.value
+
+        for task in pending:
+            task.cancel()
+            source = tasks[task]
+            outcome = SourceOutcome(source.name, source.fallback, "deadline", time.perf_counter() - start)
+            logger.warning(f"Context source '{source.name}' missed assembly deadline {self.deadline:.2f}s")
+            self._observe(outcome)
+            result.outcomes[source.name] = outcome
+            result.values[source.name] = source.fallback
+
+        if pending:
+            # 等待取消完成，避免遗留任务继续占用 DB 连接
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        return result
+
+
+def first_available(assembled: AssembledContext, names: List[str], default: Any = None) -> Optional[str]:
+    """按优先级返回第一个成功且非空的来源名"""
+    for name in names:
+        if assembled.ok(name) and assembled.get(name):
+            return name
+    return default
@@ -18,6 +18,7 @@ import time
 from typing import AsyncGenerator, List, Dict, Optional, Any, Set
 from datetime import datetime
 import uuid
+from contextlib import asynccontextmanager
 
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -44,11 +45,13 @@ from app.orchestration.dynamic_tool_registry import dynamic_tool_registry
 from app.orchestration.validator import RequestValidator, ValidationResult
 from app.orchestration.composer import ResponseComposer
 from app.orchestration.context_pruner import ContextPruner
+from app.orchestration.context_assembly import ContextAssembler, ContextSource, AssembledContext, first_available
 from app.orchestration.token_tracker import TokenTracker
 from app.orchestration.collaboration_workflows import create_collaboration_workflow, WorkflowState
 from app.routing.tool_preference_router import ToolPreferenceRouter
 from app.gen.agent.v1 import agent_service_pb2
 from app.config import settings
+from app.db.session import AsyncSessionLocal
 
 TRACER = trace.get_tracer(__name__)
 
@@ -215,7 +218,6 @@ class ProductionChatOrchestrator:
 
     def __init__(
         self,
-        db_session: Optional[AsyncSession] = None,
         redis_client=None,
         # 熔断器配置
         circuit_breaker_threshold: int = 5,
@@ -225,9 +227,13 @@ class ProductionChatOrchestrator:
         # 配置
         enable_metrics: bool = True,
         enable_circuit_breaker: bool = True,
+        # 并行上下文装配使用的会话工厂，默认 AsyncSessionLocal
+        session_factory=None,
     ):
-        self.db_session = db_session
         self.redis = redis_client
+        # 上下文来源总在自己的会话上执行：截止时间到达时被取消的只是来源自己的查询，
+        # 调用方的会话不受影响
+        self.session_factory = session_factory if session_factory is not None else AsyncSessionLocal
 
         # 核心组件
         self.state_manager = SessionStateManager(redis_client) if redis_client else None
@@ -493,6 +499,132 @@ class ProductionChatOrchestrator:
         else:
             logger.error(f"Request failed: {json.dumps(log_data)}")
 
+    @asynccontextmanager
+    async def _source_session(self):
+        """
+        为并行上下文来源提供独立的数据库会话
+
+        AsyncSession 不支持并发操作，且被取消的查询会让会话处于不确定状态，
+        因此每个来源从 session_factory 获取自己的会话，从不使用调用方的会话。
+        """
+        async with self.session_factory() as db:
+            yield db
+
+    async def _load_user_context(self, user_id: str) -> Dict[str, Any]:
+        async with self._source_session() as db:
+            return await self._build_user_context(user_id, db)
+
+    async def _load_tool_preferences(self, user_id: str) -> List[str]:
+        async with self._source_session() as db:
+            router = ToolPreferenceRouter(db, uuid.UUID(user_id), self.redis)
+            return await router.get_preferred_tools(limit=3)
+
+    async def _load_graphrag_context(self, user_id: str, query: str) -> str:
+        with TRACER.start_as_current_span("rag.graphrag"):
+            async with self._source_session() as db:
+                graph_ks = GraphKnowledgeService(db)
+                rag_result = await graph_ks.graph_rag_search(
+                    query=query,
+                    user_id=uuid.UUID(user_id),
+                    depth=2,
+                    top_k=5
+                )
+
+        # 记录 GraphRAG 指标
+        if rag_result.get("metadata"):
+            logger.info(
+                f"GraphRAG results: "
+                f"vector={rag_result['metadata'].get('vector_count', 0)}, "
+                f"graph={rag_result['metadata'].get('graph_count', 0)}, "
+                f"fused={rag_result['metadata'].get('fusion_count', 0)}"
+            )
+        return rag_result.get("context", "")
+
+    async def _load_vector_context(self, user_id: str, query: str) -> str:
+        with TRACER.start_as_current_span("rag.vector_fallback"):
+            async with self._source_session() as db:
+                ks = KnowledgeService(db)
+                return await ks.retrieve_context(user_id=uuid.UUID(user_id), query=query)
+
+    async def _load_keyword_context(self, user_id: str, query: str) -> str:
+        """关键词检索（避免向量服务依赖）"""
+        with TRACER.start_as_current_span("rag.keyword_fallback"):
+            async with self._source_session() as db:
+                galaxy_service = GalaxyService(db)
+                nodes = await galaxy_service.keyword_search(user_id=uuid.UUID(user_id), query=query, limit=5)
+        if not nodes:
+            return ""
+        lines = ["Relevant Knowledge Base (Keyword Fallback):"]
+        for node in nodes:
+            line = f"- [{node.name}]: {node.description or 'No description'}"
+            if node.parent_name:
+                line += f" (Parent: {node.parent_name})"
+            lines.append(line)
+        return "\n".join(lines)
+
+    async def _assemble_context(
+        self,
+        session_id: str,
+        user_id: str,
+        query: str
+    ) -> AssembledContext:
+        """并发装配首 token 前所需的全部上下文"""
+        budgets = settings.CHAT_CONTEXT_SOURCE_BUDGETS
+        sources = [
+            ContextSource(
+                "conversation",
+                lambda: self._build_conversation_context(session_id, user_id),
+                budgets.get("conversation", 0.5),
+                {"messages": [], "summary": None},
+            ),
+            ContextSource(
+                "user_context",
+                lambda: self._load_user_context(user_id),
+                budgets.get("user_context", 0.5),
+                self._get_fallback_context(),
+            ),
+        ]
+        if user_id:
+            sources.extend([
+                ContextSource(
+                    "tool_preferences",
+                    lambda: self._load_tool_preferences(user_id),
+                    budgets.get("tool_preferences", 0.3),
+                    [],
+                ),
+                ContextSource(
+                    "graphrag",
+                    lambda: self._load_graphrag_context(user_id, query),
+                    budgets.get("graphrag", 1.5),
+                    "",
+                ),
+                ContextSource(
+                    "vector",
+                    lambda: self._load_vector_context(user_id, query),
+                    budgets.get("vector", 1.0),
+                    "",
+                ),
+                ContextSource(
+                    "keyword",
+                    lambda: self._load_keyword_context(user_id, query),
+                    budgets.get("keyword", 0.5),
+                    "",
+                ),
+            ])
+
+        assembler = ContextAssembler(
+            deadline=settings.CHAT_CONTEXT_DEADLINE_SECONDS,
+            histogram=REQUEST_DURATION if self.enable_metrics else None,
+        )
+        assembled = await assembler.assemble(sources)
+        logger.debug(
+            "Context assembled for {}: {}".format(
+                session_id,
+                {name: f"{o.status}/{o.latency * 1000:.0f}ms" for name, o in assembled.outcomes.items()},
+            )
+        )
+        return assembled
+
     async def process_stream(
         self,
         request: agent_service_pb2.ChatRequest,
@@ -511,6 +643,9 @@ class ProductionChatOrchestrator:
         6. 分布式锁
         7. 执行处理
         8. 记录指标
+
+        db_session 仅为与 ChatOrchestrator.process_stream 保持相同签名而保留，不会被使用：
+        各上下文来源总在 session_factory 创建的独立会话上执行，调用方的会话与事务不参与本次处理。
         """
         start_time = time.time()
         request_id = request.request_id
@@ -566,8 +701,6 @@ class ProductionChatOrchestrator:
             )
             return
 
-        active_db = db_session or self.db_session
-
         try:
             # 验证请求
             with TRACER.start_as_current_span("request.validate"):
@@ -595,92 +728,33 @@ class ProductionChatOrchestrator:
             if not lock_acquired:
                 raise ValueError("Another request is processing for this session")
 
-            # 构建上下文
+            # 构建上下文（并行装配，各来源独立预算，截止时间内到达的结果合并）
             with TRACER.start_as_current_span("context.build"):
                 with REQUEST_DURATION.labels(operation="context_building").time():
-                    user_context_data = await self._build_user_context(user_id, active_db)
-                    conversation_context = await self._build_conversation_context(session_id, user_id)
+                    query = request.message if request.HasField("message") else ""
+                    assembled = await self._assemble_context(session_id, user_id, query)
+
+                user_context_data = assembled.get("user_context") or self._get_fallback_context()
+                conversation_context = assembled.get("conversation") or {"messages": [], "summary": None}
 
                 # P4: Tool Preference Routing
                 preferred_tools_hint = ""
-                try:
-                    if active_db and user_id:
-                        # Convert user_id string to UUID
-                        user_uuid = uuid.UUID(user_id)
-                        router = ToolPreferenceRouter(active_db, user_uuid, self.redis)
-                        preferred_tools = await router.get_preferred_tools(limit=3)
-                        if preferred_tools:
-                            preferred_tools_hint = f"\n\n## 工具偏好\n根据历史习惯，用户倾向于使用以下工具: {', '.join(preferred_tools)}"
-                            logger.info(f"Injected tool preferences for user {user_id}: {preferred_tools}")
-                except Exception as e:
-                    logger.warning(f"Failed to get tool preferences: {e}")
-
-                # GraphRAG 检索（增强版，带降级）
-                knowledge_context = ""
-                try:
-                    if active_db and user_id:
-                        with TRACER.start_as_current_span("rag.graphrag"):
-                            # 使用 GraphKnowledgeService 进行增强的 GraphRAG 检索
-                            graph_ks = GraphKnowledgeService(active_db)
-                            rag_result = await graph_ks.graph_rag_search(
-                                query=request.message if request.HasField("message") else "",
-                                user_id=uuid.UUID(user_id),
-                                depth=2,
-                                top_k=5
-                            )
-                        knowledge_context = rag_result.get("context", "")
-
-                        # 记录 GraphRAG 指标
-                        if rag_result.get("metadata"):
-                            logger.info(
-                                f"GraphRAG results: "
-                                f"vector={rag_result['metadata'].get('vector_count', 0)}, "
-                                f"graph={rag_result['metadata'].get('graph_count', 0)}, "
-                                f"fused={rag_result['metadata'].get('fusion_count', 0)}"
-                            )
+                preferred_tools = assembled.get("tool_preferences")
+                if preferred_tools:
+                    preferred_tools_hint = f"\n\n## 工具偏好\n根据历史习惯，用户倾向于使用以下工具: {', '.join(preferred_tools)}"
+                    logger.info(f"Injected tool preferences for user {user_id}: {preferred_tools}")
 
-                        # Prometheus 指标
-                        if PROMETHEUS_AVAILABLE:
-                            REQUEST_COUNTER.labels(status="graphrag_success", session_id=session_id).inc()
-                except Exception as e:
-                    logger.warning(f"GraphRAG retrieval failed: {e}, falling back to vector search")
-                    # 降级到普通向量检索
-                    try:
-                        if active_db and user_id:
-                            with TRACER.start_as_current_span("rag.vector_fallback"):
-                                ks = KnowledgeService(active_db)
-                                knowledge_context = await ks.retrieve_context(
-                                    user_id=uuid.UUID(user_id),
-                                    query=request.message if request.HasField("message") else ""
-                                )
-                            if PROMETHEUS_AVAILABLE:
-                                REQUEST_COUNTER.labels(status="vector_success", session_id=session_id).inc()
-                    except Exception as e2:
-                        logger.error(f"Fallback knowledge retrieval also failed: {e2}")
-                        if PROMETHEUS_AVAILABLE:
-                            REQUEST_COUNTER.labels(status="rag_failed", session_id=session_id).inc()
-                        # 降级到关键词检索（避免向量服务依赖）
-                        try:
-                            if active_db and user_id:
-                                with TRACER.start_as_current_span("rag.keyword_fallback"):
-                                    galaxy_service = GalaxyService(active_db)
-                                    nodes = await galaxy_service.keyword_search(
-                                        user_id=uuid.UUID(user_id),
-                                        query=request.message if request.HasField("message") else "",
-                                        limit=5
-                                    )
-                                if nodes:
-                                    lines = ["Relevant Knowledge Base (Keyword Fallback):"]
-                                    for node in nodes:
-                                        line = f"- [{node.name}]: {node.description or 'No description'}"
-                                        if node.parent_name:
-                                            line += f" (Parent: {node.parent_name})"
-                                        lines.append(line)
-                                    knowledge_context = "\n".join(lines)
-                                    if PROMETHEUS_AVAILABLE:
-                                        REQUEST_COUNTER.labels(status="keyword_success", session_id=session_id).inc()
-                        except Exception as e3:
-                            logger.error(f"Keyword fallback failed: {e3}")
+                # 知识检索：GraphRAG > 向量检索 > 关键词检索，取最高优先级的可用结果
+                knowledge_context = ""
+                knowledge_source = first_available(assembled, ["graphrag", "vector", "keyword"])
+                if knowledge_source:
+                    knowledge_context = assembled.get(knowledge_source)
+                    if PROMETHEUS_AVAILABLE:
+                        REQUEST_COUNTER.labels(status=f"{knowledge_source}_success", session_id=session_id).inc()
+                elif "graphrag" in assembled.outcomes:
+                    logger.error("All knowledge retrieval sources failed or timed out")
+                    if PROMETHEUS_AVAILABLE:
+                        REQUEST_COUNTER.labels(status="rag_failed", session_id=session_id).inc()
 
             # 构建 Prompt
             base_system_prompt = build_system_prompt(
@@ -138,20 +138,49 @@ class StateGraph:
                 if inspect.isawaitable(res):
                     await res
 
-    async def invoke(self, initial_state: WorkflowState, max_steps: int = 50) -> WorkflowState:
-        """Execute the graph."""
+    async def invoke(
+        self,
+        initial_state: Optional[WorkflowState] = None,
+        max_steps: int = 50,
+        resume_from: Optional[str] = None
+    ) -> WorkflowState:
+        """
+        Execute the graph.
+
+        resume_from: session id whose checkpoint should be continued. Execution
+        restarts at the node that was about to run when the checkpoint was taken,
+        so completed nodes (and their LLM calls) are not repeated. Context keys of
+        initial_state that are missing from the checkpoint (runtime dependencies
+        such as db_session / stream_callback) are carried over.
+        """
         if not self._compiled:
             self.compile()
 
         assert self.entry_point is not None
         current_node_name: str = self.entry_point
         state = initial_state
-        
-        # Load from checkpoint if available (TODO: Implement resume logic)
-        # For now, we always start fresh or from provided state
-        
         steps = 0
 
+        if resume_from:
+            checkpoint = await self.checkpointer.load_checkpoint(resume_from) if self.checkpointer else None
+            if checkpoint is None:
+                logger.warning(f"[{self.name}] No checkpoint for session {resume_from}, starting fresh")
+            elif checkpoint.node_id not in self.nodes and checkpoint.node_id not in self.end_points:
+                logger.warning(f"[{self.name}] Checkpoint node '{checkpoint.node_id}' no longer exists, starting fresh")
+            else:
+                state = checkpoint.state
+                if initial_state:
+                    for key, value in initial_state.context_data.items():
+                        state.context_data.setdefault(key, value)
+                current_node_name = checkpoint.node_id
+                steps = checkpoint.step
+                logger.info(f"⏯️ [{self.name}] Resuming session {resume_from} at '{current_node_name}' (step {steps})")
+
+        if state is None:
+            raise ValueError(f"Graph '{self.name}' needs an initial state or a checkpoint to resume from")
+
+        failed = False
+
         logger.info(f"🚀 [{self.name}] Starting execution from '{current_node_name}'")
         await self._emit_event(GraphEventType.GRAPH_START, self.name, state)
 
@@ -162,7 +191,7 @@ class StateGraph:
             
             # Save Checkpoint (Before execution)
             if self.checkpointer:
-                await self.checkpointer.save(state, current_node_name)
+                await self.checkpointer.save(state, current_node_name, steps - 1)
             
             # 1. Execute Node
             node_action = self.nodes[current_node_name]
@@ -199,6 +228,8 @@ class StateGraph:
                 logger.error(f"❌ Error in node '{current_node_name}': {e}", exc_info=True)
                 state.errors.append(f"[{self.name}] Node {current_node_name} failed: {str(e)}")
                 await self._emit_event(GraphEventType.ERROR, current_node_name, state, str(e))
+                # Keep the pre-node checkpoint so a resume retries this node
+                failed = True
                 break # Or handle error transition
 
             await self._emit_event(GraphEventType.NODE_END, current_node_name, state)
@@ -225,6 +256,9 @@ class StateGraph:
         if steps >= max_steps:
             logger.warning(f"⚠️ [{self.name}] Max steps reached ({max_steps})")
 
+        if self.checkpointer and not failed:
+            await self.checkpointer.save(state, current_node_name, steps)
+
         logger.info(f"🏁 [{self.name}] Execution finished")
         await self._emit_event(GraphEventType.GRAPH_END, self.name, state)
         return state
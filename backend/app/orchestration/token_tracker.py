@@ -6,16 +6,68 @@ TokenTracker - Token 使用量追踪器
 2. 实时配额检查
 3. 生成使用统计和报表
 4. 异步持久化到数据库
+
+写入路径:
+- 每次记录的所有计数/队列/排行榜更新合并为一个 MULTI 管道，一次往返
+- 每日排行榜使用有序集合 (ZINCRBY)，Top-N 查询为 ZUNIONSTORE + ZREVRANGE，无需 SCAN
+- 可选进程内累加器: flush_interval_ms > 0 时先在内存合并增量，按周期批量刷写
 """
 
+import asyncio
 import json
 import time
-from typing import Dict, Any, Optional, List
+from collections import defaultdict
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timedelta
 from loguru import logger
 
 import redis.asyncio as redis
 
+from app.config import settings
+
+DAY_TTL = 86400
+# 排行榜保留 31 天，覆盖最长的月度统计窗口
+LEADERBOARD_TTL = 31 * 86400
+
+
+class _UsageBuffer:
+    """待写入 Redis 的增量集合（单次记录或一个刷写周期内的合并结果）"""
+
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.lists: Dict[str, List[str]] = defaultdict(list)
+        self.zsets: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.expires: Dict[str, int] = {}
+        self.records = 0
+
+    def __bool__(self) -> bool:
+        return self.records > 0
+
+    def incr(self, key: str, amount: int, ttl: Optional[int] = None):
+        self.counters[key] += amount
+        if ttl:
+            self.expires[key] = ttl
+
+    def push(self, key: str, value: str, ttl: Optional[int] = None):
+        self.lists[key].append(value)
+        if ttl:
+            self.expires[key] = ttl
+
+    def zincr(self, key: str, member: str, amount: int, ttl: Optional[int] = None):
+        self.zsets[(key, member)] += amount
+        if ttl:
+            self.expires[key] = ttl
+
+    def apply(self, pipe) -> None:
+        for key, values in self.lists.items():
+            pipe.rpush(key, *values)
+        for key, amount in self.counters.items():
+            pipe.incrby(key, amount)
+        for (key, member), amount in self.zsets.items():
+            pipe.zincrby(key, amount, member)
+        for key, ttl in self.expires.items():
+            pipe.expire(key, ttl)
+
 
 class TokenTracker:
     """
@@ -28,16 +80,31 @@ class TokenTracker:
     - 异步记账队列
     """
 
-    def __init__(self, redis_client: redis.Redis):
+    def __init__(self, redis_client: redis.Redis, flush_interval_ms: Optional[int] = None):
         """
         初始化 TokenTracker
 
         Args:
             redis_client: Redis 客户端实例
+            flush_interval_ms: 进程内累加器刷写周期，0 表示每次记录直接写入
+                               （默认取 TOKEN_TRACKER_FLUSH_INTERVAL_MS）
         """
         self.redis = redis_client
+        if flush_interval_ms is None:
+            flush_interval_ms = settings.TOKEN_TRACKER_FLUSH_INTERVAL_MS
+        self.flush_interval = flush_interval_ms / 1000
+        self._buffer = _UsageBuffer()
+        self._flush_task: Optional[asyncio.Task] = None
         logger.info("TokenTracker initialized")
 
+    @staticmethod
+    def _daily_key(user_id: str, date: str) -> str:
+        return f"user:daily_tokens:{user_id}:{date}"
+
+    @staticmethod
+    def _leaderboard_key(date: str) -> str:
+        return f"leaderboard:tokens:{date}"
+
     async def record_usage(
         self,
         user_id: str,
@@ -79,25 +146,19 @@ class TokenTracker:
             "timestamp": timestamp
         }
 
-        await self.redis.rpush("queue:billing", json.dumps(usage_record))
-
-        # 2. 更新用户当日累计
+        # 2. 用户当日累计 / 3. 会话累计 / 4. 模型统计 / 系统总量
         today = datetime.now().strftime("%Y-%m-%d")
-        daily_key = f"user:daily_tokens:{user_id}:{today}"
-        await self.redis.incrby(daily_key, total_tokens)
-        await self.redis.expire(daily_key, 86400)  # 24小时过期
-
-        # 3. 更新会话累计
-        session_key = f"session:tokens:{session_id}"
-        await self.redis.incrby(session_key, total_tokens)
-
-        # 4. 更新模型统计
-        model_key = f"model:tokens:{model}:{today}"
-        await self.redis.incrby(model_key, total_tokens)
-        await self.redis.expire(model_key, 86400)
+        buffer = self._buffer if self.flush_interval > 0 else _UsageBuffer()
+        buffer.records += 1
+        buffer.push("queue:billing", json.dumps(usage_record))
+        buffer.incr(self._daily_key(user_id, today), total_tokens, DAY_TTL)
+        buffer.incr(f"session:tokens:{session_id}", total_tokens)
+        buffer.incr(f"model:tokens:{model}:{today}", total_tokens, DAY_TTL)
+        buffer.incr(f"system:tokens:{today}", total_tokens, DAY_TTL)
+        # 每日排行榜
+        buffer.zincr(self._leaderboard_key(today), user_id, total_tokens, LEADERBOARD_TTL)
 
         # 5. 记录到历史明细（可选，用于详细分析）
-        detail_key = f"user:details:{user_id}:{today}"
         detail = {
             "request_id": request_id,
             "session_id": session_id,
@@ -107,8 +168,12 @@ class TokenTracker:
             "model": model,
             "timestamp": timestamp
         }
-        await self.redis.rpush(detail_key, json.dumps(detail))
-        await self.redis.expire(detail_key, 86400)  # 保留24小时
+        buffer.push(f"user:details:{user_id}:{today}", json.dumps(detail), DAY_TTL)  # 保留24小时
+
+        if buffer is self._buffer:
+            self._ensure_flush_task()
+        else:
+            await self._write(buffer)
 
         logger.debug(
             f"Recorded usage for user {user_id}: "
@@ -117,6 +182,51 @@ class TokenTracker:
 
         return total_tokens
 
+    async def _write(self, buffer: _UsageBuffer) -> None:
+        """一个 MULTI 管道写入全部增量"""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            buffer.apply(pipe)
+            await pipe.execute()
+
+    def _ensure_flush_task(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while self._buffer:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """把累加器中的增量写入 Redis；写入失败时并回缓冲区等待下次刷写"""
+        buffer, self._buffer = self._buffer, _UsageBuffer()
+        if not buffer:
+            return
+        try:
+            await self._write(buffer)
+        except Exception as e:
+            logger.warning(f"TokenTracker flush failed ({buffer.records} records), will retry: {e}")
+            self._merge_back(buffer)
+
+    def _merge_back(self, buffer: _UsageBuffer) -> None:
+        current, self._buffer = self._buffer, buffer
+        for key, values in current.lists.items():
+            buffer.lists[key].extend(values)
+        for key, amount in current.counters.items():
+            buffer.counters[key] += amount
+        for member_key, amount in current.zsets.items():
+            buffer.zsets[member_key] += amount
+        buffer.expires.update(current.expires)
+        buffer.records += current.records
+
+    async def close(self) -> None:
+        """停止刷写任务并写出剩余增量"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
     async def get_daily_usage(self, user_id: str, date: Optional[str] = None) -> int:
         """
         获取用户某日的 Token 使用量
@@ -131,9 +241,10 @@ class TokenTracker:
         if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
 
-        key = f"user:daily_tokens:{user_id}:{date}"
+        key = self._daily_key(user_id, date)
         result = await self.redis.get(key)
-        return int(result) if result else 0
+        # 累加器中尚未刷写的部分也计入配额
+        return (int(result) if result else 0) + self._buffer.counters.get(key, 0)
 
     async def check_quota(
         self,
@@ -256,39 +367,34 @@ class TokenTracker:
         Returns:
             [{user_id: ..., total_tokens: ...}, ...]
         """
-        # 使用 Redis SCAN 查找所有用户
-        pattern = "user:daily_tokens:*"
-        user_totals = {}
-
-        async for key in self.redis.scan_iter(match=pattern):
-            # key 格式: user:daily_tokens:{user_id}:{date}
-            parts = key.decode("utf-8").split(":")
-            if len(parts) >= 4:
-                user_id = parts[2]
-                date = parts[3]
-
-                # 只统计指定天数内的
-                try:
-                    key_date = datetime.strptime(date, "%Y-%m-%d")
-                    days_ago = (datetime.now() - key_date).days
-
-                    if 0 <= days_ago < days:
-                        usage = await self.redis.get(key)
-                        if usage:
-                            user_totals[user_id] = user_totals.get(user_id, 0) + int(usage)
-                except:
-                    continue
-
-        # 排序并返回 Top N
-        sorted_users = sorted(
-            user_totals.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:limit]
+        now = datetime.now()
+        keys = [
+            self._leaderboard_key((now - timedelta(days=i)).strftime("%Y-%m-%d"))
+            for i in range(max(days, 1))
+        ]
+
+        if len(keys) == 1:
+            entries = await self.redis.zrevrange(keys[0], 0, limit - 1, withscores=True)
+        else:
+            # 多日合并结果短暂缓存，仪表盘刷新时复用；仅在过期后重新 ZUNIONSTORE
+            union_key = f"leaderboard:tokens:union:{days}:{now.strftime('%Y-%m-%d')}"
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.ttl(union_key)
+                pipe.zrevrange(union_key, 0, limit - 1, withscores=True)
+                ttl, entries = await pipe.execute()
+            if ttl is None or ttl <= 0:  # -2: 不存在；-1: 无过期时间，视为过期
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.zunionstore(union_key, keys)
+                    pipe.expire(union_key, 60)
+                    pipe.zrevrange(union_key, 0, limit - 1, withscores=True)
+                    entries = (await pipe.execute())[-1]
 
         return [
-            {"user_id": uid, "total_tokens": tokens}
-            for uid, tokens in sorted_users
+            {
+                "user_id": uid.decode("utf-8") if isinstance(uid, bytes) else uid,
+                "total_tokens": int(tokens),
+            }
+            for uid, tokens in entries
         ]
 
     async def get_user_details(
@@ -344,10 +450,8 @@ class TokenTracker:
         gpt35_key = f"model:tokens:gpt-3.5-turbo:{today}"
         gpt35 = await self.redis.get(gpt35_key) or 0
 
-        # 活跃用户数
-        active_users = 0
-        async for key in self.redis.scan_iter(match="user:daily_tokens:*:today"):
-            active_users += 1
+        # 活跃用户数 = 当日排行榜成员数
+        active_users = await self.redis.zcard(self._leaderboard_key(today))
 
         return {
             "date": today,
@@ -689,14 +689,17 @@ class MessageSearchRequest(BaseModel):
     tags: Optional[List[str]] = Field(default=None, max_length=10, description="标签")
     has_attachments: Optional[bool] = Field(default=None, description="是否有附件")
     # 分页
-    page: int = Field(default=1, ge=1, description="页码")
+    page: int = Field(default=1, ge=1, description="页码（未提供 cursor 时使用）")
     page_size: int = Field(default=20, ge=1, le=100, description="每页数量")
+    cursor: Optional[str] = Field(default=None, max_length=512, description="上一页返回的 next_cursor")
 
 
 class MessageSearchResult(BaseModel):
     """消息搜索结果"""
     messages: List[MessageInfo] = Field(description="消息列表")
-    total: int = Field(description="总数")
+    total: int = Field(description="总数（total_is_estimate 为 true 时为下限）")
+    total_is_estimate: bool = Field(default=False, description="总数是否为估计值")
     page: int = Field(description="当前页码")
     page_size: int = Field(description="每页数量")
     has_more: bool = Field(description="是否有更多")
+    next_cursor: Optional[str] = Field(default=None, description="下一页游标")
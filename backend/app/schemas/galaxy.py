@@ -92,26 +92,25 @@ class NodeWithStatus(NodeBase):
     position_radius: float # 距离中心的半径
     
     @classmethod
-    def from_models(cls, node, status):
-        user_status = None
-        if status:
+    def build_user_status(cls, status) -> UserStatusInfo:
+        return UserStatusInfo(
+            mastery_score=status.mastery_score,
+            total_study_minutes=status.total_study_minutes,
+            study_count=status.study_count,
+            is_unlocked=status.is_unlocked,
+            is_collapsed=status.is_collapsed,
+            is_favorite=status.is_favorite,
+            last_study_at=status.last_study_at,
+            next_review_at=status.next_review_at,
+            decay_paused=status.decay_paused,
             # 计算视觉状态
-            visual_status = cls._calculate_status(status)
-            brightness = cls._calculate_brightness(status)
-            
-            user_status = UserStatusInfo(
-                mastery_score=status.mastery_score,
-                total_study_minutes=status.total_study_minutes,
-                study_count=status.study_count,
-                is_unlocked=status.is_unlocked,
-                is_collapsed=status.is_collapsed,
-                is_favorite=status.is_favorite,
-                last_study_at=status.last_study_at,
-                next_review_at=status.next_review_at,
-                decay_paused=status.decay_paused,
-                status=visual_status,
-                brightness=brightness
-            )
+            status=cls._calculate_status(status),
+            brightness=cls._calculate_brightness(status)
+        )
+
+    @classmethod
+    def from_models(cls, node, status):
+        user_status = cls.build_user_status(status) if status else None
         
         # 处理 subject 为空的异常情况
         sector_code = SectorCode.VOID
@@ -174,6 +173,48 @@ class NodeRelationInfo(BaseModel):
     strength: float
 
 
+class GalaxyTileNode(NodeWithStatus):
+    """瓦片内节点：附带布局坐标与状态 revision"""
+    position_x: float
+    position_y: float
+    revision: int = 0  # 用户状态 revision，未解锁节点为 0
+
+    @classmethod
+    def from_models(cls, node, status):
+        base = NodeWithStatus.from_models(node, status)
+        return cls(
+            **base.model_dump(),
+            position_x=node.position_x,
+            position_y=node.position_y,
+            revision=status.revision if status else 0
+        )
+
+
+class GalaxyTileResponse(BaseModel):
+    """星图瓦片 (z/x/y)：瓦片内节点 + 以这些节点为起点的连线"""
+    z: int
+    x: int
+    y: int
+    bounds: List[float]  # [min_x, min_y, max_x, max_y]，左闭右开
+    nodes: List[GalaxyTileNode]
+    relations: List[NodeRelationInfo]
+    truncated: bool = False  # 超过 GALAXY_TILE_MAX_NODES，仅保留最重要的节点
+
+
+class NodeStatusDelta(BaseModel):
+    node_id: UUID
+    revision: int  # 节点级冲突检测 revision (更新掌握度时的基准)
+    sync_revision: int
+    user_status: UserStatusInfo
+
+
+class GalaxyStatusDeltaResponse(BaseModel):
+    """since_revision 之后变化的节点状态"""
+    sync_revision: int  # 下次请求的 since_revision
+    has_more: bool
+    statuses: List[NodeStatusDelta]
+
+
 class GalaxyUserStats(BaseModel):
     total_nodes: int = 0
     unlocked_count: int = 0
@@ -9,6 +9,7 @@ from uuid import UUID
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.core.event_bus import EventBus
 from app.models.cognitive import CognitiveFragment, AnalysisStatus
 from app.models.user import User
@@ -78,24 +79,45 @@ class CognitiveStreamWorker:
     SENSITIVE_TAGS = {"anxiety_high", "distraction_high", "depression_risk"}
     SENSITIVE_SENTIMENTS = {"anxious", "depressed", "burnout"}
 
-    def __init__(self, db: AsyncSession, redis_client, event_bus: Optional[EventBus] = None):
+    def __init__(
+        self,
+        db: AsyncSession,
+        redis_client,
+        event_bus: Optional[EventBus] = None,
+        session_factory=None,
+        shadow_writer: Optional[ShadowKafkaWriter] = None,
+    ):
         self.db = db
         self.redis = redis_client
         self.event_bus = event_bus or EventBus()
-        self.shadow_writer = ShadowKafkaWriter(enabled=os.getenv("ENABLE_KAFKA_SHADOW_WRITE", "false") == "true")
+        # 提供 session_factory 时每个事件使用独立会话，消费者可并发处理不同用户的事件
+        self.session_factory = session_factory
+        self.shadow_writer = shadow_writer or ShadowKafkaWriter(
+            enabled=os.getenv("ENABLE_KAFKA_SHADOW_WRITE", "false") == "true"
+        )
         self.bkt_service = BKTService(db)
         self.irt_service = IRTService(db)
+        # 主密钥与 DEK 缓存为进程级共享，按事件构造 worker 不会重复访问 KMS
         self.crypto_erase = CryptoEraseManager(db)
 
     async def start(self) -> None:
         await self.event_bus.connect()
+        concurrent = self.session_factory is not None
         await self.event_bus.subscribe(
             stream=self.STREAM_NAME,
             group_name=self.GROUP_NAME,
             consumer_name=f"consumer-{datetime.utcnow().timestamp()}",
-            callback=self.handle_event
+            callback=self.handle_event_in_session if concurrent else self.handle_event,
+            concurrency=settings.EVENT_BUS_CONCURRENCY if concurrent else 1,
+            # 同一用户的事件按流顺序处理（BKT/IRT 更新依赖先后次序）
+            key_fn=lambda event: event.get("user_id"),
         )
 
+    async def handle_event_in_session(self, event: Dict[str, Any]) -> None:
+        async with self.session_factory() as db:
+            worker = CognitiveStreamWorker(db, self.redis, self.event_bus, shadow_writer=self.shadow_writer)
+            await worker.handle_event(event)
+
     async def handle_event(self, event: Dict[str, Any]) -> None:
         try:
             self._record_stream_lag(event)
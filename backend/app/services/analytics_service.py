@@ -96,16 +96,15 @@ class AnalyticsService:
             
             anxiety_score = 0.0
             if fragments:
-                crypto = CryptoEraseManager(self.db)
-                anxious_count = 0
-                for f in fragments:
-                    if f.sentiment == "anxious":
-                        anxious_count += 1
-                        continue
-                    if f.sensitive_tags_encrypted:
-                        decrypted = await crypto.decrypt_payload(user_id, f.sensitive_tags_encrypted)
-                        if decrypted and "anxiety_high" in decrypted:
-                            anxious_count += 1
+                anxious_count = sum(1 for f in fragments if f.sentiment == "anxious")
+                encrypted = [
+                    (user_id, f.sensitive_tags_encrypted)
+                    for f in fragments
+                    if f.sentiment != "anxious" and f.sensitive_tags_encrypted
+                ]
+                if encrypted:
+                    decrypted = await CryptoEraseManager(self.db).decrypt_many(encrypted)
+                    anxious_count += sum(1 for tags in decrypted if tags and "anxiety_high" in tags)
                 anxiety_score = anxious_count / len(fragments)
 
             # 4. System Metrics
@@ -2,80 +2,146 @@
 BillingWorker - 异步计费任务处理器
 
 负责从 Redis 队列中消费 Token 使用记录，并批量持久化到数据库中。
+
+投递语义 (at-least-once):
+- 通过 Lua 脚本原子地把最多 batch_size 条记录从 queue:billing 移入本 Worker 的
+  处理中列表 queue:billing:processing:{worker_id}，多实例并行拉取互不重叠
+- 写库提交后才删除处理中列表；崩溃后由本 Worker 重启或其他 Worker（心跳过期）回收
+- 重复投递由 request_id 唯一约束去重 (ON CONFLICT DO NOTHING)
+
+PostgreSQL 下使用 asyncpg COPY 写入临时表，再 INSERT ... SELECT ... ON CONFLICT 合并。
 """
 
 import json
 import asyncio
+import os
+import socket
 import time
-from typing import List, Dict, Any, Optional
+import uuid
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from loguru import logger
 import redis.asyncio as redis
-from sqlalchemy import insert
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.models.chat import TokenUsage
 from app.config import settings
+from app.core.metrics import BILLING_FLUSH_LATENCY, BILLING_LAG_SECONDS, BILLING_QUEUE_DEPTH, BILLING_RECORDS
 from app.db.url import to_async_database_url
 from app.core.redis_utils import resolve_redis_password
 
+QUEUE_KEY = "queue:billing"
+PROCESSING_KEY = "queue:billing:processing:{worker_id}"
+DEAD_LETTER_KEY = "queue:billing:dead"
+WORKERS_KEY = "billing:workers"
+HEARTBEAT_KEY = "billing:worker:{worker_id}"
+
+# 原子批量拉取: LRANGE + LTRIM + RPUSH 到处理中列表，同时返回剩余队列长度
+PULL_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+    redis.call('RPUSH', KEYS[2], unpack(items))
+end
+return {redis.call('LLEN', KEYS[1]), items}
+"""
+
+# 回收处理中列表: 放回队首并删除
+REQUEUE_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[2], 0, -1)
+for i = #items, 1, -1 do
+    redis.call('LPUSH', KEYS[1], items[i])
+end
+redis.call('DEL', KEYS[2])
+return #items
+"""
+
+COPY_COLUMNS = (
+    "id", "user_id", "session_id", "request_id", "model",
+    "prompt_tokens", "completion_tokens", "total_tokens", "cost",
+    "created_at", "updated_at",
+)
+
+
 class BillingWorker:
     """
     异步计费工作器
-    
-    采用批量写入策略减少数据库压力，支持异常重试。
+
+    采用批量拉取 + 批量写入策略减少 Redis/数据库往返，支持多实例与异常重试。
     """
-    
+
     def __init__(
-        self, 
+        self,
         redis_url: str = settings.REDIS_URL,
         redis_password: Optional[str] = settings.REDIS_PASSWORD,
         db_url: str = settings.DATABASE_URL,
-        batch_size: int = 10,
-        flush_interval: int = 5
+        batch_size: int = settings.BILLING_BATCH_SIZE,
+        flush_interval: float = settings.BILLING_FLUSH_INTERVAL,
+        worker_id: Optional[str] = None,
+        redis_client: Optional[redis.Redis] = None,
+        session_factory=None,
     ):
         self.redis_url = redis_url
         self.batch_size = batch_size
         self.flush_interval = flush_interval
-        
+        self.worker_id = worker_id or os.getenv("BILLING_WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+        self.processing_key = PROCESSING_KEY.format(worker_id=self.worker_id)
+        self.heartbeat_ttl = settings.BILLING_WORKER_HEARTBEAT_TTL
+        self.max_attempts = settings.BILLING_MAX_ATTEMPTS
+
         # 初始化 Redis
-        resolved_password, _ = resolve_redis_password(redis_url, redis_password)
-        self.redis = redis.from_url(redis_url, password=resolved_password)
-        
+        if redis_client is not None:
+            self.redis = redis_client
+        else:
+            resolved_password, _ = resolve_redis_password(redis_url, redis_password)
+            self.redis = redis.from_url(redis_url, password=resolved_password)
+        self._pull = self.redis.register_script(PULL_SCRIPT)
+        self._requeue = self.redis.register_script(REQUEUE_SCRIPT)
+
         # 初始化数据库引擎和会话工厂
-        self.engine = create_async_engine(to_async_database_url(db_url))
-        self.async_session_factory = sessionmaker(
-            self.engine, expire_on_commit=False, class_=AsyncSession
-        )
-        
+        self.engine = None
+        if session_factory is not None:
+            self.async_session_factory = session_factory
+        else:
+            self.engine = create_async_engine(to_async_database_url(db_url))
+            self.async_session_factory = sessionmaker(
+                self.engine, expire_on_commit=False, class_=AsyncSession
+            )
+
         self.is_running = False
         self._batch: List[Dict[str, Any]] = []
+        self._attempts = 0
         self._last_flush_time = time.time()
-        
+        self._last_heartbeat = 0.0
+
     async def start(self):
         """启动工作器"""
-        logger.info(f"BillingWorker starting... (batch_size={self.batch_size}, flush_interval={self.flush_interval})")
+        logger.info(
+            f"BillingWorker {self.worker_id} starting... "
+            f"(batch_size={self.batch_size}, flush_interval={self.flush_interval})"
+        )
         self.is_running = True
-        
+
         try:
+            await self._heartbeat(force=True)
+            await self._recover()
+
             while self.is_running:
-                # 尝试从队列获取任务，超时 1 秒
-                result = await self.redis.blpop("queue:billing", timeout=1)
-                
-                if result:
-                    _, data = result
-                    try:
-                        record = json.loads(data)
-                        self._batch.append(record)
-                        logger.debug(f"Added record to batch. Current size: {len(self._batch)}")
-                    except Exception as e:
-                        logger.error(f"Failed to parse billing record: {e}")
-                
+                await self._heartbeat()
+
+                pulled = 0
+                if len(self._batch) < self.batch_size:
+                    pulled = await self._pull_batch(self.batch_size - len(self._batch))
+
                 # 检查是否需要刷新到数据库
                 if self._should_flush():
                     await self._flush_to_db()
-                    
+                elif not pulled:
+                    # 队列为空时短暂休眠，避免空转
+                    await asyncio.sleep(min(0.2, self.flush_interval))
+
         except asyncio.CancelledError:
             logger.info("BillingWorker stopping (cancelled)...")
         except Exception as e:
@@ -83,103 +149,225 @@ class BillingWorker:
             raise
         finally:
             self.is_running = False
-            # 停止前尝试刷新最后一批
+            # 停止前尝试刷新最后一批；失败的记录留在处理中列表，下次启动回收
             if self._batch:
                 await self._flush_to_db()
+            if not self._batch:
+                # 仍有未确认记录时保留注册，心跳过期后由其他 Worker 回收
+                await self.redis.srem(WORKERS_KEY, self.worker_id)
+                await self.redis.delete(HEARTBEAT_KEY.format(worker_id=self.worker_id))
             await self.redis.close()
-            await self.engine.dispose()
+            if self.engine is not None:
+                await self.engine.dispose()
             logger.info("BillingWorker stopped.")
 
+    # ==================== Redis 拉取与回收 ====================
+
+    async def _heartbeat(self, force: bool = False):
+        now = time.time()
+        if not force and now - self._last_heartbeat < self.heartbeat_ttl / 3:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(HEARTBEAT_KEY.format(worker_id=self.worker_id), int(now), ex=self.heartbeat_ttl)
+            pipe.sadd(WORKERS_KEY, self.worker_id)
+            await pipe.execute()
+        if not force:
+            await self._reclaim_orphans()
+        self._last_heartbeat = now
+
+    async def _recover(self):
+        """启动时接管本 Worker 上次未确认的记录，并回收已失联 Worker 的记录"""
+        pending = await self.redis.lrange(self.processing_key, 0, -1)
+        self._batch.extend(self._parse(pending))
+        if self._batch:
+            logger.warning(f"Recovered {len(self._batch)} unacknowledged billing records")
+        await self._reclaim_orphans()
+
+    async def _reclaim_orphans(self):
+        for member in await self.redis.smembers(WORKERS_KEY):
+            worker_id = member.decode() if isinstance(member, bytes) else member
+            if worker_id == self.worker_id:
+                continue
+            if await self.redis.exists(HEARTBEAT_KEY.format(worker_id=worker_id)):
+                continue
+            moved = await self._requeue(keys=[QUEUE_KEY, PROCESSING_KEY.format(worker_id=worker_id)])
+            await self.redis.srem(WORKERS_KEY, worker_id)
+            if moved:
+                logger.warning(f"Requeued {moved} billing records from dead worker {worker_id}")
+
+    async def _pull_batch(self, count: int) -> int:
+        """原子地拉取最多 count 条记录到处理中列表"""
+        depth, items = await self._pull(keys=[QUEUE_KEY, self.processing_key], args=[count])
+        BILLING_QUEUE_DEPTH.set(int(depth))
+        self._batch.extend(self._parse(items))
+        if items:
+            logger.debug(f"Pulled {len(items)} billing records. Current size: {len(self._batch)}")
+        return len(items)
+
+    def _parse(self, items) -> List[Dict[str, Any]]:
+        records = []
+        for data in items:
+            try:
+                records.append(json.loads(data))
+            except Exception as e:
+                BILLING_RECORDS.labels(result="malformed").inc()
+                logger.error(f"Failed to parse billing record: {e}")
+        return records
+
     def _should_flush(self) -> bool:
         """判断是否应该刷新批处理"""
         if not self._batch:
             return False
-            
+
         # 达到批大小
         if len(self._batch) >= self.batch_size:
             return True
-            
+
         # 超过刷新时间间隔
         if time.time() - self._last_flush_time >= self.flush_interval:
             return True
-            
+
         return False
 
+    # ==================== 持久化 ====================
+
     async def _flush_to_db(self):
-        """将批处理中的记录持久化到数据库"""
+        """将批处理中的记录持久化到数据库，提交后确认（删除处理中列表）"""
         if not self._batch:
             return
-            
+
         logger.info(f"Flushing {len(self._batch)} records to database...")
         start_time = time.time()
-        
+        rows = self._to_rows(self._batch)
+
         try:
-            async with self.async_session_factory() as session:
-                async with session.begin():
-                    # 转换记录格式以匹配模型，并处理可能的 UUID 转换或时间格式转换
-                    stmt_data = []
-                    for r in self._batch:
-                        stmt_data.append({
-                            "user_id": r["user_id"],
-                            "session_id": r["session_id"],
-                            "request_id": r["request_id"],
-                            "model": r["model"],
-                            "prompt_tokens": r["prompt_tokens"],
-                            "completion_tokens": r["completion_tokens"],
-                            "total_tokens": r["total_tokens"],
-                            "cost": r.get("cost", 0.0),
-                            "timestamp": datetime.fromtimestamp(r["timestamp"]) if "timestamp" in r else datetime.utcnow()
-                        })
-                    
-                    # 批量插入
-                    await session.execute(insert(TokenUsage), stmt_data)
-                
-                await session.commit()
-                
-            logger.info(f"Successfully persisted {len(self._batch)} records in {time.time() - start_time:.3f}s")
-            self._batch = []
-            self._last_flush_time = time.time()
-            
+            inserted = await self._persist(rows)
         except Exception as e:
-            logger.error(f"Failed to persist billing records: {e}")
-            # 如果是唯一约束冲突（可能是重复请求），尝试逐条插入或记录错误
-            if "duplicate key" in str(e).lower() or "unique constraint" in str(e).lower():
-                logger.warning("Duplicate key detected, retrying individual records...")
-                await self._retry_individually()
-            else:
-                # 其他错误则保留在批中待下次重试（需谨慎处理，防止死循环）
-                logger.error("Keeping records in batch for retry...")
-
-    async def _retry_individually(self):
-        """逐条重试插入，跳过已存在的记录"""
-        async with self.async_session_factory() as session:
-            for r in self._batch:
-                try:
-                    async with session.begin_nested():
-                        stmt_data = {
-                            "user_id": r["user_id"],
-                            "session_id": r["session_id"],
-                            "request_id": r["request_id"],
-                            "model": r["model"],
-                            "prompt_tokens": r["prompt_tokens"],
-                            "completion_tokens": r["completion_tokens"],
-                            "total_tokens": r["total_tokens"],
-                            "cost": r.get("cost", 0.0),
-                            "timestamp": datetime.fromtimestamp(r["timestamp"]) if "timestamp" in r else datetime.utcnow()
-                        }
-                        await session.execute(insert(TokenUsage), stmt_data)
-                    await session.commit()
-                except Exception as e:
-                    if "duplicate key" in str(e).lower() or "unique constraint" in str(e).lower():
-                        logger.debug(f"Skipping duplicate request_id: {r['request_id']}")
-                    else:
-                        logger.error(f"Failed to persist individual record {r['request_id']}: {e}")
-            
-            await session.commit()
-            
+            self._attempts += 1
+            logger.error(f"Failed to persist billing records (attempt {self._attempts}): {e}")
+            if self._attempts < self.max_attempts:
+                # 保留在批中与处理中列表，指数退避后重试
+                await self._backoff()
+                return
+            isolated = await self._persist_individually(rows)
+            if isolated is None:
+                # 逐条也全部失败，视为数据库不可用，继续等待
+                await self._backoff()
+                return
+            inserted, dead = isolated
+        else:
+            dead = 0
+
+        BILLING_FLUSH_LATENCY.observe(time.time() - start_time)
+        BILLING_RECORDS.labels(result="inserted").inc(inserted)
+        BILLING_RECORDS.labels(result="duplicate").inc(max(0, len(rows) - inserted - dead))
+        timestamps = [r["timestamp"] for r in self._batch if "timestamp" in r]
+        if timestamps:
+            BILLING_LAG_SECONDS.set(max(0.0, time.time() - min(timestamps)))
+
+        # 确认：提交之后才删除处理中列表，崩溃于此之前会被重新投递并由 request_id 去重
+        await self.redis.delete(self.processing_key)
+        logger.info(f"Successfully persisted {inserted}/{len(self._batch)} records in {time.time() - start_time:.3f}s")
         self._batch = []
+        self._attempts = 0
         self._last_flush_time = time.time()
 
+    async def _backoff(self):
+        """
+        指数退避，等待期间按 TTL/3 续期心跳
+
+        退避时长可达到心跳 TTL，一次性休眠会让其他 Worker 判定本 Worker 失联并回收其处理中记录。
+        """
+        remaining = min(2 ** self._attempts, 30)
+        step = self.heartbeat_ttl / 3
+        while remaining > 0:
+            await asyncio.sleep(min(step, remaining))
+            remaining -= step
+            await self._heartbeat(force=True)
+
+    @staticmethod
+    def _to_rows(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """转换记录格式以匹配模型，并按 request_id 批内去重"""
+        rows: Dict[str, Dict[str, Any]] = {}
+        for r in records:
+            created_at = datetime.utcfromtimestamp(r["timestamp"]) if "timestamp" in r else datetime.utcnow()
+            user_id = r["user_id"]
+            rows[r["request_id"]] = {
+                "id": uuid.uuid4(),
+                "user_id": user_id if isinstance(user_id, uuid.UUID) else uuid.UUID(str(user_id)),
+                "session_id": r["session_id"],
+                "request_id": r["request_id"],
+                "model": r["model"],
+                "prompt_tokens": r["prompt_tokens"],
+                "completion_tokens": r["completion_tokens"],
+                "total_tokens": r["total_tokens"],
+                "cost": r.get("cost"),
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+        return list(rows.values())
+
+    async def _persist(self, rows: List[Dict[str, Any]]) -> int:
+        """写入一批记录，返回实际插入条数（重复 request_id 被跳过）"""
+        async with self.async_session_factory() as session:
+            async with session.begin():
+                if session.get_bind().dialect.name == "postgresql":
+                    return await self._copy_rows(session, rows)
+                return await self._insert_rows(session, rows)
+
+    async def _copy_rows(self, session: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+        """COPY 到临时表，再合并到 token_usage"""
+        await session.execute(text(
+            "CREATE TEMP TABLE IF NOT EXISTS _token_usage_stage "
+            "(LIKE token_usage INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        ))
+        connection = await session.connection()
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            "_token_usage_stage",
+            records=[tuple(row[c] for c in COPY_COLUMNS) for row in rows],
+            columns=COPY_COLUMNS,
+        )
+        columns = ", ".join(COPY_COLUMNS)
+        result = await session.execute(text(
+            f"INSERT INTO token_usage ({columns}) SELECT {columns} FROM _token_usage_stage "
+            "ON CONFLICT (request_id) DO NOTHING"
+        ))
+        return result.rowcount
+
+    async def _insert_rows(self, session: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+        """非 PostgreSQL 方言：INSERT ... ON CONFLICT DO NOTHING"""
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        stmt = sqlite_insert(TokenUsage).values(rows).on_conflict_do_nothing(index_elements=["request_id"])
+        result = await session.execute(stmt)
+        return result.rowcount
+
+    async def _persist_individually(self, rows: List[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+        """
+        逐条写入以隔离坏记录，失败记录进入死信队列
+
+        Returns:
+            (插入条数, 死信条数)；全部失败时返回 None（更可能是数据库不可用）
+        """
+        inserted, failed = 0, []
+        for row in rows:
+            try:
+                inserted += await self._persist([row])
+            except Exception as e:
+                logger.error(f"Failed to persist individual record {row['request_id']}: {e}")
+                failed.append(row)
+
+        if failed and len(failed) == len(rows):
+            return None
+        if failed:
+            dead = {row["request_id"] for row in failed}
+            await self.redis.rpush(DEAD_LETTER_KEY, *[
+                json.dumps(r) for r in self._batch if r.get("request_id") in dead
+            ])
+            BILLING_RECORDS.labels(result="dead_letter").inc(len(failed))
+        return inserted, len(failed)
+
     def stop(self):
         """停止工作器"""
         self.is_running = False
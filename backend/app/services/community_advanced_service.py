@@ -17,9 +17,12 @@ from uuid import UUID
 import re
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, desc, text
+from sqlalchemy import select, and_, or_, func, desc, text, tuple_
 from sqlalchemy.orm import selectinload
 
+from app.config import settings
+from app.core.keyword_filter import KeywordFilterCache, KeywordMatch
+from app.services.message_search_index import decode_time_cursor, encode_time_cursor, ranked_search
 from app.models.community import (
     Group, GroupRole, GroupMember, GroupMessage, PrivateMessage,
     MessageType, UserEncryptionKey, MessageReport, MessageFavorite,
@@ -126,6 +129,9 @@ class EncryptionService:
 class ModerationService:
     """群管理与风控服务"""
 
+    # 各群编译好的敏感词自动机（进程内）
+    keyword_filters = KeywordFilterCache(settings.MODERATION_FILTER_RECHECK_SECONDS)
+
     @staticmethod
     async def update_announcement(
         db: AsyncSession,
@@ -172,6 +178,8 @@ class ModerationService:
             group.slow_mode_seconds = data.slow_mode_seconds
 
         await db.flush()
+        if data.keyword_filters is not None:
+            await ModerationService.keyword_filters.invalidate(group_id, group.keyword_filters)
         return group
 
     @staticmethod
@@ -265,6 +273,27 @@ class ModerationService:
         await db.flush()
         return target
 
+    @staticmethod
+    async def scan_keywords(
+        db: AsyncSession,
+        group_id: UUID,
+        content: str
+    ) -> List[KeywordMatch]:
+        """一次扫描返回所有敏感词命中位置（全角/半角、大小写不敏感）"""
+        async def load_keywords() -> Optional[List[str]]:
+            result = await db.execute(
+                select(Group.keyword_filters).where(
+                    Group.id == group_id,
+                    Group.not_deleted_filter()
+                )
+            )
+            return result.scalar_one_or_none()
+
+        automaton = await ModerationService.keyword_filters.get(group_id, load_keywords)
+        if not automaton or not content:
+            return []
+        return automaton.find_all(content)
+
     @staticmethod
     async def check_keyword_filter(
         db: AsyncSession,
@@ -272,15 +301,8 @@ class ModerationService:
         content: str
     ) -> Tuple[bool, List[str]]:
         """检查敏感词"""
-        group = await Group.get_by_id(db, group_id)
-        if not group or not group.keyword_filters:
-            return True, []
-
-        matched_keywords = []
-        for keyword in group.keyword_filters:
-            if keyword.lower() in content.lower():
-                matched_keywords.append(keyword)
-
+        matches = await ModerationService.scan_keywords(db, group_id, content)
+        matched_keywords = list(dict.fromkeys(match.keyword for match in matches))
         return len(matched_keywords) == 0, matched_keywords
 
     @staticmethod
@@ -591,58 +613,80 @@ class MessageSearchService:
         if not member_result.scalar_one_or_none():
             raise ValueError("不是群组成员")
 
-        # 构建查询
-        query = select(GroupMessage).where(
+        # 构建过滤条件
+        conditions = [
             GroupMessage.group_id == group_id,
             GroupMessage.not_deleted_filter(),
             GroupMessage.is_revoked == False
-        )
-
-        # 应用过滤条件
-        if data.keyword:
-            # 使用全文搜索
-            query = query.where(
-                func.to_tsvector('simple', func.coalesce(GroupMessage.content, '')).op('@@')(
-                    func.plainto_tsquery('simple', data.keyword)
-                )
-            )
+        ]
 
         if data.sender_id:
-            query = query.where(GroupMessage.sender_id == data.sender_id)
+            conditions.append(GroupMessage.sender_id == data.sender_id)
 
         if data.start_date:
-            query = query.where(GroupMessage.created_at >= data.start_date)
+            conditions.append(GroupMessage.created_at >= data.start_date)
 
         if data.end_date:
-            query = query.where(GroupMessage.created_at <= data.end_date)
+            conditions.append(GroupMessage.created_at <= data.end_date)
 
         if data.message_types:
-            query = query.where(GroupMessage.message_type.in_(data.message_types))
+            conditions.append(GroupMessage.message_type.in_(data.message_types))
 
         if data.topic:
-            query = query.where(GroupMessage.topic == data.topic)
-
-        # 计算总数
-        count_query = select(func.count()).select_from(query.subquery())
-        total_result = await db.execute(count_query)
-        total = total_result.scalar() or 0
+            conditions.append(GroupMessage.topic == data.topic)
 
-        # 分页
-        offset = (data.page - 1) * data.page_size
-        query = query.options(
+        load_options = (
             selectinload(GroupMessage.sender),
             selectinload(GroupMessage.reply_to)
-        ).order_by(desc(GroupMessage.created_at)).limit(data.page_size).offset(offset)
+        )
+        offset = (data.page - 1) * data.page_size
 
-        result = await db.execute(query)
+        if data.keyword:
+            # 全文索引检索：相关度排序 + keyset 游标，总数为候选集内的近似值
+            page = await ranked_search(
+                db, GroupMessage, conditions, data.keyword, data.page_size,
+                cursor=data.cursor, offset=offset, load_options=load_options
+            )
+            return {
+                "messages": page.messages,
+                "total": page.total,
+                "total_is_estimate": page.total_is_estimate,
+                "page": data.page,
+                "page_size": data.page_size,
+                "has_more": page.next_cursor is not None,
+                "next_cursor": page.next_cursor
+            }
+
+        # 无关键词：按时间倒序 keyset 分页，多取一条判断 has_more
+        query = select(GroupMessage).where(*conditions).options(*load_options).order_by(
+            desc(GroupMessage.created_at), desc(GroupMessage.id)
+        )
+        if data.cursor:
+            before_created_at, before_id = decode_time_cursor(data.cursor)
+            query = query.where(
+                tuple_(GroupMessage.created_at, GroupMessage.id) < tuple_(before_created_at, before_id)
+            )
+        else:
+            query = query.offset(offset)
+
+        result = await db.execute(query.limit(data.page_size + 1))
         messages = list(result.scalars().all())
+        has_more = len(messages) > data.page_size
+        messages = messages[:data.page_size]
+
+        # 计数封顶，避免对大群做全量 COUNT(*)
+        max_count = settings.MESSAGE_SEARCH_MAX_CANDIDATES
+        capped = select(GroupMessage.id).where(*conditions).limit(max_count).subquery()
+        total = (await db.execute(select(func.count()).select_from(capped))).scalar() or 0
 
         return {
             "messages": messages,
             "total": total,
+            "total_is_estimate": total >= max_count,
             "page": data.page,
             "page_size": data.page_size,
-            "has_more": offset + len(messages) < total
+            "has_more": has_more,
+            "next_cursor": encode_time_cursor(messages[-1].created_at, messages[-1].id) if has_more else None
         }
 
     @staticmethod
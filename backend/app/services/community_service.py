@@ -7,10 +7,12 @@ from datetime import datetime, timedelta
 from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, desc
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, and_, or_, func, desc, cast, tuple_, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import aliased, joinedload, selectinload
 
 from app.core.websocket import manager
+from app.services.message_search_index import SearchPage, decode_time_cursor, ranked_search
 from app.models.user import User
 from app.models.community import (
     Friendship, FriendshipStatus,
@@ -37,6 +39,35 @@ def _is_visible_to(content_data: Optional[dict], user_id: UUID) -> bool:
     return str(visible_to) == str(user_id)
 
 
+def _visible_to_clause(model, user_id: UUID):
+    """_is_visible_to 的 SQL 版本，用于在分页查询中过滤仅部分人可见的消息"""
+    data = cast(model.content_data, JSONB)
+    return or_(
+        model.content_data.is_(None),
+        func.coalesce(data["visibility"].astext, "") != "self",
+        # jsonb @> 同时覆盖 visible_to 为单个 id 与 id 数组两种写法
+        # type_coerce 只改变绑定类型：参数由 JSONB 绑定处理器 json 编码一次，而非 cast(json.dumps()) 的二次编码
+        data["visible_to"].contains(type_coerce(str(user_id), JSONB))
+    )
+
+
+def _history_conditions(model, before_id: Optional[UUID], cursor: Optional[str]) -> list:
+    """按 (created_at, id) 倒序翻页的 keyset 条件；cursor 优先于 before_id"""
+    if cursor:
+        before_created_at, before_msg_id = decode_time_cursor(cursor)
+        return [tuple_(model.created_at, model.id) < tuple_(before_created_at, before_msg_id)]
+    if before_id:
+        # 兼容旧客户端：在同一条 SQL 里解析 before_id 的时间，省去一次往返；
+        # 与旧实现一致，before_id 不存在时不做过滤 (返回最新一页)
+        before = aliased(model)
+        before_created_at = select(before.created_at).where(before.id == before_id).scalar_subquery()
+        return [or_(
+            before_created_at.is_(None),
+            tuple_(model.created_at, model.id) < tuple_(before_created_at, before_id)
+        )]
+    return []
+
+
 class FriendshipService:
     """好友系统服务"""
 
@@ -738,15 +769,15 @@ class GroupMessageService:
         query = select(GroupMessage).where(
             GroupMessage.group_id == group_id,
             GroupMessage.thread_root_id == thread_root_id,
-            GroupMessage.not_deleted_filter()
+            GroupMessage.not_deleted_filter(),
+            _visible_to_clause(GroupMessage, user_id)
         ).options(
-            selectinload(GroupMessage.sender),
-            selectinload(GroupMessage.reply_to).selectinload(GroupMessage.sender)
-        ).order_by(GroupMessage.created_at.asc()).limit(limit)
+            joinedload(GroupMessage.sender),
+            joinedload(GroupMessage.reply_to).joinedload(GroupMessage.sender)
+        ).order_by(GroupMessage.created_at.asc(), GroupMessage.id.asc()).limit(limit)
 
         result = await db.execute(query)
-        replies = [msg for msg in result.scalars().all() if _is_visible_to(msg.content_data, user_id)]
-        return [root, *replies]
+        return [root, *result.scalars().all()]
 
     @staticmethod
     async def search_messages(
@@ -754,9 +785,10 @@ class GroupMessageService:
         group_id: UUID,
         user_id: UUID,
         keyword: str,
-        limit: int = 50
-    ) -> List[GroupMessage]:
-        """搜索群消息"""
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> SearchPage:
+        """搜索群消息（全文索引，按相关度排序，cursor 为上一页的 next_cursor）"""
         membership_result = await db.execute(
             select(GroupMember).where(
                 GroupMember.group_id == group_id,
@@ -767,17 +799,23 @@ class GroupMessageService:
         if not membership_result.scalar_one_or_none():
             raise ValueError("不是群组成员，无法搜索消息")
 
-        query = select(GroupMessage).where(
-            GroupMessage.group_id == group_id,
-            GroupMessage.not_deleted_filter(),
-            GroupMessage.content.ilike(f"%{keyword}%")
-        ).options(
-            selectinload(GroupMessage.sender),
-            selectinload(GroupMessage.reply_to).selectinload(GroupMessage.sender)
-        ).order_by(desc(GroupMessage.created_at)).limit(limit)
-
-        result = await db.execute(query)
-        return [msg for msg in result.scalars().all() if _is_visible_to(msg.content_data, user_id)]
+        page = await ranked_search(
+            db,
+            GroupMessage,
+            [
+                GroupMessage.group_id == group_id,
+                GroupMessage.not_deleted_filter(),
+                _visible_to_clause(GroupMessage, user_id)
+            ],
+            keyword,
+            limit,
+            cursor=cursor,
+            load_options=(
+                joinedload(GroupMessage.sender),
+                joinedload(GroupMessage.reply_to).joinedload(GroupMessage.sender)
+            )
+        )
+        return page
 
     @staticmethod
     async def get_messages(
@@ -785,9 +823,15 @@ class GroupMessageService:
         group_id: UUID,
         user_id: UUID, # Added user_id for permission check
         before_id: Optional[UUID] = None,
-        limit: int = 50
+        limit: int = 50,
+        cursor: Optional[str] = None
     ) -> List[GroupMessage]:
-        """获取群消息（分页）"""
+        """
+        获取群消息（按 (created_at, id) 倒序 keyset 分页）
+
+        cursor 为上一页最后一条消息的 encode_time_cursor；返回满 limit 条时可能还有更早的消息。
+        可见性过滤在 SQL 中完成，因此每页都是满页。
+        """
         # Check membership first
         membership_result = await db.execute(
             select(GroupMember).where(
@@ -801,22 +845,16 @@ class GroupMessageService:
 
         query = select(GroupMessage).where(
             GroupMessage.group_id == group_id,
-            GroupMessage.not_deleted_filter()
+            GroupMessage.not_deleted_filter(),
+            _visible_to_clause(GroupMessage, user_id),
+            *_history_conditions(GroupMessage, before_id, cursor)
         ).options(
-            selectinload(GroupMessage.sender),
-            selectinload(GroupMessage.reply_to).selectinload(GroupMessage.sender)
-        ).order_by(desc(GroupMessage.created_at))
+            joinedload(GroupMessage.sender),
+            joinedload(GroupMessage.reply_to).joinedload(GroupMessage.sender)
+        ).order_by(desc(GroupMessage.created_at), desc(GroupMessage.id)).limit(limit)
 
-        if before_id:
-            # 获取before_id对应消息的创建时间
-            before_msg = await GroupMessage.get_by_id(db, before_id)
-            if before_msg:
-                query = query.where(GroupMessage.created_at < before_msg.created_at)
-
-        query = query.limit(limit)
         result = await db.execute(query)
-        messages = list(result.scalars().all())
-        return [msg for msg in messages if _is_visible_to(msg.content_data, user_id)]
+        return list(result.scalars().all())
 
     @staticmethod
     async def send_system_message(
@@ -1330,26 +1368,33 @@ class PrivateMessageService:
         user_id: UUID,
         friend_id: UUID,
         keyword: str,
-        limit: int = 50
-    ) -> List[Any]:
-        """搜索私聊消息"""
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> SearchPage:
+        """搜索私聊消息（全文索引，按相关度排序，cursor 为上一页的 next_cursor）"""
         from app.models.community import PrivateMessage
 
-        query = select(PrivateMessage).where(
-            or_(
-                and_(PrivateMessage.sender_id == user_id, PrivateMessage.receiver_id == friend_id),
-                and_(PrivateMessage.sender_id == friend_id, PrivateMessage.receiver_id == user_id)
-            ),
-            PrivateMessage.not_deleted_filter(),
-            PrivateMessage.content.ilike(f"%{keyword}%")
-        ).options(
-            selectinload(PrivateMessage.sender),
-            selectinload(PrivateMessage.receiver),
-            selectinload(PrivateMessage.reply_to).selectinload(PrivateMessage.sender)
-        ).order_by(desc(PrivateMessage.created_at)).limit(limit)
-
-        result = await db.execute(query)
-        return [msg for msg in result.scalars().all() if _is_visible_to(msg.content_data, user_id)]
+        page = await ranked_search(
+            db,
+            PrivateMessage,
+            [
+                or_(
+                    and_(PrivateMessage.sender_id == user_id, PrivateMessage.receiver_id == friend_id),
+                    and_(PrivateMessage.sender_id == friend_id, PrivateMessage.receiver_id == user_id)
+                ),
+                PrivateMessage.not_deleted_filter(),
+                _visible_to_clause(PrivateMessage, user_id)
+            ],
+            keyword,
+            limit,
+            cursor=cursor,
+            load_options=(
+                joinedload(PrivateMessage.sender),
+                joinedload(PrivateMessage.receiver),
+                joinedload(PrivateMessage.reply_to).joinedload(PrivateMessage.sender)
+            )
+        )
+        return page
 
     @staticmethod
     async def get_messages(
@@ -1357,9 +1402,10 @@ class PrivateMessageService:
         user_id: UUID,
         friend_id: UUID,
         before_id: Optional[UUID] = None,
-        limit: int = 50
+        limit: int = 50,
+        cursor: Optional[str] = None
     ) -> List[Any]: # List[PrivateMessage]
-        """获取与某好友的私聊记录"""
+        """获取与某好友的私聊记录（keyset 分页，规则同 GroupMessageService.get_messages）"""
         from app.models.community import PrivateMessage
         
         query = select(PrivateMessage).where(
@@ -1367,22 +1413,17 @@ class PrivateMessageService:
                 and_(PrivateMessage.sender_id == user_id, PrivateMessage.receiver_id == friend_id),
                 and_(PrivateMessage.sender_id == friend_id, PrivateMessage.receiver_id == user_id)
             ),
-            PrivateMessage.not_deleted_filter()
+            PrivateMessage.not_deleted_filter(),
+            _visible_to_clause(PrivateMessage, user_id),
+            *_history_conditions(PrivateMessage, before_id, cursor)
         ).options(
-            selectinload(PrivateMessage.sender),
-            selectinload(PrivateMessage.receiver),
-            selectinload(PrivateMessage.reply_to).selectinload(PrivateMessage.sender)
-        ).order_by(desc(PrivateMessage.created_at))
-
-        if before_id:
-            before_msg = await PrivateMessage.get_by_id(db, before_id)
-            if before_msg:
-                query = query.where(PrivateMessage.created_at < before_msg.created_at)
+            joinedload(PrivateMessage.sender),
+            joinedload(PrivateMessage.receiver),
+            joinedload(PrivateMessage.reply_to).joinedload(PrivateMessage.sender)
+        ).order_by(desc(PrivateMessage.created_at), desc(PrivateMessage.id)).limit(limit)
 
-        query = query.limit(limit)
         result = await db.execute(query)
-        messages = list(result.scalars().all())
-        return [msg for msg in messages if _is_visible_to(msg.content_data, user_id)]
+        return list(result.scalars().all())
 
     @staticmethod
     async def mark_as_read(
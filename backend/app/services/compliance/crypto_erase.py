@@ -1,42 +1,257 @@
+import asyncio
 import base64
 import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 from uuid import uuid4, UUID
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from app.config import settings
+from app.core.metrics import PERSONA_DEK_CACHE_LOOKUPS, PERSONA_DEK_INVALIDATIONS
 from app.models.compliance import UserPersonaKey, CryptoShreddingCertificate
 from app.services.compliance.key_provider import get_master_key_provider
 
+# 销毁用户密钥后广播 user_id，各进程立即丢弃缓存的 DEK
+DEK_INVALIDATION_CHANNEL = "persona:dek:invalidate"
+
+
+class MasterKeyHandle:
+    """
+    进程级主密钥句柄
+    KMS / Vault 只在首次使用时访问一次，之后所有 CryptoEraseManager 共享同一把主密钥。
+    """
+
+    def __init__(self):
+        self._aead: Optional[AESGCM] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> AESGCM:
+        if self._aead is None:
+            with self._lock:
+                if self._aead is None:
+                    self._aead = AESGCM(get_master_key_provider().get_master_key())
+        return self._aead
+
+    def reset(self) -> None:
+        """主密钥轮换后调用，下次使用时重新从 provider 加载"""
+        with self._lock:
+            self._aead = None
+
+
+@dataclass
+class _CachedDEK:
+    key_id: str
+    aead: AESGCM
+    expires_at: float
+
+
+class DEKCache:
+    """
+    进程级解包 DEK 缓存 (TTL + LRU 条数上限)
+
+    只有在订阅了失效频道时才会缓存: 任一进程销毁用户密钥后通过 pub/sub 广播，
+    其余进程立即丢弃对应 DEK。订阅不可用或中断期间不缓存 (每次回源数据库)，
+    重新订阅前会清空缓存，因此不会继续使用中断期间已被销毁的密钥。
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        redis_client: Any = None,
+    ):
+        self.ttl = ttl_seconds or settings.PERSONA_DEK_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or settings.PERSONA_DEK_CACHE_MAX_ENTRIES
+        self._redis = redis_client
+        self._entries: "OrderedDict[str, _CachedDEK]" = OrderedDict()
+        # 每次失效递增；回源读取期间发生失效时，读到的 DEK 不再写入缓存
+        self._generation = 0
+        self._pubsub = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def redis(self):
+        if self._redis is not None:
+            return self._redis
+        from app.core.cache import cache_service
+        return cache_service.redis
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def active(self) -> bool:
+        task = self._listener_task
+        if task is None or task.done():
+            return False
+        try:
+            return self._loop is asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def ensure_listener(self) -> bool:
+        """订阅失效频道 (每个事件循环一次)，返回缓存是否可用"""
+        if self.active:
+            return True
+        # 旧订阅已结束或属于已关闭的事件循环 (如 Celery 每个任务一次 asyncio.run)，期间可能错过失效消息
+        self.clear()
+        await self._release_listener()
+        redis = self.redis
+        if not redis:
+            return False
+        try:
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(DEK_INVALIDATION_CHANNEL)
+        except Exception as e:
+            logger.warning(f"DEK cache disabled, cannot subscribe to invalidations: {e}")
+            return False
+        if self.active:
+            # 并发调用方已完成订阅
+            await pubsub.close()
+            return True
+        self._pubsub = pubsub
+        self._loop = asyncio.get_running_loop()
+        self._listener_task = asyncio.create_task(self._listen(pubsub))
+        return True
+
+    async def stop(self) -> None:
+        task = self._listener_task
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self._release_listener()
+        self.clear()
+
+    async def _release_listener(self) -> None:
+        """解除当前订阅；pubsub 尽量在其所属的事件循环内关闭"""
+        task, pubsub = self._listener_task, self._pubsub
+        self._listener_task = None
+        self._pubsub = None
+        if task is not None and not task.done():
+            loop = task.get_loop()
+            if not loop.is_closed():
+                # 由 _listen 的 finally 在原循环内关闭 pubsub
+                loop.call_soon_threadsafe(task.cancel)
+                return
+        if pubsub is not None:
+            # 原循环已关闭且监听任务未被取消 (asyncio.run 退出时会取消并走 finally)，只能尽力关闭
+            try:
+                await pubsub.close()
+            except Exception as e:
+                logger.debug(f"Closing stale DEK invalidation subscription failed: {e}")
+
+    async def _listen(self, pubsub) -> None:
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message:
+                    data = message["data"]
+                    self.invalidate(data.decode("utf-8") if isinstance(data, bytes) else data, source="remote")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 可能已错过失效消息: 清空缓存，任务结束后缓存停用，下次使用时重新订阅
+            logger.error(f"DEK invalidation listener error: {e}")
+            self.clear()
+        finally:
+            try:
+                await pubsub.close()
+            except Exception as e:
+                logger.debug(f"Closing DEK invalidation subscription failed: {e}")
+            if self._pubsub is pubsub:
+                self._pubsub = None
+
+    def get(self, user_id: Any) -> Optional[_CachedDEK]:
+        if not self.active:
+            PERSONA_DEK_CACHE_LOOKUPS.labels(result="bypass").inc()
+            return None
+        key = str(user_id)
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            PERSONA_DEK_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        self._entries.move_to_end(key)
+        PERSONA_DEK_CACHE_LOOKUPS.labels(result="hit").inc()
+        return entry
+
+    def put(self, user_id: Any, key_id: str, aead: AESGCM, generation: int) -> None:
+        """generation 为回源前读取的 self.generation，期间若有失效则放弃写入"""
+        if not self.active or generation != self._generation:
+            return
+        key = str(user_id)
+        self._entries[key] = _CachedDEK(key_id=key_id, aead=aead, expires_at=time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: Any, source: str = "local") -> None:
+        self._generation += 1
+        if self._entries.pop(str(user_id), None) is not None:
+            PERSONA_DEK_INVALIDATIONS.labels(source=source).inc()
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+    async def broadcast_invalidation(self, user_id: Any) -> None:
+        """本进程立即失效，并通知其他进程"""
+        self.invalidate(user_id)
+        redis = self.redis
+        if not redis:
+            return
+        try:
+            await redis.publish(DEK_INVALIDATION_CHANNEL, str(user_id))
+        except Exception as e:
+            logger.error(
+                f"Failed to broadcast DEK invalidation for user {user_id}; "
+                f"other processes drop it within {self.ttl}s: {e}"
+            )
+
+
+master_key_handle = MasterKeyHandle()
+persona_dek_cache = DEKCache()
+
 
 class CryptoEraseManager:
     """
     云原生加密抹除管理器 (V3.1)
     使用用户级 DEK + 主密钥派生加密存储。
+
+    主密钥与解包后的 DEK 均为进程级共享，构造本类不会访问 KMS；
+    encrypt_many / decrypt_many 按用户分组，每个用户只解析一次 DEK。
     """
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, dek_cache: Optional[DEKCache] = None):
         self.db = db
-        self.master_key = self._load_master_key()
-
-    def _load_master_key(self) -> bytes:
-        provider = get_master_key_provider()
-        return provider.get_master_key()
+        self.dek_cache = dek_cache if dek_cache is not None else persona_dek_cache
 
     def _encrypt_key(self, key_bytes: bytes) -> str:
-        aes = AESGCM(self.master_key)
         nonce = os.urandom(12)
-        ciphertext = aes.encrypt(nonce, key_bytes, None)
+        ciphertext = master_key_handle.get().encrypt(nonce, key_bytes, None)
         return base64.b64encode(nonce + ciphertext).decode("ascii")
 
     def _decrypt_key(self, blob: str) -> bytes:
         data = base64.b64decode(blob.encode("ascii"))
         nonce, ciphertext = data[:12], data[12:]
-        aes = AESGCM(self.master_key)
-        return aes.decrypt(nonce, ciphertext, None)
+        return master_key_handle.get().decrypt(nonce, ciphertext, None)
 
     async def get_or_create_user_key(self, user_id: UUID) -> UserPersonaKey:
         stmt = select(UserPersonaKey).where(
@@ -61,33 +276,75 @@ class CryptoEraseManager:
         await self.db.refresh(key)
         return key
 
-    async def encrypt_payload(self, user_id: UUID, plaintext: str) -> Tuple[str, str]:
-        key = await self.get_or_create_user_key(user_id)
-        if not key.encrypted_key:
-            raise ValueError("User key is not available")
-        dek = self._decrypt_key(key.encrypted_key)
-        aes = AESGCM(dek)
-        nonce = os.urandom(12)
-        ciphertext = aes.encrypt(nonce, plaintext.encode("utf-8"), None)
-        blob = base64.b64encode(nonce + ciphertext).decode("ascii")
-        return blob, key.key_id
+    async def _resolve_deks(self, user_ids: Iterable[Any], create: bool) -> Dict[str, Tuple[str, AESGCM]]:
+        """user_id -> (key_id, DEK)；缓存未命中的用户一次查询回源，没有有效密钥的用户不在结果中"""
+        await self.dek_cache.ensure_listener()
+        resolved: Dict[str, Tuple[str, AESGCM]] = {}
+        missing: Dict[str, Any] = {}
+        for user_id in user_ids:
+            cached = self.dek_cache.get(user_id)
+            if cached:
+                resolved[str(user_id)] = (cached.key_id, cached.aead)
+            else:
+                missing[str(user_id)] = user_id
+        if not missing:
+            return resolved
 
-    async def decrypt_payload(self, user_id: UUID, blob: str) -> Optional[str]:
-        stmt = select(UserPersonaKey).where(
-            UserPersonaKey.user_id == user_id,
-            UserPersonaKey.is_active == True
+        generation = self.dek_cache.generation
+        result = await self.db.execute(
+            select(UserPersonaKey).where(
+                UserPersonaKey.user_id.in_(list(missing.values())),
+                UserPersonaKey.is_active == True
+            )
         )
-        result = await self.db.execute(stmt)
-        key = result.scalar_one_or_none()
-        if not key or not key.encrypted_key:
-            return None
+        keys = list(result.scalars().all())
+        found = {str(key.user_id) for key in keys}
+        if create:
+            for uid, user_id in missing.items():
+                if uid not in found:
+                    keys.append(await self.get_or_create_user_key(user_id))
 
-        dek = self._decrypt_key(key.encrypted_key)
-        data = base64.b64decode(blob.encode("ascii"))
-        nonce, ciphertext = data[:12], data[12:]
-        aes = AESGCM(dek)
-        plaintext = aes.decrypt(nonce, ciphertext, None)
-        return plaintext.decode("utf-8")
+        for key in keys:
+            if not key.encrypted_key:
+                continue
+            aead = AESGCM(self._decrypt_key(key.encrypted_key))
+            resolved[str(key.user_id)] = (key.key_id, aead)
+            self.dek_cache.put(key.user_id, key.key_id, aead, generation)
+        return resolved
+
+    async def encrypt_many(self, items: Sequence[Tuple[UUID, str]]) -> List[Tuple[str, str]]:
+        """批量加密 [(user_id, plaintext)] -> [(blob, key_id)]，缺少密钥的用户会先创建密钥"""
+        deks = await self._resolve_deks({str(user_id): user_id for user_id, _ in items}.values(), create=True)
+        encrypted = []
+        for user_id, plaintext in items:
+            entry = deks.get(str(user_id))
+            if entry is None:
+                raise ValueError("User key is not available")
+            key_id, aead = entry
+            nonce = os.urandom(12)
+            ciphertext = aead.encrypt(nonce, plaintext.encode("utf-8"), None)
+            encrypted.append((base64.b64encode(nonce + ciphertext).decode("ascii"), key_id))
+        return encrypted
+
+    async def decrypt_many(self, items: Sequence[Tuple[UUID, str]]) -> List[Optional[str]]:
+        """批量解密 [(user_id, blob)]，密钥已销毁或不存在的条目返回 None"""
+        deks = await self._resolve_deks({str(user_id): user_id for user_id, _ in items}.values(), create=False)
+        plaintexts: List[Optional[str]] = []
+        for user_id, blob in items:
+            entry = deks.get(str(user_id))
+            if entry is None:
+                plaintexts.append(None)
+                continue
+            data = base64.b64decode(blob.encode("ascii"))
+            nonce, ciphertext = data[:12], data[12:]
+            plaintexts.append(entry[1].decrypt(nonce, ciphertext, None).decode("utf-8"))
+        return plaintexts
+
+    async def encrypt_payload(self, user_id: UUID, plaintext: str) -> Tuple[str, str]:
+        return (await self.encrypt_many([(user_id, plaintext)]))[0]
+
+    async def decrypt_payload(self, user_id: UUID, blob: str) -> Optional[str]:
+        return (await self.decrypt_many([(user_id, blob)]))[0]
 
     async def destroy_user_key(self, user_id: UUID, cloud_provider_ack: Optional[str] = None) -> CryptoShreddingCertificate:
         stmt = select(UserPersonaKey).where(
@@ -103,6 +360,8 @@ class CryptoEraseManager:
         key.destroyed_at = datetime.utcnow()
         key.encrypted_key = None
         await self.db.commit()
+        # 提交后再广播: 其他进程收到消息时回源只能读到已销毁的密钥
+        await self.dek_cache.broadcast_invalidation(user_id)
 
         certificate = CryptoShreddingCertificate(
             user_id=user_id,
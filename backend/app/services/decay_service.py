@@ -2,16 +2,57 @@
 遗忘衰减服务 (Decay Service)
 实现艾宾浩斯遗忘曲线，让知识点随时间逐渐暗淡
 """
+import json
 import math
 from uuid import UUID
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict
-from sqlalchemy import select, and_, func
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from loguru import logger
+from sqlalchemy import select, update, and_, or_, func, text, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.galaxy import UserNodeStatus, KnowledgeNode
 
 
+# PostgreSQL 集合式衰减：一条语句完成一个 keyset 分片的选取、更新和统计
+_PG_DECAY_CHUNK_SQL = """
+WITH batch AS (
+    SELECT user_id, node_id, mastery_score AS old_mastery,
+           floor(extract(epoch FROM (CAST(:now AS timestamp) - last_study_at)) / 86400) AS days
+    FROM user_node_status
+    WHERE is_unlocked = true
+      AND coalesce(decay_paused, false) = false
+      AND last_study_at < :cutoff
+      AND mastery_score > :min_mastery
+      {cursor_clause}
+    ORDER BY user_id, node_id
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+),
+updated AS (
+    UPDATE user_node_status AS s
+    SET mastery_score = GREATEST(
+            CAST(:min_mastery AS double precision),
+            b.old_mastery * exp(
+                -ln(2) / (CAST(:half_life AS double precision) * (1 + b.old_mastery / 50.0)) * b.days
+            )
+        ),
+        updated_at = :now
+    FROM batch b
+    WHERE s.user_id = b.user_id AND s.node_id = b.node_id
+    RETURNING b.old_mastery, s.mastery_score AS new_mastery, s.is_collapsed
+)
+SELECT
+    (SELECT count(*) FROM updated) AS processed,
+    (SELECT count(*) FROM updated WHERE old_mastery >= :dim AND new_mastery < :dim) AS dimmed,
+    (SELECT count(*) FROM updated
+        WHERE new_mastery < :collapse AND coalesce(is_collapsed, false) = false) AS collapsed,
+    (SELECT user_id FROM batch ORDER BY user_id DESC, node_id DESC LIMIT 1) AS last_user_id,
+    (SELECT node_id FROM batch ORDER BY user_id DESC, node_id DESC LIMIT 1) AS last_node_id
+"""
+
+
 class DecayService:
     """
     遗忘曲线衰减服务
@@ -30,59 +71,221 @@ class DecayService:
     THRESHOLD_DIM = 20.0  # 低于此值星星变暗
     THRESHOLD_COLLAPSE = 10.0  # 低于此值可能坍缩
 
-    def __init__(self, db: AsyncSession):
+    # 批处理参数
+    DECAY_BATCH_SIZE = 5000  # 每个 keyset 分片的行数
+    CHECKPOINT_KEY_PREFIX = "decay:checkpoint:"
+    CHECKPOINT_TTL = 3 * 86400
+
+    def __init__(self, db: AsyncSession, redis_client=None):
         self.db = db
+        self.redis = redis_client
 
-    async def apply_daily_decay(self) -> Dict[str, int]:
+    async def apply_daily_decay(
+        self,
+        batch_size: Optional[int] = None,
+        resume: bool = True
+    ) -> Dict[str, int]:
         """
         每日遗忘衰减任务
 
+        按 (user_id, node_id) keyset 分片处理，每片独立提交：
+        - PostgreSQL：半衰期公式下推为单条 UPDATE ... FROM batch RETURNING
+        - 其他方言：分片读取后用 NumPy 向量化计算，再按主键批量更新
+
+        每片提交后写入检查点 (Redis)，任务中断后重新执行会从上次的游标继续；
+        当天已完成的任务不会重复衰减。
+
+        Args:
+            batch_size: 分片大小，默认 DECAY_BATCH_SIZE
+            resume: 是否从当天的检查点继续
+
         Returns:
             dict: 衰减统计 {processed: int, dimmed: int, collapsed: int}
         """
+        batch_size = batch_size or self.DECAY_BATCH_SIZE
+        now = datetime.now(timezone.utc).replace(tzinfo=None)  # 列为 naive UTC
+        run_id = now.date().isoformat()
+
         stats = {'processed': 0, 'dimmed': 0, 'collapsed': 0}
-        now = datetime.now(timezone.utc)
+        cursor: Optional[Tuple[UUID, UUID]] = None
+
+        checkpoint = await self._load_checkpoint(run_id) if resume else None
+        if checkpoint:
+            stats.update(checkpoint["stats"])
+            if checkpoint.get("completed"):
+                logger.info(f"Daily decay {run_id} already completed, skipping")
+                return stats
+            # 续跑时沿用首次启动的时间基准，保证同一轮次的过滤条件一致
+            now = datetime.fromisoformat(checkpoint["started_at"])
+            if checkpoint.get("cursor"):
+                cursor = (UUID(checkpoint["cursor"][0]), UUID(checkpoint["cursor"][1]))
+            logger.info(f"Resuming daily decay {run_id} from cursor {cursor}")
+
+        use_sql = self._dialect_name() == "postgresql"
+
+        while True:
+            if use_sql:
+                chunk_stats, cursor = await self._decay_chunk_sql(now, cursor, batch_size)
+            else:
+                chunk_stats, cursor = await self._decay_chunk_vectorized(now, cursor, batch_size)
 
-        # 1. 查询需要衰减的节点状态
-        # 条件：已解锁 + 未暂停衰减 + 上次学习超过 1 天
-        query = select(UserNodeStatus).where(
-            and_(
-                UserNodeStatus.is_unlocked == True,
-                UserNodeStatus.decay_paused == False,
-                UserNodeStatus.last_study_at < now - timedelta(days=self.DECAY_CHECK_INTERVAL),
-                UserNodeStatus.mastery_score > self.MIN_MASTERY
-            )
-        )
+            if chunk_stats['processed'] == 0:
+                break
 
-        result = await self.db.execute(query)
-        statuses = result.scalars().all()
+            for key in stats:
+                stats[key] += chunk_stats[key]
+            await self.db.commit()
+            await self._save_checkpoint(run_id, now, cursor, stats, completed=False)
 
-        # 2. 逐个应用衰减
-        for status in statuses:
-            old_mastery = status.mastery_score
+        await self.db.commit()
+        await self._save_checkpoint(run_id, now, None, stats, completed=True)
 
-            # 计算衰减
-            days_elapsed = (now - status.last_study_at).days
-            new_mastery = self._calculate_decay(
-                current_mastery=status.mastery_score,
-                days_elapsed=days_elapsed
-            )
+        return stats
 
-            # 更新状态
-            status.mastery_score = new_mastery
-            stats['processed'] += 1
+    def _dialect_name(self) -> str:
+        try:
+            return self.db.get_bind().dialect.name
+        except Exception:
+            return ""
 
-            # 检查状态变化
-            if old_mastery >= self.THRESHOLD_DIM > new_mastery:
-                stats['dimmed'] += 1
+    async def _decay_chunk_sql(
+        self,
+        now: datetime,
+        cursor: Optional[Tuple[UUID, UUID]],
+        batch_size: int
+    ) -> Tuple[Dict[str, int], Optional[Tuple[UUID, UUID]]]:
+        """PostgreSQL：在数据库内完成一个分片的衰减"""
+        params = {
+            "now": now,
+            "cutoff": now - timedelta(days=self.DECAY_CHECK_INTERVAL),
+            "min_mastery": self.MIN_MASTERY,
+            "half_life": self.BASE_HALF_LIFE_DAYS,
+            "dim": self.THRESHOLD_DIM,
+            "collapse": self.THRESHOLD_COLLAPSE,
+            "limit": batch_size,
+        }
+        cursor_clause = ""
+        if cursor:
+            cursor_clause = "AND (user_id, node_id) > (:after_user_id, :after_node_id)"
+            params["after_user_id"], params["after_node_id"] = cursor
+
+        result = await self.db.execute(text(_PG_DECAY_CHUNK_SQL.format(cursor_clause=cursor_clause)), params)
+        row = result.mappings().one()
+
+        chunk_stats = {
+            'processed': int(row["processed"] or 0),
+            'dimmed': int(row["dimmed"] or 0),
+            'collapsed': int(row["collapsed"] or 0),
+        }
+        next_cursor = (row["last_user_id"], row["last_node_id"]) if row["last_user_id"] else cursor
+        return chunk_stats, next_cursor
 
-            if new_mastery < self.THRESHOLD_COLLAPSE and not status.is_collapsed:
-                # 标记坍缩风险 (但不自动坍缩)
-                stats['collapsed'] += 1
+    async def _decay_chunk_vectorized(
+        self,
+        now: datetime,
+        cursor: Optional[Tuple[UUID, UUID]],
+        batch_size: int
+    ) -> Tuple[Dict[str, int], Optional[Tuple[UUID, UUID]]]:
+        """通用方言：读取一个分片，NumPy 计算后按主键批量更新"""
+        conditions = [
+            UserNodeStatus.is_unlocked == True,
+            # NULL 与 false 同视为未暂停（与 SQL 路径的 coalesce 一致）
+            or_(UserNodeStatus.decay_paused.is_(None), UserNodeStatus.decay_paused.is_(False)),
+            UserNodeStatus.last_study_at < now - timedelta(days=self.DECAY_CHECK_INTERVAL),
+            UserNodeStatus.mastery_score > self.MIN_MASTERY,
+        ]
+        if cursor:
+            conditions.append(tuple_(UserNodeStatus.user_id, UserNodeStatus.node_id) > tuple_(*cursor))
 
-        await self.db.commit()
+        query = (
+            select(
+                UserNodeStatus.user_id,
+                UserNodeStatus.node_id,
+                UserNodeStatus.mastery_score,
+                UserNodeStatus.last_study_at,
+                UserNodeStatus.is_collapsed,
+            )
+            .where(and_(*conditions))
+            .order_by(UserNodeStatus.user_id, UserNodeStatus.node_id)
+            .limit(batch_size)
+        )
+        rows = (await self.db.execute(query)).all()
+        if not rows:
+            return {'processed': 0, 'dimmed': 0, 'collapsed': 0}, cursor
+
+        old_mastery = np.fromiter((row.mastery_score for row in rows), dtype=np.float64, count=len(rows))
+        days = np.fromiter(
+            ((now - row.last_study_at.replace(tzinfo=None)).days for row in rows),
+            dtype=np.float64,
+            count=len(rows),
+        )
+        collapsed_flags = np.fromiter((bool(row.is_collapsed) for row in rows), dtype=bool, count=len(rows))
+        new_mastery = self.decay_kernel(old_mastery, days)
+
+        await self.db.execute(
+            update(UserNodeStatus),
+            [
+                {"user_id": row.user_id, "node_id": row.node_id, "mastery_score": float(value), "updated_at": now}
+                for row, value in zip(rows, new_mastery)
+            ],
+        )
 
-        return stats
+        chunk_stats = {
+            'processed': len(rows),
+            'dimmed': int(np.count_nonzero((old_mastery >= self.THRESHOLD_DIM) & (new_mastery < self.THRESHOLD_DIM))),
+            'collapsed': int(np.count_nonzero((new_mastery < self.THRESHOLD_COLLAPSE) & ~collapsed_flags)),
+        }
+        return chunk_stats, (rows[-1].user_id, rows[-1].node_id)
+
+    @classmethod
+    def decay_kernel(cls, mastery: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """
+        _calculate_decay 的向量化版本
+
+        Args:
+            mastery: 当前掌握度数组
+            days: 距上次学习的整天数数组
+
+        Returns:
+            np.ndarray: 衰减后的掌握度
+        """
+        stability_factor = 1 + (mastery / 100) * 2
+        decay_rate = math.log(2) / (cls.BASE_HALF_LIFE_DAYS * stability_factor)
+        return np.maximum(mastery * np.exp(-decay_rate * days), cls.MIN_MASTERY)
+
+    def _checkpoint_key(self, run_id: str) -> str:
+        return f"{self.CHECKPOINT_KEY_PREFIX}{run_id}"
+
+    async def _load_checkpoint(self, run_id: str) -> Optional[Dict]:
+        if not self.redis:
+            return None
+        try:
+            raw = await self.redis.get(self._checkpoint_key(run_id))
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"Failed to load decay checkpoint: {e}")
+            return None
+
+    async def _save_checkpoint(
+        self,
+        run_id: str,
+        started_at: datetime,
+        cursor: Optional[Tuple[UUID, UUID]],
+        stats: Dict[str, int],
+        completed: bool
+    ) -> None:
+        if not self.redis:
+            return
+        payload = {
+            "started_at": started_at.isoformat(),
+            "cursor": [str(cursor[0]), str(cursor[1])] if cursor else None,
+            "stats": stats,
+            "completed": completed,
+        }
+        try:
+            await self.redis.set(self._checkpoint_key(run_id), json.dumps(payload), ex=self.CHECKPOINT_TTL)
+        except Exception as e:
+            logger.warning(f"Failed to save decay checkpoint: {e}")
 
     def _calculate_decay(self, current_mastery: float, days_elapsed: int) -> float:
         """
@@ -1,10 +1,11 @@
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Any
+from typing import AsyncIterator, List, Dict, Optional, Any
 from uuid import UUID
 from fastapi import HTTPException
 from app.core.ingestion.ingestion_service import ingestion_service
 from loguru import logger
 from app.core.cache import cache_service
+from app.services.embedding_service import embedding_service
 from app.models.galaxy import KnowledgeNode
 from app.models.file_storage import StoredFile
 from sqlalchemy import select, func
@@ -20,6 +21,14 @@ class VectorChunk:
     section_title: Optional[str]
     metadata: Dict = field(default_factory=dict)
     ocr_confidence: Optional[float] = None  # 0.0-1.0, None if not from OCR
+    content_hash: Optional[str] = None  # key into the shared chunk_embeddings store
+
+@dataclass
+class PageChunks:
+    """One extracted page split into vector chunks (streaming unit)."""
+    index: int
+    total: int
+    chunks: List[VectorChunk]
 
 @dataclass
 class QualityResult:
@@ -660,10 +669,64 @@ class DocumentService:
         """
         Extract document chunks suitable for vectorization.
         """
-        chunks = await asyncio.to_thread(ingestion_service.process_file, file_path)
-        if not chunks:
-            return []
+        results: List[VectorChunk] = []
+        async for page in self.stream_vector_chunks(file_path, chunk_size, chunk_overlap):
+            results.extend(page.chunks)
+        return results
+
+    async def stream_vector_chunks(
+        self,
+        file_path: str,
+        chunk_size: int = 1200,
+        chunk_overlap: int = 200,
+        max_workers: Optional[int] = None,
+    ) -> AsyncIterator[PageChunks]:
+        """
+        Stream vector chunks page by page while extraction is still running.
 
+        Pages are extracted in a worker pool (see IngestionService.iter_pages) on a
+        background thread and handed over through a bounded queue, so a slow
+        consumer throttles extraction instead of buffering the whole document.
+        Each chunk carries a content hash over (embedding model, splitter params,
+        normalized text) so callers can reuse previously computed vectors.
+        """
+        splitter = self._make_splitter(chunk_size, chunk_overlap)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=4)
+        done = object()
+        cancelled = False
+
+        def produce():
+            try:
+                for page in ingestion_service.iter_pages(file_path, max_workers=max_workers):
+                    if cancelled:
+                        return
+                    item = PageChunks(page.index, page.total, self._split_chunk(splitter, page.chunk, (chunk_size, chunk_overlap)))
+                    asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+            except BaseException as exc:
+                asyncio.run_coroutine_threadsafe(queue.put(exc), loop).result()
+            else:
+                asyncio.run_coroutine_threadsafe(queue.put(done), loop).result()
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            cancelled = True
+            # Unblock a producer waiting on a full queue, then wait for it to exit
+            while not producer.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.sleep(0.01)
+
+    @staticmethod
+    def _make_splitter(chunk_size: int, chunk_overlap: int):
         try:
             from langchain_text_splitters import RecursiveCharacterTextSplitter
         except ImportError as exc:
@@ -672,28 +735,32 @@ class DocumentService:
                 detail="Vector chunking requires langchain-text-splitters (llm extras)."
             ) from exc
 
-        splitter = RecursiveCharacterTextSplitter(
+        return RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             separators=["\n\n", "\n", ". ", " ", ""],
         )
 
+    @staticmethod
+    def _split_chunk(splitter, chunk, hash_params: tuple = ()) -> List[VectorChunk]:
+        if chunk is None:
+            return []
+        text = (chunk.text or "").strip()
+        if not text:
+            return []
+
         results: List[VectorChunk] = []
-        for chunk in chunks:
-            text = (chunk.text or "").strip()
-            if not text:
+        for piece in splitter.split_text(text):
+            content = piece.strip()
+            if len(content) < 20:
                 continue
-            for piece in splitter.split_text(text):
-                content = piece.strip()
-                if len(content) < 20:
-                    continue
-                results.append(VectorChunk(
-                    content=content,
-                    page_numbers=[chunk.page_num] if chunk.page_num else [],
-                    section_title=chunk.metadata.get("title") if chunk.metadata else None,
-                    ocr_confidence=chunk.ocr_confidence,
-                ))
-
+            results.append(VectorChunk(
+                content=content,
+                page_numbers=[chunk.page_num] if chunk.page_num else [],
+                section_title=chunk.metadata.get("title") if chunk.metadata else None,
+                ocr_confidence=chunk.ocr_confidence,
+                content_hash=embedding_service.content_hash(content, *hash_params),
+            ))
         return results
 
 document_service = DocumentService()
@@ -2,8 +2,16 @@
 向量嵌入服务 (Embedding Service)
 用于将文本转换为向量表示，支持语义搜索
 """
-from typing import List
+import asyncio
+import base64
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
 import httpx
+import numpy as np
+from loguru import logger
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.config import settings
@@ -17,8 +25,15 @@ class EmbeddingService:
     - Qwen (通义千问)
     - DeepSeek
     - OpenAI (备用)
+
+    性能优化：
+    - 共享 keep-alive HTTP 连接池，避免每次调用重新握手
+    - 请求合并 (micro-batching)：窗口期内并发的 get_embedding 合并为一次 /v1/embeddings 请求
+    - 内容哈希缓存：L1 进程内 LRU + L2 Redis，键为 (模型, 规范化文本)
     """
 
+    CACHE_PREFIX = "embedding:cache:"
+
     def __init__(self):
         self.provider = settings.LLM_PROVIDER
         if self.provider == "deepseek":
@@ -30,31 +45,281 @@ class EmbeddingService:
         self.embedding_model = settings.EMBEDDING_MODEL
         self.embedding_dim = settings.EMBEDDING_DIM
 
+        self.coalesce_window = settings.EMBEDDING_COALESCE_WINDOW_MS / 1000.0
+        self.max_batch_size = settings.EMBEDDING_MAX_BATCH_SIZE
+        self.local_cache_size = settings.EMBEDDING_LOCAL_CACHE_SIZE
+        self.cache_ttl = settings.EMBEDDING_CACHE_TTL
+
+        # L1: 进程内 LRU
+        self._local_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+
+        # 共享 HTTP 客户端与合并队列绑定在创建它们的事件循环上
+        # （Celery 任务中每次 asyncio.run 都会新建循环）
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_guard: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[str, Tuple[str, List[asyncio.Future]]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: set = set()
+
+        self.stats = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "api_calls": 0,
+            "coalesced_requests": 0,
+        }
+
+    # ==================== 缓存 ====================
+
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        """NFC 规范化并折叠空白，保证等价文本命中同一缓存项"""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    def content_hash(self, text: str, *params: Any) -> str:
+        """
+        内容寻址哈希：模型 + 附加参数（如切分参数）+ 规范化文本
+
+        用作共享向量库 (chunk_embeddings) 的主键
+        """
+        parts = [self.embedding_model, *(str(p) for p in params), self._normalize_text(text)]
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _cache_key(self, normalized_text: str) -> str:
+        digest = hashlib.sha256(f"{self.embedding_model}\0{normalized_text}".encode("utf-8")).hexdigest()
+        return f"{self.CACHE_PREFIX}{self.embedding_model}:{digest}"
+
+    @staticmethod
+    def _encode_vector(embedding: List[float]) -> str:
+        return base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode("ascii")
+
+    @staticmethod
+    def _decode_vector(raw: str) -> List[float]:
+        return np.frombuffer(base64.b64decode(raw), dtype=np.float32).tolist()
+
+    def _get_redis(self):
+        from app.core.cache import cache_service
+        return cache_service.redis
+
+    def _local_get(self, key: str) -> Optional[List[float]]:
+        embedding = self._local_cache.get(key)
+        if embedding is not None:
+            self._local_cache.move_to_end(key)
+        return embedding
+
+    def _local_set(self, key: str, embedding: List[float]) -> None:
+        self._local_cache[key] = embedding
+        self._local_cache.move_to_end(key)
+        while len(self._local_cache) > self.local_cache_size:
+            self._local_cache.popitem(last=False)
+
+    async def _cache_lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """批量查询 L1/L2 缓存，返回命中的 key -> embedding"""
+        found: Dict[str, List[float]] = {}
+        remote_keys = []
+        for key in keys:
+            embedding = self._local_get(key)
+            if embedding is not None:
+                found[key] = embedding
+                self.stats["local_hits"] += 1
+            else:
+                remote_keys.append(key)
+
+        redis = self._get_redis()
+        if remote_keys and redis:
+            try:
+                values = await redis.mget(remote_keys)
+                for key, raw in zip(remote_keys, values):
+                    if raw:
+                        embedding = self._decode_vector(raw)
+                        found[key] = embedding
+                        self._local_set(key, embedding)
+                        self.stats["redis_hits"] += 1
+            except Exception as e:
+                logger.warning(f"Embedding cache lookup failed: {e}")
+
+        return found
+
+    async def _cache_store(self, items: Dict[str, List[float]]) -> None:
+        for key, embedding in items.items():
+            self._local_set(key, embedding)
+
+        redis = self._get_redis()
+        if not items or not redis:
+            return
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for key, embedding in items.items():
+                pipe.setex(key, self.cache_ttl, self._encode_vector(embedding))
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Embedding cache store failed: {e}")
+
+    # ==================== HTTP ====================
+
+    def _bind_loop(self) -> None:
+        """确保共享客户端和合并队列属于当前事件循环"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # 旧循环上的连接与 future 无法复用；客户端只能在其所属循环上关闭，
+        # 若旧循环仍未关闭，取消守护任务让它在旧循环上关闭客户端
+        guard = self._client_guard
+        if guard is not None and not guard.done() and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(guard.cancel)
+        self._client = None
+        self._client_guard = None
+        self._pending = {}
+        self._flush_handle = None
+        self._flush_tasks = set()
+        self._loop = loop
+
+    def _get_client(self) -> httpx.AsyncClient:
+        self._bind_loop()
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=60.0,
+                limits=httpx.Limits(
+                    max_connections=settings.EMBEDDING_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.EMBEDDING_HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=60.0,
+                ),
+            )
+            self._client_guard = asyncio.get_running_loop().create_task(self._close_with_loop(self._client))
+        return self._client
+
+    @staticmethod
+    async def _close_with_loop(client: httpx.AsyncClient) -> None:
+        """
+        守护任务：被取消时在客户端所属循环上关闭它
+
+        asyncio.run 退出前会取消残留任务，因此 Celery 中每次 asyncio.run 创建的客户端
+        都会在循环关闭前被关闭，不会遗留绑定在已关闭循环上的连接。
+        """
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await client.aclose()
+
+    async def close(self) -> None:
+        """关闭共享 HTTP 客户端（应用关闭时调用）"""
+        if self._client_guard is not None:
+            self._client_guard.cancel()
+            self._client_guard = None
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10)
     )
+    async def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """调用 OpenAI 兼容的 /v1/embeddings 接口（不经过缓存）"""
+        client = self._get_client()
+        self.stats["api_calls"] += 1
+        response = await client.post(
+            f"{self.base_url}/v1/embeddings" if "/v1/embeddings" not in self.base_url else self.base_url,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={
+                "model": self.embedding_model,
+                "input": texts
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        # 按索引顺序返回
+        embeddings = [None] * len(texts)
+        for item in data["data"]:
+            embeddings[item["index"]] = item["embedding"]
+
+        return embeddings
+
+    # ==================== 请求合并 ====================
+
+    def _start_flush(self) -> None:
+        task = asyncio.get_running_loop().create_task(self._flush_pending())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    def _schedule_flush(self) -> None:
+        if len(self._pending) >= self.max_batch_size:
+            if self._flush_handle:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+            self._start_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.coalesce_window, self._start_flush)
+
+    async def _flush_pending(self) -> None:
+        self._flush_handle = None
+        if not self._pending:
+            return
+        batch = self._pending
+        self._pending = {}
+
+        keys = list(batch.keys())
+        texts = [batch[key][0] for key in keys]
+        try:
+            embeddings = await self._request_embeddings(texts)
+        except Exception as e:
+            for _, futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        results = dict(zip(keys, embeddings))
+        for key, (_, futures) in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(results[key])
+        await self._cache_store(results)
+
+    # ==================== 公共接口 ====================
+
     async def get_embedding(self, text: str) -> List[float]:
         """
         获取文本的向量表示
 
+        先查缓存；未命中时加入合并队列，与窗口期内的其他请求一起发送。
+
         Args:
             text: 输入文本
 
         Returns:
             List[float]: 向量 (默认 1536 维)
         """
-        embeddings = await self.batch_embeddings([text])
-        return embeddings[0]
+        normalized = self._normalize_text(text)
+        key = self._cache_key(normalized)
+
+        cached = await self._cache_lookup([key])
+        if key in cached:
+            return cached[key]
+
+        self._bind_loop()
+        future = asyncio.get_running_loop().create_future()
+        if key in self._pending:
+            # 相同文本的并发请求共享同一个结果
+            self._pending[key][1].append(future)
+            self.stats["coalesced_requests"] += 1
+        else:
+            self.stats["misses"] += 1
+            self._pending[key] = (normalized, [future])
+            if len(self._pending) > 1:
+                self.stats["coalesced_requests"] += 1
+        self._schedule_flush()
+        return await future
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10)
-    )
     async def batch_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
         批量获取文本向量
 
+        已缓存的文本不会重复请求；重复文本只请求一次；
+        未命中部分按 EMBEDDING_MAX_BATCH_SIZE 分批发送。
+
         Args:
             texts: 文本列表
 
@@ -64,25 +329,25 @@ class EmbeddingService:
         if not texts:
             return []
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            # 使用 OpenAI 兼容的 API 格式
-            response = await client.post(
-                f"{self.base_url}/v1/embeddings" if "/v1/embeddings" not in self.base_url else self.base_url,
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json={
-                    "model": self.embedding_model,
-                    "input": texts
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
+        normalized = [self._normalize_text(text) for text in texts]
+        keys = [self._cache_key(text) for text in normalized]
+        results = await self._cache_lookup(list(dict.fromkeys(keys)))
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, normalized):
+            if key not in results and key not in missing:
+                missing[key] = text
+        self.stats["misses"] += len(missing)
 
-            # 按索引顺序返回
-            embeddings = [None] * len(texts)
-            for item in data["data"]:
-                embeddings[item["index"]] = item["embedding"]
+        missing_keys = list(missing.keys())
+        for i in range(0, len(missing_keys), self.max_batch_size):
+            batch_keys = missing_keys[i:i + self.max_batch_size]
+            embeddings = await self._request_embeddings([missing[key] for key in batch_keys])
+            fetched = dict(zip(batch_keys, embeddings))
+            results.update(fetched)
+            await self._cache_store(fetched)
 
-            return embeddings
+        return [results[key] for key in keys]
 
     async def _qwen_embedding(self, client: httpx.AsyncClient, text: str) -> List[float]:
         """通义千问 Embedding API"""
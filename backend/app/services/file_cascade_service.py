@@ -334,15 +334,17 @@ class FileCascadeService:
                 return stats
 
             # 2. 恢复文件
+            deleted_at = file.deleted_at
             file.deleted_at = None
             stats["file_restored"] = True
 
             # 3. 恢复关联的 chunks
+            # 只恢复随文件一起软删除的切片；处理中断遗留的暂存切片 (deleted_at = 运行开始时间) 保持隐藏
             chunks_stmt = (
                 update(DocumentChunk)
                 .where(
                     DocumentChunk.file_id == file_id,
-                    DocumentChunk.deleted_at.isnot(None)
+                    DocumentChunk.deleted_at == deleted_at
                 )
                 .values(deleted_at=None)
             )
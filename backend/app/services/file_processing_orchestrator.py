@@ -2,28 +2,34 @@
 File processing orchestrator
 文件处理编排服务
 """
+import asyncio
 import json
 import os
 import tempfile
-from typing import Optional
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
 from uuid import UUID
 
 import httpx
 from loguru import logger
-from sqlalchemy import delete
+from sqlalchemy import delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.core.cache import cache_service
-from app.models.document_chunks import DocumentChunk
+from app.db.session import AsyncSessionLocal
+from app.models.document_chunks import ChunkEmbedding, DocumentChunk
 from app.models.file_storage import StoredFile
-from app.services.document_service import document_service
+from app.services.document_service import VectorChunk, document_service
 from app.services.embedding_service import embedding_service
 from app.services.thumbnail_service import thumbnail_service
 
 
 class FileProcessingOrchestrator:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, session_factory=AsyncSessionLocal):
         self.db = db
+        # 向量阶段与入库阶段并发，查询共享向量库时使用独立的短会话
+        self.session_factory = session_factory
 
     async def process_file(
         self,
@@ -42,23 +48,26 @@ class FileProcessingOrchestrator:
         await self._publish_status(file_id, user_id, "processing", 10)
 
         temp_path = await self._download_file(download_url, file_name)
+        # 本次运行写入的切片以 deleted_at = run_started_at 暂存（检索不可见），质量门通过后才替换旧切片
+        run_started_at = datetime.utcnow()
         try:
-            chunks = await document_service.extract_vector_chunks(temp_path)
+            # 提取 → 切分 → 向量化 → 入库 流水线并发执行
+            chunks = await self._run_chunk_pipeline(file_id, user_id, temp_path, staged_at=run_started_at)
             if not chunks:
                 raise ValueError("No extractable content for vectorization")
 
             # 1. Quality Check
             quality = document_service.check_quality(chunks)
             if not quality.passed:
+                await self._discard_new_chunks(file_id, run_started_at)
                 error_msg = f"Quality Gate Failed: {'; '.join(quality.issues)}"
                 await self._update_status(file_record, "failed", error_message=error_msg)
                 await self._publish_status(file_id, user_id, "failed", 100, error=error_msg)
                 return {"status": "failed", "error": error_msg}
 
-            await self._replace_chunks(file_id)
-            await self._store_chunks(file_id, user_id, chunks, quality.score)
+            await self._replace_chunks(file_id, run_started_at, quality.score)
 
-            await self._publish_status(file_id, user_id, "processing", 80)
+            await self._publish_status(file_id, user_id, "processing", 80, stage="drafting")
 
             # 2. Drafting
             await document_service.draft_knowledge_nodes(self.db, file_id, user_id, chunks)
@@ -70,6 +79,8 @@ class FileProcessingOrchestrator:
 
             return {"status": "processed", "file_id": str(file_id)}
         except Exception as exc:
+            await self.db.rollback()
+            await self._discard_new_chunks(file_id, run_started_at)
             await self._update_status(file_record, "failed", error_message=str(exc))
             await self._publish_status(file_id, user_id, "failed", 100, error=str(exc))
             raise
@@ -91,34 +102,206 @@ class FileProcessingOrchestrator:
 
         return temp_path
 
-    async def _replace_chunks(self, file_id: UUID) -> None:
-        await self.db.execute(delete(DocumentChunk).where(DocumentChunk.file_id == file_id))
+    async def _replace_chunks(self, file_id: UUID, run_started_at: datetime, quality_score: float) -> None:
+        """新切片通过质量门后：删除旧切片，发布暂存切片并回填文档级质量分"""
+        await self.db.execute(
+            delete(DocumentChunk).where(
+                DocumentChunk.file_id == file_id,
+                DocumentChunk.created_at < run_started_at,
+            )
+        )
+        await self.db.execute(
+            update(DocumentChunk)
+            .where(DocumentChunk.file_id == file_id, DocumentChunk.created_at >= run_started_at)
+            .values(quality_score=quality_score, deleted_at=None)
+        )
         await self.db.commit()
 
-    async def _store_chunks(self, file_id: UUID, user_id: UUID, chunks, quality_score: float = 1.0) -> None:
-        texts = [chunk.content for chunk in chunks]
-        batch_size = 16
-        index = 0
-
-        while index < len(texts):
-            batch_texts = texts[index:index + batch_size]
-            embeddings = await embedding_service.batch_embeddings(batch_texts)
-            items = []
-            for offset, (chunk, embedding) in enumerate(zip(chunks[index:index + batch_size], embeddings)):
-                items.append(DocumentChunk(
-                    file_id=file_id,
-                    user_id=user_id,
-                    chunk_index=index + offset,
-                    page_numbers=chunk.page_numbers, # JSON list
-                    section_title=chunk.section_title,
-                    content=chunk.content,
-                    embedding=embedding,
-                    quality_score=quality_score,
-                    pipeline_version="v1"
-                ))
-            self.db.add_all(items)
+    async def _discard_new_chunks(self, file_id: UUID, run_started_at: datetime) -> None:
+        try:
+            await self.db.execute(
+                delete(DocumentChunk).where(
+                    DocumentChunk.file_id == file_id,
+                    DocumentChunk.created_at >= run_started_at,
+                )
+            )
             await self.db.commit()
-            index += batch_size
+        except Exception as exc:
+            logger.warning(f"Failed to discard partial chunks for file {file_id}: {exc}")
+
+    async def _run_chunk_pipeline(
+        self,
+        file_id: UUID,
+        user_id: UUID,
+        file_path: str,
+        staged_at: Optional[datetime] = None,
+    ) -> List[VectorChunk]:
+        """
+        流式切片流水线
+
+        extract (进程池逐页提取/OCR，按页序流出) → embed (并发批量向量化) → insert (顺序写库)
+        阶段之间使用有界队列，任一阶段变慢都会向上游施加背压。
+        进度按阶段上报：提取占 10-45%，入库占 45-75%。
+
+        embed 阶段先按 content_hash 查询共享向量库 (chunk_embeddings)，只对未命中的
+        切片调用向量化接口，重复上传和相同教材因此几乎不产生向量化开销。
+        """
+        batch_size = settings.INGEST_EMBED_BATCH_SIZE
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+        insert_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+        embed_workers = max(1, settings.INGEST_EMBED_CONCURRENCY)
+        all_chunks: List[VectorChunk] = []
+        progress = {"pages": 0, "total_pages": 0, "stored": 0, "reused": 0, "last": 10}
+        # 本次运行已得到的向量 (content_hash -> embedding)，文档内重复切片也只向量化一次
+        known_vectors: Dict[str, List[float]] = {}
+
+        async def report(stage: str) -> None:
+            extract_frac = progress["pages"] / progress["total_pages"] if progress["total_pages"] else 0.0
+            store_frac = progress["stored"] / len(all_chunks) if all_chunks else 0.0
+            percent = 10 + int(35 * extract_frac + 30 * extract_frac * store_frac)
+            # 至少推进 2% 才发布，避免逐页刷屏
+            if percent >= progress["last"] + 2:
+                progress["last"] = percent
+                await self._publish_status(
+                    file_id, user_id, "processing", percent, stage=stage,
+                    detail={
+                        "pages_done": progress["pages"],
+                        "pages_total": progress["total_pages"],
+                        "chunks_stored": progress["stored"],
+                        "chunks_total": len(all_chunks),
+                        "chunks_reused": progress["reused"],
+                    },
+                )
+
+        async def extract() -> None:
+            pending: List[tuple] = []
+            async for page in document_service.stream_vector_chunks(file_path):
+                progress["pages"], progress["total_pages"] = page.index + 1, page.total
+                for chunk in page.chunks:
+                    pending.append((len(all_chunks), chunk))
+                    all_chunks.append(chunk)
+                    if len(pending) >= batch_size:
+                        await embed_queue.put(pending)
+                        pending = []
+                await report("extracting")
+            if pending:
+                await embed_queue.put(pending)
+            for _ in range(embed_workers):
+                await embed_queue.put(None)
+
+        async def embed() -> None:
+            while (batch := await embed_queue.get()) is not None:
+                hashes = {chunk.content_hash for _, chunk in batch if chunk.content_hash}
+                lookup = hashes - known_vectors.keys()
+                if lookup:
+                    known_vectors.update(await self._lookup_embeddings(lookup))
+
+                misses: Dict[str, str] = {}
+                unhashed = []
+                for position, (_, chunk) in enumerate(batch):
+                    if not chunk.content_hash:
+                        unhashed.append(position)
+                    elif chunk.content_hash not in known_vectors:
+                        misses.setdefault(chunk.content_hash, chunk.content)
+
+                texts = list(misses.values()) + [batch[position][1].content for position in unhashed]
+                computed = await embedding_service.batch_embeddings(texts) if texts else []
+                fresh = dict(zip(misses.keys(), computed))
+                known_vectors.update(fresh)
+                direct = dict(zip(unhashed, computed[len(misses):]))
+
+                embeddings = [
+                    direct[position] if position in direct else known_vectors[chunk.content_hash]
+                    for position, (_, chunk) in enumerate(batch)
+                ]
+                progress["reused"] += len(batch) - len(misses) - len(unhashed)
+                await insert_queue.put((batch, embeddings, fresh))
+
+        async def insert() -> None:
+            finished = 0
+            while finished < embed_workers:
+                item = await insert_queue.get()
+                if item is None:
+                    finished += 1
+                    continue
+                batch, embeddings, fresh = item
+                await self._store_chunks(file_id, user_id, batch, embeddings, fresh, staged_at)
+                progress["stored"] += len(batch)
+                await report("embedding")
+
+        async def embed_then_signal() -> None:
+            try:
+                await embed()
+            finally:
+                await insert_queue.put(None)
+
+        tasks = [asyncio.create_task(extract()), asyncio.create_task(insert())]
+        tasks += [asyncio.create_task(embed_then_signal()) for _ in range(embed_workers)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return all_chunks
+
+    async def _lookup_embeddings(self, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        """从共享向量库批量读取已有向量"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(ChunkEmbedding.content_hash, ChunkEmbedding.embedding)
+                .where(ChunkEmbedding.content_hash.in_(list(hashes)))
+            )
+            return {content_hash: list(embedding) for content_hash, embedding in result.all()}
+
+    async def _store_chunks(
+        self,
+        file_id: UUID,
+        user_id: UUID,
+        batch,
+        embeddings,
+        fresh: Optional[Dict[str, List[float]]] = None,
+        staged_at: Optional[datetime] = None,
+    ) -> None:
+        """
+        写入一批已向量化的切片 (batch: [(chunk_index, VectorChunk)])
+
+        fresh 为本批新计算的向量，先写入共享向量库（并发写入同一 hash 时保留先到者）。
+        切片以 deleted_at = staged_at 暂存，由 _replace_chunks 在质量门通过后发布。
+        """
+        if fresh:
+            await self._upsert_embeddings(fresh)
+        items = [
+            DocumentChunk(
+                file_id=file_id,
+                user_id=user_id,
+                chunk_index=index,
+                page_numbers=chunk.page_numbers, # JSON list
+                section_title=chunk.section_title,
+                content=chunk.content,
+                content_hash=chunk.content_hash,
+                embedding=embedding,
+                pipeline_version="v1",
+                deleted_at=staged_at,
+            )
+            for (index, chunk), embedding in zip(batch, embeddings)
+        ]
+        self.db.add_all(items)
+        await self.db.commit()
+
+    async def _upsert_embeddings(self, vectors: Dict[str, List[float]]) -> None:
+        rows = [
+            {"content_hash": content_hash, "embedding_model": embedding_service.embedding_model, "embedding": embedding}
+            for content_hash, embedding in vectors.items()
+        ]
+        if self.db.get_bind().dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        await self.db.execute(
+            insert(ChunkEmbedding).values(rows).on_conflict_do_nothing(index_elements=["content_hash"])
+        )
 
     async def _update_status(self, record: StoredFile, status: str, error_message: Optional[str] = None) -> None:
         record.status = status
@@ -133,6 +316,8 @@ class FileProcessingOrchestrator:
         status: str,
         progress: int,
         error: Optional[str] = None,
+        stage: Optional[str] = None,
+        detail: Optional[dict] = None,
     ) -> None:
         if not cache_service.redis:
             await cache_service.init_redis()
@@ -145,6 +330,10 @@ class FileProcessingOrchestrator:
             "status": status,
             "progress": progress,
         }
+        if stage:
+            payload["stage"] = stage
+        if detail:
+            payload.update(detail)
         if error:
             payload["error"] = error[:200]
         try:
@@ -11,6 +11,7 @@ class CollaborativeGalaxyService:
     def __init__(self, galaxy_id: str):
         self.galaxy_id = galaxy_id
         self.ydoc = Y.YDoc()
+        self.last_update_id = 0  # 已应用的 crdt_update_log 水位
         self.galaxy_map = self.ydoc.get_map("galaxy")
 
     def add_node(self, user_id: str, node_data: Dict[str, Any]):
@@ -57,7 +58,10 @@ class CollaborativeGalaxyService:
     def get_state_vector(self) -> bytes:
         return Y.encode_state_vector(self.ydoc)
 
-    def get_update(self) -> bytes:
+    def get_update(self, state_vector: Optional[bytes] = None) -> bytes:
+        """客户端已有 state_vector 时只返回它缺少的部分"""
+        if state_vector:
+            return Y.encode_state_as_update(self.ydoc, state_vector)
         return Y.encode_state_as_update(self.ydoc)
 
     def apply_update(self, update: bytes):
@@ -0,0 +1,346 @@
+"""
+协作星图会话管理 (Collaborative Session Manager)
+
+每个星图文档在任一时刻只由一个进程 (owner) 持有并处理同步:
+- 所有权通过 Redis 租约 crdt:owner:{galaxy_id} 分配 (SET NX PX)，每次同步续期
+- 非 owner 收到的同步请求经 pub/sub 转发到 owner 的频道 crdt:pod:{pod_id}，等待其回复
+- owner 不在线 (无订阅者) 时清除其租约并重新竞争
+- 内存中的文档按 LRU + 空闲超时淘汰。更新在返回前已追加到 crdt_update_log，
+  文档不会有未落盘的状态，淘汰时只需交还租约
+
+Single-owner YDoc sessions: Redis lease for ownership, pub/sub forwarding for
+non-owners, LRU/idle-bounded in-memory cache.
+"""
+import asyncio
+import base64
+import json
+import os
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.core.metrics import COLLAB_DOCS_CACHED, COLLAB_SYNC_REQUESTS
+from app.services.galaxy.collaborative_service import CollaborativeGalaxyService
+from app.services.galaxy.crdt_persistence import CRDTPersistenceManager
+
+# 无 owner 时占有租约；本进程已是 owner 时续期；返回当前 owner
+_ACQUIRE_LEASE = """
+local owner = redis.call('GET', KEYS[1])
+if not owner then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return ARGV[1]
+end
+if owner == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return owner
+"""
+
+# 仅当租约仍属于指定 owner 时删除
+_RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class OwnerUnavailableError(RuntimeError):
+    """文档 owner 未能在超时内处理转发的同步请求"""
+
+
+class _NotOwnerError(RuntimeError):
+    pass
+
+
+class _DocSession:
+    __slots__ = ("service", "lock", "last_used")
+
+    def __init__(self):
+        self.service: Optional[CollaborativeGalaxyService] = None
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+class CollaborativeSessionManager:
+    """
+    协作文档会话管理器
+    Bounded, owner-sharded cache of collaborative YDocs
+    """
+
+    LEASE_PREFIX = "crdt:owner:"
+    CHANNEL_PREFIX = "crdt:pod:"
+    SWEEP_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        db_session_factory: Optional[Callable] = None,
+        redis_client: Any = None,
+        pod_id: Optional[str] = None,
+        max_docs: Optional[int] = None,
+        idle_seconds: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+        forward_timeout: Optional[float] = None,
+    ):
+        self.db_session_factory = db_session_factory
+        self._redis = redis_client
+        self.pod_id = pod_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.max_docs = max_docs or settings.CRDT_SESSION_MAX_DOCS
+        self.idle_seconds = idle_seconds or settings.CRDT_SESSION_IDLE_SECONDS
+        self.lease_ms = int((lease_seconds or settings.CRDT_OWNER_LEASE_SECONDS) * 1000)
+        self.forward_timeout = forward_timeout or settings.CRDT_FORWARD_TIMEOUT_SECONDS
+
+        self._docs: "OrderedDict[str, _DocSession]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        # 事件循环只弱引用任务：保留转发请求任务的强引用，避免执行中被回收
+        self._serving: Set[asyncio.Task] = set()
+        self._pubsub = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._last_sweep = time.monotonic()
+
+    @property
+    def redis(self):
+        if self._redis is not None:
+            return self._redis
+        from app.core.cache import cache_service
+        return cache_service.redis
+
+    @property
+    def channel(self) -> str:
+        return f"{self.CHANNEL_PREFIX}{self.pod_id}"
+
+    # ---------------- lifecycle ----------------
+
+    async def start(self, db_session_factory: Optional[Callable] = None):
+        """订阅本进程的转发频道；没有 Redis 时退化为单进程模式"""
+        if db_session_factory:
+            self.db_session_factory = db_session_factory
+        if not self.redis or self._listener_task:
+            return
+        self._pubsub = self.redis.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._listener_task = asyncio.create_task(self._listen())
+        logger.info(f"Collaborative sessions listening on {self.channel}")
+
+    async def stop(self):
+        """停止监听并交还所有租约"""
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+        if self._pubsub:
+            await self._pubsub.close()
+            self._pubsub = None
+        for task in list(self._serving):
+            task.cancel()
+        await asyncio.gather(*self._serving, return_exceptions=True)
+        for galaxy_id in list(self._docs):
+            await self._evict(galaxy_id)
+
+    # ---------------- sync entry point ----------------
+
+    async def sync(
+        self,
+        galaxy_id: str,
+        user_id: Optional[str],
+        update: bytes = b"",
+        state_vector: bytes = b"",
+    ) -> Tuple[bytes, bytes]:
+        """
+        同步一个协作文档，返回 (相对 state_vector 的增量, 服务端 state_vector)
+        Apply the client update at the owner and return the diff against state_vector
+        """
+        if time.monotonic() - self._last_sweep >= self.SWEEP_INTERVAL:
+            await self.sweep_idle()
+        for attempt in range(2):
+            owner = await self._acquire(galaxy_id)
+            try:
+                if owner == self.pod_id:
+                    COLLAB_SYNC_REQUESTS.labels(route="local").inc()
+                    return await self._sync_local(galaxy_id, user_id, update, state_vector)
+                COLLAB_SYNC_REQUESTS.labels(route="forwarded").inc()
+                return await self._forward(owner, galaxy_id, user_id, update, state_vector)
+            except _NotOwnerError:
+                # 租约在转发途中易主，按新的 owner 重试一次
+                COLLAB_SYNC_REQUESTS.labels(route="owner_lost").inc()
+                if attempt:
+                    raise OwnerUnavailableError(f"Ownership of galaxy {galaxy_id} is moving, retry later")
+        raise OwnerUnavailableError(f"Owner of galaxy {galaxy_id} is unavailable")
+
+    # ---------------- ownership ----------------
+
+    async def _acquire(self, galaxy_id: str) -> str:
+        redis = self.redis
+        if not redis:
+            return self.pod_id
+        owner = await redis.eval(_ACQUIRE_LEASE, 1, f"{self.LEASE_PREFIX}{galaxy_id}", self.pod_id, self.lease_ms)
+        return owner.decode() if isinstance(owner, bytes) else owner
+
+    async def _release(self, galaxy_id: str, owner: str):
+        redis = self.redis
+        if not redis:
+            return
+        try:
+            await redis.eval(_RELEASE_LEASE, 1, f"{self.LEASE_PREFIX}{galaxy_id}", owner)
+        except Exception as e:
+            logger.warning(f"Failed to release collaborative lease for {galaxy_id}: {e}")
+
+    # ---------------- local documents ----------------
+
+    async def _sync_local(self, galaxy_id: str, user_id: Optional[str], update: bytes, state_vector: bytes):
+        session = self._docs.get(galaxy_id)
+        if session is None:
+            session = self._docs[galaxy_id] = _DocSession()
+            await self._evict_overflow(keep=galaxy_id)
+        else:
+            self._docs.move_to_end(galaxy_id)
+
+        async with session.lock:
+            session.last_used = time.monotonic()
+            async with self.db_session_factory() as db:
+                persistence = CRDTPersistenceManager(self.redis, db)
+                service = session.service
+                if service is None:
+                    ydoc, last_update_id = await persistence.restore(galaxy_id)
+                    service = CollaborativeGalaxyService(galaxy_id)
+                    service.ydoc = ydoc
+                    service.last_update_id = last_update_id
+                    session.service = service
+
+                if update:
+                    service.apply_update(update)
+                    update_id = await persistence.append_update(galaxy_id, user_id, update)
+                    if user_id:
+                        # 审计日志 (crdt_operation_log)；增量日志本身不承担审计
+                        await persistence.log_operation(
+                            galaxy_id=galaxy_id,
+                            user_id=user_id,
+                            op_type="crdt_sync",
+                            op_data={"update_size": len(update), "update_id": update_id},
+                        )
+
+                # 追上上一任 owner 写入的更新 (本次更新会被幂等地再应用一次)
+                updates, service.last_update_id = await persistence.load_since(galaxy_id, service.last_update_id)
+                for pending in updates:
+                    service.apply_update(pending)
+
+                return service.get_update(state_vector or None), service.get_state_vector()
+
+    async def _evict(self, galaxy_id: str):
+        session = self._docs.pop(galaxy_id, None)
+        COLLAB_DOCS_CACHED.set(len(self._docs))
+        if session is not None:
+            # 所有更新均已追加到 crdt_update_log，只需交还租约
+            await self._release(galaxy_id, self.pod_id)
+
+    async def _evict_overflow(self, keep: str):
+        for galaxy_id in list(self._docs):
+            if len(self._docs) <= self.max_docs:
+                break
+            session = self._docs.get(galaxy_id)
+            if galaxy_id != keep and session is not None and not session.lock.locked():
+                await self._evict(galaxy_id)
+        COLLAB_DOCS_CACHED.set(len(self._docs))
+
+    async def sweep_idle(self):
+        """淘汰空闲超时的文档"""
+        self._last_sweep = time.monotonic()
+        deadline = time.monotonic() - self.idle_seconds
+        for galaxy_id, session in list(self._docs.items()):
+            if session.last_used < deadline and not session.lock.locked():
+                await self._evict(galaxy_id)
+
+    # ---------------- forwarding ----------------
+
+    async def _forward(self, owner: str, galaxy_id: str, user_id: Optional[str], update: bytes, state_vector: bytes):
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        payload = json.dumps({
+            "type": "sync",
+            "request_id": request_id,
+            "reply_to": self.channel,
+            "galaxy_id": galaxy_id,
+            "user_id": user_id,
+            "update": _b64(update),
+            "state_vector": _b64(state_vector),
+        })
+        try:
+            if not await self.redis.publish(f"{self.CHANNEL_PREFIX}{owner}", payload):
+                # owner 进程已退出：清除其租约，由下一轮重新竞争
+                await self._release(galaxy_id, owner)
+                raise _NotOwnerError(owner)
+            reply = await asyncio.wait_for(future, timeout=self.forward_timeout)
+        except asyncio.TimeoutError:
+            raise OwnerUnavailableError(f"Owner {owner} of galaxy {galaxy_id} did not answer")
+        finally:
+            self._pending.pop(request_id, None)
+
+        if reply.get("not_owner"):
+            raise _NotOwnerError(owner)
+        if reply.get("error"):
+            raise RuntimeError(reply["error"])
+        return base64.b64decode(reply["update"]), base64.b64decode(reply["state_vector"])
+
+    async def _serve_forwarded(self, request: dict):
+        galaxy_id = request["galaxy_id"]
+        reply: Dict[str, Any] = {"type": "reply", "request_id": request["request_id"]}
+        try:
+            if await self._acquire(galaxy_id) != self.pod_id:
+                reply["not_owner"] = True
+            else:
+                COLLAB_SYNC_REQUESTS.labels(route="served").inc()
+                update, state_vector = await self._sync_local(
+                    galaxy_id,
+                    request.get("user_id"),
+                    base64.b64decode(request.get("update") or ""),
+                    base64.b64decode(request.get("state_vector") or ""),
+                )
+                reply.update(update=_b64(update), state_vector=_b64(state_vector))
+        except Exception as e:
+            logger.error(f"Forwarded collaborative sync for {galaxy_id} failed: {e}")
+            reply["error"] = str(e)
+        await self.redis.publish(request["reply_to"], json.dumps(reply))
+
+    async def _handle_message(self, data: str):
+        message = json.loads(data)
+        if message.get("type") == "sync":
+            task = asyncio.create_task(self._serve_forwarded(message))
+            self._serving.add(task)
+            task.add_done_callback(self._serving.discard)
+        elif message.get("type") == "reply":
+            future = self._pending.get(message.get("request_id"))
+            if future and not future.done():
+                future.set_result(message)
+
+    async def _listen(self):
+        try:
+            while True:
+                try:
+                    message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message:
+                        await self._handle_message(message["data"])
+                    if time.monotonic() - self._last_sweep >= self.SWEEP_INTERVAL:
+                        await self.sweep_idle()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Collaborative session listener error: {e}")
+                    await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            pass
+
+
+collaborative_sessions = CollaborativeSessionManager()
@@ -1,103 +1,137 @@
 from datetime import datetime
-import json
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import y_py as Y
-from sqlalchemy import select, update, insert
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from redis.asyncio import Redis
-from app.models.galaxy import CRDTSnapshot, CollaborativeGalaxy, CRDTOperationLog
+from app.models.galaxy import CRDTSnapshot, CRDTOperationLog, CRDTUpdateLog
 from loguru import logger
 
 class CRDTPersistenceManager:
     """
-    CRDT 状态持久化管理器: 内存 -> Redis -> PostgreSQL
-    CRDT Persistence Manager: Memory -> Redis -> PostgreSQL
+    CRDT 状态持久化管理器: 快照 + append-only 增量日志
+    CRDT Persistence Manager: snapshot + append-only update log
+
+    文档状态 = crdt_snapshots.state_data + crdt_update_log 中 id > last_update_id 的增量更新。
+    同步只追加客户端发来的增量 (O(编辑大小))，compact() 定期把日志折叠进快照。
     """
 
     def __init__(self, redis_client: Redis, db_session: AsyncSession):
         self.redis = redis_client
         self.db = db_session
-        self._batch_buffer = []
 
-    async def persist_snapshot(self, galaxy_id: str, ydoc: Y.YDoc):
+    async def append_update(self, galaxy_id: str, user_id: Optional[str], update: bytes) -> int:
         """
-        1. 内存 -> Redis (高频写入)
-        Memory -> Redis (High-frequency write)
+        追加一条增量更新，返回日志 id
+        Append an incremental Yjs update, returns its log id
         """
-        # 序列化 Yjs 文档
-        update_data = Y.encode_state_as_update(ydoc)
+        # 同一星图的追加串行提交，保证 id 顺序即可见顺序，"id > 水位" 不会漏掉更新
+        await self.db.execute(select(func.pg_advisory_xact_lock(func.hashtext(str(galaxy_id)))))
+        result = await self.db.execute(
+            insert(CRDTUpdateLog)
+            .values(galaxy_id=galaxy_id, user_id=user_id or None, update_data=update)
+            .returning(CRDTUpdateLog.id)
+        )
+        update_id = result.scalar_one()
+        await self.db.commit()
+        return update_id
 
-        # Redis 持久化 (TTL 24h)
-        # 注意: 如果 redis_client 设置了 decode_responses=True, 
-        # 这里存储 bytes 可能会有问题。
-        # 建议使用独立的 redis 实例或确保可以处理 bytes。
-        key = f"crdt:snapshot:{galaxy_id}"
-        await self.redis.set(key, update_data, ex=86400)
+    async def load_since(self, galaxy_id: str, after_id: int = -1) -> Tuple[List[bytes], int]:
+        """
+        读取水位 after_id 之后的更新 (按应用顺序) 及新的水位
+        Updates after the given high-water mark, in apply order, plus the new mark
 
-        # 记录最后同步时间
-        await self.redis.set(
-            f"crdt:timestamp:{galaxy_id}",
-            datetime.utcnow().isoformat(),
-            ex=86400
-        )
+        after_id=-1 读取完整文档。若日志已被压缩越过 after_id，先返回快照 (Yjs 更新幂等，可重复应用)。
+        """
+        # 先读日志再读快照: 两次读取之间若发生压缩，后读的快照必然覆盖被删除的日志
+        rows = (await self.db.execute(
+            select(CRDTUpdateLog.id, CRDTUpdateLog.update_data)
+            .where(CRDTUpdateLog.galaxy_id == galaxy_id, CRDTUpdateLog.id > after_id)
+            .order_by(CRDTUpdateLog.id)
+        )).all()
+        snapshot = (await self.db.execute(
+            select(CRDTSnapshot.state_data, CRDTSnapshot.last_update_id)
+            .where(CRDTSnapshot.galaxy_id == galaxy_id, CRDTSnapshot.last_update_id > after_id)
+        )).first()
+
+        updates = []
+        high_water = after_id
+        if snapshot:
+            updates.append(snapshot.state_data)
+            high_water = max(high_water, snapshot.last_update_id)
+        for row in rows:
+            updates.append(row.update_data)
+            high_water = max(high_water, row.id)
+        return updates, high_water
+
+    async def restore(self, galaxy_id: str) -> Tuple[Y.YDoc, int]:
+        """
+        恢复: 快照 + 增量日志 -> 内存，返回文档与水位
+        Restore: snapshot + update log -> Memory
+        """
+        updates, high_water = await self.load_since(galaxy_id)
+        ydoc = Y.YDoc()
+        for update in updates:
+            Y.apply_update(ydoc, update)
+        return ydoc, max(high_water, 0)
 
-    async def persist_to_db(self, galaxy_id: str, ydoc: Y.YDoc):
+    async def compact(self, galaxy_id: str, min_updates: int = 1) -> int:
         """
-        2. Redis -> PostgreSQL (低频, 定时任务)
-        Redis -> PostgreSQL (Low-frequency, scheduled task)
+        把增量日志折叠进快照，返回折叠的更新数
+        Fold the update log into the snapshot (background task)
         """
-        update_data = Y.encode_state_as_update(ydoc)
-        
-        # Upsert 到数据库
+        pending = (await self.db.execute(
+            select(func.count()).select_from(CRDTUpdateLog).where(CRDTUpdateLog.galaxy_id == galaxy_id)
+        )).scalar() or 0
+        if pending < min_updates:
+            return 0
+
+        ydoc, high_water = await self.restore(galaxy_id)
+        state_data = Y.encode_state_as_update(ydoc)
+        folded = (await self.db.execute(
+            select(func.count()).select_from(CRDTUpdateLog).where(
+                CRDTUpdateLog.galaxy_id == galaxy_id, CRDTUpdateLog.id <= high_water
+            )
+        )).scalar() or 0
+
+        now = datetime.utcnow()
         stmt = insert(CRDTSnapshot).values(
             galaxy_id=galaxy_id,
-            state_data=update_data,
-            operation_count=0, # TODO: implement operation count tracking
-            updated_at=datetime.utcnow()
-        ).on_conflict_do_update(
+            state_data=state_data,
+            operation_count=folded,
+            last_update_id=high_water,
+            created_at=now,
+            updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
             index_elements=['galaxy_id'],
             set_={
-                'state_data': update_data,
-                'updated_at': datetime.utcnow()
-            }
+                'state_data': stmt.excluded.state_data,
+                'operation_count': CRDTSnapshot.operation_count + folded,
+                'last_update_id': stmt.excluded.last_update_id,
+                'updated_at': now
+            },
+            # 并发压缩时不让较旧的快照覆盖较新的
+            where=CRDTSnapshot.last_update_id < stmt.excluded.last_update_id
         )
-        
         await self.db.execute(stmt)
+        await self.db.execute(
+            delete(CRDTUpdateLog).where(CRDTUpdateLog.galaxy_id == galaxy_id, CRDTUpdateLog.id <= high_water)
+        )
         await self.db.commit()
+        logger.info(f"Compacted {folded} CRDT updates of galaxy {galaxy_id} into snapshot @ {high_water}")
+        return folded
 
-    async def restore(self, galaxy_id: str) -> Y.YDoc:
-        """
-        3. 恢复: PostgreSQL -> Redis -> 内存
-        Restore: PostgreSQL -> Redis -> Memory
-        """
-        # 优先从 Redis 恢复 (最新)
-        key = f"crdt:snapshot:{galaxy_id}"
-        redis_data = await self.redis.get(key)
-        
-        ydoc = Y.YDoc()
-        if redis_data:
-            # 如果 redis_client 设置了 decode_responses=True, 
-            # redis_data 可能是 string, 需要转回 bytes
-            if isinstance(redis_data, str):
-                redis_data = redis_data.encode('latin-1') # Or appropriate encoding
-            
-            Y.apply_update(ydoc, redis_data)
-            return ydoc
-
-        # Redis 无数据, 从 PostgreSQL 恢复
+    async def galaxies_to_compact(self, min_updates: int, limit: int = 100) -> List[str]:
+        """日志条数达到阈值的星图"""
         result = await self.db.execute(
-            select(CRDTSnapshot.state_data).where(CRDTSnapshot.galaxy_id == galaxy_id)
+            select(CRDTUpdateLog.galaxy_id)
+            .group_by(CRDTUpdateLog.galaxy_id)
+            .having(func.count() >= min_updates)
+            .limit(limit)
         )
-        row = result.scalar_one_or_none()
-
-        if row:
-            Y.apply_update(ydoc, row)
-            # 回填到 Redis
-            await self.persist_snapshot(galaxy_id, ydoc)
-            return ydoc
-
-        # 无历史数据, 返回空文档
-        return ydoc
+        return [str(galaxy_id) for galaxy_id in result.scalars().all()]
 
     async def log_operation(self, galaxy_id: str, user_id: str, op_type: str, op_data: dict):
         """
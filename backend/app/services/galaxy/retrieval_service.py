@@ -12,7 +12,7 @@ from app.models.file_storage import StoredFile
 from app.models.galaxy import KnowledgeNode, UserNodeStatus
 from app.services.embedding_service import embedding_service
 from app.services.rerank_service import rerank_service
-from app.core.redis_search_client import redis_search_client
+from app.core.redis_search_client import SearchFilter, redis_search_client
 from app.config import settings
 from app.schemas.galaxy import SearchResultItem, NodeBase, UserStatusInfo, SectorCode
 try:
@@ -75,13 +75,18 @@ class KnowledgeRetrievalService:
         query_embedding = await embedding_service.get_embedding(actual_vector_text)
         
         # 3. Parallel Retrieval
-        vector_limit = limit * 10
-        keyword_limit = limit * 10
+        # 范围条件在 RediSearch 内预过滤（KNN 只在范围内排序），不再大量超取后在 DB 侧丢弃
+        scope = SearchFilter(
+            subject_ids=[subject_id] if subject_id else None,
+            visible_to=str(user_id_uuid),
+        )
+        vector_limit = limit * settings.RAG_CANDIDATE_MULTIPLIER
+        keyword_limit = limit * settings.RAG_CANDIDATE_MULTIPLIER
         
         cleaned_query = " ".join([w for w in query_str.split() if len(w) > 1]) or "*"
             
         bm25_q = (
-            Query(cleaned_query)
+            Query(scope.apply(cleaned_query))
             .paging(0, keyword_limit)
             .return_fields("id", "parent_id", "content", "parent_name", "importance")
             .dialect(2)
@@ -90,7 +95,9 @@ class KnowledgeRetrievalService:
         vector_task = redis_search_client.hybrid_search(
             text_query="*", 
             vector=query_embedding,
-            top_k=vector_limit
+            top_k=vector_limit,
+            filters=scope,
+            ef_runtime=settings.RAG_VECTOR_EF_RUNTIME or None,
         )
         keyword_task = redis_search_client.search(bm25_q)
         
@@ -172,6 +179,7 @@ class KnowledgeRetrievalService:
             .join(StoredFile, StoredFile.id == DocumentChunk.file_id)
             .where(DocumentChunk.user_id == user_id)
             .where(DocumentChunk.file_id.in_(file_ids))
+            .where(DocumentChunk.deleted_at.is_(None))
             .where(DocumentChunk.embedding.isnot(None))
             .order_by("distance")
             .limit(limit * 5)
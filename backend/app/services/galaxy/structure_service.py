@@ -1,14 +1,21 @@
 from uuid import UUID
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, and_, or_, func
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.models.galaxy import KnowledgeNode, UserNodeStatus, NodeRelation
 from app.models.subject import Subject
 from app.schemas.galaxy import NodeWithStatus, GalaxyGraphResponse, NodeRelationInfo
 
+def _in_box(min_x: float, min_y: float, max_x: float, max_y: float):
+    """Containment test served by the GiST index on point(position_x, position_y)"""
+    position = func.point(KnowledgeNode.position_x, KnowledgeNode.position_y)
+    return position.op("<@")(func.box(func.point(min_x, min_y), func.point(max_x, max_y)))
+
+
 class GraphStructureService:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -152,18 +159,108 @@ class GraphStructureService:
         """Get nodes within a bounding box (Viewport Query)"""
         stmt = (
             select(KnowledgeNode)
-            .where(
+            .where(_in_box(min_x, min_y, max_x, max_y))
+            .limit(limit)
+        )
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
+
+    @staticmethod
+    def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+        """Quadtree tile z/x/y -> (min_x, min_y, max_x, max_y); tiles halve per zoom level"""
+        size = settings.GALAXY_TILE_BASE_SIZE / (2 ** z)
+        return x * size, y * size, (x + 1) * size, (y + 1) * size
+
+    async def get_tile(
+        self,
+        user_id: UUID,
+        z: int,
+        x: int,
+        y: int,
+        include_locked: bool = True
+    ) -> Tuple[list, list, bool]:
+        """
+        Nodes inside one tile (with user status) and the relations starting at them.
+
+        Tiles are half-open so a node on a border belongs to exactly one tile.
+        Coarse zoom levels keep only important, seed or unlocked nodes
+        (GALAXY_TILE_LOD_MIN_IMPORTANCE); at most GALAXY_TILE_MAX_NODES are
+        returned, most important first.
+        """
+        min_x, min_y, max_x, max_y = self.tile_bounds(z, x, y)
+        max_nodes = settings.GALAXY_TILE_MAX_NODES
+        query = (
+            select(KnowledgeNode, UserNodeStatus)
+            .outerjoin(
+                UserNodeStatus,
                 and_(
-                    KnowledgeNode.position_x >= min_x,
-                    KnowledgeNode.position_x <= max_x,
-                    KnowledgeNode.position_y >= min_y,
-                    KnowledgeNode.position_y <= max_y
+                    UserNodeStatus.node_id == KnowledgeNode.id,
+                    UserNodeStatus.user_id == user_id
                 )
             )
-            .limit(limit)
+            .options(selectinload(KnowledgeNode.subject))
+            .where(
+                _in_box(min_x, min_y, max_x, max_y),
+                KnowledgeNode.position_x < max_x,
+                KnowledgeNode.position_y < max_y
+            )
+            .order_by(KnowledgeNode.importance_level.desc(), KnowledgeNode.id)
+            .limit(max_nodes + 1)
+        )
+
+        min_importance = settings.GALAXY_TILE_LOD_MIN_IMPORTANCE.get(z)
+        if min_importance:
+            query = query.where(
+                or_(
+                    KnowledgeNode.importance_level >= min_importance,
+                    KnowledgeNode.is_seed == True,
+                    UserNodeStatus.is_unlocked == True
+                )
+            )
+        if not include_locked:
+            query = query.where(UserNodeStatus.is_unlocked == True)
+
+        result = await self.db.execute(query)
+        nodes_with_status = result.all()
+        truncated = len(nodes_with_status) > max_nodes
+        nodes_with_status = nodes_with_status[:max_nodes]
+
+        # Each relation is served by the tile of its source node
+        relations = []
+        node_ids = [node.id for node, _ in nodes_with_status]
+        if node_ids:
+            relations_result = await self.db.execute(
+                select(NodeRelation).where(NodeRelation.source_node_id.in_(node_ids))
+            )
+            relations = relations_result.scalars().all()
+
+        return nodes_with_status, relations, truncated
+
+    async def get_status_delta(
+        self,
+        user_id: UUID,
+        since_revision: int,
+        limit: int
+    ) -> Tuple[List[UserNodeStatus], bool]:
+        """
+        User node statuses changed after since_revision, oldest first.
+
+        sync_revision is a per-user counter (bumped by a trigger on every status
+        write), so it serves as the sync cursor; revision stays the per-node
+        conflict token.
+        """
+        stmt = (
+            select(UserNodeStatus)
+            .where(
+                UserNodeStatus.user_id == user_id,
+                UserNodeStatus.sync_revision > since_revision
+            )
+            .order_by(UserNodeStatus.sync_revision)
+            .limit(limit + 1)
         )
         result = await self.db.execute(stmt)
-        return list(result.scalars().all())
+        statuses = list(result.scalars().all())
+        return statuses[:limit], len(statuses) > limit
 
     async def get_graph_view(
         self,
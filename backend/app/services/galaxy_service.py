@@ -17,13 +17,15 @@ from app.models.galaxy import KnowledgeNode, NodeRelation
 from app.models.outbox import EventOutbox
 from app.schemas.galaxy import (
     GalaxyGraphResponse, SparkResult, SearchResultItem, 
-    GalaxyUserStats, NodeWithStatus, NodeRelationInfo
+    GalaxyUserStats, NodeWithStatus, NodeRelationInfo,
+    GalaxyTileNode, GalaxyTileResponse, GalaxyStatusDeltaResponse, NodeStatusDelta
 )
 from app.services.galaxy.structure_service import GraphStructureService
 from app.services.galaxy.retrieval_service import KnowledgeRetrievalService
 from app.services.galaxy.stats_service import GalaxyStatsService
 from app.services.expansion_service import ExpansionService
 from app.services.embedding_service import embedding_service
+from app.config import settings
 from app.core.cache import cached
 from app.core.event_bus import event_bus, KnowledgeNodeUpdated
 from app.gen.sparkle.rag.v1 import evidence_pb2
@@ -192,6 +194,63 @@ class GalaxyService:
             user_stats=user_stats
         )
 
+    async def get_galaxy_tile(
+        self,
+        user_id: UUID,
+        z: int,
+        x: int,
+        y: int,
+        include_locked: bool = True
+    ) -> GalaxyTileResponse:
+        """One z/x/y tile of the galaxy (nodes, outgoing relations, user status)"""
+        nodes_with_status, relations, truncated = await self.structure.get_tile(
+            user_id, z, x, y, include_locked
+        )
+        return GalaxyTileResponse(
+            z=z,
+            x=x,
+            y=y,
+            bounds=list(self.structure.tile_bounds(z, x, y)),
+            nodes=[
+                GalaxyTileNode.from_models(node, status)
+                for node, status in nodes_with_status
+            ],
+            relations=[
+                NodeRelationInfo(
+                    source_node_id=rel.source_node_id,
+                    target_node_id=rel.target_node_id,
+                    relation_type=rel.relation_type,
+                    strength=rel.strength
+                )
+                for rel in relations
+            ],
+            truncated=truncated
+        )
+
+    async def get_status_delta(
+        self,
+        user_id: UUID,
+        since_revision: int = 0,
+        limit: Optional[int] = None
+    ) -> GalaxyStatusDeltaResponse:
+        """Node statuses changed since a client's last revision cursor"""
+        statuses, has_more = await self.structure.get_status_delta(
+            user_id, since_revision, limit or settings.GALAXY_STATUS_DELTA_LIMIT
+        )
+        return GalaxyStatusDeltaResponse(
+            sync_revision=statuses[-1].sync_revision if statuses else since_revision,
+            has_more=has_more,
+            statuses=[
+                NodeStatusDelta(
+                    node_id=status.node_id,
+                    revision=status.revision,
+                    sync_revision=status.sync_revision,
+                    user_status=NodeWithStatus.build_user_status(status)
+                )
+                for status in statuses
+            ]
+        )
+
     # --- Delegated to KnowledgeRetrievalService ---
 
     async def keyword_search(
@@ -1,56 +1,32 @@
 """
 Graph Reasoning Service (Neuro-Symbolic AI)
-基于 NetworkX 的动态学习路径生成引擎
+基于进程级前置依赖图 (PrerequisiteGraphStore) 的动态学习路径生成引擎
 """
 
-import networkx as nx
 from typing import List, Dict, Any, Set, Optional
 from uuid import UUID
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
-from app.models.galaxy import KnowledgeNode, NodeRelation, UserNodeStatus
+from app.core.cache import cache_service
+from app.models.galaxy import UserNodeStatus
+from app.services.prerequisite_graph_store import (
+    CyclicDependencyError,
+    PrerequisiteGraphStore,
+    prerequisite_graph_store,
+)
 
 
 class GraphReasoningService:
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, graph_store: Optional[PrerequisiteGraphStore] = None):
         self.db = db
-        self.G: Optional[nx.DiGraph] = None
-    
-    async def _load_graph(self):
-        """
-        从数据库加载图结构到 NetworkX
-        注意：生产环境中应考虑缓存 (Redis/Pickle) 以避免每次请求都全量加载
-        """
-        if self.G is not None:
-            return
+        # 默认使用进程级共享图：只在首次使用/过期时全量加载，之后跟随 graph_sync 事件增量更新
+        self.graph = graph_store or prerequisite_graph_store
 
-        self.G = nx.DiGraph()
-        
-        # 1. 加载所有节点
-        nodes_result = await self.db.execute(select(KnowledgeNode))
-        nodes = nodes_result.scalars().all()
-        for node in nodes:
-            self.G.add_node(
-                node.id, 
-                name=node.name, 
-                description=node.description
-            )
-            
-        # 2. 加载 'PREREQUISITE' 类型的边
-        edges_result = await self.db.execute(
-            select(NodeRelation).where(NodeRelation.relation_type == "PREREQUISITE")
-        )
-        edges = edges_result.scalars().all()
-        
-        edge_list = []
-        for edge in edges:
-            # networkx edge format: (u, v, attr_dict)
-            edge_list.append((edge.source_node_id, edge.target_node_id))
-            
-        self.G.add_edges_from(edge_list)
-        logger.info(f"Graph loaded: {self.G.number_of_nodes()} nodes, {self.G.number_of_edges()} edges")
+    async def _load_graph(self):
+        """确保共享图已加载"""
+        await self.graph.ensure_loaded(self.db, redis_client=cache_service.redis)
 
     async def generate_learning_path(
         self, 
@@ -62,73 +38,40 @@ class GraphReasoningService:
         
         Algorithm:
         1. 获取目标节点的所有祖先 (Ancestors)
-        2. 构建子图
-        3. 拓扑排序
-        4. 剔除用户已掌握的节点 (Pruning)
+        2. 对祖先子图拓扑排序
+        3. 剔除用户已掌握的节点 (Pruning)
         """
         await self._load_graph()
         
-        if not self.G.has_node(target_node_id):
+        if not self.graph.has_node(target_node_id):
             logger.warning(f"Target node {target_node_id} not found in graph")
             return []
 
-        # 1. 获取所有前置依赖 (Ancestors)
+        # 1-2. 祖先子图拓扑排序 (Topological Sort) - 线性化 DAG
         try:
-            ancestors = nx.ancestors(self.G, target_node_id)
-        except Exception as e:
-            logger.error(f"Error finding ancestors: {e}")
-            return []
-            
-        # 包含目标节点本身
-        subgraph_nodes = ancestors | {target_node_id}
-        
-        # 2. 提取子图
-        subgraph = self.G.subgraph(subgraph_nodes)
-        
-        # 3. 拓扑排序 (Topological Sort) - 线性化 DAG
-        try:
-            # topological_sort 返回的是生成器，转为 list
-            path_nodes_ids = list(nx.topological_sort(subgraph))
-        except nx.NetworkXUnfeasible:
+            path_nodes_ids = self.graph.learning_order(target_node_id)
+        except CyclicDependencyError:
             logger.error("Cycle detected in prerequisite graph! Cannot perform topological sort.")
-            # Fallback: Just return the subgraph nodes (unordered) or handle error
             return [{"error": "Cyclic dependency detected"}]
             
-        # 4. 获取用户已掌握的节点 (Mastered Nodes)
+        # 3. 获取用户已掌握的节点 (Mastered Nodes)
         mastered_ids = await self._get_user_mastered_ids(user_id)
         
-        # 5. 构建最终路径 (Pruning & Formatting)
+        # 4. 构建最终路径：返回完整路径并标记状态，由前端决定是否折叠已掌握节点
         final_path = []
         for node_id in path_nodes_ids:
-            node_data = self.G.nodes[node_id]
             is_mastered = node_id in mastered_ids
             
-            # 如果是目标节点，即使掌握了也显示（或者可以标记为复习）
-            # 这里策略是：如果不显示已掌握的，路径可能为空。
-            # 更好的 UX 是：显示完整路径，但标记状态。
-            
-            # 简化版逻辑：只返回未掌握的 + 目标节点？
-            # 或者是返回完整路径，由前端渲染状态。
-            # User Prompt 要求: "个性化剪枝... 剔除该节点"
-            # 但为了展示"路径感"，保留"已掌握"节点但标记状态可能更好。
-            # 既然 Prompt 明确说 "final_path = [node for node in learning_path if node not in user_mastered_ids]"
-            # 我们先遵循 Prompt 的剪枝逻辑，但为了 UX，我也会返回状态，前端可以选择隐藏。
-            
             status = "mastered" if is_mastered else "locked"
             # 解锁逻辑：如果该节点的所有前置都已掌握，则为 "unlocked" / "next_to_learn"
             if not is_mastered:
-                 predecessors = list(self.G.predecessors(node_id))
+                 predecessors = self.graph.predecessors(node_id)
                  if all(p in mastered_ids for p in predecessors):
                      status = "unlocked"
             
-            # 剪枝策略：如果完全遵循 Prompt 剔除，用户可能看不到上下文。
-            # 我将返回所有节点，但带上状态，让前端决定是否折叠。
-            # 但为了满足 "最短的通关路径" 这一描述，我们主要关注未掌握的。
-            
-            # 这里我做一个折衷：返回路径对象，包含 prune 建议
             final_path.append({
                 "id": str(node_id),
-                "name": node_data.get("name", "Unknown"),
+                "name": self.graph.name(node_id) or "Unknown",
                 "status": status, # mastered, unlocked, locked
                 "is_target": node_id == target_node_id
             })
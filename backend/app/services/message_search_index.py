@@ -0,0 +1,163 @@
+"""
+消息全文检索 (Message Search Index)
+
+group_messages / private_messages 上的 search_vector 是数据库生成列：
+    to_tsvector('simple', message_search_text(content))
+message_search_text 先做 NFKC（全角→半角）与小写，再把连续的中日韩字符
+切成重叠二元组并在末尾补一个单字，其余文本交给 'simple' 解析器分词。
+例如 "学习小组 ABC" -> "学习 习小 小组 组 abc"。
+
+查询端用同样的规则生成 tsquery：
+- 中日韩片段 -> 二元组短语查询（'学习' <-> '习小'），等价于子串匹配
+- 单个汉字 / 拉丁词 -> 前缀查询（'学':*）
+- 各片段之间 AND
+
+结果按 ts_rank_cd 排序，基于 (rank, created_at, id) 的游标做 keyset 分页；
+只在最近 MESSAGE_SEARCH_MAX_CANDIDATES 条命中内排序，总数为近似值。
+"""
+import base64
+import json
+import re
+import unicodedata
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+
+# 与 migration p21 中 message_search_text() 的字符区间保持一致
+CJK_CHARS = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_SEGMENT_RE = re.compile(f"[{CJK_CHARS}]+|[^{CJK_CHARS}]+")
+_CJK_RE = re.compile(f"[{CJK_CHARS}]")
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def _lexeme(token: str) -> str:
+    return "'" + token.replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def build_search_query(keyword: str) -> Optional[str]:
+    """关键词 -> to_tsquery('simple', ...) 的查询串；没有可检索内容时返回 None"""
+    text = unicodedata.normalize("NFKC", keyword).lower()
+    clauses = []
+    for segment in _SEGMENT_RE.findall(text):
+        if _CJK_RE.match(segment):
+            if len(segment) == 1:
+                clauses.append(f"{_lexeme(segment)}:*")
+            else:
+                bigrams = [segment[i:i + 2] for i in range(len(segment) - 1)]
+                clauses.append("(" + " <-> ".join(_lexeme(bigram) for bigram in bigrams) + ")")
+        else:
+            clauses.extend(f"{_lexeme(word)}:*" for word in _WORD_RE.findall(segment))
+    return " & ".join(clauses) or None
+
+
+def encode_cursor(rank: float, created_at: datetime, message_id: Any) -> str:
+    payload = json.dumps([rank, created_at.isoformat(), str(message_id)])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, datetime, uuid.UUID]:
+    try:
+        rank, created_at, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(rank), datetime.fromisoformat(created_at), uuid.UUID(message_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("无效的搜索游标") from e
+
+
+def encode_time_cursor(created_at: datetime, message_id: Any) -> str:
+    """无关键词时按 (created_at, id) 倒序分页的游标"""
+    payload = json.dumps([created_at.isoformat(), str(message_id)])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_time_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), uuid.UUID(message_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("无效的搜索游标") from e
+
+
+@dataclass
+class SearchPage:
+    messages: List[Any]
+    total: int             # 近似总数（达到候选上限时为下限）
+    total_is_estimate: bool
+    next_cursor: Optional[str]
+
+
+async def ranked_search(
+    db: AsyncSession,
+    model,
+    conditions: list,
+    keyword: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+    load_options: tuple = ()
+) -> SearchPage:
+    """
+    在 model.search_vector 上做排序检索
+
+    conditions: 会话/群组范围等额外过滤条件
+    cursor: 上一页返回的 next_cursor（优先于 offset）
+    """
+    tsquery = build_search_query(keyword)
+    if not tsquery:
+        return SearchPage([], 0, False, None)
+
+    query = func.to_tsquery("simple", tsquery)
+    search_vector = model.search_vector
+    max_candidates = settings.MESSAGE_SEARCH_MAX_CANDIDATES
+
+    # 最近的命中作为候选集，限制排序代价
+    candidates = (
+        select(
+            model.id.label("id"),
+            model.created_at.label("created_at"),
+            func.ts_rank_cd(search_vector, query).label("rank")
+        )
+        .where(search_vector.op("@@")(query), *conditions)
+        .order_by(model.created_at.desc())
+        .limit(max_candidates)
+        .cte("candidates")
+    )
+    total = select(func.count()).select_from(candidates).scalar_subquery()
+
+    page = (
+        select(candidates.c.id, candidates.c.created_at, candidates.c.rank, total.label("total"))
+        .order_by(candidates.c.rank.desc(), candidates.c.created_at.desc(), candidates.c.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        rank, created_at, message_id = decode_cursor(cursor)
+        page = page.where(
+            tuple_(candidates.c.rank, candidates.c.created_at, candidates.c.id)
+            < tuple_(rank, created_at, message_id)
+        )
+    elif offset:
+        page = page.offset(offset)
+
+    rows = (await db.execute(page)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return SearchPage([], 0, False, None)
+    total_count = rows[0].total
+
+    ids = [row.id for row in rows]
+    result = await db.execute(select(model).where(model.id.in_(ids)).options(*load_options))
+    by_id = {message.id: message for message in result.scalars().all()}
+
+    last = rows[-1]
+    return SearchPage(
+        messages=[by_id[message_id] for message_id in ids if message_id in by_id],
+        total=total_count,
+        total_is_estimate=total_count >= max_candidates,
+        next_cursor=encode_cursor(last.rank, last.created_at, last.id) if has_more else None
+    )
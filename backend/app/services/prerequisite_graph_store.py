@@ -0,0 +1,373 @@
+"""
+Prerequisite Graph Store - 进程级前置依赖图
+
+GraphReasoningService 原先每个请求都把全部 KnowledgeNode 和 PREREQUISITE
+关系读入一个新的 networkx.DiGraph。本模块在进程内维护一份紧凑的图：
+
+- 节点使用连续整数 ID，UUID/名称保存在并列数组中
+- 前驱邻接以 CSR (indptr/indices) 数组保存，新增边先进入增量表，超过阈值后合并
+- 首次使用时从数据库构建一次，之后跟随 Redis Stream (stream:graph_sync) 中
+  GraphSyncWorker 的 node_created / relation_created 事件增量更新
+- 超过 GRAPH_STORE_REFRESH_SECONDS 后在后台任务中整体重建 (兜底删除等未发事件的变更)，
+  重建期间继续使用当前的图，完成后再替换；只有首次构建在请求内同步完成
+
+祖先查询、子图拓扑排序和前驱检查的开销只与目标节点的祖先子图大小相关，
+与全图规模无关。
+"""
+
+import asyncio
+import heapq
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from app.config import settings
+from app.models.galaxy import KnowledgeNode, NodeRelation
+
+PREREQUISITE = "PREREQUISITE"
+
+
+class CyclicDependencyError(Exception):
+    """前置依赖子图中存在环"""
+
+
+class PrerequisiteGraphStore:
+    """CSR 表示的前置依赖图"""
+
+    STREAM_KEY = "stream:graph_sync"
+
+    def __init__(self, compact_threshold: int = 1024, session_factory: Optional[Callable] = None):
+        self.compact_threshold = compact_threshold
+        # 后台重建使用独立会话，不占用触发它的请求会话
+        self._session_factory = session_factory
+
+        self._ids: List[UUID] = []
+        self._names: List[str] = []
+        self._index: Dict[UUID, int] = {}
+
+        # 前驱 CSR：节点 i 的前驱为 _pred_indices[_pred_indptr[i]:_pred_indptr[i + 1]]
+        self._pred_indptr = np.zeros(1, dtype=np.int64)
+        self._pred_indices = np.zeros(0, dtype=np.int32)
+        # 构建后新增的边 (target -> [source, ...])，compact 时并入 CSR
+        self._pending_preds: Dict[int, List[int]] = {}
+        self._pending_count = 0
+
+        self._loaded_at: Optional[float] = None
+        self._load_lock = asyncio.Lock()
+        self._follower: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    # ==================== 构建 ====================
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def _is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return time.monotonic() - self._loaded_at > settings.GRAPH_STORE_REFRESH_SECONDS
+
+    @property
+    def session_factory(self) -> Callable:
+        if self._session_factory is not None:
+            return self._session_factory
+        from app.db.session import AsyncSessionLocal
+        return AsyncSessionLocal
+
+    async def ensure_loaded(self, db: AsyncSession, redis_client=None) -> None:
+        """首次使用时从数据库构建；过期后在后台重建，当前请求继续使用现有的图"""
+        if not self._is_stale():
+            return
+        if self.is_loaded:
+            self._schedule_refresh(redis_client)
+            return
+        async with self._load_lock:
+            if self.is_loaded:
+                return
+            # 先记录事件流位置再读库，保证构建期间的事件不会丢失（重复应用是幂等的）
+            stream_id = await self._stream_position(redis_client)
+            nodes, edges = await self._read_graph(db)
+            self.build(nodes, edges)
+            if redis_client is not None and stream_id is not None:
+                self._start_follower(redis_client, stream_id)
+
+    def _schedule_refresh(self, redis_client=None) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh(redis_client))
+
+    async def _refresh(self, redis_client=None) -> None:
+        """后台重建：在线程中计算新的 CSR，完成后一次性替换"""
+        try:
+            stream_id = await self._stream_position(redis_client)
+            async with self.session_factory() as db:
+                nodes, edges = await self._read_graph(db)
+            built = await asyncio.to_thread(self._compute, nodes, edges)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 保留当前的图，下一次过期检查时重试
+            logger.warning(f"Prerequisite graph refresh failed: {e}")
+            return
+        # 替换之前由旧跟随者应用的事件，会由新跟随者从 stream_id 起重新应用
+        self._swap(*built)
+        if redis_client is not None and stream_id is not None:
+            self._start_follower(redis_client, stream_id)
+
+    async def _read_graph(self, db: AsyncSession) -> Tuple[List[Tuple[UUID, str]], List[Tuple[UUID, UUID]]]:
+        start = time.perf_counter()
+        nodes_result = await db.execute(
+            select(KnowledgeNode).options(load_only(KnowledgeNode.id, KnowledgeNode.name))
+        )
+        nodes = [(node.id, node.name) for node in nodes_result.scalars().all()]
+
+        edges_result = await db.execute(
+            select(NodeRelation)
+            .options(load_only(NodeRelation.source_node_id, NodeRelation.target_node_id))
+            .where(NodeRelation.relation_type == PREREQUISITE)
+        )
+        edges = [(edge.source_node_id, edge.target_node_id) for edge in edges_result.scalars().all()]
+        logger.info(
+            f"Prerequisite graph read: {len(nodes)} nodes, {len(edges)} edges "
+            f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+        return nodes, edges
+
+    def build(self, nodes: Iterable[Tuple[UUID, str]], edges: Iterable[Tuple[UUID, UUID]]) -> None:
+        """从节点与边列表整体构建 CSR"""
+        self._swap(*self._compute(nodes, edges))
+
+    @staticmethod
+    def _compute(
+        nodes: Iterable[Tuple[UUID, str]],
+        edges: Iterable[Tuple[UUID, UUID]],
+    ) -> Tuple[List[UUID], List[str], Dict[UUID, int], np.ndarray, np.ndarray]:
+        """纯计算，不修改实例状态 (可在线程中执行)"""
+        ids: List[UUID] = []
+        names: List[str] = []
+        index: Dict[UUID, int] = {}
+        for node_id, name in nodes:
+            if node_id in index:
+                continue
+            index[node_id] = len(ids)
+            ids.append(node_id)
+            names.append(name)
+
+        pairs = set()
+        for source, target in edges:
+            if source in index and target in index:
+                pairs.add((index[target], index[source]))
+
+        indptr, indices = PrerequisiteGraphStore._csr_arrays(len(ids), pairs)
+        return ids, names, index, indptr, indices
+
+    def _swap(
+        self,
+        ids: List[UUID],
+        names: List[str],
+        index: Dict[UUID, int],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+    ) -> None:
+        self._ids, self._names, self._index = ids, names, index
+        self._pred_indptr, self._pred_indices = indptr, indices
+        self._pending_preds = {}
+        self._pending_count = 0
+        self._loaded_at = time.monotonic()
+
+    @staticmethod
+    def _csr_arrays(node_count: int, pairs: Iterable[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """pairs: (target, source)"""
+        edge_array = np.array(sorted(pairs), dtype=np.int64).reshape(-1, 2)
+        counts = np.bincount(edge_array[:, 0], minlength=node_count) if len(edge_array) else np.zeros(node_count, dtype=np.int64)
+        return np.concatenate(([0], np.cumsum(counts))).astype(np.int64), edge_array[:, 1].astype(np.int32)
+
+    def _compact(self) -> None:
+        """把增量边并入 CSR"""
+        node_count = len(self._ids)
+        pairs = set()
+        for target in range(len(self._pred_indptr) - 1):
+            for source in self._pred_indices[self._pred_indptr[target]:self._pred_indptr[target + 1]]:
+                pairs.add((target, int(source)))
+        for target, sources in self._pending_preds.items():
+            for source in sources:
+                pairs.add((target, source))
+        self._pred_indptr, self._pred_indices = self._csr_arrays(node_count, pairs)
+        self._pending_preds = {}
+        self._pending_count = 0
+
+    # ==================== 增量更新 ====================
+
+    def add_node(self, node_id: UUID, name: str = "") -> int:
+        idx = self._index.get(node_id)
+        if idx is not None:
+            if name:
+                self._names[idx] = name
+            return idx
+        idx = len(self._ids)
+        self._index[node_id] = idx
+        self._ids.append(node_id)
+        self._names.append(name)
+        # 新节点在 CSR 中没有前驱
+        self._pred_indptr = np.append(self._pred_indptr, self._pred_indptr[-1])
+        return idx
+
+    def add_edge(self, source_id: UUID, target_id: UUID) -> None:
+        source = self.add_node(source_id) if source_id not in self._index else self._index[source_id]
+        target = self.add_node(target_id) if target_id not in self._index else self._index[target_id]
+        if source in self._pred_ints(target):
+            return
+        self._pending_preds.setdefault(target, []).append(source)
+        self._pending_count += 1
+        if self._pending_count >= self.compact_threshold:
+            self._compact()
+
+    def apply_event(self, msg_type: str, data: Dict[str, Any]) -> None:
+        """应用 GraphSyncWorker 的同步事件"""
+        if not self.is_loaded:
+            return
+        if msg_type == "node_created":
+            self.add_node(UUID(str(data["id"])), data.get("name", ""))
+        elif msg_type == "relation_created":
+            if str(data.get("type", "")).upper() == PREREQUISITE:
+                self.add_edge(UUID(str(data["source"])), UUID(str(data["target"])))
+
+    # ==================== 事件流跟随 ====================
+
+    async def _stream_position(self, redis_client) -> Optional[str]:
+        if redis_client is None:
+            return None
+        try:
+            latest = await redis_client.xrevrange(self.STREAM_KEY, count=1)
+            if latest:
+                msg_id = latest[0][0]
+                return msg_id.decode() if isinstance(msg_id, bytes) else msg_id
+            return "0-0"
+        except Exception as e:
+            logger.warning(f"Prerequisite graph cannot read {self.STREAM_KEY}: {e}")
+            return None
+
+    def _start_follower(self, redis_client, stream_id: str) -> None:
+        if self._follower and not self._follower.done():
+            self._follower.cancel()
+        self._follower = asyncio.create_task(self._follow(redis_client, stream_id))
+
+    async def _follow(self, redis_client, last_id: str) -> None:
+        """以独立读者身份 (XREAD) 跟随同步事件，不影响 GraphSyncWorker 的消费组"""
+        while True:
+            try:
+                response = await redis_client.xread({self.STREAM_KEY: last_id}, count=100, block=5000)
+                for _, messages in response or []:
+                    for msg_id, fields in messages:
+                        last_id = msg_id.decode() if isinstance(msg_id, bytes) else msg_id
+                        self._apply_stream_message(fields)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.warning(f"Prerequisite graph follower error: {e}")
+                await asyncio.sleep(1)
+
+    def _apply_stream_message(self, fields: Dict[Any, Any]) -> None:
+        decoded = {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in fields.items()
+        }
+        try:
+            self.apply_event(decoded.get("type", ""), json.loads(decoded.get("data", "{}")))
+        except Exception as e:
+            logger.warning(f"Prerequisite graph ignored malformed event: {e}")
+
+    async def close(self) -> None:
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+        if self._follower:
+            self._follower.cancel()
+            await asyncio.gather(self._follower, return_exceptions=True)
+            self._follower = None
+
+    # ==================== 查询 ====================
+
+    def has_node(self, node_id: UUID) -> bool:
+        return node_id in self._index
+
+    def name(self, node_id: UUID) -> str:
+        return self._names[self._index[node_id]]
+
+    def _pred_ints(self, idx: int) -> List[int]:
+        preds = []
+        if idx < len(self._pred_indptr) - 1:
+            preds = self._pred_indices[self._pred_indptr[idx]:self._pred_indptr[idx + 1]].tolist()
+        pending = self._pending_preds.get(idx)
+        if pending:
+            preds.extend(pending)
+        return preds
+
+    def predecessors(self, node_id: UUID) -> List[UUID]:
+        idx = self._index.get(node_id)
+        if idx is None:
+            return []
+        return [self._ids[p] for p in self._pred_ints(idx)]
+
+    def _ancestor_ints(self, idx: int) -> Set[int]:
+        seen: Set[int] = set()
+        stack = [idx]
+        while stack:
+            for pred in self._pred_ints(stack.pop()):
+                if pred not in seen:
+                    seen.add(pred)
+                    stack.append(pred)
+        seen.discard(idx)
+        return seen
+
+    def ancestors(self, node_id: UUID) -> Set[UUID]:
+        idx = self._index.get(node_id)
+        if idx is None:
+            return set()
+        return {self._ids[i] for i in self._ancestor_ints(idx)}
+
+    def learning_order(self, target_id: UUID) -> List[UUID]:
+        """
+        目标节点及其全部祖先的拓扑序 (Kahn)
+
+        Raises:
+            KeyError: 目标节点不存在
+            CyclicDependencyError: 祖先子图中存在环
+        """
+        target = self._index[target_id]
+        members = self._ancestor_ints(target) | {target}
+
+        in_degree = {v: 0 for v in members}
+        successors: Dict[int, List[int]] = {v: [] for v in members}
+        for v in members:
+            for p in self._pred_ints(v):
+                if p in members:
+                    in_degree[v] += 1
+                    successors[p].append(v)
+
+        ready = [v for v, degree in in_degree.items() if degree == 0]
+        heapq.heapify(ready)
+        order: List[int] = []
+        while ready:
+            v = heapq.heappop(ready)
+            order.append(v)
+            for s in successors[v]:
+                in_degree[s] -= 1
+                if in_degree[s] == 0:
+                    heapq.heappush(ready, s)
+
+        if len(order) != len(members):
+            raise CyclicDependencyError(f"Cycle detected among prerequisites of {target_id}")
+        return [self._ids[v] for v in order]
+
+
+# 进程级单例
+prerequisite_graph_store = PrerequisiteGraphStore()
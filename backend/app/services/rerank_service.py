@@ -1,8 +1,52 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from loguru import logger
 from app.config import settings
+from app.core.metrics import RERANK_BATCH_LATENCY, RERANK_BATCH_SIZE, RERANK_FALLBACKS, RERANK_PAIRS
+
+ScoreKey = Tuple[str, str, str]  # (query hash, chunk id, model)
+
+
+def _load_cross_encoder(model_name: str, backend: str, onnx_file: str):
+    if backend == "onnx":
+        try:
+            import optimum.onnxruntime  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError(
+                "RERANK_BACKEND=onnx requires sentence-transformers>=4.1 and optimum[onnxruntime] "
+                "(pip install -r requirements-rerank-onnx.txt)"
+            ) from e
+    from sentence_transformers import CrossEncoder
+    if backend == "onnx":
+        model_kwargs = {"file_name": onnx_file} if onnx_file else {}
+        return CrossEncoder(model_name, max_length=512, backend="onnx", model_kwargs=model_kwargs)
+    return CrossEncoder(model_name, max_length=512)
+
+
+# Model instance owned by a process-pool worker (see RERANK_PROCESS_WORKERS)
+_worker_model = None
+
+
+def _init_worker(model_name: str, backend: str, onnx_file: str, threads: int) -> None:
+    global _worker_model
+    try:
+        import torch
+        # Workers split the cores instead of each spawning one intra-op thread per core
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = _load_cross_encoder(model_name, backend, onnx_file)
+
+
+def _predict_in_worker(pairs: List[List[str]]) -> List[float]:
+    return [float(score) for score in _worker_model.predict(pairs)]
+
 
 class RerankService:
     """
@@ -10,20 +54,61 @@ class RerankService:
     Supports:
     - RRF (Reciprocal Rank Fusion)
     - Cross-Encoder Reranking (Local Model)
+
+    Cross-encoder scoring is a dynamic-batching engine:
+    - (query, doc) pairs from concurrent rerank calls are merged into one
+      predict call of up to RERANK_MAX_BATCH_SIZE pairs or RERANK_BATCH_WINDOW_MS
+    - scores are cached in an LRU keyed by (query hash, chunk id, model)
+    - a call that exceeds RERANK_LATENCY_BUDGET_MS returns the fused (RRF) order;
+      its batch still finishes and fills the cache
+    - inference runs on one thread, or on a process pool (optionally an int8 ONNX model)
     """
 
     def __init__(self):
         self.model = None
-        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.model_name = settings.RERANK_MODEL
+        self.backend = settings.RERANK_BACKEND
+        self.process_workers = settings.RERANK_PROCESS_WORKERS
+        self.executor: Executor = self._make_executor()
+        self._predict_fn = self._predict_local
+        self._ready = False
         self._load_model_task = None
         self.enabled = settings.RERANKER_ENABLED
         self._load_failed = False
 
+        self.batch_window = settings.RERANK_BATCH_WINDOW_MS / 1000.0
+        self.max_batch_size = settings.RERANK_MAX_BATCH_SIZE
+        self.score_cache_size = settings.RERANK_SCORE_CACHE_SIZE
+        self.latency_budget = settings.RERANK_LATENCY_BUDGET_MS / 1000.0
+
+        self._score_cache: "OrderedDict[ScoreKey, float]" = OrderedDict()
+
+        # Pending pairs and timers belong to the loop that created them
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[ScoreKey, Tuple[List[str], List[asyncio.Future]]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._batch_tasks: set = set()
+
+    def _use_process_pool(self) -> bool:
+        # Daemonic processes (e.g. Celery prefork workers) cannot fork children
+        return self.process_workers > 0 and not multiprocessing.current_process().daemon
+
+    def _make_executor(self) -> Executor:
+        if not self._use_process_pool():
+            return ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        threads = max(1, (os.cpu_count() or 1) // self.process_workers)
+        return ProcessPoolExecutor(
+            max_workers=self.process_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_name, self.backend, settings.RERANK_ONNX_FILE, threads),
+        )
+
     async def ensure_model_loaded(self):
         """Ensure model is loaded (call this if auto-load failed)"""
         if not self.enabled or self._load_failed:
             return
-        if not self.model and not self._load_model_task:
+        if not self._ready and not self._load_model_task:
             self._load_model_task = asyncio.create_task(self._load_model())
         if self._load_model_task:
             await self._load_model_task
@@ -33,19 +118,27 @@ class RerankService:
         if not self.enabled or self._load_failed:
             return
         try:
-            logger.info(f"⏳ Loading Reranker model ({settings.RERANK_MODEL})...")
+            logger.info(f"⏳ Loading Reranker model ({self.model_name}, backend={self.backend})...")
             # Run in executor to avoid blocking loop
             loop = asyncio.get_running_loop()
-            await loop.run_in_executor(self.executor, self._init_transformer)
+            if self._use_process_pool():
+                # Workers load the model in their initializer; a warm-up call surfaces load errors
+                self._predict_fn = _predict_in_worker
+                await loop.run_in_executor(self.executor, _predict_in_worker, [["warmup", "warmup"]])
+            else:
+                await loop.run_in_executor(self.executor, self._init_transformer)
+            self._ready = True
             logger.success("✅ Reranker model loaded.")
         except Exception as e:
             self._load_failed = True
             logger.warning(f"⚠️ Failed to load Reranker model, disabling reranker: {e}")
 
     def _init_transformer(self):
-        from sentence_transformers import CrossEncoder
         # Use configured model (default: BAAI/bge-reranker-base)
-        self.model = CrossEncoder(settings.RERANK_MODEL, max_length=512)
+        self.model = _load_cross_encoder(self.model_name, self.backend, settings.RERANK_ONNX_FILE)
+
+    def _predict_local(self, pairs: List[List[str]]) -> List[float]:
+        return [float(score) for score in self.model.predict(pairs)]
 
     def reciprocal_rank_fusion(self, search_results_list: List[List[Any]], k: int = 60) -> List[tuple]:
         """
@@ -56,7 +149,7 @@ class RerankService:
         """
         scores = {} # item_id -> score
         items = {} # item_id -> item object
-        
+
         for results in search_results_list:
             for rank, item in enumerate(results):
                 # We assume item has an 'id' attribute or key
@@ -65,20 +158,123 @@ class RerankService:
                     item_id = str(item.get("id"))
                 else:
                     item_id = str(item.id)
-                    
+
                 if item_id not in scores:
                     scores[item_id] = 0.0
                     items[item_id] = item
-                
+
                 scores[item_id] += 1.0 / (k + rank + 1)
-        
+
         # Sort by score desc
         sorted_results = sorted(scores.items(), key=lambda x: x[1], reverse=True)
         return [(items[item_id], score) for item_id, score in sorted_results]
 
-    async def rerank(self, query: str, candidates: List[Any], top_k: int = 5) -> List[Any]:
+    # ==================== Score cache ====================
+
+    @staticmethod
+    def _hash_text(text: str) -> str:
+        return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def _candidate_text(c: Any) -> str:
+        # Handle dict or object
+        if isinstance(c, dict):
+            return c.get('content', '') or c.get('description', '') or c.get('name', '')
+        return getattr(c, 'content', '') or getattr(c, 'description', '') or getattr(c, 'name', '')
+
+    def _candidate_id(self, c: Any, text: str) -> str:
+        item_id = c.get("id") if isinstance(c, dict) else getattr(c, "id", None)
+        # Without a stable id, key on the text itself
+        return str(item_id) if item_id is not None else f"text:{self._hash_text(text)}"
+
+    def _cache_get(self, key: ScoreKey) -> Optional[float]:
+        score = self._score_cache.get(key)
+        if score is not None:
+            self._score_cache.move_to_end(key)
+        return score
+
+    def _cache_set(self, key: ScoreKey, score: float) -> None:
+        self._score_cache[key] = score
+        self._score_cache.move_to_end(key)
+        while len(self._score_cache) > self.score_cache_size:
+            self._score_cache.popitem(last=False)
+
+    # ==================== Dynamic batching ====================
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # Futures from a finished loop (e.g. a previous asyncio.run) cannot be resolved
+        self._pending = {}
+        self._flush_handle = None
+        self._batch_tasks = set()
+        self._loop = loop
+
+    def _submit(self, key: ScoreKey, query: str, text: str) -> asyncio.Future:
+        self._bind_loop()
+        future = asyncio.get_running_loop().create_future()
+        if key in self._pending:
+            # Same pair requested concurrently: score it once
+            self._pending[key][1].append(future)
+        else:
+            self._pending[key] = ([query, text], [future])
+        if len(self._pending) >= self.max_batch_size:
+            self._start_batch()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._start_batch)
+        return future
+
+    def _start_batch(self) -> None:
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        # Detach synchronously so a batch never exceeds max_batch_size
+        batch = self._pending
+        self._pending = {}
+        task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: Dict[ScoreKey, Tuple[List[str], List[asyncio.Future]]]) -> None:
+        keys = list(batch.keys())
+        pairs = [batch[key][0] for key in keys]
+        RERANK_BATCH_SIZE.observe(len(pairs))
+        started = time.perf_counter()
+        try:
+            scores = await asyncio.get_running_loop().run_in_executor(self.executor, self._predict_fn, pairs)
+        except Exception as e:
+            for _, futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        RERANK_BATCH_LATENCY.observe(time.perf_counter() - started)
+        RERANK_PAIRS.labels(result="scored").inc(len(pairs))
+
+        for key, score in zip(keys, scores):
+            self._cache_set(key, score)
+            for future in batch[key][1]:
+                if not future.done():
+                    future.set_result(score)
+
+    # ==================== Public API ====================
+
+    async def rerank(
+        self,
+        query: str,
+        candidates: List[Any],
+        top_k: int = 5,
+        budget_ms: Optional[float] = None,
+    ) -> List[Any]:
         """
         Rerank candidates based on query using local Cross-Encoder.
+
+        Candidates are expected in fused (RRF) order, which is also the
+        fallback when the model is unavailable or the latency budget
+        (budget_ms, default RERANK_LATENCY_BUDGET_MS) runs out.
         """
         if not candidates:
             return []
@@ -86,49 +282,54 @@ class RerankService:
         if not self.enabled:
             return candidates[:top_k]
 
-        if not self.model and not self._load_failed:
+        if not self._ready and not self._load_failed:
             await self.ensure_model_loaded()
 
-        if not self.model:
+        if not self._ready:
             # If model not ready or failed, return original top_k
             logger.warning("Reranker model not ready, returning original order.")
+            RERANK_FALLBACKS.labels(reason="not_ready").inc()
             return candidates[:top_k]
 
-        try:
-            # Prepare pairs [query, doc_text]
-            # Handle dict or object
-            pairs = []
-            valid_candidates = []
-            
-            for c in candidates:
-                text = ""
-                if isinstance(c, dict):
-                    text = c.get('content', '') or c.get('description', '') or c.get('name', '')
-                else:
-                    text = getattr(c, 'content', '') or getattr(c, 'description', '') or getattr(c, 'name', '')
-                
-                if text:
-                    pairs.append([query, text])
-                    valid_candidates.append(c)
-            
-            if not pairs:
-                return candidates[:top_k]
+        query_hash = self._hash_text(query)
+        scored: List[Tuple[Any, float]] = []
+        waiting: List[Tuple[Any, asyncio.Future]] = []
+        for c in candidates:
+            text = self._candidate_text(c)
+            if not text:
+                continue
+            key = (query_hash, self._candidate_id(c, text), self.model_name)
+            score = self._cache_get(key)
+            if score is not None:
+                scored.append((c, score))
+            else:
+                waiting.append((c, self._submit(key, query, text)))
 
-            # Run inference in executor
-            loop = asyncio.get_running_loop()
-            scores = await loop.run_in_executor(self.executor, lambda: self.model.predict(pairs))
-            
-            # Combine candidates with scores
-            scored_candidates = list(zip(valid_candidates, scores))
-            
-            # Sort by score desc
-            scored_candidates.sort(key=lambda x: x[1], reverse=True)
-            
-            # Return top_k items
-            return [item for item, score in scored_candidates[:top_k]]
-            
-        except Exception as e:
-            logger.error(f"Error during reranking: {e}")
+        if not scored and not waiting:
             return candidates[:top_k]
+        RERANK_PAIRS.labels(result="cache_hit").inc(len(scored))
+
+        if waiting:
+            budget = self.latency_budget if budget_ms is None else budget_ms / 1000.0
+            pending = asyncio.gather(*(future for _, future in waiting))
+            # Keep the batch alive past a timeout so its scores still reach the cache
+            pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+            try:
+                scores = await asyncio.wait_for(asyncio.shield(pending), timeout=budget or None)
+            except asyncio.TimeoutError:
+                logger.warning(f"Rerank exceeded {budget * 1000:.0f}ms budget, returning fused order.")
+                RERANK_FALLBACKS.labels(reason="budget").inc()
+                return candidates[:top_k]
+            except Exception as e:
+                logger.error(f"Error during reranking: {e}")
+                RERANK_FALLBACKS.labels(reason="error").inc()
+                return candidates[:top_k]
+            scored.extend((c, score) for (c, _), score in zip(waiting, scores))
+
+        # Sort by score desc
+        scored.sort(key=lambda x: x[1], reverse=True)
+
+        # Return top_k items
+        return [item for item, score in scored[:top_k]]
 
 rerank_service = RerankService()
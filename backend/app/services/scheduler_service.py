@@ -6,6 +6,7 @@ import json
 import asyncio
 
 from app.db.session import AsyncSessionLocal
+from app.core.cache import cache_service
 from app.models.user import User
 from app.models.task import Task, TaskStatus
 from app.services.notification_service import NotificationService
@@ -71,7 +72,7 @@ class SchedulerService:
         logger.info("Starting daily decay job...")
         try:
             async with AsyncSessionLocal() as db:
-                decay_service = DecayService(db)
+                decay_service = DecayService(db, redis_client=cache_service.redis)
                 stats = await decay_service.apply_daily_decay()
 
                 logger.info(
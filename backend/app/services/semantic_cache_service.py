@@ -7,6 +7,7 @@ Redis Semantic Cache Service - 语义缓存服务
 import json
 import hashlib
 import asyncio
+import time
 from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
 from loguru import logger
@@ -14,9 +15,23 @@ import numpy as np
 
 from redis.asyncio import Redis
 from redis.asyncio.lock import Lock
+from redis.commands.search.field import TagField, VectorField
+from redis.commands.search.index_definition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
 from app.config import settings
+from app.core.metrics import CACHE_HIT_COUNT, SEMANTIC_CACHE_LOOKUP_LATENCY
 from app.services.embedding_service import embedding_service
 
+# 无 user_id 的缓存条目在向量索引中的 owner 标签
+GLOBAL_OWNER_TAG = "_global"
+
+# RediSearch TAG 查询中需要转义的字符
+_TAG_ESCAPE_CHARS = set(",.<>{}[]\"':;!@#$%^&*()-+=~| /\\")
+
+
+def _escape_tag(value: str) -> str:
+    return "".join(f"\\{ch}" if ch in _TAG_ESCAPE_CHARS else ch for ch in value)
+
 
 class SemanticCacheService:
     """
@@ -28,6 +43,8 @@ class SemanticCacheService:
     - 缓存命中率统计
     - LRU 驱逐策略
     - 互斥锁防止缓存击穿 (Cache Stampede Protection)
+    - RediSearch 向量索引 (HNSW/FLAT) 单次往返的 Top-1 语义检索，
+      模块不可用时降级为随机采样线性扫描
     """
 
     def __init__(
@@ -48,8 +65,14 @@ class SemanticCacheService:
         self.LOCK_PREFIX = "semantic_cache:lock:"
         self.EMBED_PREFIX = "semantic_cache:emb:"
         self.KEY_SET = "semantic_cache:keys"
+        self.VEC_PREFIX = "semantic_cache:vec:"
+        self.INDEX_NAME = settings.SEMANTIC_CACHE_INDEX_NAME
         self.max_candidates = settings.SEMANTIC_CACHE_MAX_CANDIDATES
 
+        # None = 尚未探测；True/False = 向量索引是否可用（每个进程探测一次）
+        self._vector_index_ready: Optional[bool] = None
+        self._index_lock = asyncio.Lock()
+
         # 初始化统计
         # 注意：这里不能在 __init__ 中 await，所以统计初始化改为按需触发或单独的 async init 方法
         # 为了兼容性，我们在第一次写入时检查，或者接受外部传入的 redis_client 已经准备好
@@ -67,6 +90,8 @@ class SemanticCacheService:
                 "total_misses": 0,
                 "total_sets": 0,
                 "semantic_hits": 0,
+                "semantic_lookups": 0,
+                "semantic_lookup_ms": 0,
                 "start_time": datetime.utcnow().isoformat()
             }
             await self.redis.hset(self.STATS_KEY, mapping={
@@ -99,6 +124,9 @@ class SemanticCacheService:
 
     def _embedding_key(self, cache_key: str) -> str:
         return f"{self.EMBED_PREFIX}{cache_key}"
+
+    def _vector_key(self, cache_key: str) -> str:
+        return f"{self.VEC_PREFIX}{cache_key}"
     
     def _generate_lock_key(self, cache_key: str) -> str:
         """生成锁键"""
@@ -128,6 +156,9 @@ class SemanticCacheService:
     ) -> None:
         if not self.redis:
             return
+        if await self._ensure_vector_index(embedding):
+            await self._set_vector_entry(cache_key, embedding, user_id, ttl)
+            return
         emb_key = self._embedding_key(cache_key)
         payload = {
             "embedding": embedding,
@@ -138,6 +169,119 @@ class SemanticCacheService:
         await self.redis.setex(emb_key, ttl, json.dumps(payload))
         await self.redis.sadd(self.KEY_SET, cache_key)
 
+    async def _ensure_vector_index(self, embedding: List[float]) -> bool:
+        """
+        探测/创建语义缓存向量索引（每个进程一次）
+
+        RediSearch 模块不可用时返回 False，调用方降级为线性扫描。
+        """
+        if not self.redis or not settings.SEMANTIC_CACHE_INDEX_ENABLED:
+            return False
+        if len(embedding) != settings.EMBEDDING_DIM:
+            # 维度与索引不一致（例如降级的伪向量），不进入索引
+            return False
+        if self._vector_index_ready is not None:
+            return self._vector_index_ready
+
+        async with self._index_lock:
+            if self._vector_index_ready is not None:
+                return self._vector_index_ready
+
+            self._vector_index_ready = await self.create_vector_index()
+
+        return self._vector_index_ready
+
+    async def create_vector_index(self) -> bool:
+        """
+        创建语义缓存向量索引（已存在则直接返回 True）
+
+        索引为 HASH 类型，前缀 semantic_cache:vec:，字段：
+        - embedding: FLOAT32 二进制向量 (COSINE)
+        - owner: TAG，用户 ID 或 _global
+        - cache_key: TAG，指向实际缓存值的键
+        RediSearch 模块不可用或创建失败时返回 False。
+        """
+        ft = self.redis.ft(self.INDEX_NAME)
+        try:
+            await ft.info()
+            return True
+        except Exception as info_error:
+            if "unknown command" in str(info_error).lower():
+                logger.warning("RediSearch not available, semantic cache falls back to linear scan")
+                return False
+        try:
+            algorithm = settings.SEMANTIC_CACHE_INDEX_ALGORITHM.upper()
+            attributes = {
+                "TYPE": "FLOAT32",
+                "DIM": settings.EMBEDDING_DIM,
+                "DISTANCE_METRIC": "COSINE",
+            }
+            if algorithm == "HNSW":
+                attributes.update({"M": 16, "EF_CONSTRUCTION": 200})
+            schema = (
+                TagField("owner"),
+                TagField("cache_key"),
+                VectorField("embedding", algorithm, attributes),
+            )
+            definition = IndexDefinition(prefix=[self.VEC_PREFIX], index_type=IndexType.HASH)
+            await ft.create_index(schema, definition=definition)
+            logger.info(f"Semantic cache vector index '{self.INDEX_NAME}' created ({algorithm})")
+            return True
+        except Exception as e:
+            if "index already exists" in str(e).lower():
+                return True
+            logger.warning(f"Semantic cache vector index unavailable: {e}")
+            return False
+
+    async def _set_vector_entry(
+        self,
+        cache_key: str,
+        embedding: List[float],
+        user_id: Optional[str],
+        ttl: int
+    ) -> None:
+        """写入向量索引条目（HSET + EXPIRE 一次往返）"""
+        vec_key = self._vector_key(cache_key)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(vec_key, mapping={
+            "embedding": np.asarray(embedding, dtype=np.float32).tobytes(),
+            "owner": user_id or GLOBAL_OWNER_TAG,
+            "cache_key": cache_key,
+        })
+        pipe.expire(vec_key, ttl)
+        await pipe.execute()
+
+    async def _search_vector_index(
+        self,
+        query_embedding: List[float],
+        user_id: Optional[str],
+        threshold: float
+    ) -> Optional[Tuple[str, float]]:
+        """KNN 1 检索，按 owner 预过滤，单次往返返回最相似的缓存键"""
+        if user_id:
+            prefilter = f"@owner:{{{GLOBAL_OWNER_TAG} | {_escape_tag(user_id)}}}"
+        else:
+            prefilter = "*"
+
+        q = (
+            Query(f"({prefilter})=>[KNN 1 @embedding $vec AS distance]")
+            .sort_by("distance")
+            .paging(0, 1)
+            .return_fields("cache_key", "distance")
+            .dialect(2)
+        )
+        vector_blob = np.asarray(query_embedding, dtype=np.float32).tobytes()
+        result = await self.redis.ft(self.INDEX_NAME).search(q, {"vec": vector_blob})
+
+        if not result or not result.docs:
+            return None
+        doc = result.docs[0]
+        # COSINE 距离 = 1 - 余弦相似度
+        score = 1.0 - float(doc.distance)
+        if score >= threshold:
+            return doc.cache_key, score
+        return None
+
     def _cosine_similarity(self, a: List[float], b: List[float]) -> float:
         if not a or not b:
             return 0.0
@@ -157,6 +301,32 @@ class SemanticCacheService:
         if not self.redis:
             return None
 
+        start = time.perf_counter()
+        mode = "scan"
+        try:
+            if await self._ensure_vector_index(query_embedding):
+                mode = "index"
+                try:
+                    return await self._search_vector_index(query_embedding, user_id, threshold)
+                except Exception as e:
+                    logger.warning(f"Semantic cache index search failed, falling back to scan: {e}")
+                    mode = "scan"
+            return await self._scan_similar_cache_key(query_embedding, user_id, threshold)
+        finally:
+            elapsed = time.perf_counter() - start
+            SEMANTIC_CACHE_LOOKUP_LATENCY.labels(mode=mode).observe(elapsed)
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hincrby(self.STATS_KEY, "semantic_lookups", 1)
+            pipe.hincrbyfloat(self.STATS_KEY, "semantic_lookup_ms", round(elapsed * 1000, 3))
+            await pipe.execute()
+
+    async def _scan_similar_cache_key(
+        self,
+        query_embedding: List[float],
+        user_id: Optional[str],
+        threshold: float
+    ) -> Optional[Tuple[str, float]]:
+        """降级路径：随机采样候选键并逐个计算余弦相似度"""
         total_keys = await self.redis.scard(self.KEY_SET)
         if total_keys == 0:
             return None
@@ -220,6 +390,7 @@ class SemanticCacheService:
             if cached_data:
                 # 命中
                 await self.redis.hincrby(self.STATS_KEY, "total_hits", 1)
+                CACHE_HIT_COUNT.labels(cache_name="semantic_cache", result="hit").inc()
                 result = json.loads(cached_data)
 
                 logger.debug(
@@ -239,6 +410,7 @@ class SemanticCacheService:
                     if cached_similar:
                         await self.redis.hincrby(self.STATS_KEY, "total_hits", 1)
                         await self.redis.hincrby(self.STATS_KEY, "semantic_hits", 1)
+                        CACHE_HIT_COUNT.labels(cache_name="semantic_cache", result="semantic_hit").inc()
                         result = json.loads(cached_similar)
                         logger.debug(
                             f"Cache SEMANTIC HIT: query='{query[:30]}...', score={score:.3f}"
@@ -247,6 +419,7 @@ class SemanticCacheService:
 
             # 未命中
             await self.redis.hincrby(self.STATS_KEY, "total_misses", 1)
+            CACHE_HIT_COUNT.labels(cache_name="semantic_cache", result="miss").inc()
             logger.debug(f"Cache MISS: query='{query[:30]}...'")
             return None
 
@@ -412,6 +585,7 @@ class SemanticCacheService:
         try:
             cache_key = self._generate_cache_key(query, user_id)
             deleted = await self.redis.delete(cache_key)
+            await self.redis.delete(self._vector_key(cache_key), self._embedding_key(cache_key))
             logger.info(f"Cache INVALIDATE: query='{query[:30]}...', deleted={deleted}")
             return deleted > 0
 
@@ -430,12 +604,16 @@ class SemanticCacheService:
             return 0
 
         try:
-            # 查找所有缓存键
+            # 查找所有缓存键；向量索引条目 (semantic_cache:vec:*) 随 HASH 删除自动移出索引，
+            # 索引本身保留，其他进程无需重新探测
             keys = await self.redis.keys(f"{self.CACHE_PREFIX}*")
             emb_keys = await self.redis.keys(f"{self.EMBED_PREFIX}*")
+            vec_keys = await self.redis.keys(f"{self.VEC_PREFIX}*")
 
-            if keys or emb_keys:
-                delete_keys = list(keys or []) + list(emb_keys or []) + [self.KEY_SET]
+            if keys or emb_keys or vec_keys:
+                delete_keys = list(dict.fromkeys(
+                    [*(keys or []), *(emb_keys or []), *(vec_keys or []), self.KEY_SET]
+                ))
                 deleted = await self.redis.delete(*delete_keys)
                 logger.warning(f"Cache CLEAR_ALL: deleted {deleted} keys")
                 return deleted
@@ -475,6 +653,12 @@ class SemanticCacheService:
             stats["hit_rate_percent"] = round(hit_rate, 2)
             stats["total_requests"] = total_requests
 
+            lookups = stats.get("semantic_lookups", 0)
+            stats["avg_semantic_lookup_ms"] = (
+                round(stats.get("semantic_lookup_ms", 0) / lookups, 3) if lookups > 0 else 0
+            )
+            stats["vector_index_enabled"] = bool(self._vector_index_ready)
+
             return stats
 
         except Exception as e:
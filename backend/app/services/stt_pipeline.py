@@ -0,0 +1,478 @@
+"""
+Streaming STT pipeline
+流式语音识别流水线: 接收音频 -> VAD 分句 -> ASR 工作池
+
+Wire format: the client sends 16-bit little-endian mono PCM at STT_SAMPLE_RATE
+as binary frames and the text message "STOP" when done. The server answers with
+    {"type": "transcription", "segment": n, "text": "...", "is_final": bool, "start_ms": .., "end_ms": ..}
+partial hypotheses while an utterance is in progress and one final per utterance,
+finals always in segment order.
+
+Stages are connected by bounded queues. When the ASR stage falls behind, partial
+hypotheses are skipped and finals wait for a slot; once the audio queue is full the
+receiver stops reading the socket, pushing backpressure to the client via TCP.
+"""
+import asyncio
+import io
+import math
+import time
+import wave
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+import numpy as np
+from fastapi import WebSocket
+from loguru import logger
+
+from app.config import settings
+from app.core.metrics import STT_ASR_LATENCY, STT_FIRST_RESULT_LATENCY, STT_PARTIALS_DROPPED
+
+BYTES_PER_SAMPLE = 2  # 16-bit PCM
+# Frames quieter than this are never speech, whatever the noise floor
+MIN_SPEECH_DBFS = -50.0
+# Audio kept from before speech onset so the first syllable is not clipped
+PREROLL_MS = 150
+# Utterances with less voiced audio are treated as clicks/noise (unless a partial was already sent)
+MIN_VOICED_MS = 90
+AUDIO_QUEUE_CHUNKS = 32
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """Wrap raw PCM in a WAV container, in memory"""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(BYTES_PER_SAMPLE)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buf.getvalue()
+
+
+# ---------------- ASR backends ----------------
+
+class ASRBackend(ABC):
+    """Transcribes one in-memory PCM segment"""
+
+    name = "asr"
+
+    @abstractmethod
+    async def transcribe(self, pcm: bytes, sample_rate: int, language: Optional[str] = None,
+                         is_final: bool = True) -> str:
+        pass
+
+
+class WhisperAPIBackend(ASRBackend):
+    """OpenAI-compatible /audio/transcriptions; the segment is uploaded as an in-memory WAV"""
+
+    name = "whisper"
+
+    def __init__(self, client: Any, model: str = "whisper-1"):
+        self.client = client
+        self.model = model
+
+    async def transcribe(self, pcm: bytes, sample_rate: int, language: Optional[str] = None,
+                         is_final: bool = True) -> str:
+        transcript = await self.client.audio.transcriptions.create(
+            model=self.model,
+            file=("segment.wav", pcm_to_wav(pcm, sample_rate), "audio/wav"),
+            language=language,
+            response_format="json"
+        )
+        return transcript.text
+
+
+class LocalASRBackend(ASRBackend):
+    """
+    Deterministic local stand-in: "utterance <duration>ms".
+    delay_seconds / real_time_factor simulate backend latency, so first-result
+    latency and per-connection CPU can be measured offline.
+    """
+
+    name = "local"
+
+    def __init__(self, delay_seconds: float = 0.0, real_time_factor: float = 0.0):
+        self.delay_seconds = delay_seconds
+        self.real_time_factor = real_time_factor
+
+    async def transcribe(self, pcm: bytes, sample_rate: int, language: Optional[str] = None,
+                         is_final: bool = True) -> str:
+        duration = len(pcm) / (BYTES_PER_SAMPLE * sample_rate)
+        delay = self.delay_seconds + duration * self.real_time_factor
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return f"utterance {int(duration * 1000)}ms"
+
+
+def build_asr_backend(kind: str, client: Any = None) -> Optional[ASRBackend]:
+    if kind == "local":
+        return LocalASRBackend()
+    if client is None:
+        return None
+    return WhisperAPIBackend(client)
+
+
+# ---------------- VAD ----------------
+
+class EnergyVAD:
+    """Frame energy against an adaptive noise floor"""
+
+    def __init__(self, threshold_db: float, initial_floor_db: float = -60.0):
+        self.threshold_db = threshold_db
+        self.noise_floor_db = initial_floor_db
+
+    def is_speech(self, frame: bytes) -> bool:
+        samples = np.frombuffer(frame, dtype="<i2").astype(np.float32)
+        rms = math.sqrt(float(np.mean(samples * samples))) if samples.size else 0.0
+        level_db = 20 * math.log10(rms / 32768.0 + 1e-10)
+        voiced = level_db >= MIN_SPEECH_DBFS and level_db >= self.noise_floor_db + self.threshold_db
+        if not voiced:
+            # 噪声底下降立即跟随，上升缓慢跟随（避免把持续语音当作噪声）
+            if level_db < self.noise_floor_db:
+                self.noise_floor_db = max(level_db, -70.0)
+            else:
+                self.noise_floor_db += 0.05 * (level_db - self.noise_floor_db)
+        return voiced
+
+
+class WebRTCVAD:
+    """webrtcvad (GMM-based) when installed; frames must be 10/20/30 ms"""
+
+    def __init__(self, sample_rate: int, aggressiveness: int = 2):
+        import webrtcvad
+        self.sample_rate = sample_rate
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+    def is_speech(self, frame: bytes) -> bool:
+        return self.vad.is_speech(frame, self.sample_rate)
+
+
+def build_vad(mode: str, sample_rate: int, frame_ms: int, threshold_db: float):
+    if mode == "webrtc" and frame_ms in (10, 20, 30):
+        try:
+            return WebRTCVAD(sample_rate)
+        except ImportError:
+            logger.warning("webrtcvad not installed, falling back to energy VAD")
+    return EnergyVAD(threshold_db)
+
+
+# ---------------- Segmentation ----------------
+
+@dataclass
+class SpeechSegment:
+    """An utterance (final) or the utterance so far (partial)"""
+    index: int
+    pcm: bytes
+    start_ms: int
+    end_ms: int
+    is_final: bool
+
+
+class VADSegmenter:
+    """Splits a PCM stream into utterances; pure and synchronous"""
+
+    def __init__(self, vad: Any, sample_rate: int, frame_ms: int, silence_ms: int,
+                 max_segment_ms: int, partial_interval_ms: int):
+        self.vad = vad
+        self.frame_ms = frame_ms
+        self.frame_bytes = sample_rate * frame_ms // 1000 * BYTES_PER_SAMPLE
+        self.silence_frames = max(1, silence_ms // frame_ms)
+        self.max_frames = max(1, max_segment_ms // frame_ms)
+        self.partial_frames = partial_interval_ms // frame_ms if partial_interval_ms > 0 else 0
+        self.min_voiced_frames = max(1, MIN_VOICED_MS // frame_ms)
+
+        self._remainder = b""
+        self._position = 0  # frames consumed
+        self._preroll: Deque[bytes] = deque(maxlen=max(1, PREROLL_MS // frame_ms))
+        self._speech: Optional[bytearray] = None
+        self._start_frame = 0
+        self._frames = 0
+        self._voiced = 0
+        self._silence_run = 0
+        self._last_partial = 0
+        self._index: Optional[int] = None
+        self._next_index = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return self._speech is not None
+
+    def feed(self, pcm: bytes) -> List[SpeechSegment]:
+        data = self._remainder + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._remainder = data[usable:]
+        segments: List[SpeechSegment] = []
+        for offset in range(0, usable, self.frame_bytes):
+            self._frame(data[offset:offset + self.frame_bytes], segments)
+        return segments
+
+    def flush(self) -> List[SpeechSegment]:
+        """End of stream: finalize the utterance in progress"""
+        segments: List[SpeechSegment] = []
+        if self._speech is not None:
+            self._finish(segments, trim_frames=self._silence_run)
+        return segments
+
+    def _frame(self, frame: bytes, segments: List[SpeechSegment]) -> None:
+        voiced = self.vad.is_speech(frame)
+        self._position += 1
+
+        if self._speech is None:
+            self._preroll.append(frame)
+            if not voiced:
+                return
+            self._speech = bytearray(b"".join(self._preroll))
+            self._preroll.clear()
+            self._frames = len(self._speech) // self.frame_bytes
+            self._start_frame = self._position - self._frames
+            self._voiced = 1
+            self._silence_run = 0
+            self._last_partial = 0
+            return
+
+        self._speech.extend(frame)
+        self._frames += 1
+        if voiced:
+            self._voiced += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+
+        if self._silence_run >= self.silence_frames:
+            self._finish(segments, trim_frames=self._silence_run)
+        elif self._frames >= self.max_frames:
+            self._finish(segments, trim_frames=0)
+            # Speech continues straight into the next utterance
+            self._speech = bytearray()
+            self._start_frame = self._position
+            self._frames = self._voiced = self._silence_run = self._last_partial = 0
+        elif self.partial_frames and self._frames - self._last_partial >= self.partial_frames and voiced:
+            self._last_partial = self._frames
+            segments.append(self._segment(self._frames, is_final=False))
+
+    def _finish(self, segments: List[SpeechSegment], trim_frames: int) -> None:
+        frames = self._frames - trim_frames
+        if frames > 0 and (self._voiced >= self.min_voiced_frames or self._index is not None):
+            segments.append(self._segment(frames, is_final=True))
+        self._speech = None
+        self._index = None
+
+    def _segment(self, frames: int, is_final: bool) -> SpeechSegment:
+        if self._index is None:
+            # Indices are assigned on first emission, so discarded noise leaves no gaps
+            self._index = self._next_index
+            self._next_index += 1
+        return SpeechSegment(
+            index=self._index,
+            pcm=bytes(self._speech[:frames * self.frame_bytes]),
+            start_ms=self._start_frame * self.frame_ms,
+            end_ms=(self._start_frame + frames) * self.frame_ms,
+            is_final=is_final
+        )
+
+
+# ---------------- Pipeline ----------------
+
+@dataclass
+class STTStreamStats:
+    """Per-connection measurements"""
+    audio_ms: int = 0
+    segments: int = 0
+    partials_sent: int = 0
+    partials_dropped: int = 0
+    first_result_latency: Optional[float] = None
+    vad_cpu_seconds: float = 0.0  # CPU spent segmenting this connection's audio
+    asr_seconds: float = 0.0  # wall time spent in the ASR backend
+    asr_calls: Dict[str, int] = field(default_factory=lambda: {"partial": 0, "final": 0})
+
+
+class STTStreamPipeline:
+    """receive -> VAD segmentation -> ASR worker pool, for one websocket"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        backend: ASRBackend,
+        language: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        workers: Optional[int] = None,
+        max_pending_segments: Optional[int] = None,
+        segmenter: Optional[VADSegmenter] = None
+    ):
+        self.websocket = websocket
+        self.backend = backend
+        self.language = language
+        self.sample_rate = sample_rate or settings.STT_SAMPLE_RATE
+        self.workers = workers or settings.STT_ASR_WORKERS
+        self.max_pending_segments = max_pending_segments or settings.STT_MAX_PENDING_SEGMENTS
+        frame_ms = settings.STT_VAD_FRAME_MS
+        self.segmenter = segmenter or VADSegmenter(
+            vad=build_vad(settings.STT_VAD_MODE, self.sample_rate, frame_ms, settings.STT_VAD_THRESHOLD_DB),
+            sample_rate=self.sample_rate,
+            frame_ms=frame_ms,
+            silence_ms=settings.STT_VAD_SILENCE_MS,
+            max_segment_ms=int(settings.STT_MAX_SEGMENT_SECONDS * 1000),
+            partial_interval_ms=settings.STT_PARTIAL_INTERVAL_MS
+        )
+        self.stats = STTStreamStats()
+
+        self._disconnected = False
+        self._speech_started_at: Optional[float] = None
+        self._send_lock = asyncio.Lock()
+        self._finalized: set = set()  # segments whose final is queued: their partials are stale
+        self._partial_end: Dict[int, int] = {}  # newest partial sent per segment
+        self._pending_finals: Dict[int, Dict[str, Any]] = {}
+        self._next_final = 0
+
+    async def run(self) -> bool:
+        """Process the stream; returns True when the client sent STOP"""
+        audio_queue: asyncio.Queue = asyncio.Queue(maxsize=AUDIO_QUEUE_CHUNKS)
+        job_queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending_segments)
+        receiver = asyncio.create_task(self._receive(audio_queue))
+        segmenter = asyncio.create_task(self._segment(audio_queue, job_queue))
+        workers = [asyncio.create_task(self._transcribe(job_queue)) for _ in range(self.workers)]
+        tasks = [receiver, segmenter, *workers]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception():
+                    raise task.exception()
+            stopped = receiver.result()
+            if stopped:
+                await self._send({"type": "status", "content": "completed"})
+            return stopped
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.stats.first_result_latency is not None:
+                STT_FIRST_RESULT_LATENCY.observe(self.stats.first_result_latency)
+            logger.info(
+                f"STT stream finished: {self.stats.audio_ms}ms audio, {self.stats.segments} segments, "
+                f"{self.stats.partials_sent} partials ({self.stats.partials_dropped} dropped), "
+                f"first result {self.stats.first_result_latency}, VAD CPU {self.stats.vad_cpu_seconds:.3f}s"
+            )
+
+    async def _receive(self, audio_queue: asyncio.Queue) -> bool:
+        """Stage 1: read the socket; blocks (stops reading) while the audio queue is full"""
+        stopped = False
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message.get("type") == "websocket.disconnect":
+                    self._disconnected = True
+                    break
+                if message.get("bytes") is not None:
+                    await audio_queue.put(message["bytes"])
+                elif message.get("text") == "STOP":
+                    stopped = True
+                    break
+        finally:
+            await audio_queue.put(None)
+        return stopped
+
+    async def _segment(self, audio_queue: asyncio.Queue, job_queue: asyncio.Queue) -> None:
+        """Stage 2: VAD segmentation"""
+        while True:
+            chunk = await audio_queue.get()
+            if chunk is None:
+                break
+            self.stats.audio_ms += len(chunk) * 1000 // (BYTES_PER_SAMPLE * self.sample_rate)
+            cpu = time.thread_time()
+            was_speaking = self.segmenter.in_speech
+            segments = self.segmenter.feed(chunk)
+            if self._speech_started_at is None and (segments or (self.segmenter.in_speech and not was_speaking)):
+                self._speech_started_at = time.monotonic()
+            self.stats.vad_cpu_seconds += time.thread_time() - cpu
+            for segment in segments:
+                await self._enqueue(job_queue, segment)
+
+        if not self._disconnected:
+            for segment in self.segmenter.flush():
+                await self._enqueue(job_queue, segment)
+        for _ in range(self.workers):
+            await job_queue.put(None)
+
+    async def _enqueue(self, job_queue: asyncio.Queue, segment: SpeechSegment) -> None:
+        if not segment.is_final:
+            try:
+                job_queue.put_nowait(segment)
+            except asyncio.QueueFull:
+                # ASR is behind: skip the hypothesis, the next one (or the final) supersedes it
+                self.stats.partials_dropped += 1
+                STT_PARTIALS_DROPPED.inc()
+            return
+        self._finalized.add(segment.index)
+        self.stats.segments += 1
+        await job_queue.put(segment)
+
+    async def _transcribe(self, job_queue: asyncio.Queue) -> None:
+        """Stage 3: ASR worker"""
+        while True:
+            segment = await job_queue.get()
+            if segment is None:
+                break
+            if self._disconnected or (not segment.is_final and segment.index in self._finalized):
+                continue
+            kind = "final" if segment.is_final else "partial"
+            started = time.monotonic()
+            error = None
+            try:
+                text = await self.backend.transcribe(
+                    segment.pcm, self.sample_rate, language=self.language, is_final=segment.is_final
+                )
+            except Exception as e:
+                logger.error(f"STT {kind} transcription failed for segment {segment.index}: {e}")
+                if not segment.is_final:
+                    continue
+                text, error = "", str(e)
+            elapsed = time.monotonic() - started
+            self.stats.asr_seconds += elapsed
+            self.stats.asr_calls[kind] += 1
+            STT_ASR_LATENCY.labels(kind=kind).observe(elapsed)
+            await self._emit(segment, text, error)
+
+    async def _emit(self, segment: SpeechSegment, text: str, error: Optional[str]) -> None:
+        message: Dict[str, Any] = {
+            "type": "transcription",
+            "segment": segment.index,
+            "text": text,
+            "is_final": segment.is_final,
+            "start_ms": segment.start_ms,
+            "end_ms": segment.end_ms,
+        }
+        if error:
+            message["error"] = error
+
+        async with self._send_lock:
+            if not segment.is_final:
+                # Workers finish out of order: only send partials newer than what the client has
+                if segment.index < self._next_final or segment.end_ms <= self._partial_end.get(segment.index, -1):
+                    return
+                self._partial_end[segment.index] = segment.end_ms
+                self.stats.partials_sent += 1
+                await self._send_locked(message)
+                return
+
+            self._pending_finals[segment.index] = message
+            while self._next_final in self._pending_finals:
+                await self._send_locked(self._pending_finals.pop(self._next_final))
+                self._partial_end.pop(self._next_final, None)
+                self._next_final += 1
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        async with self._send_lock:
+            await self._send_locked(message)
+
+    async def _send_locked(self, message: Dict[str, Any]) -> None:
+        if self._disconnected:
+            return
+        if message.get("type") == "transcription" and self.stats.first_result_latency is None \
+                and self._speech_started_at is not None:
+            self.stats.first_result_latency = time.monotonic() - self._speech_started_at
+        try:
+            await self.websocket.send_json(message)
+        except Exception as e:
+            logger.info(f"STT stream send failed, client gone: {e}")
+            self._disconnected = True
@@ -11,6 +11,7 @@ from app.config import settings
 from app.services.llm_service import llm_service
 # We'll use the LLM provider's client if available, or create a new OpenAI client for audio
 from app.services.llm.providers import OpenAICompatibleProvider
+from app.services.stt_pipeline import STTStreamPipeline, build_asr_backend
 
 class STTService:
     def __init__(self):
@@ -36,6 +37,9 @@ class STTService:
             logger.error("OpenAI package not found. STT will not work.")
             self.client = None
 
+        # Streaming ASR backend ('local' is a deterministic stand-in for offline measurement)
+        self.asr_backend = build_asr_backend(settings.STT_ASR_BACKEND, self.client)
+
     async def transcribe_file(self, file_path: str, language: Optional[str] = None) -> Dict[str, Any]:
         """
         Transcribe an audio file using OpenAI Whisper API.
@@ -101,93 +105,32 @@ class STTService:
             logger.error(f"Enhancement failed: {e}")
             return text
 
-    async def handle_websocket_stream(self, websocket: WebSocket):
+    async def handle_websocket_stream(self, websocket: WebSocket, language: Optional[str] = None):
         """
         Handle WebSocket audio stream.
-        Current implementation strategy:
-        - Receive chunks of audio bytes.
-        - Buffer until a silence threshold or size threshold.
-        - Save to temp file.
-        - Transcribe.
-        - Send back partial/final result.
+        Three-stage pipeline (see app/services/stt_pipeline.py):
+        - Receive 16-bit mono PCM chunks (backpressure: stop reading when ASR falls behind).
+        - Segment utterances with VAD.
+        - Transcribe in-memory segments in a worker pool, sending partial and final results.
         """
         await websocket.accept()
-        
+
         session_id = str(uuid.uuid4())
-        temp_filename = os.path.join(self.upload_dir, f"stream_{session_id}.webm")
-        
-        # Buffer config
-        CHUNK_THRESHOLD = 100 * 1024 # 100KB buffer (approx 3-5 seconds of audio depending on codec)
-        buffer = bytearray()
-        
+        if not self.asr_backend:
+            await websocket.send_json({"type": "error", "content": "STT Service Unavailable (Client Init Failed)"})
+            await websocket.close()
+            return
+
+        pipeline = STTStreamPipeline(websocket, self.asr_backend, language=language)
         try:
-            while True:
-                # Receive data
-                # We expect bytes (audio) or text (control commands)
-                data = await websocket.receive()
-                
-                if "bytes" in data:
-                    chunk = data["bytes"]
-                    buffer.extend(chunk)
-                    
-                    if len(buffer) >= CHUNK_THRESHOLD:
-                        # Process buffer
-                        await self._process_buffer(websocket, buffer, temp_filename)
-                        buffer = bytearray() # Clear buffer
-                        
-                elif "text" in data:
-                    text = data["text"]
-                    if text == "STOP":
-                        # Process remaining buffer
-                        if len(buffer) > 0:
-                            await self._process_buffer(websocket, buffer, temp_filename)
-                        
-                        # Send completion signal
-                        await websocket.send_json({"type": "status", "content": "completed"})
-                        break
-                        
+            await pipeline.run()
         except WebSocketDisconnect:
             logger.info(f"WebSocket disconnected: {session_id}")
         except Exception as e:
             logger.error(f"WebSocket error: {e}")
-            await websocket.send_json({"type": "error", "content": str(e)})
-        finally:
-            # Cleanup
-            if os.path.exists(temp_filename):
-                os.remove(temp_filename)
-
-    async def _process_buffer(self, websocket: WebSocket, audio_data: bytearray, filename: str):
-        """Helper to write buffer to file and transcribe"""
-        # Write to temp file
-        # Note: In a real streaming setup, we'd append. 
-        # But for Whisper API, we need a valid file header usually.
-        # If the client sends raw PCM, we need to wrap it.
-        # If the client sends chunks of a webm stream, simply concatenating might break headers.
-        # For simplicity in this generic implementation:
-        # We assume the client sends valid standalone chunks OR we just overwrite the file to test.
-        # 
-        # Better Strategy for "Pseudo-Streaming":
-        # Save the current buffer as a standalone file (if possible) or append to a growing file 
-        # and transcribe the *difference*? No, OpenAI transcribes the whole file.
-        #
-        # Simple Approach: Write current buffer to a file, transcribe it.
-        # This assumes the buffer contains a valid audio segment (e.g. from a client recorder that flushes on silence).
-        
-        with open(filename, "wb") as f:
-            f.write(audio_data)
-            
-        # Transcribe
-        result = await self.transcribe_file(filename)
-        
-        if not result["error"]:
-            text = result["text"]
-            # Enhance
-            # enhanced = await self.enhance_transcript(text) # Optional: might be too slow for stream
-            
-            await websocket.send_json({
-                "type": "transcription", 
-                "text": text,
-                "is_final": False 
-            })
+            try:
+                await websocket.send_json({"type": "error", "content": str(e)})
+            except Exception:
+                pass
 
 stt_service = STTService()
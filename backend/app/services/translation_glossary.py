@@ -0,0 +1,166 @@
+"""
+Translation Glossary Store
+
+Versioned, per-subject terminology for TranslationService.
+
+Glossary ids:
+    "{subject}_terms_v{version}"  pinned version, e.g. "cs_terms_v1"
+    "{subject}_terms"             latest published version of the subject
+
+Published versions are immutable, so pinned lookups are cached in-process
+forever; "latest" pointers are re-checked every TRANSLATION_GLOSSARY_REFRESH_SECONDS.
+The glossary id (with version) is part of the translation memory key, so
+publishing a new version never serves translations made with old terms.
+"""
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import func, select
+
+from app.config.settings import settings
+from app.models.translation import TranslationGlossary
+
+GLOSSARY_ID_PATTERN = re.compile(r"^(?P<subject>[a-z0-9]+)_terms(?:_v(?P<version>\d+))?$")
+
+
+@dataclass(frozen=True)
+class Glossary:
+    """One published glossary version"""
+    subject: str
+    version: int
+    terms: Tuple[Tuple[str, str], ...]  # (source, target), hashable and immutable
+
+    @property
+    def glossary_id(self) -> str:
+        return f"{self.subject}_terms_v{self.version}"
+
+    def as_dicts(self) -> List[Dict[str, str]]:
+        return [{"source": source, "target": target} for source, target in self.terms]
+
+
+def _glossary(subject: str, version: int, terms: List[Dict[str, str]]) -> Glossary:
+    return Glossary(subject=subject, version=version, terms=tuple((t["source"], t["target"]) for t in terms))
+
+
+# Seed versions shipped with the code; later versions are published to the database
+BUILTIN_GLOSSARIES: Dict[str, List[Glossary]] = {
+    "cs": [
+        _glossary("cs", 1, [
+            {"source": "cache", "target": "缓存"},
+            {"source": "database", "target": "数据库"},
+            {"source": "API", "target": "应用程序接口"},
+            {"source": "function", "target": "函数"},
+            {"source": "variable", "target": "变量"},
+            {"source": "loop", "target": "循环"},
+            {"source": "condition", "target": "条件"},
+            {"source": "array", "target": "数组"},
+            {"source": "object", "target": "对象"},
+            {"source": "class", "target": "类"},
+        ]),
+    ],
+}
+
+
+def parse_glossary_id(glossary_id: str) -> Optional[Tuple[str, Optional[int]]]:
+    """'cs_terms_v2' -> ('cs', 2); 'cs_terms' -> ('cs', None); unknown formats -> None"""
+    match = GLOSSARY_ID_PATTERN.match(glossary_id or "")
+    if not match:
+        return None
+    version = match.group("version")
+    return match.group("subject"), int(version) if version else None
+
+
+class GlossaryStore:
+    """Resolves glossary ids against built-in seeds and the translation_glossaries table."""
+
+    def __init__(self, session_factory: Optional[Callable] = None, refresh_seconds: Optional[float] = None):
+        self._session_factory = session_factory
+        self.refresh_seconds = refresh_seconds or settings.TRANSLATION_GLOSSARY_REFRESH_SECONDS
+        self._pinned: Dict[Tuple[str, int], Glossary] = {}
+        self._latest: Dict[str, Tuple[float, Optional[Glossary]]] = {}
+
+    @property
+    def session_factory(self) -> Callable:
+        if self._session_factory is not None:
+            return self._session_factory
+        from app.db.session import AsyncSessionLocal
+        return AsyncSessionLocal
+
+    async def get(self, glossary_id: Optional[str]) -> Optional[Glossary]:
+        """Resolve a glossary id; unknown ids and storage errors resolve to no glossary."""
+        parsed = parse_glossary_id(glossary_id) if glossary_id else None
+        if not parsed:
+            return None
+        subject, version = parsed
+        try:
+            if version is None:
+                return await self._get_latest(subject)
+            return await self._get_pinned(subject, version)
+        except Exception as e:
+            logger.warning(f"Glossary lookup failed for {glossary_id}: {e}")
+            return None
+
+    async def _get_pinned(self, subject: str, version: int) -> Optional[Glossary]:
+        cached = self._pinned.get((subject, version))
+        if cached:
+            return cached
+        glossary = next((g for g in BUILTIN_GLOSSARIES.get(subject, []) if g.version == version), None)
+        if glossary is None:
+            async with self.session_factory() as db:
+                row = (await db.execute(
+                    select(TranslationGlossary).where(
+                        TranslationGlossary.subject == subject,
+                        TranslationGlossary.version == version,
+                        TranslationGlossary.deleted_at.is_(None)
+                    )
+                )).scalar_one_or_none()
+            if row is None:
+                return None
+            glossary = _glossary(row.subject, row.version, row.terms)
+        self._pinned[(subject, version)] = glossary
+        return glossary
+
+    async def _get_latest(self, subject: str) -> Optional[Glossary]:
+        cached = self._latest.get(subject)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        async with self.session_factory() as db:
+            row = (await db.execute(
+                select(TranslationGlossary)
+                .where(TranslationGlossary.subject == subject, TranslationGlossary.deleted_at.is_(None))
+                .order_by(TranslationGlossary.version.desc())
+                .limit(1)
+            )).scalar_one_or_none()
+        builtin = BUILTIN_GLOSSARIES.get(subject, [])
+        glossary = builtin[-1] if builtin else None
+        if row is not None and (glossary is None or row.version > glossary.version):
+            glossary = _glossary(row.subject, row.version, row.terms)
+        if glossary is not None:
+            self._pinned[(subject, glossary.version)] = glossary
+        self._latest[subject] = (time.monotonic() + self.refresh_seconds, glossary)
+        return glossary
+
+    async def publish(self, subject: str, terms: List[Dict[str, str]]) -> Glossary:
+        """Publish the terms as the next version of the subject's glossary."""
+        async with self.session_factory() as db:
+            current = (await db.execute(
+                select(func.max(TranslationGlossary.version)).where(TranslationGlossary.subject == subject)
+            )).scalar() or 0
+            builtin = BUILTIN_GLOSSARIES.get(subject, [])
+            version = max(current, builtin[-1].version if builtin else 0) + 1
+            db.add(TranslationGlossary(subject=subject, version=version, terms=terms))
+            await db.commit()
+
+        glossary = _glossary(subject, version, terms)
+        self._pinned[(subject, version)] = glossary
+        self._latest.pop(subject, None)
+        logger.info(f"Published glossary {glossary.glossary_id} ({len(terms)} terms)")
+        return glossary
+
+
+# Singleton instance
+glossary_store = GlossaryStore()
@@ -0,0 +1,170 @@
+"""
+Translation Memory
+
+Segment-level cache of finished translations, so a paragraph that was
+translated once (e.g. the same textbook page opened by many students) costs
+zero LLM calls afterwards.
+
+Entries live in Redis under translation:tm:{key}. With TRANSLATION_MEMORY_PERSIST
+they are also written to the translation_memory table, which serves Redis misses
+and backfills Redis.
+"""
+import hashlib
+import json
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.config.settings import settings
+from app.core.metrics import TRANSLATION_MEMORY_LOOKUPS
+from app.models.translation import TranslationMemoryEntry
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class MemoryEntry:
+    """A translated segment to remember"""
+    key: str
+    source_text: str
+    translation: str
+
+
+class TranslationMemory:
+    """Redis-first translation memory with an optional PostgreSQL backing."""
+
+    KEY_PREFIX = "translation:tm:"
+
+    def __init__(
+        self,
+        redis_client: Any = None,
+        ttl_seconds: Optional[int] = None,
+        persist: Optional[bool] = None,
+        session_factory: Optional[Callable] = None
+    ):
+        self._redis = redis_client
+        self.ttl = ttl_seconds or settings.TRANSLATION_MEMORY_TTL_SECONDS
+        self.persist = settings.TRANSLATION_MEMORY_PERSIST if persist is None else persist
+        self._session_factory = session_factory
+
+    @property
+    def redis(self):
+        if self._redis is not None:
+            return self._redis
+        from app.core.cache import cache_service
+        return cache_service.redis
+
+    @property
+    def session_factory(self) -> Callable:
+        if self._session_factory is not None:
+            return self._session_factory
+        from app.db.session import AsyncSessionLocal
+        return AsyncSessionLocal
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """NFKC + collapsed whitespace; case is kept since it can change the translation"""
+        return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+    @staticmethod
+    def make_key(
+        text: str,
+        source_lang: str,
+        target_lang: str,
+        glossary_version: str,
+        profile: str = ""
+    ) -> str:
+        """
+        Key = (normalized segment, source lang, target lang, glossary version).
+        `profile` carries whatever else changes the output (domain, style, prompt version).
+        """
+        key_data = [TranslationMemory.normalize(text), source_lang, target_lang, glossary_version, profile]
+        return hashlib.sha256(json.dumps(key_data, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    async def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """Look up keys, returning key -> translation for hits only."""
+        if not keys:
+            return {}
+        found: Dict[str, str] = {}
+
+        redis = self.redis
+        if redis:
+            try:
+                values = await redis.mget([f"{self.KEY_PREFIX}{key}" for key in keys])
+                found.update((key, value) for key, value in zip(keys, values) if value is not None)
+            except Exception as e:
+                logger.warning(f"Translation memory Redis lookup failed: {e}")
+
+        missing = [key for key in keys if key not in found]
+        if missing and self.persist:
+            try:
+                async with self.session_factory() as db:
+                    rows = (await db.execute(
+                        select(TranslationMemoryEntry.key, TranslationMemoryEntry.translation)
+                        .where(TranslationMemoryEntry.key.in_(missing))
+                    )).all()
+                backfill = {row.key: row.translation for row in rows}
+                found.update(backfill)
+                await self._write_redis(backfill)
+            except Exception as e:
+                logger.warning(f"Translation memory database lookup failed: {e}")
+
+        TRANSLATION_MEMORY_LOOKUPS.labels(result="hit").inc(len(found))
+        TRANSLATION_MEMORY_LOOKUPS.labels(result="miss").inc(len(keys) - len(found))
+        return found
+
+    async def put_many(
+        self,
+        entries: List[MemoryEntry],
+        source_lang: str,
+        target_lang: str,
+        glossary_version: str
+    ) -> None:
+        """Remember translated segments; failures are logged, never raised."""
+        if not entries:
+            return
+        await self._write_redis({entry.key: entry.translation for entry in entries})
+
+        if not self.persist:
+            return
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    insert(TranslationMemoryEntry)
+                    .values([
+                        {
+                            "key": entry.key,
+                            "source_lang": source_lang,
+                            "target_lang": target_lang,
+                            "glossary_version": glossary_version,
+                            "source_text": entry.source_text,
+                            "translation": entry.translation,
+                        }
+                        for entry in entries
+                    ])
+                    .on_conflict_do_nothing(index_elements=["key"])
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Translation memory database write failed: {e}")
+
+    async def _write_redis(self, translations: Dict[str, str]) -> None:
+        redis = self.redis
+        if not redis or not translations:
+            return
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for key, translation in translations.items():
+                pipe.set(f"{self.KEY_PREFIX}{key}", translation, ex=self.ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Translation memory Redis write failed: {e}")
+
+
+# Singleton instance
+translation_memory = TranslationMemory()
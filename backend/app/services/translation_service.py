@@ -2,13 +2,15 @@
 Translation Service - Focus Translate v2
 
 Provides segment-based translation with caching, glossary support, and timeout handling.
+Segments found in the translation memory cost no LLM call; the rest are packed
+into token-budgeted batches translated concurrently.
 """
 import asyncio
 import hashlib
 import json
 import time
-from typing import List, Optional, Dict, Any
-from dataclasses import dataclass, asdict
+from typing import List, Optional, Dict, Any, Tuple
+from dataclasses import dataclass, asdict, replace
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
@@ -16,9 +18,18 @@ from loguru import logger
 from app.config.settings import settings
 from app.services.llm_service import llm_service
 from app.core.cache import cache_service
+from app.core.metrics import TRANSLATION_LLM_BATCHES
+from app.services.translation_glossary import glossary_store
+from app.services.translation_memory import MemoryEntry, translation_memory
 from app.services.vocabulary_service import vocabulary_service
 
 
+def _estimate_tokens(text: str) -> int:
+    """Rough token count: ~1 token per CJK character, ~4 characters per token otherwise"""
+    cjk = sum(1 for c in text if '\u3040' <= c <= '\u9fff' or '\uac00' <= c <= '\ud7af')
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
 @dataclass
 class TranslationSegment:
     """Input segment for translation"""
@@ -53,7 +64,9 @@ class TranslationService:
     Features:
     - Segment-based translation for better caching
     - L2 cache with stable keys (segmenter_version + prompt_version)
-    - Glossary support for terminology consistency
+    - Segment-level translation memory (Redis, optional PostgreSQL backing)
+    - Packed LLM calls under a token budget, run concurrently under a semaphore
+    - Versioned per-subject glossaries for terminology consistency
     - Timeout fallback for reliability
     """
 
@@ -89,7 +102,8 @@ class TranslationService:
             domain: Domain for terminology ("cs", "math", "business", "general")
             style: Translation style ("concise", "literal", "natural")
             glossary_id: Optional glossary for terminology consistency
-            timeout: Max time per segment (default: 5.0s)
+                ("cs_terms_v1" pins a version, "cs_terms" follows the latest)
+            timeout: Max time per segment; a packed call gets timeout x its segments (default: 5.0s)
             user_id: User ID for quota tracking
             fingerprint: Content hash for signal tracking
             db: Database session for quota check
@@ -107,9 +121,14 @@ class TranslationService:
             except Exception as e:
                 logger.warning(f"Signal evaluation failed: {e}")
 
-        # 1. Check L2 cache (by segment hash)
+        # 1. Resolve the versioned glossary (its version is part of every cache key)
+        glossary = await glossary_store.get(glossary_id) if glossary_id else None
+        glossary_terms = glossary.as_dicts() if glossary else []
+        glossary_version = glossary.glossary_id if glossary else ""
+
+        # 2. Check L2 cache (whole request)
         cache_key = self._generate_cache_key(
-            segments, source_lang, target_lang, domain, style, glossary_id
+            segments, source_lang, target_lang, domain, style, glossary_version or glossary_id
         )
 
         cached = await cache_service.get(cache_key)
@@ -126,56 +145,75 @@ class TranslationService:
                 recommendation=recommendation
             )
 
-        # 2. Load glossary if specified
-        glossary_terms = await self._load_glossary(glossary_id) if glossary_id else []
+        # 3. Segment-level translation memory
+        profile = f"{domain}|{style}|{self.prompt_version}"
+        keys = [
+            translation_memory.make_key(s.text, source_lang, target_lang, glossary_version, profile)
+            for s in segments
+        ]
+        translated: Dict[str, str] = await translation_memory.get_many(list(dict.fromkeys(keys)))
+
+        # 4. Translate cache-missing segments (deduplicated) in packed, concurrent LLM calls
+        pending: Dict[str, TranslationSegment] = {}
+        for key, segment in zip(keys, segments):
+            if key not in translated and key not in pending:
+                pending[key] = segment
+
+        failures: Dict[str, TranslatedSegment] = {}
+        batches = self._pack_batches(list(pending.items()))
+        if batches:
+            semaphore = asyncio.Semaphore(settings.TRANSLATION_LLM_CONCURRENCY)
+            outcomes = await asyncio.gather(*[
+                self._run_batch(
+                    batch, semaphore, source_lang, target_lang,
+                    domain, style, glossary_terms, timeout
+                )
+                for batch in batches
+            ])
+            for done, failed in outcomes:
+                translated.update(done)
+                failures.update(failed)
 
-        # 3. Translate each segment
         translated_segments = []
-        for segment in segments:
-            try:
-                result = await asyncio.wait_for(
-                    self._translate_segment(
-                        segment, source_lang, target_lang,
-                        domain, style, glossary_terms
-                    ),
-                    timeout=timeout
-                )
-                translated_segments.append(result)
-            except asyncio.TimeoutError:
-                logger.warning(f"Translation timeout for segment {segment.id}: {segment.text[:50]}...")
-                # Fallback: simple placeholder
-                translated_segments.append(TranslatedSegment(
-                    id=segment.id,
-                    translation=f"[Translation timeout: {segment.text[:50]}...]",
-                    notes=["Translation service timeout"],
-                    spans=[]
-                ))
-            except Exception as e:
-                logger.error(f"Translation error for segment {segment.id}: {e}")
+        for key, segment in zip(keys, segments):
+            if key in translated:
                 translated_segments.append(TranslatedSegment(
                     id=segment.id,
-                    translation=f"[Translation error: {str(e)}]",
-                    notes=[f"Error: {type(e).__name__}"],
+                    translation=translated[key],
+                    notes=self._terminology_notes(segment.text, glossary_terms),
                     spans=[]
                 ))
+            else:
+                translated_segments.append(replace(failures[key], id=segment.id))
+
+        # 5. Remember new translations and store the whole result
+        await translation_memory.put_many(
+            [
+                MemoryEntry(key=key, source_text=segment.text, translation=translated[key])
+                for key, segment in pending.items()
+                if key in translated
+            ],
+            source_lang, target_lang, glossary_version
+        )
 
-        # 4. Store in cache
         result = TranslationResult(
             segments=translated_segments,
-            provider="llm",  # Or specific provider
-            model_id=llm_service.chat_model,
-            cache_hit=False,
+            provider="llm" if batches else "cache",
+            model_id=llm_service.chat_model if batches else "cached",
+            cache_hit=not batches,
             latency_ms=int((time.time() - start_time) * 1000),
             recommendation=recommendation
         )
 
-        # Cache for 24 hours
-        await cache_service.set(cache_key, {
-            "segments": [asdict(s) for s in translated_segments]
-        }, ttl=86400)
+        # Cache for 24 hours (placeholders from timeouts/errors are never cached)
+        if not failures:
+            await cache_service.set(cache_key, {
+                "segments": [asdict(s) for s in translated_segments]
+            }, ttl=86400)
 
         logger.info(
             f"Translation completed: {len(segments)} segments, "
+            f"{len(segments) - len(pending)} from memory, {len(batches)} LLM calls, "
             f"{result.latency_ms}ms, cache_key={cache_key[:16]}..."
         )
 
@@ -221,6 +259,162 @@ class TranslationService:
             "daily_quota_remaining": quota_remaining
         }
 
+    def _pack_batches(
+        self,
+        items: List[Tuple[str, TranslationSegment]]
+    ) -> List[List[Tuple[str, TranslationSegment]]]:
+        """Pack (key, segment) pairs into batches bounded by token budget and segment count"""
+        batches: List[List[Tuple[str, TranslationSegment]]] = []
+        current: List[Tuple[str, TranslationSegment]] = []
+        tokens = 0
+        for item in items:
+            cost = _estimate_tokens(item[1].text)
+            if current and (
+                tokens + cost > settings.TRANSLATION_BATCH_MAX_TOKENS
+                or len(current) >= settings.TRANSLATION_BATCH_MAX_SEGMENTS
+            ):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append(item)
+            tokens += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _run_batch(
+        self,
+        batch: List[Tuple[str, TranslationSegment]],
+        semaphore: asyncio.Semaphore,
+        source_lang: str,
+        target_lang: str,
+        domain: str,
+        style: str,
+        glossary_terms: List[Dict[str, str]],
+        timeout: float
+    ) -> Tuple[Dict[str, str], Dict[str, TranslatedSegment]]:
+        """Translate one batch; returns (key -> translation, key -> placeholder on failure)"""
+        segments = [segment for _, segment in batch]
+        async with semaphore:
+            try:
+                translations = await asyncio.wait_for(
+                    self._translate_batch(
+                        segments, source_lang, target_lang,
+                        domain, style, glossary_terms
+                    ),
+                    # Same budget per segment as unpacked calls
+                    timeout=timeout * len(segments)
+                )
+                return {key: translation for (key, _), translation in zip(batch, translations)}, {}
+            except asyncio.TimeoutError:
+                logger.warning(f"Translation timeout for {len(segments)} segments: {segments[0].text[:50]}...")
+                return {}, {
+                    key: TranslatedSegment(
+                        id=segment.id,
+                        translation=f"[Translation timeout: {segment.text[:50]}...]",
+                        notes=["Translation service timeout"],
+                        spans=[]
+                    )
+                    for key, segment in batch
+                }
+            except Exception as e:
+                logger.error(f"Translation error for {len(segments)} segments starting at {segments[0].id}: {e}")
+                return {}, {
+                    key: TranslatedSegment(
+                        id=segment.id,
+                        translation=f"[Translation error: {str(e)}]",
+                        notes=[f"Error: {type(e).__name__}"],
+                        spans=[]
+                    )
+                    for key, segment in batch
+                }
+
+    async def _translate_batch(
+        self,
+        segments: List[TranslationSegment],
+        source_lang: str,
+        target_lang: str,
+        domain: str,
+        style: str,
+        glossary_terms: List[Dict[str, str]]
+    ) -> List[str]:
+        """Translate several segments with one LLM call (JSON array in, JSON array out)"""
+        if len(segments) == 1:
+            result = await self._translate_segment(
+                segments[0], source_lang, target_lang, domain, style, glossary_terms
+            )
+            return [result.translation]
+
+        TRANSLATION_LLM_BATCHES.observe(len(segments))
+        texts = [s.text for s in segments]
+        prompt = f"""Translate each {source_lang} text in the JSON array below to {target_lang}.
+Domain: {domain}
+Style: {style}
+{self._glossary_prompt(texts, glossary_terms)}
+
+Texts: {json.dumps(texts, ensure_ascii=False)}
+
+Output ONLY a JSON array of {len(texts)} strings: the translations, in the same order."""
+
+        response = await llm_service.chat(
+            messages=[{"role": "user", "content": prompt}],
+            model=llm_service.chat_model  # Fast model
+        )
+        translations = self._parse_packed_response(response, len(texts))
+        if translations is not None:
+            return translations
+
+        # Malformed packed output: fall back to one call per segment
+        logger.warning(f"Packed translation response unusable for {len(texts)} segments, retrying one by one")
+        translations = []
+        for segment in segments:
+            result = await self._translate_segment(
+                segment, source_lang, target_lang, domain, style, glossary_terms
+            )
+            translations.append(result.translation)
+        return translations
+
+    @staticmethod
+    def _parse_packed_response(response: str, expected: int) -> Optional[List[str]]:
+        """Extract the JSON array of translations, tolerating code fences or surrounding text"""
+        text = (response or "").strip()
+        start, end = text.find("["), text.rfind("]")
+        if start == -1 or end <= start:
+            return None
+        try:
+            translations = json.loads(text[start:end + 1])
+        except ValueError:
+            return None
+        if (
+            not isinstance(translations, list)
+            or len(translations) != expected
+            or not all(isinstance(t, str) for t in translations)
+        ):
+            return None
+        return [t.strip() for t in translations]
+
+    @staticmethod
+    def _glossary_prompt(texts: List[str], glossary_terms: List[Dict[str, str]]) -> str:
+        """Terminology block with the terms that occur in the texts"""
+        lowered = [t.lower() for t in texts]
+        relevant = [
+            term for term in glossary_terms
+            if any(term["source"].lower() in text for text in lowered)
+        ]
+        if not relevant:
+            return ""
+        return "\n\nTerminology:\n" + "\n".join(
+            [f"- {t['source']}: {t['target']}" for t in relevant[:20]]
+        )
+
+    @staticmethod
+    def _terminology_notes(text: str, glossary_terms: List[Dict[str, str]]) -> List[str]:
+        """Extract terminology notes (simple heuristic)"""
+        return [
+            f"{term['source']} = {term['target']}"
+            for term in glossary_terms
+            if term["source"].lower() in text.lower()
+        ]
+
     async def _translate_segment(
         self,
         segment: TranslationSegment,
@@ -232,17 +426,10 @@ class TranslationService:
     ) -> TranslatedSegment:
         """Translate a single segment using LLM"""
 
-        # Build prompt with glossary
-        glossary_text = ""
-        if glossary_terms:
-            glossary_text = "\n\nTerminology:\n" + "\n".join(
-                [f"- {t['source']}: {t['target']}" for t in glossary_terms[:10]]
-            )
-
         prompt = f"""Translate the following {source_lang} text to {target_lang}.
 Domain: {domain}
 Style: {style}
-{glossary_text}
+{self._glossary_prompt([segment.text], glossary_terms)}
 
 Text: {segment.text}
 
@@ -254,18 +441,10 @@ Output ONLY the translation, no explanations."""
             model=llm_service.chat_model  # Fast model
         )
 
-        translation = response.strip()
-
-        # Extract terminology notes (simple heuristic)
-        notes = []
-        for term in glossary_terms:
-            if term["source"].lower() in segment.text.lower():
-                notes.append(f"{term['source']} = {term['target']}")
-
         return TranslatedSegment(
             id=segment.id,
-            translation=translation,
-            notes=notes,
+            translation=response.strip(),
+            notes=self._terminology_notes(segment.text, glossary_terms),
             spans=[]  # TODO: Implement alignment extraction in Phase 2
         )
 
@@ -285,7 +464,7 @@ Output ONLY the translation, no explanations."""
         - Normalized segment text (lowercase, trimmed)
         - Language pair
         - Domain and style
-        - Glossary ID
+        - Glossary ID (with resolved version)
         - Segmenter version
         - Prompt version
         """
@@ -309,32 +488,16 @@ Output ONLY the translation, no explanations."""
 
     async def _load_glossary(self, glossary_id: str) -> List[Dict[str, str]]:
         """
-        Load glossary terms from database or config.
+        Load glossary terms from the versioned glossary store.
 
         Args:
-            glossary_id: Glossary identifier
+            glossary_id: Glossary identifier ("cs_terms_v1" pinned, "cs_terms" latest)
 
         Returns:
             List of term mappings [{"source": "cache", "target": "缓存"}, ...]
         """
-        # TODO: Implement glossary storage in database
-        # For MVP, return built-in CS glossary
-
-        if glossary_id == "cs_terms_v1":
-            return [
-                {"source": "cache", "target": "缓存"},
-                {"source": "database", "target": "数据库"},
-                {"source": "API", "target": "应用程序接口"},
-                {"source": "function", "target": "函数"},
-                {"source": "variable", "target": "变量"},
-                {"source": "loop", "target": "循环"},
-                {"source": "condition", "target": "条件"},
-                {"source": "array", "target": "数组"},
-                {"source": "object", "target": "对象"},
-                {"source": "class", "target": "类"},
-            ]
-
-        return []
+        glossary = await glossary_store.get(glossary_id)
+        return glossary.as_dicts() if glossary else []
 
     def segment_text(self, text: str) -> List[TranslationSegment]:
         """
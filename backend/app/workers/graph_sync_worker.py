@@ -6,14 +6,42 @@
 
 import asyncio
 import json
-from typing import Dict, Any, Optional
+import os
+import socket
+from typing import Dict, Any, List, Optional
 from loguru import logger
 
+from app.config import settings
 from app.core.age_client import get_age_client, init_age
 from app.core.cache import cache_service
+from app.core.event_bus import StreamConsumer
 from app.models.graph_models import KnowledgeVertex
 
 
+def _decode_message(msg_data: Dict[Any, Any]) -> Dict[str, Any]:
+    """stream:graph_sync 条目: type + JSON data"""
+    decoded = {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in msg_data.items()
+    }
+    return {"type": decoded.get("type", ""), "data": json.loads(decoded.get("data") or "{}")}
+
+
+def sync_ordering_keys(message: Dict[str, Any]) -> List[str]:
+    """
+    涉及同一节点/用户的消息按流顺序执行（如先建节点再建边），其余消息并发
+    """
+    data = message.get("data") or {}
+    msg_type = message.get("type")
+    if msg_type == "node_created":
+        return [f"node:{data.get('id')}"]
+    if msg_type == "relation_created":
+        return [f"node:{data.get('source')}", f"node:{data.get('target')}"]
+    if msg_type == "user_status_updated":
+        return [f"node:{data.get('node_id')}", f"user:{data.get('user_id')}"]
+    return []
+
+
 class GraphSyncWorker:
     """图同步 Worker"""
 
@@ -23,7 +51,10 @@ class GraphSyncWorker:
         self.running = False
         self.stream_key = "stream:graph_sync"
         self.group_name = "graph_sync_group"
-        self.consumer_name = "worker_1"
+        # 每个进程独立的消费者名；崩溃进程遗留的挂起消息由其他消费者 XAUTOCLAIM 接管
+        self.consumer_name = f"worker-{socket.gethostname()}-{os.getpid()}"
+        self.consumer: Optional[StreamConsumer] = None
+        self._task: Optional[asyncio.Task] = None
 
     async def start(self):
         """启动 Worker"""
@@ -51,53 +82,34 @@ class GraphSyncWorker:
 
         self.running = True
 
-        # 开始消费
-        asyncio.create_task(self._consume())
+        # 开始消费：批量拉取，按节点/用户键保序并发写入 AGE，批量确认
+        self.consumer = StreamConsumer(
+            self.redis,
+            self.stream_key,
+            self.group_name,
+            self.consumer_name,
+            self._process_message,
+            concurrency=settings.EVENT_BUS_CONCURRENCY,
+            key_fn=sync_ordering_keys,
+            parse=_decode_message,
+            block_ms=5000,
+        )
+        self._task = asyncio.create_task(self.consumer.run())
 
     async def stop(self):
         """停止 Worker"""
         logger.info("🛑 停止图同步 Worker...")
         self.running = False
+        if self.consumer:
+            self.consumer.stop()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
 
-    async def _consume(self):
-        """消费消息"""
-        logger.info("开始消费同步消息...")
-
-        while self.running:
-            try:
-                # 读取消息（阻塞 5 秒）
-                messages = await self.redis.xreadgroup(
-                    self.group_name,
-                    self.consumer_name,
-                    {self.stream_key: ">"},  # 从未确认的消息开始
-                    count=10,
-                    block=5000
-                )
-
-                if not messages:
-                    continue
-
-                for stream, msg_list in messages:
-                    for msg_id, msg_data in msg_list:
-                        try:
-                            # 处理消息
-                            await self._process_message(msg_id, msg_data)
-                        except Exception as e:
-                            logger.error(f"处理消息失败 {msg_id}: {e}")
-                            # 可以选择重试或移到死信队列
-
-            except asyncio.CancelledError:
-                logger.info("Worker 被取消")
-                break
-            except Exception as e:
-                logger.error(f"消费循环错误: {e}")
-                await asyncio.sleep(1)  # 避免快速重试
-
-    async def _process_message(self, msg_id: bytes, msg_data: Dict[bytes, bytes]):
-        """处理单条消息"""
-        # 解析消息
-        msg_type = msg_data[b"type"].decode('utf-8')
-        data = json.loads(msg_data[b"data"].decode('utf-8'))
+    async def _process_message(self, message: Dict[str, Any]):
+        """处理单条消息（抛出异常则不确认，稍后由 XAUTOCLAIM 重试）"""
+        msg_type = message["type"]
+        data = message["data"]
 
         logger.debug(f"处理消息: {msg_type} - {data.get('id', 'N/A')}")
 
@@ -111,10 +123,6 @@ class GraphSyncWorker:
             else:
                 logger.warning(f"未知消息类型: {msg_type}")
 
-            # 确认消息已处理
-            await self.redis.xack(self.stream_key, self.group_name, msg_id)
-            logger.debug(f"消息已确认: {msg_id}")
-
         except Exception as e:
             logger.error(f"处理消息 {msg_type} 失败: {e}")
             # 不确认消息，稍后重试
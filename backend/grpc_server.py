@@ -27,6 +27,7 @@ from app.gen.galaxy.v1 import galaxy_service_pb2, galaxy_service_pb2_grpc
 from app.gen.proto.error_book import error_book_pb2, error_book_pb2_grpc
 from app.services.agent_grpc_service import AgentServiceImpl
 from app.services.galaxy_grpc_service import GalaxyGrpcServiceImpl
+from app.services.galaxy.collaborative_sessions import collaborative_sessions
 from app.services.error_book_grpc_service import ErrorBookGrpcServiceImpl
 from app.api.grpc_auth import AuthInterceptor
 from app.core.cache import cache_service
@@ -64,6 +65,7 @@ class GracefulShutdown:
 
         logger.info("Stopping gRPC server...")
         await self.server.stop(grace=5.0)  # 5 秒优雅关闭
+        await collaborative_sessions.stop()  # 交还协作文档所有权
         await cache_service.close()
         logger.info("gRPC server stopped successfully")
 
@@ -113,6 +115,7 @@ async def serve():
         galaxy_service_pb2_grpc.add_GalaxyServiceServicer_to_server(
             GalaxyGrpcServiceImpl(db_session_factory=AsyncSessionLocal), server
         )
+        await collaborative_sessions.start(AsyncSessionLocal)
         logger.info("Registered GalaxyService (gRPC)")
 
     if settings.DEBUG or settings.GRPC_ENABLE_REFLECTION:
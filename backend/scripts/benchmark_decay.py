@@ -0,0 +1,82 @@
+"""
+每日遗忘衰减基准测试
+
+在合成数据上对比逐行 Python 计算 (DecayService._calculate_decay) 与
+分片 NumPy 向量化计算 (DecayService.decay_kernel) 的吞吐量，并校验两者结果一致。
+
+用法:
+    python scripts/benchmark_decay.py --rows 10000000
+    python scripts/benchmark_decay.py --rows 1000000 --scalar-sample 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.decay_service import DecayService
+
+
+def synthesize(rows: int, seed: int):
+    """生成合成的 (mastery_score, days_elapsed) 数据"""
+    rng = np.random.default_rng(seed)
+    mastery = rng.uniform(DecayService.MIN_MASTERY, 100.0, size=rows)
+    days = rng.integers(1, 120, size=rows).astype(np.float64)
+    return mastery, days
+
+
+def bench_scalar(mastery: np.ndarray, days: np.ndarray) -> float:
+    service = DecayService(db=None)
+    mastery_list = mastery.tolist()
+    days_list = days.astype(int).tolist()
+    start = time.perf_counter()
+    for m, d in zip(mastery_list, days_list):
+        service._calculate_decay(m, d)
+    return time.perf_counter() - start
+
+
+def bench_vectorized(mastery: np.ndarray, days: np.ndarray, batch_size: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, len(mastery), batch_size):
+        chunk_mastery = mastery[offset:offset + batch_size]
+        new_mastery = DecayService.decay_kernel(chunk_mastery, days[offset:offset + batch_size])
+        # 与 apply_daily_decay 相同的统计开销
+        np.count_nonzero((chunk_mastery >= DecayService.THRESHOLD_DIM) & (new_mastery < DecayService.THRESHOLD_DIM))
+        np.count_nonzero(new_mastery < DecayService.THRESHOLD_COLLAPSE)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark daily decay kernels on synthetic data")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch-size", type=int, default=DecayService.DECAY_BATCH_SIZE)
+    parser.add_argument("--scalar-sample", type=int, default=200_000,
+                        help="逐行基线只跑样本并按比例外推，避免 10M 行耗时过长")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    mastery, days = synthesize(args.rows, args.seed)
+
+    sample = min(args.scalar_sample, args.rows)
+    scalar_sample_time = bench_scalar(mastery[:sample], days[:sample])
+    scalar_time = scalar_sample_time * args.rows / sample
+
+    vectorized_time = bench_vectorized(mastery, days, args.batch_size)
+
+    service = DecayService(db=None)
+    check = min(10_000, args.rows)
+    expected = [service._calculate_decay(m, int(d)) for m, d in zip(mastery[:check], days[:check])]
+    np.testing.assert_allclose(DecayService.decay_kernel(mastery[:check], days[:check]), expected, rtol=1e-12)
+
+    print(f"rows={args.rows:,} batch_size={args.batch_size}")
+    print(f"  per-row python : {scalar_time:8.2f}s  ({args.rows / scalar_time:,.0f} rows/s, "
+          f"extrapolated from {sample:,} rows)")
+    print(f"  numpy chunks   : {vectorized_time:8.2f}s  ({args.rows / vectorized_time:,.0f} rows/s)")
+    print(f"  speedup        : {scalar_time / vectorized_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
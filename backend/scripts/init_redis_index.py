@@ -39,6 +39,10 @@ async def init_index():
         TextField("$.parent_name", as_name="parent_name"),
         NumericField("$.subject_id", as_name="subject_id"),
         NumericField("$.importance", as_name="importance"),
+        # Pre-filter fields (SearchFilter): 学科大类、归属用户 (public 为公共知识)、发布状态
+        TagField("$.sector", as_name="sector"),
+        TagField("$.owner_id", as_name="owner_id"),
+        TagField("$.status", as_name="status"),
         # Vector Field Definition
         VectorField(
             "$.vector",
@@ -6,13 +6,14 @@ from loguru import logger
 # 添加项目根目录到 python 路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app.config import settings
 from app.services.billing_worker import BillingWorker
 
 async def main():
     logger.info("Starting Token Billing Worker...")
     worker = BillingWorker(
-        batch_size=int(os.getenv("BILLING_BATCH_SIZE", "10")),
-        flush_interval=int(os.getenv("BILLING_FLUSH_INTERVAL", "5"))
+        batch_size=int(os.getenv("BILLING_BATCH_SIZE", settings.BILLING_BATCH_SIZE)),
+        flush_interval=float(os.getenv("BILLING_FLUSH_INTERVAL", settings.BILLING_FLUSH_INTERVAL))
     )
     
     try:
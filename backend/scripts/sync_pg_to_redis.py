@@ -8,6 +8,7 @@ import logging
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sqlalchemy import select
+from sqlalchemy.orm import selectinload
 from redis.asyncio import Redis
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from loguru import logger
@@ -16,6 +17,7 @@ from app.db.session import AsyncSessionLocal
 from app.models.galaxy import KnowledgeNode
 from app.services.embedding_service import embedding_service
 from app.config import settings
+from app.core.redis_search_client import PUBLIC_OWNER
 from app.core.redis_utils import resolve_redis_password
 
 # Configure logging
@@ -39,7 +41,11 @@ async def sync_data():
     # 2. Connect to Postgres & Fetch Nodes
     logger.info("📦 Fetching KnowledgeNodes from DB...")
     async with AsyncSessionLocal() as session:
-        stmt = select(KnowledgeNode).where(KnowledgeNode.description.isnot(None))
+        stmt = (
+            select(KnowledgeNode)
+            .options(selectinload(KnowledgeNode.subject), selectinload(KnowledgeNode.source_file))
+            .where(KnowledgeNode.description.isnot(None))
+        )
         result = await session.execute(stmt)
         nodes = result.scalars().all()
     
@@ -61,6 +67,9 @@ async def sync_data():
             continue
             
         chunks = text_splitter.split_text(node.description)
+        # 文档导入的节点归属上传者，其余为公共知识
+        owner_id = str(node.source_file.user_id) if node.source_file else PUBLIC_OWNER
+        sector = node.subject.sector_code if node.subject else "VOID"
         
         # Batch embedding if possible, but embedding_service handles batching?
         # embedding_service.batch_embeddings takes a list of strings.
@@ -84,6 +93,9 @@ async def sync_data():
                 "keywords": f"{node.name} {node.keywords if node.keywords else ''}",
                 "subject_id": node.subject_id if node.subject_id else 0,
                 "importance": node.importance_level,
+                "sector": sector,
+                "owner_id": owner_id,
+                "status": node.status or "published",
                 "vector": vector
             }
             
@@ -6,16 +6,21 @@
 
 import asyncio
 import json
+import time
 import uuid
-from typing import List, Optional, Dict, Any
+from collections import defaultdict
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 
 from loguru import logger
+from sqlalchemy import and_, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.core.age_client import get_age_client
 from app.models.galaxy import KnowledgeNode, NodeRelation
 from app.models.graph_models import KnowledgeVertex, RelationEdge
+from app.models.subject import Subject
 from app.services.knowledge_service import KnowledgeService
 from app.core.cache import cache_service
 
@@ -292,87 +297,195 @@ class GraphKnowledgeService:
             logger.warning(f"获取兴趣图谱失败: {e}")
             return {"error": str(e)}
 
-    async def sync_all_to_age(self):
+    # ==================== PG → AGE 批量同步 ====================
+
+    AGE_WATERMARK_KEY = "graph_sync:age:watermark:{kind}"
+
+    _NODE_COLUMNS = (
+        KnowledgeNode.id, KnowledgeNode.name, KnowledgeNode.description,
+        KnowledgeNode.importance_level, KnowledgeNode.keywords,
+        KnowledgeNode.source_type, KnowledgeNode.created_at,
+        KnowledgeNode.updated_at, KnowledgeNode.deleted_at,
+        Subject.sector_code,
+    )
+    _RELATION_COLUMNS = (
+        NodeRelation.id, NodeRelation.source_node_id, NodeRelation.target_node_id,
+        NodeRelation.relation_type, NodeRelation.strength, NodeRelation.created_by,
+        NodeRelation.updated_at, NodeRelation.deleted_at,
+    )
+
+    async def sync_all_to_age(
+        self,
+        page_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> Dict[str, Any]:
         """
         全量同步（一次性任务）
 
-        用于初始迁移或数据修复
+        用于初始迁移或数据修复。按主键 keyset 分页读取（不使用 OFFSET），
+        每批行合成一条 UNWIND ... MERGE 语句，在 AGE 连接池上有界并发写入。
+        MERGE 保证重复执行幂等；同步完成后把增量水位推进到本次开始时刻。
         """
-        logger.info("开始全量同步到 AGE...")
-
-        # 同步节点
-        offset = 0
-        batch_size = 100
+        return await self._bulk_sync(full=True, page_size=page_size,
+                                     batch_size=batch_size, concurrency=concurrency)
 
-        while True:
-            result = await self.db.execute(
-                select(KnowledgeNode)
-                .limit(batch_size)
-                .offset(offset)
-            )
-            nodes = result.scalars().all()
-
-            if not nodes:
-                break
+    async def sync_incremental_to_age(
+        self,
+        page_size: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        增量同步
 
-            for node in nodes:
-                await self._sync_node_to_age(node)
+        以 (updated_at, id) 水位为游标，只同步上次之后变化的节点和关系；
+        软删除的行在 AGE 中同步删除。水位按批推进并存入 Redis，中断后可续跑。
+        """
+        return await self._bulk_sync(full=False, page_size=page_size,
+                                     batch_size=batch_size, concurrency=concurrency)
 
-            offset += batch_size
-            logger.info(f"已同步 {offset} 个节点...")
+    async def _bulk_sync(
+        self,
+        full: bool,
+        page_size: Optional[int],
+        batch_size: Optional[int],
+        concurrency: Optional[int],
+    ) -> Dict[str, Any]:
+        page_size = page_size or settings.AGE_SYNC_PAGE_SIZE
+        batch_size = batch_size or settings.AGE_SYNC_BATCH_SIZE
+        concurrency = concurrency or settings.AGE_SYNC_CONCURRENCY
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+        stats = {"mode": "full" if full else "incremental", "nodes": 0, "relations": 0,
+                 "deleted_nodes": 0, "deleted_relations": 0, "statements": 0}
+
+        logger.info(f"开始{'全量' if full else '增量'}同步到 AGE...")
+        await self.age_client.ensure_property_index("KnowledgeNode")
+
+        # 节点必须先于关系写入：边的 MATCH 依赖端点顶点已存在
+        for kind in ("nodes", "relations"):
+            watermark = None if full else await self._load_watermark(kind)
+            async for rows, last in self._iter_sync_pages(kind, watermark, page_size, full):
+                statements = self._build_sync_statements(kind, rows, batch_size, stats)
+                stats["statements"] += await self.age_client.execute_cypher_many(statements, concurrency)
+                if not full:
+                    await self._save_watermark(kind, last)
+            logger.info(f"AGE 同步 {kind} 完成: {stats}")
+
+        if full:
+            # 全量结果覆盖开始时刻之前的所有变更
+            for kind in ("nodes", "relations"):
+                await self._save_watermark(kind, (started_at, None))
+
+        stats["elapsed_ms"] = int((time.perf_counter() - start) * 1000)
+        logger.info(f"AGE 同步完成: {stats}")
+        return stats
+
+    async def _iter_sync_pages(self, kind: str, watermark: Optional[Tuple[datetime, Optional[str]]],
+                               page_size: int, full: bool):
+        """keyset 分页：全量按 id，增量按 (updated_at, id)"""
+        model = KnowledgeNode if kind == "nodes" else NodeRelation
+        columns = self._NODE_COLUMNS if kind == "nodes" else self._RELATION_COLUMNS
+        last_id: Optional[uuid.UUID] = None
+        last_ts: Optional[datetime] = watermark[0] if watermark else None
+        if watermark and watermark[1]:
+            last_id = uuid.UUID(watermark[1])
 
-        # 同步关系
-        offset = 0
         while True:
-            result = await self.db.execute(
-                select(NodeRelation)
-                .limit(batch_size)
-                .offset(offset)
+            query = select(*columns).select_from(model).limit(page_size)
+            if kind == "nodes":
+                # 星域来自学科 (sync_pg_to_redis 同样取 subject.sector_code)
+                query = query.outerjoin(Subject, KnowledgeNode.subject_id == Subject.id)
+            if full:
+                query = query.where(model.deleted_at.is_(None)).order_by(model.id)
+                if last_id is not None:
+                    query = query.where(model.id > last_id)
+            else:
+                query = query.order_by(model.updated_at, model.id)
+                if last_ts is not None:
+                    cursor = model.updated_at > last_ts
+                    if last_id is not None:
+                        cursor = or_(cursor, and_(model.updated_at == last_ts, model.id > last_id))
+                    else:
+                        cursor = or_(cursor, model.updated_at == last_ts)
+                    query = query.where(cursor)
+
+            rows = (await self.db.execute(query)).all()
+            if not rows:
+                return
+            last_id, last_ts = rows[-1].id, rows[-1].updated_at
+            yield rows, (last_ts, str(last_id))
+            if len(rows) < page_size:
+                return
+
+    def _build_sync_statements(self, kind: str, rows, batch_size: int, stats: Dict[str, Any]) -> List[str]:
+        """把一页行拆成若干 UNWIND 语句（边按类型分组，类型无法参数化）"""
+        statements: List[str] = []
+
+        def _chunks(items):
+            for offset in range(0, len(items), batch_size):
+                yield items[offset:offset + batch_size]
+
+        if kind == "nodes":
+            upserts = [
+                KnowledgeVertex(
+                    id=str(row.id),
+                    name=row.name,
+                    description=row.description or "",
+                    importance=row.importance_level or 1,
+                    sector=row.sector_code or "VOID",
+                    keywords=row.keywords or [],
+                    source_type=row.source_type or "seed",
+                    created_at=row.created_at or datetime.utcnow(),
+                ).to_dict()
+                for row in rows if row.deleted_at is None
+            ]
+            deletes = [str(row.id) for row in rows if row.deleted_at is not None]
+            statements.extend(self.age_client.build_merge_vertices("KnowledgeNode", chunk) for chunk in _chunks(upserts))
+            statements.extend(self.age_client.build_delete_vertices("KnowledgeNode", chunk) for chunk in _chunks(deletes))
+            stats["nodes"] += len(upserts)
+            stats["deleted_nodes"] += len(deletes)
+            return statements
+
+        upserts_by_type: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        deletes_by_type: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for row in rows:
+            edge = {"source": str(row.source_node_id), "target": str(row.target_node_id)}
+            label = row.relation_type.upper()
+            if row.deleted_at is not None:
+                deletes_by_type[label].append(edge)
+                stats["deleted_relations"] += 1
+            else:
+                edge.update(strength=str(row.strength), created_by=row.created_by or "seed")
+                upserts_by_type[label].append(edge)
+                stats["relations"] += 1
+        for label, edges in upserts_by_type.items():
+            statements.extend(
+                self.age_client.build_merge_edges("KnowledgeNode", "KnowledgeNode", label, chunk)
+                for chunk in _chunks(edges)
             )
-            relations = result.scalars().all()
-
-            if not relations:
-                break
-
-            for rel in relations:
-                await self._sync_relation_to_age(rel)
-
-            offset += batch_size
-            logger.info(f"已同步 {offset} 条关系...")
-
-        logger.info("全量同步完成")
-
-    async def _sync_node_to_age(self, node: KnowledgeNode):
-        """同步单个节点到 AGE"""
-        try:
-            vertex = KnowledgeVertex(
-                id=str(node.id),
-                name=node.name,
-                description=node.description or "",
-                importance=node.importance_level or 1,
-                sector=node.sector_code or "VOID",
-                keywords=node.keywords or [],
-                source_type=node.source_type or "seed",
-                created_at=node.created_at
-            )
-
-            await self.age_client.add_vertex("KnowledgeNode", vertex.to_dict())
-        except Exception as e:
-            logger.warning(f"同步节点到 AGE 失败 {node.id}: {e}")
-
-    async def _sync_relation_to_age(self, rel: NodeRelation):
-        """同步单个关系到 AGE"""
-        try:
-            await self.age_client.add_edge(
-                from_label="KnowledgeNode",
-                from_props={"id": str(rel.source_node_id)},
-                to_label="KnowledgeNode",
-                to_props={"id": str(rel.target_node_id)},
-                edge_label=rel.relation_type.upper(),
-                edge_props={
-                    "strength": str(rel.strength),
-                    "created_by": rel.created_by or "seed"
-                }
+        for label, edges in deletes_by_type.items():
+            statements.extend(
+                self.age_client.build_delete_edges("KnowledgeNode", "KnowledgeNode", label, chunk)
+                for chunk in _chunks(edges)
             )
-        except Exception as e:
-            logger.warning(f"同步关系到 AGE 失败 {rel.id}: {e}")
+        return statements
+
+    async def _load_watermark(self, kind: str) -> Optional[Tuple[datetime, Optional[str]]]:
+        if not self.redis:
+            return None
+        raw = await self.redis.get(self.AGE_WATERMARK_KEY.format(kind=kind))
+        if not raw:
+            return None
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["updated_at"]), data.get("id")
+
+    async def _save_watermark(self, kind: str, watermark: Tuple[datetime, Optional[str]]):
+        if not self.redis:
+            return
+        updated_at, last_id = watermark
+        await self.redis.set(
+            self.AGE_WATERMARK_KEY.format(kind=kind),
+            json.dumps({"updated_at": updated_at.isoformat(), "id": last_id}),
+        )
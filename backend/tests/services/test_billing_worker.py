@@ -0,0 +1,120 @@
+# Test: Billing Worker (batched pull, idempotent persistence)
+
+import json
+import time
+import uuid
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models.chat import TokenUsage
+from app.services.billing_worker import BillingWorker, QUEUE_KEY
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(TokenUsage.__table__.create)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+def _redis(pulled=None):
+    client = MagicMock()
+    client.register_script = MagicMock(side_effect=[
+        AsyncMock(return_value=[0, pulled or []]),  # pull
+        AsyncMock(return_value=0),                  # requeue
+    ])
+    client.delete = AsyncMock()
+    client.rpush = AsyncMock()
+    return client
+
+
+def _record(request_id, user_id=None, tokens=10):
+    return {
+        "user_id": str(user_id or uuid.uuid4()), "session_id": "s1", "request_id": request_id,
+        "prompt_tokens": tokens, "completion_tokens": 0, "total_tokens": tokens,
+        "model": "gpt-4", "cost": None, "timestamp": time.time(),
+    }
+
+
+async def _count(session_factory):
+    async with session_factory() as session:
+        return (await session.execute(select(func.count()).select_from(TokenUsage))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_pull_and_flush_dedupes_redelivered_records(session_factory):
+    items = [json.dumps(_record("r1")), json.dumps(_record("r2")), json.dumps(_record("r1")), "not-json"]
+    redis_client = _redis(items)
+    worker = BillingWorker(redis_client=redis_client, session_factory=session_factory,
+                           batch_size=10, worker_id="w1")
+
+    assert await worker._pull_batch(10) == 4
+    worker._pull.assert_awaited_once_with(keys=[QUEUE_KEY, "queue:billing:processing:w1"], args=[10])
+    await worker._flush_to_db()
+
+    assert await _count(session_factory) == 2
+    redis_client.delete.assert_awaited_once_with("queue:billing:processing:w1")
+
+    # 重新投递（例如提交后、确认前崩溃）不会产生重复行
+    worker._batch = [_record("r1"), _record("r3")]
+    await worker._flush_to_db()
+    assert await _count(session_factory) == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_records_unacknowledged(session_factory, monkeypatch):
+    redis_client = _redis()
+    worker = BillingWorker(redis_client=redis_client, session_factory=session_factory, worker_id="w1")
+    worker._persist = AsyncMock(side_effect=RuntimeError("db down"))
+    sleep = AsyncMock()
+    monkeypatch.setattr("app.services.billing_worker.asyncio.sleep", sleep)
+    worker._heartbeat = AsyncMock()
+
+    worker._batch = [_record("r1")]
+    await worker._flush_to_db()
+
+    assert len(worker._batch) == 1
+    redis_client.delete.assert_not_awaited()
+
+    # 退避时长达到心跳 TTL 时，分段休眠并在每段之间续期心跳
+    worker.heartbeat_ttl = 30
+    worker._attempts = 4
+    sleep.reset_mock()
+    worker._heartbeat.reset_mock()
+    await worker._flush_to_db()
+    delays = [call.args[0] for call in sleep.await_args_list]
+    assert sum(delays) == 30 and max(delays) <= 10
+    assert worker._heartbeat.await_count == len(delays)
+
+
+@pytest.mark.asyncio
+async def test_poison_record_goes_to_dead_letter_after_max_attempts(session_factory, monkeypatch):
+    redis_client = _redis()
+    worker = BillingWorker(redis_client=redis_client, session_factory=session_factory, worker_id="w1")
+    worker.max_attempts = 1
+    real_persist = worker._persist
+
+    async def persist(rows):
+        if any(r["request_id"] == "bad" for r in rows):
+            raise ValueError("constraint violation")
+        return await real_persist(rows)
+
+    worker._persist = persist
+    worker._batch = [_record("good"), _record("bad")]
+    await worker._flush_to_db()
+
+    assert await _count(session_factory) == 1
+    dead = redis_client.rpush.await_args.args
+    assert dead[0] == "queue:billing:dead" and json.loads(dead[1])["request_id"] == "bad"
+    redis_client.delete.assert_awaited_once()
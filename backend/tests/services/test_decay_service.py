@@ -0,0 +1,116 @@
+# Test: Decay Service (set-based daily decay)
+
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from unittest.mock import AsyncMock
+
+from app.models.galaxy import UserNodeStatus
+from app.services.decay_service import DecayService
+
+
+@pytest_asyncio.fixture
+async def db():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(UserNodeStatus.__table__.create)
+    async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+def _status(mastery, days_ago, **kwargs):
+    now = datetime.utcnow()
+    return UserNodeStatus(
+        user_id=kwargs.pop("user_id", uuid.uuid4()),
+        node_id=uuid.uuid4(),
+        mastery_score=mastery,
+        is_unlocked=kwargs.pop("is_unlocked", True),
+        decay_paused=kwargs.pop("decay_paused", False),
+        is_collapsed=kwargs.pop("is_collapsed", False),
+        last_study_at=now - timedelta(days=days_ago, hours=1),
+        last_interacted_at=now,
+        created_at=now,
+        updated_at=now,
+        **kwargs,
+    )
+
+
+def test_decay_kernel_matches_scalar_formula():
+    service = DecayService(db=None)
+    rng = random.Random(7)
+    mastery = np.array([rng.uniform(0, 100) for _ in range(500)])
+    days = np.array([rng.randint(1, 90) for _ in range(500)], dtype=np.float64)
+
+    vectorized = DecayService.decay_kernel(mastery, days)
+    scalar = [service._calculate_decay(m, int(d)) for m, d in zip(mastery, days)]
+
+    np.testing.assert_allclose(vectorized, scalar, rtol=1e-12)
+
+
+@pytest.mark.asyncio
+async def test_apply_daily_decay_in_chunks(db):
+    rows = [
+        _status(80.0, 3),
+        _status(21.0, 10),   # dims below 20
+        _status(12.0, 5),    # drops below collapse threshold
+        _status(12.0, 5, is_collapsed=True),
+        _status(50.0, 4),
+        _status(90.0, 5, decay_paused=True),
+        _status(60.0, 6, decay_paused=None),  # legacy row: NULL means not paused
+        _status(90.0, 5, is_unlocked=False),
+        _status(90.0, 0),    # studied today
+        _status(5.0, 30),    # already at floor
+    ]
+    expected = {(r.user_id, r.node_id): r.mastery_score for r in rows}
+    db.add_all(rows)
+    await db.commit()
+
+    service = DecayService(db)
+    stats = await service.apply_daily_decay(batch_size=2)
+
+    assert stats == {"processed": 6, "dimmed": 1, "collapsed": 1}
+
+    result = await db.execute(select(UserNodeStatus))
+    for status in result.scalars():
+        before = expected[(status.user_id, status.node_id)]
+        if status.decay_paused or not status.is_unlocked or before <= service.MIN_MASTERY \
+                or status.last_study_at > datetime.utcnow() - timedelta(days=1):
+            assert status.mastery_score == before
+        else:
+            days = (datetime.utcnow() - status.last_study_at).days
+            assert status.mastery_score == pytest.approx(service._calculate_decay(before, days))
+
+
+@pytest.mark.asyncio
+async def test_completed_checkpoint_is_not_reapplied(db):
+    db.add(_status(80.0, 3))
+    await db.commit()
+
+    store = {}
+    redis = AsyncMock()
+    redis.get.side_effect = lambda key: store.get(key)
+    redis.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value)
+
+    service = DecayService(db, redis_client=redis)
+    first = await service.apply_daily_decay()
+    second = await service.apply_daily_decay()
+
+    assert first == second == {"processed": 1, "dimmed": 0, "collapsed": 0}
+    checkpoint = json.loads(next(iter(store.values())))
+    assert checkpoint["completed"] is True
+
+    status = (await db.execute(select(UserNodeStatus))).scalar_one()
+    assert status.mastery_score == pytest.approx(service._calculate_decay(80.0, 3))
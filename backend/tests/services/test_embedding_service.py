@@ -0,0 +1,106 @@
+# Test: Embedding Service (request coalescing + content-hash cache)
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services.embedding_service import EmbeddingService
+
+
+def _fake_request(texts):
+    return [[float(len(text)), 1.0] for text in texts]
+
+
+@pytest.fixture
+def service():
+    svc = EmbeddingService()
+    svc.coalesce_window = 0.005
+    return svc
+
+
+@pytest.mark.asyncio
+async def test_concurrent_get_embedding_coalesced_into_one_request(service):
+    request = AsyncMock(side_effect=_fake_request)
+    with patch.object(service, "_request_embeddings", request), \
+         patch.object(service, "_get_redis", return_value=None):
+        results = await asyncio.gather(
+            service.get_embedding("what is entropy"),
+            service.get_embedding("what  is entropy "),
+            service.get_embedding("define enthalpy"),
+        )
+
+    request.assert_awaited_once()
+    assert sorted(request.call_args.args[0]) == ["define enthalpy", "what is entropy"]
+    assert results[0] == results[1]
+    assert results[2] == [15.0, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_cached_text_is_never_embedded_twice(service):
+    request = AsyncMock(side_effect=_fake_request)
+    with patch.object(service, "_request_embeddings", request), \
+         patch.object(service, "_get_redis", return_value=None):
+        first = await service.get_embedding("photosynthesis")
+        second = await service.get_embedding("photosynthesis")
+        batch = await service.batch_embeddings(["photosynthesis", "osmosis", "osmosis"])
+
+    assert first == second == batch[0]
+    assert batch[1] == batch[2]
+    assert request.await_count == 2
+    assert request.call_args.args[0] == ["osmosis"]
+    assert service.stats["local_hits"] >= 2
+
+
+@pytest.mark.asyncio
+async def test_batch_embeddings_reads_redis_before_calling_api(service):
+    redis = AsyncMock()
+    redis.mget.return_value = [service._encode_vector([0.5, 0.25]), None]
+    request = AsyncMock(side_effect=_fake_request)
+    with patch.object(service, "_request_embeddings", request), \
+         patch.object(service, "_get_redis", return_value=redis), \
+         patch.object(service, "_cache_store", AsyncMock()):
+        result = await service.batch_embeddings(["cached", "fresh"])
+
+    assert result == [[0.5, 0.25], [5.0, 1.0]]
+    request.assert_awaited_once_with(["fresh"])
+
+
+@pytest.mark.asyncio
+async def test_coalesced_failure_propagates_to_all_waiters(service):
+    request = AsyncMock(side_effect=RuntimeError("upstream down"))
+    with patch.object(service, "_request_embeddings", request), \
+         patch.object(service, "_get_redis", return_value=None):
+        results = await asyncio.gather(
+            service.get_embedding("a"),
+            service.get_embedding("b"),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    request.assert_awaited_once()
+
+
+def test_client_is_closed_before_its_event_loop_ends():
+    # Celery tasks run each job in a fresh asyncio.run loop
+    service = EmbeddingService()
+
+    async def use_client():
+        return service._get_client()
+
+    first = asyncio.run(use_client())
+    assert first.is_closed
+
+    second = asyncio.run(use_client())
+    assert second is not first and second.is_closed
+
+
+@pytest.mark.asyncio
+async def test_close_releases_client_and_guard(service):
+    client = service._get_client()
+    guard = service._client_guard
+
+    await service.close()
+    await asyncio.sleep(0)
+
+    assert client.is_closed and guard.done()
+    assert service._client is None and service._client_guard is None
@@ -0,0 +1,254 @@
+# Test: streaming ingestion pipeline
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.core.ingestion.ingestion_service import iter_ordered
+from app.services.document_service import PageChunks, VectorChunk
+from app.services.file_processing_orchestrator import FileProcessingOrchestrator
+
+
+def test_iter_ordered_yields_in_order_with_bounded_window():
+    in_flight, peak = 0, 0
+    lock = threading.Lock()
+
+    def work(i):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.001 * (5 - i % 5))  # later pages finish first
+        with lock:
+            in_flight -= 1
+        return i
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(iter_ordered(executor, work, [(i,) for i in range(20)], window=4))
+
+    assert results == list(range(20))
+    assert peak <= 4
+
+
+def test_thread_workers_get_their_own_pdf_handle(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.core.ingestion import ingestion_service as module
+
+    opened = []
+
+    def fake_open(path):
+        pdf = SimpleNamespace(owner=threading.get_ident(), closed=False, pages=list(range(40)))
+        pdf.close = lambda: setattr(pdf, "closed", True)
+        opened.append(pdf)
+        return pdf
+
+    def extract(page, i):
+        time.sleep(0.001)
+        # The handle used for this page belongs to the calling thread
+        assert module._open_pdf("doc.pdf").owner == threading.get_ident()
+        return i
+
+    monkeypatch.setattr(module, "pdfplumber", SimpleNamespace(open=fake_open), raising=False)
+    monkeypatch.setattr(module.ingestion_service, "_extract_page", extract)
+
+    executor = ThreadPoolExecutor(max_workers=4)
+    try:
+        results = list(iter_ordered(executor, module._extract_pdf_page, [("doc.pdf", i) for i in range(40)], window=8))
+    finally:
+        executor.shutdown(wait=True)
+        module._release_pdf("doc.pdf")
+
+    assert results == list(range(40))
+    assert 1 <= len(opened) <= 4
+    assert len({pdf.owner for pdf in opened}) == len(opened)
+    assert all(pdf.closed for pdf in opened)
+    assert "doc.pdf" not in module._OPENED_PDFS
+
+
+@pytest.mark.asyncio
+async def test_chunk_pipeline_embeds_and_stores_while_streaming(monkeypatch):
+    pages = [
+        PageChunks(i, 3, [VectorChunk(content=f"page {i} chunk {j}", page_numbers=[i + 1], section_title=None)
+                          for j in range(5)])
+        for i in range(3)
+    ]
+
+    async def stream(_path):
+        for page in pages:
+            yield page
+
+    monkeypatch.setattr("app.services.file_processing_orchestrator.settings.INGEST_EMBED_BATCH_SIZE", 4)
+    monkeypatch.setattr("app.services.file_processing_orchestrator.settings.INGEST_EMBED_CONCURRENCY", 2)
+    monkeypatch.setattr("app.services.file_processing_orchestrator.document_service.stream_vector_chunks", stream)
+    embed = AsyncMock(side_effect=lambda texts: [[float(len(t))] for t in texts])
+    monkeypatch.setattr("app.services.file_processing_orchestrator.embedding_service.batch_embeddings", embed)
+
+    orchestrator = FileProcessingOrchestrator(AsyncMock())
+    stored = []
+    orchestrator._store_chunks = AsyncMock(side_effect=lambda f, u, batch, *_: stored.extend(batch))
+    orchestrator._publish_status = AsyncMock()
+
+    chunks = await orchestrator._run_chunk_pipeline(uuid.uuid4(), uuid.uuid4(), "/tmp/doc.pdf")
+
+    assert len(chunks) == 15
+    assert sorted(index for index, _ in stored) == list(range(15))
+    assert embed.await_count == 4  # 15 chunks in batches of 4
+    stages = {call.kwargs.get("stage") for call in orchestrator._publish_status.await_args_list}
+    assert {"extracting", "embedding"} <= stages
+    percents = [call.args[3] for call in orchestrator._publish_status.await_args_list]
+    assert percents == sorted(percents) and percents[-1] <= 75
+
+
+@pytest.mark.asyncio
+async def test_chunk_pipeline_propagates_stage_failure(monkeypatch):
+    async def stream(_path):
+        yield PageChunks(0, 1, [VectorChunk(content="some chunk content", page_numbers=[1], section_title=None)])
+
+    monkeypatch.setattr("app.services.file_processing_orchestrator.document_service.stream_vector_chunks", stream)
+    monkeypatch.setattr(
+        "app.services.file_processing_orchestrator.embedding_service.batch_embeddings",
+        AsyncMock(side_effect=RuntimeError("embedding backend down")),
+    )
+    orchestrator = FileProcessingOrchestrator(AsyncMock())
+    orchestrator._publish_status = AsyncMock()
+
+    with pytest.raises(RuntimeError, match="embedding backend down"):
+        await orchestrator._run_chunk_pipeline(uuid.uuid4(), uuid.uuid4(), "/tmp/doc.pdf")
+
+
+@pytest.mark.asyncio
+async def test_stream_vector_chunks_bridges_extractor_thread(monkeypatch):
+    from app.core.ingestion.ingestion_service import ExtractedChunk, PageResult
+    from app.services.document_service import document_service
+
+    def iter_pages(path, max_workers=None):
+        for i in range(6):
+            chunk = ExtractedChunk(text=f"page {i} " + "content " * 5, page_num=i + 1, source="pdf")
+            yield PageResult(i, 6, chunk if i != 3 else None)
+
+    class Splitter:
+        def split_text(self, text):
+            return [text]
+
+    monkeypatch.setattr("app.services.document_service.ingestion_service.iter_pages", iter_pages)
+    monkeypatch.setattr(type(document_service), "_make_splitter", staticmethod(lambda size, overlap: Splitter()))
+
+    pages = [page async for page in document_service.stream_vector_chunks("/tmp/doc.pdf")]
+
+    assert [p.index for p in pages] == list(range(6))
+    assert [len(p.chunks) for p in pages] == [1, 1, 1, 0, 1, 1]
+    assert pages[4].chunks[0].page_numbers == [5]
+
+
+def test_content_hash_ignores_whitespace_but_tracks_splitter_params():
+    from app.services.embedding_service import embedding_service
+
+    base = embedding_service.content_hash("Newton's  second\nlaw", 1200, 200)
+    assert base == embedding_service.content_hash("Newton's second law ", 1200, 200)
+    assert base != embedding_service.content_hash("Newton's second law", 800, 200)
+    assert base != embedding_service.content_hash("Newton's third law", 1200, 200)
+
+
+@pytest.mark.asyncio
+async def test_reprocessing_only_embeds_unseen_hashes(monkeypatch):
+    contents = ["unchanged intro", "unchanged theorem", "rewritten proof", "rewritten proof", "unchanged intro"]
+    chunks = [VectorChunk(content=c, page_numbers=[1], section_title=None, content_hash=f"h-{c}") for c in contents]
+
+    async def stream(_path):
+        yield PageChunks(0, 1, chunks)
+
+    monkeypatch.setattr("app.services.file_processing_orchestrator.settings.INGEST_EMBED_BATCH_SIZE", 8)
+    monkeypatch.setattr("app.services.file_processing_orchestrator.settings.INGEST_EMBED_CONCURRENCY", 1)
+    monkeypatch.setattr("app.services.file_processing_orchestrator.document_service.stream_vector_chunks", stream)
+    embed = AsyncMock(side_effect=lambda texts: [[float(len(t))] for t in texts])
+    monkeypatch.setattr("app.services.file_processing_orchestrator.embedding_service.batch_embeddings", embed)
+
+    orchestrator = FileProcessingOrchestrator(AsyncMock())
+    orchestrator._lookup_embeddings = AsyncMock(
+        return_value={"h-unchanged intro": [1.0], "h-unchanged theorem": [2.0]}
+    )
+    stored = []
+    orchestrator._store_chunks = AsyncMock(side_effect=lambda f, u, batch, embs, fresh, staged: stored.append((embs, fresh)))
+    orchestrator._publish_status = AsyncMock()
+
+    await orchestrator._run_chunk_pipeline(uuid.uuid4(), uuid.uuid4(), "/tmp/doc.pdf")
+
+    embed.assert_awaited_once_with(["rewritten proof"])
+    embeddings, fresh = stored[0]
+    assert embeddings == [[1.0], [2.0], [15.0], [15.0], [1.0]]
+    assert fresh == {"h-rewritten proof": [15.0]}
+    reused = [call.kwargs["detail"]["chunks_reused"] for call in orchestrator._publish_status.await_args_list]
+    assert reused[-1] == 4
+
+
+@pytest.mark.asyncio
+async def test_store_chunks_shares_vectors_across_files():
+    from datetime import datetime
+
+    from sqlalchemy import func, select
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import StaticPool
+
+    from app.models.document_chunks import ChunkEmbedding, DocumentChunk
+
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(ChunkEmbedding.__table__.create)
+        await conn.run_sync(DocumentChunk.__table__.create)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    vector = [0.5] * 1536
+    chunk = VectorChunk(content="shared textbook paragraph", page_numbers=[1], section_title=None, content_hash="a" * 64)
+
+    try:
+        async with factory() as session:
+            orchestrator = FileProcessingOrchestrator(session, session_factory=factory)
+            staged_at = datetime.utcnow()
+            for _ in range(2):  # two users upload the same textbook
+                await orchestrator._store_chunks(
+                    uuid.uuid4(), uuid.uuid4(), [(0, chunk)], [vector], {chunk.content_hash: vector}, staged_at
+                )
+
+            assert await session.scalar(select(func.count()).select_from(ChunkEmbedding)) == 1
+            rows = (await session.execute(select(DocumentChunk))).scalars().all()
+            assert [r.content_hash for r in rows] == [chunk.content_hash] * 2
+            assert all(r.deleted_at == staged_at for r in rows)
+
+            found = await orchestrator._lookup_embeddings([chunk.content_hash, "b" * 64])
+            assert list(found) == [chunk.content_hash]
+            assert found[chunk.content_hash] == pytest.approx(vector)
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_restore_leaves_orphaned_staged_chunks_hidden():
+    from datetime import datetime
+    from types import SimpleNamespace
+    from unittest.mock import MagicMock
+
+    from app.services.file_cascade_service import FileCascadeService
+
+    deleted_at = datetime(2026, 3, 1, 12, 0)
+    file = SimpleNamespace(deleted_at=deleted_at)
+    found = MagicMock()
+    found.scalar_one_or_none.return_value = file
+    db = AsyncMock()
+    db.execute = AsyncMock(side_effect=[found, MagicMock(rowcount=3), MagicMock(rowcount=0)])
+
+    stats = await FileCascadeService(db).restore_soft_deleted_file(uuid.uuid4())
+
+    assert stats["chunks_restored"] == 3 and file.deleted_at is None
+    chunks_stmt = db.execute.await_args_list[1].args[0]
+    params = chunks_stmt.compile().params
+    # Only chunks soft-deleted together with the file, not rows staged by a crashed run
+    assert "deleted_at = :deleted_at_1" in str(chunks_stmt)
+    assert params["deleted_at_1"] == deleted_at
@@ -0,0 +1,99 @@
+"""
+PrerequisiteGraphStore Tests
+"""
+
+import asyncio
+import json
+import uuid
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.prerequisite_graph_store import CyclicDependencyError, PrerequisiteGraphStore
+
+
+def _chain(store, count):
+    ids = [uuid.uuid4() for _ in range(count)]
+    store.build(
+        [(node_id, f"Node {i}") for i, node_id in enumerate(ids)],
+        list(zip(ids, ids[1:])),
+    )
+    return ids
+
+
+def test_learning_order_only_touches_ancestors():
+    store = PrerequisiteGraphStore()
+    ids = _chain(store, 5)
+
+    assert store.learning_order(ids[2]) == ids[:3]
+    assert store.ancestors(ids[2]) == set(ids[:2])
+    assert store.predecessors(ids[0]) == []
+
+
+def test_incremental_events_and_compaction():
+    store = PrerequisiteGraphStore(compact_threshold=2)
+    ids = _chain(store, 2)
+    new_id = uuid.uuid4()
+
+    store.apply_event("node_created", {"id": str(new_id), "name": "New"})
+    store.apply_event("relation_created", {"source": str(ids[1]), "target": str(new_id), "type": "prerequisite"})
+    # 非前置关系与重复边不影响图
+    store.apply_event("relation_created", {"source": str(ids[0]), "target": str(new_id), "type": "RELATED"})
+    store.apply_event("relation_created", {"source": str(ids[1]), "target": str(new_id), "type": "PREREQUISITE"})
+    assert store.learning_order(new_id) == ids + [new_id]
+
+    # 第二条增量边触发合并进 CSR
+    store.apply_event("relation_created", {"source": str(ids[0]), "target": str(new_id), "type": "PREREQUISITE"})
+    assert store._pending_count == 0
+    assert sorted(store.predecessors(new_id)) == sorted([ids[0], ids[1]])
+    assert store.name(new_id) == "New"
+
+
+def test_cycle_and_stream_message_decoding():
+    store = PrerequisiteGraphStore()
+    ids = _chain(store, 2)
+
+    store._apply_stream_message({
+        b"type": b"relation_created",
+        b"data": json.dumps({"source": str(ids[1]), "target": str(ids[0]), "type": "PREREQUISITE"}).encode(),
+    })
+    with pytest.raises(CyclicDependencyError):
+        store.learning_order(ids[1])
+
+
+@pytest.mark.asyncio
+async def test_stale_graph_is_rebuilt_in_background(monkeypatch):
+    release = asyncio.Event()
+    fresh_ids = [uuid.uuid4() for _ in range(3)]
+
+    class FakeSession:
+        async def __aenter__(self):
+            await release.wait()
+            return "refresh-session"
+
+        async def __aexit__(self, *exc):
+            return False
+
+    store = PrerequisiteGraphStore(session_factory=FakeSession)
+    ids = _chain(store, 2)
+    store._read_graph = AsyncMock(return_value=(
+        [(node_id, f"Fresh {i}") for i, node_id in enumerate(fresh_ids)],
+        list(zip(fresh_ids, fresh_ids[1:])),
+    ))
+    store._loaded_at -= 10_000
+
+    # Stale: the request returns at once and keeps using the current graph
+    db = MagicMock()
+    await store.ensure_loaded(db)
+    await store.ensure_loaded(db)
+    assert store.learning_order(ids[1]) == ids
+    refresh = store._refresh_task
+    assert refresh is not None and not refresh.done()
+
+    release.set()
+    await refresh
+    store._read_graph.assert_awaited_once_with("refresh-session")
+    assert store.learning_order(fresh_ids[2]) == fresh_ids
+    assert not store.has_node(ids[0])
+    assert not store._is_stale()
+    await store.close()
@@ -104,3 +104,96 @@ async def test_get_with_lock_lock_error_fallback(mock_redis):
     
     assert result == "fallback_data"
     factory.assert_called_once()
+
+
+def _index_redis(mock_redis, docs):
+    """Attach a RediSearch mock whose index already exists."""
+    ft = MagicMock()
+    ft.info = AsyncMock(return_value={})
+    ft.search = AsyncMock(return_value=MagicMock(docs=docs))
+    mock_redis.ft.return_value = ft
+    mock_redis.hincrbyfloat = AsyncMock()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[1, True])
+    mock_redis.pipeline.return_value = pipe
+    return ft, pipe
+
+
+@pytest.mark.asyncio
+async def test_semantic_lookup_uses_vector_index(mock_redis):
+    """Semantic lookup is a single KNN query pre-filtered by owner, no linear scan"""
+    from app.config import settings
+
+    service = SemanticCacheService(redis_client=mock_redis)
+    ft, pipe = _index_redis(mock_redis, [MagicMock(cache_key="semantic_cache:abc", distance="0.02")])
+    mock_redis.get.side_effect = [None, b'{"data": "similar_result", "cached_at": "now"}']
+
+    embedding = [0.1] * settings.EMBEDDING_DIM
+    with patch("app.services.semantic_cache_service.embedding_service.get_embedding", AsyncMock(return_value=embedding)):
+        result = await service.get("test query", user_id="user-1", similarity_threshold=0.9)
+
+    assert result == "similar_result"
+    ft.search.assert_awaited_once()
+    query = ft.search.call_args.args[0]
+    assert "@owner:{_global | user\\-1}" in query.query_string()
+    assert "KNN 1 @embedding" in query.query_string()
+    mock_redis.scard.assert_not_called()
+    mock_redis.srandmember.assert_not_called()
+    mock_redis.hincrby.assert_any_call(service.STATS_KEY, "semantic_hits", 1)
+    # Lookup stats are batched into one pipeline round trip
+    pipe.hincrby.assert_called_once_with(service.STATS_KEY, "semantic_lookups", 1)
+    assert pipe.hincrbyfloat.call_args.args[:2] == (service.STATS_KEY, "semantic_lookup_ms")
+    mock_redis.hincrbyfloat.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_semantic_lookup_below_threshold_is_miss(mock_redis):
+    from app.config import settings
+
+    service = SemanticCacheService(redis_client=mock_redis)
+    _index_redis(mock_redis, [MagicMock(cache_key="semantic_cache:abc", distance="0.4")])
+    mock_redis.get.return_value = None
+
+    embedding = [0.1] * settings.EMBEDDING_DIM
+    with patch("app.services.semantic_cache_service.embedding_service.get_embedding", AsyncMock(return_value=embedding)):
+        result = await service.get("test query", similarity_threshold=0.9)
+
+    assert result is None
+    mock_redis.hincrby.assert_any_call(service.STATS_KEY, "total_misses", 1)
+
+
+@pytest.mark.asyncio
+async def test_set_writes_binary_vector_entry(mock_redis):
+    from app.config import settings
+
+    service = SemanticCacheService(redis_client=mock_redis)
+    _, pipe = _index_redis(mock_redis, [])
+
+    embedding = [0.5] * settings.EMBEDDING_DIM
+    with patch("app.services.semantic_cache_service.embedding_service.get_embedding", AsyncMock(return_value=embedding)):
+        assert await service.set("test query", {"answer": 1}, user_id="user-1", ttl=60)
+
+    mapping = pipe.hset.call_args.kwargs["mapping"]
+    assert mapping["owner"] == "user-1"
+    assert isinstance(mapping["embedding"], bytes)
+    assert len(mapping["embedding"]) == settings.EMBEDDING_DIM * 4
+    pipe.expire.assert_called_once()
+    # Indexed entries replace the JSON payload + key set used by the scan fallback
+    mock_redis.sadd.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_clear_all_removes_vector_entries(mock_redis):
+    service = SemanticCacheService(redis_client=mock_redis)
+    vec_key = f"{service.VEC_PREFIX}semantic_cache:abc"
+    mock_redis.keys.side_effect = lambda pattern: {
+        f"{service.CACHE_PREFIX}*": ["semantic_cache:abc", vec_key],
+        f"{service.EMBED_PREFIX}*": [],
+        f"{service.VEC_PREFIX}*": [vec_key],
+    }[pattern]
+    mock_redis.delete.return_value = 3
+
+    assert await service.clear_all() == 3
+    deleted = mock_redis.delete.call_args.args
+    assert vec_key in deleted and len(deleted) == len(set(deleted))
+    assert service.KEY_SET in deleted
@@ -0,0 +1,175 @@
+"""
+Unit Tests for translation memory, packed LLM calls and versioned glossaries
+"""
+
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.config.settings import settings
+from app.services.translation_glossary import GlossaryStore
+from app.services.translation_memory import TranslationMemory
+from app.services.translation_service import TranslationService, TranslationSegment
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipe:
+            def __init__(self):
+                self.ops = []
+
+            def set(self, key, value, ex=None):
+                self.ops.append((key, value))
+
+            async def execute(self):
+                redis.data.update(self.ops)
+
+        return Pipe()
+
+
+@pytest.fixture
+def mock_cache_service():
+    mock = MagicMock()
+    mock.get = AsyncMock(return_value=None)
+    mock.set = AsyncMock()
+    return mock
+
+
+def _packed_llm(max_seen=None):
+    """Fake LLM: translates every text of a packed/single prompt to '<text>-zh'."""
+    active = {"now": 0, "max": 0}
+
+    async def chat(messages, model=None):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        prompt = messages[0]["content"]
+        packed = re.search(r"^Texts: (.*)$", prompt, re.M)
+        if packed:
+            return json.dumps([f"{t}-zh" for t in json.loads(packed.group(1))], ensure_ascii=False)
+        return re.search(r"^Text: (.*)$", prompt, re.M).group(1) + "-zh"
+
+    llm = MagicMock()
+    llm.chat = AsyncMock(side_effect=chat)
+    llm.chat_model = "test-model"
+    return llm, active
+
+
+@pytest.mark.asyncio
+async def test_repeated_paragraphs_cost_zero_llm_calls(mock_cache_service):
+    service = TranslationService()
+    memory = TranslationMemory(redis_client=FakeRedis(), persist=False)
+    llm, _ = _packed_llm()
+
+    first = [
+        TranslationSegment(id="s0", text="The cache is warm"),
+        TranslationSegment(id="s1", text="The  cache is warm "),  # same after normalization
+        TranslationSegment(id="s2", text="Loops repeat"),
+    ]
+    with patch("app.services.translation_service.cache_service", mock_cache_service), \
+         patch("app.services.translation_service.llm_service", llm), \
+         patch("app.services.translation_service.translation_memory", memory):
+        result = await service.translate(first, source_lang="en", target_lang="zh-CN")
+        assert llm.chat.call_count == 1
+        prompt = llm.chat.call_args.kwargs["messages"][0]["content"]
+        assert prompt.count("cache is warm") == 1
+        assert [s.id for s in result.segments] == ["s0", "s1", "s2"]
+        assert result.segments[1].translation == "The cache is warm-zh"
+
+        # Same paragraphs in a different request: served from translation memory
+        again = [
+            TranslationSegment(id="p0", text="Loops repeat"),
+            TranslationSegment(id="p1", text="The cache is warm"),
+        ]
+        result = await service.translate(again, source_lang="en", target_lang="zh-CN")
+
+    assert llm.chat.call_count == 1
+    assert result.cache_hit is True
+    assert [s.translation for s in result.segments] == ["Loops repeat-zh", "The cache is warm-zh"]
+
+
+@pytest.mark.asyncio
+async def test_misses_packed_into_concurrent_batches(mock_cache_service, monkeypatch):
+    monkeypatch.setattr(settings, "TRANSLATION_BATCH_MAX_SEGMENTS", 2)
+    monkeypatch.setattr(settings, "TRANSLATION_LLM_CONCURRENCY", 2)
+    service = TranslationService()
+    memory = TranslationMemory(redis_client=FakeRedis(), persist=False)
+    llm, active = _packed_llm()
+
+    segments = [TranslationSegment(id=f"s{i}", text=f"Sentence {i}") for i in range(7)]
+    known = memory.make_key("Sentence 3", "en", "zh-CN", "", f"general|natural|{service.prompt_version}")
+    memory._redis.data[f"{memory.KEY_PREFIX}{known}"] = "句子三"
+
+    with patch("app.services.translation_service.cache_service", mock_cache_service), \
+         patch("app.services.translation_service.llm_service", llm), \
+         patch("app.services.translation_service.translation_memory", memory):
+        result = await service.translate(segments, source_lang="en", target_lang="zh-CN")
+
+    # 6 misses, 2 per call, at most 2 calls in flight
+    assert llm.chat.call_count == 3
+    assert active["max"] == 2
+    sent = " ".join(c.kwargs["messages"][0]["content"] for c in llm.chat.call_args_list)
+    assert "Sentence 3" not in sent
+    assert [s.translation for s in result.segments] == [
+        "Sentence 0-zh", "Sentence 1-zh", "Sentence 2-zh", "句子三",
+        "Sentence 4-zh", "Sentence 5-zh", "Sentence 6-zh",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_malformed_packed_response_falls_back_per_segment(mock_cache_service):
+    service = TranslationService()
+    memory = TranslationMemory(redis_client=FakeRedis(), persist=False)
+    llm = MagicMock()
+    llm.chat = AsyncMock(side_effect=["Sorry, here you go: 一, 二", "一", "二"])
+    llm.chat_model = "test-model"
+
+    segments = [TranslationSegment(id="s0", text="one"), TranslationSegment(id="s1", text="two")]
+    with patch("app.services.translation_service.cache_service", mock_cache_service), \
+         patch("app.services.translation_service.llm_service", llm), \
+         patch("app.services.translation_service.translation_memory", memory):
+        result = await service.translate(segments, source_lang="en", target_lang="zh-CN")
+
+    assert llm.chat.call_count == 3
+    assert [s.translation for s in result.segments] == ["一", "二"]
+
+
+@pytest.mark.asyncio
+async def test_glossary_versions_pinned_and_latest():
+    row = SimpleNamespace(subject="cs", version=2, terms=[{"source": "cache", "target": "高速缓存"}])
+    db = MagicMock()
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = row
+    db.execute = AsyncMock(return_value=result)
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=db)
+    session.__aexit__ = AsyncMock(return_value=False)
+    store = GlossaryStore(session_factory=lambda: session, refresh_seconds=60)
+
+    pinned = await store.get("cs_terms_v1")
+    assert pinned.version == 1 and {"source": "cache", "target": "缓存"} in pinned.as_dicts()
+    assert db.execute.await_count == 0  # built-in seed, no database round trip
+
+    latest = await store.get("cs_terms")
+    assert latest.glossary_id == "cs_terms_v2"
+    assert await store.get("cs_terms") is latest
+    assert await store.get("cs_terms_v2") is latest
+    assert db.execute.await_count == 1
+
+    assert await store.get("not a glossary") is None
+    # New glossary version -> different translation memory entries
+    assert TranslationMemory.make_key("cache", "en", "zh-CN", pinned.glossary_id) != \
+        TranslationMemory.make_key("cache", "en", "zh-CN", latest.glossary_id)
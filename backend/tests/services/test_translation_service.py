@@ -179,15 +179,14 @@ async def test_translate_timeout_handling(mock_cache_service, mock_llm_service):
 
 @pytest.mark.asyncio
 async def test_translate_multiple_segments(mock_cache_service, mock_llm_service):
-    """Test translation with multiple segments"""
+    """Test translation with multiple segments - packed into one LLM call"""
     service = TranslationService()
 
     # Mock cache miss
     mock_cache_service.get.return_value = None
 
-    # Return different translations for each segment
-    translations = ["句子一", "句子二", "句子三"]
-    mock_llm_service.chat.side_effect = translations
+    # Packed call returns a JSON array of translations in order
+    mock_llm_service.chat.return_value = '["句子一", "句子二", "句子三"]'
 
     segments = [
         TranslationSegment(id="s0", text="Sentence one"),
@@ -209,8 +208,8 @@ async def test_translate_multiple_segments(mock_cache_service, mock_llm_service)
     assert result.segments[1].translation == "句子二"
     assert result.segments[2].translation == "句子三"
 
-    # LLM should be called 3 times
-    assert mock_llm_service.chat.call_count == 3
+    # All segments fit one token budget: a single LLM call
+    assert mock_llm_service.chat.call_count == 1
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,122 @@
+"""
+PG → AGE 批量同步测试
+"""
+
+import json
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.core.age_client import AgeClient
+from services.graph_knowledge_service import GraphKnowledgeService
+
+
+def _node(name, updated_at, deleted_at=None, sector_code=None):
+    return SimpleNamespace(
+        id=uuid.uuid4(), name=name, description="", importance_level=1,
+        keywords=["k"], source_type="seed", created_at=updated_at,
+        updated_at=updated_at, deleted_at=deleted_at, sector_code=sector_code,
+    )
+
+
+def _relation(source, target, updated_at, relation_type="prerequisite", deleted_at=None):
+    return SimpleNamespace(
+        id=uuid.uuid4(), source_node_id=source.id, target_node_id=target.id,
+        relation_type=relation_type, strength=0.5, created_by="seed",
+        updated_at=updated_at, deleted_at=deleted_at,
+    )
+
+
+def _result(rows):
+    return MagicMock(all=MagicMock(return_value=rows))
+
+
+@pytest.fixture
+def service():
+    svc = GraphKnowledgeService(AsyncMock())
+    svc.age_client = MagicMock()
+    svc.age_client.ensure_property_index = AsyncMock()
+    svc.age_client.execute_cypher_many = AsyncMock(side_effect=lambda statements, concurrency: len(statements))
+    svc.age_client.build_merge_vertices = AgeClient.build_merge_vertices
+    svc.age_client.build_delete_vertices = AgeClient.build_delete_vertices
+    svc.age_client.build_merge_edges = AgeClient.build_merge_edges
+    svc.age_client.build_delete_edges = AgeClient.build_delete_edges
+    svc.redis = AsyncMock()
+    svc.redis.get.return_value = None
+    return svc
+
+
+def test_literal_escapes_strings():
+    literal = AgeClient._literal({"name": "it's $$ a\\b", "n": 2, "tags": ["x", None]})
+    assert literal == "{name: 'it\\'s \\u0024\\u0024 a\\\\b', n: 2, tags: ['x', null]}"
+
+
+@pytest.mark.asyncio
+async def test_full_sync_batches_keyset_pages(service):
+    now = datetime.utcnow()
+    nodes = [_node(f"N{i}", now, sector_code="COSMOS") for i in range(2)] + [_node("N2", now)]
+    relations = [_relation(nodes[0], nodes[1], now), _relation(nodes[1], nodes[2], now, "related")]
+    service.db.execute.side_effect = [
+        _result(nodes[:2]), _result(nodes[2:]),  # 节点两页（第二页不满即结束）
+        _result(relations), _result([]),  # 关系整页后再取一页为空
+    ]
+
+    stats = await service.sync_all_to_age(page_size=2, batch_size=10)
+
+    assert stats["nodes"] == 3 and stats["relations"] == 2
+    # 每页一条顶点语句，边按类型各一条
+    assert stats["statements"] == 4
+    edge_statements = service.age_client.execute_cypher_many.await_args_list[-1].args[0]
+    assert any("PREREQUISITE" in s for s in edge_statements)
+    assert any("RELATED" in s for s in edge_statements)
+    # 第二页的查询带上了 id 游标而不是 OFFSET
+    second_query = str(service.db.execute.await_args_list[1].args[0])
+    assert "knowledge_nodes.id >" in second_query and "OFFSET" not in second_query.upper()
+    # 星域取自学科，未关联学科的节点写入 VOID
+    assert "LEFT OUTER JOIN subjects ON knowledge_nodes.subject_id = subjects.id" in second_query
+    vertex_statements = [
+        s for call in service.age_client.execute_cypher_many.await_args_list for s in call.args[0]
+        if "MERGE (v:KnowledgeNode" in s
+    ]
+    assert "sector: 'COSMOS'" in vertex_statements[0] and "sector: 'VOID'" in vertex_statements[1]
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync_deletes_and_advances_watermark(service):
+    now = datetime.utcnow()
+    kept, removed = _node("kept", now), _node("removed", now, deleted_at=now)
+    service.redis.get.return_value = json.dumps({"updated_at": (now - timedelta(hours=1)).isoformat(), "id": None})
+    service.db.execute.side_effect = [_result([kept, removed]), _result([])]
+
+    stats = await service.sync_incremental_to_age(page_size=10)
+
+    assert stats["nodes"] == 1 and stats["deleted_nodes"] == 1
+    statements = service.age_client.execute_cypher_many.await_args_list[0].args[0]
+    assert any("DETACH DELETE" in s and str(removed.id) in s for s in statements)
+    saved = json.loads(service.redis.set.await_args_list[0].args[1])
+    assert saved["id"] == str(removed.id)
+    assert "updated_at >" in str(service.db.execute.await_args_list[0].args[0])
+
+
+def test_beat_runs_incremental_sync(monkeypatch):
+    from app.core.celery_app import celery_app
+    from app.core import celery_tasks
+
+    entry = next(e for e in celery_app.conf.beat_schedule.values() if e["task"] == "sync_graph_to_age")
+    assert entry["task"] in celery_app.tasks and entry["task"] == celery_tasks.sync_graph_to_age.name
+
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=False)
+    monkeypatch.setattr("app.db.session.AsyncSessionLocal", MagicMock(return_value=session))
+    age_client = MagicMock(close=AsyncMock())
+    monkeypatch.setattr("services.graph_knowledge_service.get_age_client", lambda: age_client)
+    sync = AsyncMock(return_value={"mode": "incremental", "nodes": 2})
+    monkeypatch.setattr(GraphKnowledgeService, "sync_incremental_to_age", sync)
+
+    assert celery_tasks.sync_graph_to_age.run() == {"status": "success", "mode": "incremental", "nodes": 2}
+    sync.assert_awaited_once()
+    age_client.close.assert_awaited_once()  # pool is bound to this task's event loop
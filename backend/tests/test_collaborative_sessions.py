@@ -0,0 +1,136 @@
+# Test: bounded, lease-owned collaborative YDoc sessions
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+import y_py as Y
+
+from app.services.galaxy import collaborative_sessions
+from app.services.galaxy.collaborative_sessions import (
+    _ACQUIRE_LEASE, CollaborativeSessionManager,
+)
+
+
+class FakeRedis:
+    """Lease scripts and in-process pub/sub shared by several managers."""
+
+    def __init__(self):
+        self.leases = {}
+        self.subscribers = {}
+
+    async def eval(self, script, numkeys, key, owner, *args):
+        current = self.leases.get(key)
+        if script == _ACQUIRE_LEASE:
+            if current is None:
+                self.leases[key] = owner
+                return owner
+            return current
+        if current == owner:
+            del self.leases[key]
+            return 1
+        return 0
+
+    async def publish(self, channel, payload):
+        manager = self.subscribers.get(channel)
+        if manager is None:
+            return 0
+        asyncio.get_running_loop().call_soon(asyncio.ensure_future, manager._handle_message(payload))
+        return 1
+
+
+def _edit(key, value):
+    doc = Y.YDoc()
+    with doc.begin_transaction() as txn:
+        doc.get_map("galaxy").set(txn, key, value)
+    return Y.encode_state_as_update(doc)
+
+
+@pytest.fixture
+def persistence(monkeypatch):
+    manager = MagicMock()
+    manager.restore = AsyncMock(side_effect=lambda galaxy_id: (Y.YDoc(), 0))
+    manager.append_update = AsyncMock(return_value=1)
+    manager.log_operation = AsyncMock()
+    manager.load_since = AsyncMock(side_effect=lambda galaxy_id, after_id: ([], after_id))
+    monkeypatch.setattr(collaborative_sessions, "CRDTPersistenceManager", MagicMock(return_value=manager))
+    return manager
+
+
+def _manager(redis, pod_id, **kwargs):
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=MagicMock())
+    session.__aexit__ = AsyncMock(return_value=False)
+    manager = CollaborativeSessionManager(lambda: session, redis_client=redis, pod_id=pod_id, **kwargs)
+    redis.subscribers[manager.channel] = manager
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_lru_and_idle_eviction_release_leases(persistence):
+    redis = FakeRedis()
+    manager = _manager(redis, "pod-a", max_docs=2, idle_seconds=60)
+
+    for galaxy_id in ("g1", "g2", "g3"):
+        await manager.sync(galaxy_id, "u1")
+    assert list(manager._docs) == ["g2", "g3"]
+    assert "crdt:owner:g1" not in redis.leases and redis.leases["crdt:owner:g3"] == "pod-a"
+
+    manager._docs["g2"].last_used -= 120
+    await manager.sweep_idle()
+    assert list(manager._docs) == ["g3"]
+    assert "crdt:owner:g2" not in redis.leases
+
+
+@pytest.mark.asyncio
+async def test_non_owner_forwards_sync_to_lease_holder(persistence):
+    redis = FakeRedis()
+    owner = _manager(redis, "pod-a")
+    other = _manager(redis, "pod-b")
+    await owner.sync("g1", "u1")
+
+    edit = _edit("n1", "Algebra")
+    update, state_vector = await other.sync("g1", "u2", edit)
+
+    assert "g1" not in other._docs  # no second copy of the doc
+    assert owner._docs["g1"].service.ydoc.get_map("galaxy")["n1"] == "Algebra"
+    persistence.append_update.assert_awaited_once_with("g1", "u2", edit)
+    client = Y.YDoc()
+    Y.apply_update(client, update)
+    assert client.get_map("galaxy")["n1"] == "Algebra"
+    assert state_vector == Y.encode_state_vector(owner._docs["g1"].service.ydoc)
+
+
+@pytest.mark.asyncio
+async def test_lease_of_departed_owner_is_taken_over(persistence):
+    redis = FakeRedis()
+    redis.leases["crdt:owner:g1"] = "pod-gone"
+    survivor = _manager(redis, "pod-b")
+
+    await survivor.sync("g1", "u1", _edit("n1", "x"))
+
+    assert redis.leases["crdt:owner:g1"] == "pod-b"
+    assert "g1" in survivor._docs
+
+
+@pytest.mark.asyncio
+async def test_forwarded_sync_tasks_are_held_until_done(persistence):
+    manager = _manager(FakeRedis(), "pod-a")
+    release = asyncio.Event()
+
+    async def serve(request):
+        await release.wait()
+
+    manager._serve_forwarded = serve
+    await manager._handle_message('{"type": "sync"}')
+    assert len(manager._serving) == 1
+    release.set()
+    await asyncio.sleep(0.01)
+    assert manager._serving == set()
+
+    # stop() cancels whatever is still in flight
+    release.clear()
+    await manager._handle_message('{"type": "sync"}')
+    (task,) = manager._serving
+    await manager.stop()
+    assert task.cancelled() and manager._serving == set()
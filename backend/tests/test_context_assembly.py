@@ -0,0 +1,105 @@
+"""
+ContextAssembler 功能测试
+
+测试场景:
+1. 独立来源并发执行，总耗时取决于最慢来源而非总和
+2. 来源超出自身预算 - 使用降级值
+3. 来源异常 - 使用降级值
+4. 整体截止时间 - 未完成来源被取消
+5. 每个来源的耗时上报到 Histogram
+"""
+
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.orchestration.context_assembly import ContextAssembler, ContextSource, first_available
+
+
+def _delayed(value, delay):
+    async def loader():
+        await asyncio.sleep(delay)
+        return value
+    return loader
+
+
+class TestContextAssembler:
+
+    @pytest.mark.asyncio
+    async def test_sources_run_concurrently(self):
+        assembler = ContextAssembler(deadline=1.0)
+        sources = [ContextSource(f"s{i}", _delayed(i, 0.1), timeout=0.5) for i in range(4)]
+
+        start = time.perf_counter()
+        result = await assembler.assemble(sources)
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.3
+        assert result.values == {"s0": 0, "s1": 1, "s2": 2, "s3": 3}
+        assert all(result.ok(f"s{i}") for i in range(4))
+
+    @pytest.mark.asyncio
+    async def test_source_budget_and_errors_fall_back(self):
+        async def broken():
+            raise RuntimeError("db down")
+
+        assembler = ContextAssembler(deadline=1.0)
+        result = await assembler.assemble([
+            ContextSource("slow", _delayed("late", 0.5), timeout=0.05, fallback="fallback"),
+            ContextSource("broken", broken, timeout=0.5, fallback=[]),
+            ContextSource("fast", _delayed("ok", 0.01), timeout=0.5),
+        ])
+
+        assert result.get("slow") == "fallback"
+        assert result.outcomes["slow"].status == "timeout"
+        assert result.get("broken") == []
+        assert result.outcomes["broken"].status == "error"
+        assert result.get("fast") == "ok"
+
+    @pytest.mark.asyncio
+    async def test_deadline_cancels_pending_sources(self):
+        cancelled = asyncio.Event()
+
+        async def hanging():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        assembler = ContextAssembler(deadline=0.05)
+        result = await assembler.assemble([
+            ContextSource("hanging", hanging, timeout=5, fallback=""),
+            ContextSource("fast", _delayed("ok", 0.0), timeout=1),
+        ])
+
+        assert result.outcomes["hanging"].status == "deadline"
+        assert result.get("hanging") == ""
+        assert result.get("fast") == "ok"
+        assert cancelled.is_set()
+
+    @pytest.mark.asyncio
+    async def test_latency_reported_per_source(self):
+        histogram = MagicMock()
+        assembler = ContextAssembler(deadline=1.0, histogram=histogram)
+        await assembler.assemble([
+            ContextSource("graphrag", _delayed("ctx", 0.0), timeout=1),
+            ContextSource("conversation", _delayed({}, 0.0), timeout=1),
+        ])
+
+        operations = {call.kwargs["operation"] for call in histogram.labels.call_args_list}
+        assert operations == {"context.graphrag", "context.conversation"}
+        assert histogram.labels.return_value.observe.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_first_available_respects_priority(self):
+        assembler = ContextAssembler(deadline=1.0)
+        result = await assembler.assemble([
+            ContextSource("graphrag", _delayed("", 0.0), timeout=1, fallback=""),
+            ContextSource("vector", _delayed("vector ctx", 0.0), timeout=1, fallback=""),
+            ContextSource("keyword", _delayed("keyword ctx", 0.0), timeout=1, fallback=""),
+        ])
+
+        assert first_available(result, ["graphrag", "vector", "keyword"]) == "vector"
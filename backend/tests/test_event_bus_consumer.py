@@ -0,0 +1,135 @@
+# Test: batched EventBus stream consumer
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.core.event_bus import EventBus, StreamConsumer
+from app.workers.graph_sync_worker import sync_ordering_keys
+
+
+def _consumer(redis_client, callback, **kwargs):
+    kwargs.setdefault("batch_size", 16)
+    kwargs.setdefault("concurrency", 4)
+    kwargs.setdefault("max_deliveries", 3)
+    return StreamConsumer(redis_client, "sparkle_events", "group", "c1", callback, **kwargs)
+
+
+def _redis():
+    client = MagicMock()
+    client.xack = AsyncMock()
+    client.xadd = AsyncMock()
+    client.xreadgroup = AsyncMock(return_value=[])
+    client.xinfo_groups = AsyncMock(return_value=[])
+    return client
+
+
+@pytest.mark.asyncio
+async def test_same_key_runs_in_order_other_keys_run_concurrently():
+    log = []
+    running = 0
+    peak = 0
+
+    async def callback(event):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02 if event["seq"] == 0 else 0.001)
+        log.append((event["user_id"], event["seq"]))
+        running -= 1
+
+    client = _redis()
+    consumer = _consumer(client, callback, key_fn=lambda e: e["user_id"])
+    for i, (user, seq) in enumerate([("a", 0), ("b", 0), ("a", 1), ("c", 0), ("a", 2)]):
+        consumer.dispatch(f"{i + 1}-0", {"user_id": user, "seq": json.dumps(seq)})
+
+    await consumer.drain()
+
+    assert [seq for user, seq in log if user == "a"] == [0, 1, 2]
+    assert peak >= 2  # b/c did not wait behind a
+    client.xack.assert_awaited_once()
+    assert sorted(client.xack.await_args.args[2:]) == ["1-0", "2-0", "3-0", "4-0", "5-0"]
+
+
+@pytest.mark.asyncio
+async def test_failed_messages_stay_pending_and_are_reclaimed_or_dead_lettered():
+    attempts = []
+
+    async def callback(event):
+        attempts.append(event["n"])
+        if event["n"] == 1:
+            raise RuntimeError("handler down")
+
+    client = _redis()
+    consumer = _consumer(client, callback)
+    consumer.dispatch("1-0", {"n": "1"})
+    consumer.dispatch("2-0", {"n": "2"})
+    await consumer.drain()
+    assert client.xack.await_args.args[2:] == ("2-0",)  # failure not acked
+
+    client.xack.reset_mock()
+    client.xautoclaim = AsyncMock(return_value=["0-0", [("1-0", {"n": "1"}), ("7-0", {"n": "7"})], []])
+    client.xpending_range = AsyncMock(return_value=[
+        {"message_id": "1-0", "times_delivered": 4},
+        {"message_id": "7-0", "times_delivered": 2},
+    ])
+
+    assert await consumer.reclaim() == 1
+    await consumer.drain()
+
+    assert attempts == [1, 2, 7]
+    dead_stream, body = client.xadd.await_args.args
+    assert dead_stream == "sparkle_events:dead"
+    assert body["dead_message_id"] == "1-0" and body["n"] == "1"
+    assert sorted(client.xack.await_args.args[2:]) == ["1-0", "7-0"]
+
+
+@pytest.mark.asyncio
+async def test_poll_fetches_only_free_slots_and_records_backlog():
+    gate = asyncio.Event()
+
+    async def callback(event):
+        await gate.wait()
+
+    client = _redis()
+    client.xautoclaim = AsyncMock(return_value=["0-0", [], []])
+    client.xinfo_groups = AsyncMock(return_value=[{"name": "group", "pending": 3, "lag": 12}])
+    consumer = _consumer(client, callback, batch_size=4, concurrency=2)
+    client.xreadgroup = AsyncMock(return_value=[("sparkle_events", [("1-0", {"x": "1"}), ("2-0", {"x": "2"})])])
+
+    await consumer.poll()
+    assert client.xreadgroup.await_args.kwargs["count"] == 4
+    await consumer.poll()
+    assert client.xreadgroup.await_args.kwargs["count"] == 2  # two entries still in flight
+    client.xautoclaim.assert_awaited_once()  # reclaim only runs once per interval
+
+    from app.core.metrics import EVENT_BUS_LAG, EVENT_BUS_PENDING
+    assert EVENT_BUS_PENDING.labels(stream="sparkle_events", group="group")._value.get() == 3
+    assert EVENT_BUS_LAG.labels(stream="sparkle_events", group="group")._value.get() == 12
+
+    gate.set()
+    await consumer.drain()
+
+
+@pytest.mark.asyncio
+async def test_publish_trims_stream(monkeypatch):
+    bus = EventBus()
+    bus.redis = MagicMock()
+    bus.redis.xadd = AsyncMock(return_value="1-0")
+
+    await bus.publish("nudge.triggered", {"user_id": "u1"})
+    assert bus.redis.xadd.await_args.kwargs == {"maxlen": 100000, "approximate": True}
+
+    monkeypatch.setattr("app.core.event_bus.settings.EVENT_BUS_STREAM_RETENTION_SECONDS", 3600)
+    await bus.publish("nudge.triggered", {"user_id": "u1"})
+    kwargs = bus.redis.xadd.await_args.kwargs
+    assert kwargs["approximate"] is True and kwargs["minid"].endswith("-0") and "maxlen" not in kwargs
+
+
+def test_graph_sync_relations_wait_on_both_endpoints():
+    assert sync_ordering_keys({"type": "node_created", "data": {"id": "n1"}}) == ["node:n1"]
+    assert sync_ordering_keys({"type": "relation_created", "data": {"source": "n1", "target": "n2"}}) == [
+        "node:n1", "node:n2"
+    ]
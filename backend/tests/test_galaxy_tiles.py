@@ -0,0 +1,89 @@
+# Test: galaxy tiles, ETags and since_revision delta sync
+
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.api.v1.galaxy import get_galaxy_tile
+from app.schemas.galaxy import GalaxyTileResponse
+from app.services.galaxy.structure_service import GraphStructureService
+from app.services.galaxy_service import GalaxyService
+
+
+def _status(sync_revision, revision=1, mastery=40.0):
+    return SimpleNamespace(
+        node_id=uuid.uuid4(), revision=revision, sync_revision=sync_revision, mastery_score=mastery,
+        total_study_minutes=10, study_count=1, is_unlocked=True, is_collapsed=False,
+        is_favorite=False, last_study_at=None, next_review_at=None, decay_paused=False,
+    )
+
+
+@pytest.mark.asyncio
+async def test_tile_query_uses_half_open_box_and_lod(monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "GALAXY_TILE_BASE_SIZE", 1024.0)
+    monkeypatch.setattr(settings, "GALAXY_TILE_LOD_MIN_IMPORTANCE", {1: 4})
+
+    assert GraphStructureService.tile_bounds(1, -1, 0) == (-512.0, 0.0, 0.0, 512.0)
+
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=[])))
+    nodes, relations, truncated = await GraphStructureService(db).get_tile(uuid.uuid4(), 1, -1, 0)
+
+    assert (nodes, relations, truncated) == ([], [], False)
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "point(knowledge_nodes.position_x, knowledge_nodes.position_y) <@ box(" in sql
+    assert "knowledge_nodes.position_x < " in sql
+    assert "knowledge_nodes.importance_level >= " in sql
+
+
+@pytest.mark.asyncio
+async def test_status_delta_pages_by_revision_cursor():
+    service = GalaxyService.__new__(GalaxyService)
+    service.structure = MagicMock()
+    service.structure.get_status_delta = AsyncMock(return_value=([_status(7), _status(9)], True))
+
+    delta = await service.get_status_delta(uuid.uuid4(), since_revision=5, limit=2)
+    assert delta.sync_revision == 9
+    assert delta.has_more is True
+    assert [s.sync_revision for s in delta.statuses] == [7, 9]
+    # The per-node conflict token is passed through untouched
+    assert [s.revision for s in delta.statuses] == [1, 1]
+    assert delta.statuses[0].user_status.status == "shining"
+
+    service.structure.get_status_delta = AsyncMock(return_value=([], False))
+    empty = await service.get_status_delta(uuid.uuid4(), since_revision=9)
+    assert (empty.sync_revision, empty.has_more, empty.statuses) == (9, False, [])
+
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=[])))))
+    await GraphStructureService(db).get_status_delta(uuid.uuid4(), since_revision=9, limit=10)
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "user_node_status.sync_revision > " in sql
+    assert "ORDER BY user_node_status.sync_revision" in sql
+
+
+@pytest.mark.asyncio
+async def test_tile_endpoint_returns_304_for_matching_etag():
+    tile = GalaxyTileResponse(z=0, x=0, y=0, bounds=[0, 0, 4096, 4096], nodes=[], relations=[])
+    galaxy_service = MagicMock()
+    galaxy_service.get_galaxy_tile = AsyncMock(return_value=tile)
+    user_id = str(uuid.uuid4())
+
+    first = await get_galaxy_tile(
+        request=SimpleNamespace(headers={}), z=0, x=0, y=0, include_locked=True,
+        user_id=user_id, galaxy_service=galaxy_service,
+    )
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and etag.startswith('W/"')
+
+    second = await get_galaxy_tile(
+        request=SimpleNamespace(headers={"if-none-match": f'"other", {etag}'}), z=0, x=0, y=0,
+        include_locked=True, user_id=user_id, galaxy_service=galaxy_service,
+    )
+    assert second.status_code == 304
+    assert second.body == b""
+    assert second.headers["etag"] == etag
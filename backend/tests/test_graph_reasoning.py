@@ -8,6 +8,7 @@ import uuid
 import networkx as nx
 from unittest.mock import Mock, AsyncMock, MagicMock
 from app.services.graph_reasoning_service import GraphReasoningService
+from app.services.prerequisite_graph_store import PrerequisiteGraphStore
 from app.models.galaxy import KnowledgeNode, NodeRelation
 
 @pytest.fixture
@@ -16,7 +17,8 @@ def mock_db():
 
 @pytest.fixture
 def service(mock_db):
-    return GraphReasoningService(mock_db)
+    # 每个测试使用独立的图，避免进程级共享图在测试间泄漏状态
+    return GraphReasoningService(mock_db, graph_store=PrerequisiteGraphStore())
 
 @pytest.mark.asyncio
 async def test_generate_simple_path(service, mock_db):
@@ -0,0 +1,60 @@
+# Test: group keyword filter (Aho-Corasick)
+
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.core.keyword_filter import KeywordAutomaton, KeywordFilterCache, KeywordMatch, keyword_fingerprint
+
+
+def test_automaton_finds_overlapping_matches_in_one_pass():
+    automaton = KeywordAutomaton(["he", "she", "his", "hers", "HE", ""])
+    assert len(automaton) == 4  # "HE" folds onto "he", empty keywords are skipped
+
+    matches = automaton.find_all("ushers")
+    assert [(m.keyword, m.start, m.end) for m in matches] == [
+        ("she", 1, 4), ("he", 2, 4), ("hers", 2, 6),
+    ]
+
+
+def test_automaton_folds_fullwidth_and_reports_original_offsets():
+    automaton = KeywordAutomaton(["作弊", "ABC", "ｆｉ"])
+    text = "考试别作弊，ＡＢＣ和abc都算，ﬁ也算"
+    matches = automaton.find_all(text)
+
+    assert [m.keyword for m in matches] == ["作弊", "ABC", "ABC", "ｆｉ"]
+    for match in matches[:3]:
+        assert text[match.start:match.end] in {"作弊", "ＡＢＣ", "abc"}
+    # U+FB01 expands to two folded characters but is one original character
+    assert matches[3] == KeywordMatch("ｆｉ", text.index("ﬁ"), text.index("ﬁ") + 1)
+
+
+@pytest.mark.asyncio
+async def test_cache_rebuilds_only_when_version_changes(monkeypatch):
+    group_id = uuid.uuid4()
+    cache = KeywordFilterCache(recheck_seconds=0)
+    store = {}
+    redis = AsyncMock()
+    redis.get.side_effect = lambda key: store.get(key)
+
+    async def fake_set(key, value, ex=None, nx=False):
+        if not (nx and key in store):
+            store[key] = value
+    redis.set.side_effect = fake_set
+    monkeypatch.setattr(cache, "_get_redis", lambda: redis)
+
+    keywords = ["spam"]
+    loader = AsyncMock(side_effect=lambda: list(keywords))
+
+    first = await cache.get(group_id, loader)
+    assert await cache.get(group_id, loader) is first
+    assert loader.await_count == 1
+    assert store[f"{cache.VERSION_PREFIX}{group_id}"] == keyword_fingerprint(["spam"])
+
+    # Another process updated the list: only the Redis version changed here
+    keywords[:] = ["spam", "scam"]
+    store[f"{cache.VERSION_PREFIX}{group_id}"] = keyword_fingerprint(keywords)
+    rebuilt = await cache.get(group_id, loader)
+    assert loader.await_count == 2
+    assert [m.keyword for m in rebuilt.find_all("scam")] == ["scam"]
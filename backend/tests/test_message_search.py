@@ -0,0 +1,128 @@
+# Test: CJK-aware message search queries, keyset cursors and chat history paging
+
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.models.community import GroupMessage
+from app.services.community_service import GroupMessageService, PrivateMessageService, _visible_to_clause
+from app.services.message_search_index import (
+    build_search_query, decode_cursor, encode_cursor, encode_time_cursor, ranked_search,
+)
+
+
+def test_build_search_query_mirrors_bigram_tokenizer():
+    assert build_search_query("学习小组") == "('学习' <-> '习小' <-> '小组')"
+    assert build_search_query("学") == "'学':*"
+    # NFKC folds full-width Latin; mixed segments are ANDed
+    assert build_search_query("ＡＢＣ 考研") == "'abc':* & ('考研')"
+    assert build_search_query("it's") == "'it':* & 's':*"
+    assert build_search_query("  !!! ") is None
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    created_at = datetime(2026, 1, 22, 8, 30, tzinfo=timezone.utc)
+    message_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(0.25, created_at, message_id)) == (0.25, created_at, message_id)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_ranked_search_uses_index_and_returns_next_cursor():
+    created_at = datetime(2026, 1, 22, tzinfo=timezone.utc)
+    ids = [uuid.uuid4() for _ in range(3)]
+    rows = [SimpleNamespace(id=i, created_at=created_at, rank=1.0 - n / 10, total=3) for n, i in enumerate(ids)]
+    messages = [SimpleNamespace(id=i) for i in reversed(ids)]
+
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[
+        MagicMock(all=MagicMock(return_value=rows)),
+        MagicMock(scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=messages)))),
+    ])
+    page = await ranked_search(db, GroupMessage, [GroupMessage.group_id == uuid.uuid4()], "学习", limit=2)
+
+    sql = str(db.execute.await_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+    assert "group_messages.search_vector @@ to_tsquery" in sql
+    assert "ts_rank_cd(group_messages.search_vector" in sql
+    assert [m.id for m in page.messages] == ids[:2]
+    assert (page.total, page.total_is_estimate) == (3, False)
+    assert decode_cursor(page.next_cursor) == (0.9, created_at, ids[1])
+
+
+def _history_db(*results):
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[
+        MagicMock(scalar_one_or_none=MagicMock(return_value=result)) if not isinstance(result, list)
+        else MagicMock(scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=result))))
+        for result in results
+    ])
+    return db
+
+
+@pytest.mark.asyncio
+async def test_group_history_is_one_keyset_query_with_sql_visibility():
+    user_id = uuid.uuid4()
+    cursor = encode_time_cursor(datetime(2026, 1, 22, tzinfo=timezone.utc), uuid.uuid4())
+    db = _history_db(SimpleNamespace(), [SimpleNamespace(id=1)])
+
+    messages = await GroupMessageService.get_messages(db, uuid.uuid4(), user_id, limit=20, cursor=cursor)
+
+    assert len(messages) == 1
+    assert db.execute.await_count == 2  # membership check + one page query
+    sql = str(db.execute.await_args_list[1].args[0].compile(dialect=postgresql.dialect()))
+    assert "(group_messages.created_at, group_messages.id) < (" in sql
+    assert "CAST(group_messages.content_data AS JSONB) ->> " in sql and "s::JSONB)" in sql
+    assert "LEFT OUTER JOIN users" in sql  # sender / reply_to.sender joined, not extra round trips
+    assert "ORDER BY group_messages.created_at DESC, group_messages.id DESC" in sql
+
+
+def test_visible_to_binds_user_id_as_jsonb_string_once():
+    user_id = uuid.uuid4()
+    dialect = postgresql.asyncpg.dialect()
+    compiled = _visible_to_clause(GroupMessage, user_id).compile(dialect=dialect)
+    name = next(key for key, value in compiled.params.items() if value == str(user_id))
+    bind = compiled.binds[name]
+
+    assert f"@> ${list(compiled.params).index(name) + 1}::JSONB" in str(compiled)
+    # jsonb @> '"<uuid>"', not the double-encoded '"\\"<uuid>\\""'
+    assert bind.type._cached_bind_processor(dialect)(compiled.params[name]) == f'"{user_id}"'
+
+
+@pytest.mark.asyncio
+async def test_private_history_resolves_before_id_inline():
+    db = _history_db([])
+    await PrivateMessageService.get_messages(db, uuid.uuid4(), uuid.uuid4(), before_id=uuid.uuid4())
+
+    assert db.execute.await_count == 1
+    sql = str(db.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "(private_messages.created_at, private_messages.id) < ((SELECT private_messages_2.created_at" in sql
+    # Unknown before_id keeps the legacy behaviour: no filter, newest page
+    assert "(SELECT private_messages_2.created_at" in sql and ") IS NULL OR (" in sql
+
+    with pytest.raises(ValueError):
+        await PrivateMessageService.get_messages(_history_db([]), uuid.uuid4(), uuid.uuid4(), cursor="bogus")
+
+
+@pytest.mark.asyncio
+async def test_group_search_rejects_bad_cursor_with_400(monkeypatch):
+    from fastapi import HTTPException
+    from app.api.v1 import community
+
+    search = AsyncMock(side_effect=ValueError("不是群组成员，无法搜索消息"))
+    monkeypatch.setattr(community.GroupMessageService, "search_messages", search)
+    user = SimpleNamespace(id=uuid.uuid4())
+
+    with pytest.raises(HTTPException) as bad_cursor:
+        await community.search_group_messages(uuid.uuid4(), MagicMock(), "考研", 20, "bogus", user, MagicMock())
+    assert bad_cursor.value.status_code == 400
+    search.assert_not_awaited()
+
+    cursor = encode_cursor(0.5, datetime(2026, 1, 22, tzinfo=timezone.utc), uuid.uuid4())
+    with pytest.raises(HTTPException) as not_member:
+        await community.search_group_messages(uuid.uuid4(), MagicMock(), "考研", 20, cursor, user, MagicMock())
+    assert not_member.value.status_code == 403
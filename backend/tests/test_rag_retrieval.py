@@ -1,5 +1,8 @@
+import asyncio
+import time
+
 import pytest
-from app.services.rerank_service import RerankService
+from app.services.rerank_service import RerankService, _load_cross_encoder
 from unittest.mock import MagicMock
 
 class MockItem:
@@ -44,6 +47,14 @@ def test_reciprocal_rank_fusion():
     assert fused[0][1] > fused[1][1]
     assert fused[1][1] > fused[2][1]
 
+def test_onnx_backend_reports_missing_optional_dependency(monkeypatch):
+    import sys
+    monkeypatch.setitem(sys.modules, "optimum.onnxruntime", None)
+
+    with pytest.raises(RuntimeError, match="optimum\\[onnxruntime\\]"):
+        _load_cross_encoder("BAAI/bge-reranker-base", "onnx", "")
+
+
 def test_rrf_empty_lists():
     """测试空列表处理"""
     service = RerankService()
@@ -59,3 +70,67 @@ def test_rrf_single_source():
     assert len(fused) == 2
     assert fused[0][0].id == 1
     assert fused[0][1] > fused[1][1]
+
+
+def _ready_service(predict):
+    service = RerankService()
+    service.enabled = True
+    service._ready = True
+    service._predict_fn = predict
+    return service
+
+
+@pytest.mark.asyncio
+async def test_rerank_batches_concurrent_requests():
+    """并发请求的 (query, doc) 对合并为一次 predict 调用"""
+    calls = []
+
+    def predict(pairs):
+        calls.append(list(pairs))
+        return [float(len(doc)) for _, doc in pairs]
+
+    service = _ready_service(predict)
+    first, second = await asyncio.gather(
+        service.rerank("q1", [MockItem(1, "a"), MockItem(2, "bbb")], top_k=2),
+        service.rerank("q2", [MockItem(3, "cc")], top_k=1),
+    )
+
+    assert len(calls) == 1
+    assert len(calls[0]) == 3
+    assert [item.id for item in first] == [2, 1]
+    assert [item.id for item in second] == [3]
+
+
+@pytest.mark.asyncio
+async def test_rerank_reuses_cached_scores():
+    """相同 (query, chunk, model) 的分数直接命中 LRU 缓存"""
+    calls = []
+
+    def predict(pairs):
+        calls.append(list(pairs))
+        return [float(len(doc)) for _, doc in pairs]
+
+    service = _ready_service(predict)
+    candidates = [MockItem(1, "a"), MockItem(2, "bbb")]
+    await service.rerank("same query", candidates, top_k=2)
+    result = await service.rerank("same  query", candidates + [MockItem(4, "dddd")], top_k=3)
+
+    assert len(calls) == 2
+    assert calls[1] == [["same  query", "dddd"]]
+    assert [item.id for item in result] == [4, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_rerank_falls_back_to_fused_order_over_budget():
+    """超出延迟预算时返回 RRF 顺序，批次完成后分数仍写入缓存"""
+    def predict(pairs):
+        time.sleep(0.2)
+        return [float(len(doc)) for _, doc in pairs]
+
+    service = _ready_service(predict)
+    candidates = [MockItem(1, "a"), MockItem(2, "bbb")]
+    result = await service.rerank("q", candidates, top_k=2, budget_ms=20)
+    assert [item.id for item in result] == [1, 2]
+
+    await asyncio.gather(*service._batch_tasks)
+    assert len(service._score_cache) == 2
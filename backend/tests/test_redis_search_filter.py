@@ -0,0 +1,70 @@
+# Test: RediSearch pre-filtered KNN
+
+import struct
+import uuid
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.core.redis_search_client import RedisSearchClient, SearchFilter
+
+
+def test_filter_compiles_tag_and_numeric_clauses():
+    scope = SearchFilter(
+        subject_ids=[3, 7],
+        sectors=["COSMOS"],
+        visible_to="6f1c-42",
+        statuses=["published"],
+        min_importance=2,
+    )
+    assert scope.compile() == (
+        "(@subject_id:[3 3] | @subject_id:[7 7]) @sector:{COSMOS} "
+        "@owner_id:{public | 6f1c\\-42} @status:{published} @importance:[2 +inf]"
+    )
+    assert scope.apply("newton laws").startswith("(newton laws) (@subject_id:[3 3]")
+    assert SearchFilter().apply("") == "*"
+    assert SearchFilter(max_importance=3).apply("*") == "@importance:[-inf 3]"
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_prefilters_knn_and_sets_ef_runtime():
+    client = RedisSearchClient.__new__(RedisSearchClient)
+    client.index_name = "idx:knowledge"
+    client.search = AsyncMock(return_value=MagicMock(docs=[]))
+
+    await client.hybrid_search(
+        "*", [0.5, 0.25], top_k=20, filters=SearchFilter(subject_ids=[4]), ef_runtime=64
+    )
+
+    query, params = client.search.await_args.args
+    assert query.query_string() == "(@subject_id:[4 4])=>[KNN 20 @vector $vec EF_RUNTIME $ef AS vector_score]"
+    assert params == {"vec": struct.pack("2f", 0.5, 0.25), "ef": 64}
+
+    await client.hybrid_search("*", [0.5], top_k=5)
+    query, params = client.search.await_args.args
+    assert query.query_string() == "(*)=>[KNN 5 @vector $vec AS vector_score]"
+    assert set(params) == {"vec"}
+
+
+@pytest.mark.asyncio
+async def test_retrieval_scopes_both_recall_paths_to_user_and_subject(monkeypatch):
+    from app.services.galaxy.retrieval_service import KnowledgeRetrievalService
+
+    monkeypatch.setattr("app.services.galaxy.retrieval_service.settings.RAG_VECTOR_EF_RUNTIME", 128)
+    user_id = uuid.uuid4()
+    with patch("app.services.galaxy.retrieval_service.redis_search_client") as search_client, \
+            patch("app.services.galaxy.retrieval_service.embedding_service") as embeddings, \
+            patch("app.services.galaxy.retrieval_service.rerank_service") as rerank:
+        search_client.hybrid_search = AsyncMock(return_value=MagicMock(docs=[]))
+        search_client.search = AsyncMock(return_value=MagicMock(docs=[]))
+        embeddings.get_embedding = AsyncMock(return_value=[0.1] * 4)
+        rerank.reciprocal_rank_fusion.return_value = []
+
+        service = KnowledgeRetrievalService(AsyncMock())
+        await service._execute_hybrid_search(user_id, "gauss law", subject_id=9, limit=5)
+
+    kwargs = search_client.hybrid_search.await_args.kwargs
+    assert kwargs["filters"] == SearchFilter(subject_ids=[9], visible_to=str(user_id))
+    assert kwargs["top_k"] == 20 and kwargs["ef_runtime"] == 128
+    bm25 = search_client.search.await_args.args[0]
+    assert bm25.query_string().startswith("(gauss law) @subject_id:[9 9] @owner_id:{public | ")
@@ -0,0 +1,121 @@
+# Test: SSE history on Redis Streams
+
+import json
+
+import pytest
+
+from app.core.sse import SSEManager, event_generator
+
+
+class FakeStreamRedis:
+    """Minimal XADD/XRANGE/EXPIRE with Redis stream ID semantics"""
+
+    def __init__(self):
+        self.streams = {}
+        self.calls = []
+        self.ms = 1_700_000_000_000
+
+    def _xadd(self, key, fields, maxlen=None, approximate=True):
+        entries = self.streams.setdefault(key, [])
+        last = entries[-1][0] if entries else "0-0"
+        last_ms, last_seq = map(int, last.split("-"))
+        entry_id = f"{self.ms}-{last_seq + 1 if last_ms == self.ms else 0}"
+        entries.append((entry_id, dict(fields)))
+        if maxlen:
+            del entries[:-maxlen]
+        return entry_id
+
+    def pipeline(self, transaction=True):
+        redis = self
+        ops = []
+
+        class Pipe:
+            def xadd(self, *args, **kwargs):
+                ops.append(("xadd", args, kwargs))
+
+            def expire(self, *args):
+                ops.append(("expire", args, {}))
+
+            async def execute(self):
+                redis.calls.append([op for op, _, _ in ops])
+                return [redis._xadd(*a, **k) if op == "xadd" else True for op, a, k in ops]
+
+        return Pipe()
+
+    async def xrange(self, key, min="-", max="+", count=None):
+        self.calls.append(["xrange", min, count])
+        exclusive = min.startswith("(")
+        start = tuple(map(int, min.lstrip("(").split("-")))
+        out = []
+        for entry_id, fields in self.streams.get(key, []):
+            eid = tuple(map(int, entry_id.split("-")))
+            if eid > start or (eid == start and not exclusive):
+                out.append((entry_id, fields))
+        return out[:count] if count else out
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeStreamRedis()
+    monkeypatch.setattr("app.core.sse.cache_service.redis", redis)
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_events_in_same_millisecond_get_distinct_ids_in_one_round_trip(fake_redis):
+    manager = SSEManager()
+    queue = await manager.connect("u1")
+    for i in range(3):
+        await manager.send_to_user("u1", "node_sparked", {"i": i})
+
+    seqs = [queue.get_nowait()["seq"] for _ in range(3)]
+    assert seqs == [f"{fake_redis.ms}-0", f"{fake_redis.ms}-1", f"{fake_redis.ms}-2"]
+    assert fake_redis.calls == [["xadd", "expire"]] * 3
+
+
+@pytest.mark.asyncio
+async def test_resume_reads_only_events_after_last_event_id(fake_redis, monkeypatch):
+    monkeypatch.setattr("app.core.sse.phase5_config.SSE_REPLAY_MAX_EVENTS", 10)
+    manager = SSEManager()
+    for i in range(5):
+        await manager.send_to_user("u1", "tick", {"i": i})
+
+    queue = await manager.connect("u1", last_event_id=f"{fake_redis.ms}-2")
+
+    assert fake_redis.calls[-1] == ["xrange", f"({fake_redis.ms}-2", 10]
+    replayed = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert [e["data"]["i"] for e in replayed] == [3, 4]
+    assert replayed[0]["seq"] == f"{fake_redis.ms}-3"
+
+    # Legacy clients sent a millisecond timestamp; resume from the following millisecond
+    legacy = await manager.connect("u2", last_event_id=str(fake_redis.ms - 1))
+    assert legacy.qsize() == 0
+    assert fake_redis.calls[-1][1] == f"({fake_redis.ms - 1}-0"
+
+
+@pytest.mark.asyncio
+async def test_live_events_during_replay_are_merged_in_order(fake_redis):
+    manager = SSEManager()
+    for i in range(3):
+        await manager.send_to_user("u1", "tick", {"i": i})
+
+    original_xrange = fake_redis.xrange
+
+    async def racing_xrange(*args, **kwargs):
+        result = await original_xrange(*args, **kwargs)
+        await manager.send_to_user("u1", "tick", {"i": 3})  # arrives while replay is in flight
+        await manager.send_to_user("u1", "tick", {"i": 2}, is_done=True)
+        return result
+
+    fake_redis.xrange = racing_xrange
+    queue = await manager.connect("u1", last_event_id=f"{fake_redis.ms}-0")
+    events = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert [e["seq"] for e in events] == [f"{fake_redis.ms}-{i}" for i in (1, 2, 3, 4)]
+    assert [e["data"]["i"] for e in events] == [1, 2, 3, 2]
+
+    frames = event_generator(queue)
+    queue.put_nowait(events[0])
+    assert await frames.__anext__() == f"id: {fake_redis.ms}-1\n"
+    assert await frames.__anext__() == "event: tick\n"
+    assert json.loads((await frames.__anext__())[len("data: "):]) == {"i": 1}
+    await frames.aclose()
@@ -0,0 +1,211 @@
+# Test: append-only StateGraph checkpoints and resume_from
+
+import pytest
+from redis.exceptions import WatchError
+
+from app.checkpoint.redis_checkpointer import RedisCheckpointer
+from app.orchestration.statechart_engine import StateGraph, WorkflowState
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+        self.watched = None
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.ops.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.watched = None
+
+    async def watch(self, key):
+        self.watched = (key, self.redis.versions.get(key, 0))
+
+    async def hget(self, key, field):
+        return self.redis.data.get(key, {}).get(field)
+
+    def multi(self):
+        pass
+
+    async def execute(self):
+        if self.watched and self.redis.versions.get(self.watched[0], 0) != self.watched[1]:
+            raise WatchError("watched key changed")
+        self.redis.executed.append([op[0] for op in self.ops])
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.ops]
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio (decode_responses=True) for the checkpointer."""
+
+    def __init__(self):
+        self.data = {}
+        self.executed = []
+        self.versions = {}  # key -> write count, for WATCH
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+
+    def hset(self, key, mapping):
+        self.versions[key] = self.versions.get(key, 0) + 1
+        self.data.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+
+    def hincrby(self, key, field, amount):
+        self.versions[key] = self.versions.get(key, 0) + 1
+        value = int(self.data.setdefault(key, {}).get(field, 0)) + amount
+        self.data[key][field] = str(value)
+        return value
+
+    def hdel(self, key, *fields):
+        for f in fields:
+            self.data.get(key, {}).pop(f, None)
+
+    def expire(self, key, ttl):
+        pass
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, []))
+
+    async def get(self, key):
+        return None
+
+
+def _state(messages):
+    return WorkflowState(
+        messages=[{"role": "user", "content": m} for m in messages],
+        context_data={"session_id": "s1", "topic": "math", "stream_callback": print},
+    )
+
+
+@pytest.mark.asyncio
+async def test_saves_append_only_deltas_after_first_full_write():
+    redis = FakeRedis()
+    checkpointer = RedisCheckpointer(redis)
+    state = _state(["a", "b"])
+
+    await checkpointer.save(state, "planner")
+    assert redis.executed[-1][0] == "delete"
+
+    state.append_message("assistant", "c")
+    state.context_data["plan"] = ["x"]
+    await checkpointer.save(state, "executor", step=1)
+    ops = redis.executed[-1]
+    assert "delete" not in ops and ops.count("rpush") == 1
+    assert len(redis.data["checkpoint:s1:messages"]) == 3
+    assert redis.data["checkpoint:s1:context"] == {"session_id": '"s1"', "topic": '"math"', "plan": '["x"]'}
+
+    # Unchanged state only touches meta
+    await checkpointer.save(state, "executor", step=2)
+    assert redis.executed[-1] == ["hset", "expire", "expire", "expire", "hincrby"]
+    assert redis.data["checkpoint:s1:meta"]["generation"] == "3"
+
+    checkpoint = await RedisCheckpointer(redis).load_checkpoint("s1")
+    assert (checkpoint.node_id, checkpoint.step) == ("executor", 2)
+    assert [m["content"] for m in checkpoint.state.messages] == ["a", "b", "c"]
+    assert "stream_callback" not in checkpoint.state.context_data
+
+
+@pytest.mark.asyncio
+async def test_rewritten_history_and_interval_trigger_compaction():
+    redis = FakeRedis()
+    checkpointer = RedisCheckpointer(redis, compact_every=3)
+    state = _state(["a", "b", "c"])
+    await checkpointer.save(state, "n1")
+
+    # Context pruning replaced the history
+    state.messages = [{"role": "system", "content": "summary"}]
+    await checkpointer.save(state, "n2")
+    assert redis.executed[-1][0] == "delete"
+    assert redis.data["checkpoint:s1:messages"] == ['{"role": "system", "content": "summary"}']
+
+    await checkpointer.save(state, "n3")
+    assert redis.executed[-1][0] != "delete"
+    await checkpointer.save(state, "n4")
+    assert redis.executed[-1][0] != "delete"
+    await checkpointer.save(state, "n5")
+    assert redis.executed[-1][0] == "delete"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writer_forces_compaction_instead_of_stale_delta(monkeypatch):
+    redis = FakeRedis()
+    ours, theirs = RedisCheckpointer(redis), RedisCheckpointer(redis)
+    await ours.save(_state(["a", "b"]), "n1")
+
+    # Another process resumes the session and rewrites it with a different history
+    await theirs.save(_state(["x"]), "n2")
+    assert redis.data["checkpoint:s1:meta"]["generation"] == "2"
+
+    state = _state(["a", "b", "c"])
+    await ours.save(state, "n3")
+    assert redis.executed[-1][0] == "delete"  # full write, not "+1 message" onto ["x"]
+    assert [m["content"] for m in (await RedisCheckpointer(redis).load("s1")).messages] == ["a", "b", "c"]
+    assert redis.data["checkpoint:s1:meta"]["generation"] == "3"
+
+    # Writer slipping in between WATCH and EXEC is caught by the transaction
+    real_hget = FakePipeline.hget
+
+    async def racing_hget(pipe, key, field):
+        value = await real_hget(pipe, key, field)
+        redis.hincrby(key, "generation", 1)
+        return value
+
+    monkeypatch.setattr(FakePipeline, "hget", racing_hget)
+    state.append_message("assistant", "d")
+    await ours.save(state, "n4")
+    assert redis.executed[-1][0] == "delete"
+    assert len(redis.data["checkpoint:s1:messages"]) == 4
+
+
+@pytest.mark.asyncio
+async def test_resume_from_continues_at_the_interrupted_node():
+    calls = []
+    fail_once = {"executor": True}
+
+    def node(name):
+        def run(state):
+            calls.append(name)
+            if fail_once.pop(name, False):
+                raise RuntimeError("LLM timeout")
+            state.append_message("assistant", name)
+            return state
+        return run
+
+    graph = StateGraph("G")
+    for name in ("planner", "executor", "reporter"):
+        graph.add_node(name, node(name))
+    graph.add_edge("planner", "executor").add_edge("executor", "reporter").add_edge("reporter", "__end__")
+    graph.set_entry_point("planner")
+    graph.checkpointer = RedisCheckpointer(FakeRedis())
+
+    first = await graph.invoke(_state(["hi"]))
+    assert calls == ["planner", "executor"] and first.errors
+
+    calls.clear()
+    callback = object()
+    runtime = WorkflowState(context_data={"stream_callback": callback})
+    resumed = await graph.invoke(runtime, resume_from="s1")
+    assert calls == ["executor", "reporter"]
+    assert [m["content"] for m in resumed.messages] == ["hi", "planner", "executor", "reporter"]
+    assert resumed.errors == []
+    assert resumed.context_data["stream_callback"] is callback
+
+    calls.clear()
+    await graph.invoke(resume_from="s1")
+    assert calls == []  # finished checkpoint sits at __end__
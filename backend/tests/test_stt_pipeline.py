@@ -0,0 +1,139 @@
+# Test: pipelined streaming STT (receive -> VAD segmentation -> ASR worker pool)
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.stt_pipeline import (
+    ASRBackend, EnergyVAD, LocalASRBackend, STTStreamPipeline, VADSegmenter,
+)
+
+RATE = 16000
+
+
+def _tone(seconds, amplitude=8000):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype("<i2").tobytes()
+
+
+def _silence(seconds, seed=0):
+    noise = np.random.default_rng(seed).normal(0, 20, int(RATE * seconds))
+    return noise.astype("<i2").tobytes()
+
+
+def _segmenter(partial_interval_ms=1000, max_segment_ms=15000):
+    return VADSegmenter(
+        EnergyVAD(threshold_db=12.0), sample_rate=RATE, frame_ms=30, silence_ms=600,
+        max_segment_ms=max_segment_ms, partial_interval_ms=partial_interval_ms,
+    )
+
+
+def _chunks(pcm, size=3201):
+    # Odd chunk size: frames straddle chunk boundaries
+    return [pcm[i:i + size] for i in range(0, len(pcm), size)]
+
+
+class FakeWebSocket:
+    def __init__(self, pcm, chunk_size=3200):
+        self.incoming = [{"type": "websocket.receive", "bytes": c} for c in _chunks(pcm, chunk_size)]
+        self.incoming.append({"type": "websocket.receive", "text": "STOP"})
+        self.sent = []
+
+    async def receive(self):
+        await asyncio.sleep(0)
+        return self.incoming.pop(0)
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+def test_vad_segmenter_emits_partials_and_finals():
+    segmenter = _segmenter()
+    audio = _silence(0.5) + _tone(1.5) + _silence(0.9, seed=1) + _tone(0.6) + _silence(0.2, seed=2)
+
+    segments = []
+    for chunk in _chunks(audio):
+        segments.extend(segmenter.feed(chunk))
+    assert segmenter.in_speech
+    segments.extend(segmenter.flush())
+
+    finals = [s for s in segments if s.is_final]
+    partials = [s for s in segments if not s.is_final]
+    assert [s.index for s in finals] == [0, 1]
+    assert [s.index for s in partials] == [0]
+    # Onset includes the pre-roll, trailing silence is trimmed
+    assert 300 <= finals[0].start_ms <= 510
+    assert 1950 <= finals[0].end_ms <= 2100
+    assert len(finals[0].pcm) == (finals[0].end_ms - finals[0].start_ms) * RATE // 1000 * 2
+    assert partials[0].end_ms < finals[0].end_ms
+    assert 2700 <= finals[1].start_ms <= 2910
+    assert 3480 <= finals[1].end_ms <= 3540
+    # Pure noise yields nothing
+    assert _segmenter().feed(_silence(2.0, seed=3)) == []
+
+
+@pytest.mark.asyncio
+async def test_pipeline_streams_partial_and_final_results_in_memory():
+    audio = _silence(0.3) + _tone(1.2) + _silence(0.8) + _tone(0.5) + _silence(0.8)
+    websocket = FakeWebSocket(audio)
+    pipeline = STTStreamPipeline(
+        websocket, LocalASRBackend(delay_seconds=0.01), sample_rate=RATE,
+        workers=2, max_pending_segments=4, segmenter=_segmenter(),
+    )
+
+    assert await pipeline.run() is True
+
+    results = [m for m in websocket.sent if m["type"] == "transcription"]
+    finals = [m for m in results if m["is_final"]]
+    assert [m["segment"] for m in finals] == [0, 1]
+    assert finals[0]["text"] == f"utterance {finals[0]['end_ms'] - finals[0]['start_ms']}ms"
+    # A partial for the first utterance precedes its final
+    first_partial = next(i for i, m in enumerate(results) if not m["is_final"])
+    assert results[first_partial]["segment"] == 0
+    assert first_partial < results.index(finals[0])
+    assert websocket.sent[-1] == {"type": "status", "content": "completed"}
+
+    stats = pipeline.stats
+    assert stats.audio_ms == pytest.approx(3600, abs=2)
+    assert stats.segments == 2
+    assert stats.first_result_latency is not None and stats.first_result_latency < 1.0
+    assert stats.vad_cpu_seconds > 0
+
+
+class SlowFirstBackend(ASRBackend):
+    """First final is slow, later ones fast: workers complete out of order."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def transcribe(self, pcm, sample_rate, language=None, is_final=True):
+        self.calls.append(is_final)
+        if is_final and self.calls.count(True) == 1:
+            await asyncio.sleep(0.3)
+        else:
+            await asyncio.sleep(0.05)
+        return f"{len(pcm)}"
+
+
+@pytest.mark.asyncio
+async def test_slow_asr_keeps_final_order_and_applies_backpressure():
+    utterance = _tone(0.6) + _silence(0.7)
+    audio = _silence(0.2) + utterance * 6
+    websocket = FakeWebSocket(audio, chunk_size=RATE * 2 // 10)  # 100 ms chunks
+    backend = SlowFirstBackend()
+    pipeline = STTStreamPipeline(
+        websocket, backend, sample_rate=RATE, workers=2, max_pending_segments=1,
+        segmenter=_segmenter(partial_interval_ms=300),
+    )
+
+    await pipeline.run()
+
+    finals = [m for m in websocket.sent if m.get("is_final")]
+    assert [m["segment"] for m in finals] == list(range(6))
+    # Partials were skipped instead of queueing behind the slow ASR stage...
+    assert pipeline.stats.partials_dropped > 0
+    # ...and no partial was sent after its segment's final
+    for index, message in enumerate(websocket.sent):
+        if message.get("type") == "transcription" and not message["is_final"]:
+            assert all(m["segment"] != message["segment"] for m in websocket.sent[:index] if m.get("is_final"))
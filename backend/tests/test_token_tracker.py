@@ -0,0 +1,76 @@
+"""
+TokenTracker Tests
+"""
+
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.orchestration.token_tracker import TokenTracker
+
+
+def _redis():
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[])
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    client = MagicMock()
+    client.pipeline = MagicMock(return_value=pipe)
+    client.get = AsyncMock(return_value=None)
+    return client, pipe
+
+
+@pytest.mark.asyncio
+async def test_record_usage_is_single_pipeline():
+    client, pipe = _redis()
+    tracker = TokenTracker(client, flush_interval_ms=0)
+
+    total = await tracker.record_usage("u1", "s1", "r1", 10, 5, model="gpt-4")
+
+    assert total == 15
+    client.pipeline.assert_called_once_with(transaction=True)
+    pipe.execute.assert_awaited_once()
+    today = datetime.now().strftime("%Y-%m-%d")
+    pipe.zincrby.assert_called_once_with(f"leaderboard:tokens:{today}", 15, "u1")
+    pipe.incrby.assert_any_call(f"user:daily_tokens:u1:{today}", 15)
+
+
+@pytest.mark.asyncio
+async def test_accumulator_merges_records_and_counts_unflushed_quota():
+    client, pipe = _redis()
+    tracker = TokenTracker(client, flush_interval_ms=60_000)
+
+    await tracker.record_usage("u1", "s1", "r1", 10, 0)
+    await tracker.record_usage("u1", "s1", "r2", 20, 0)
+
+    pipe.execute.assert_not_awaited()
+    assert await tracker.get_daily_usage("u1") == 30
+
+    await tracker.close()
+    pipe.execute.assert_awaited_once()
+    today = datetime.now().strftime("%Y-%m-%d")
+    pipe.incrby.assert_any_call(f"user:daily_tokens:u1:{today}", 30)
+    billing_push = [c for c in pipe.rpush.call_args_list if c.args[0] == "queue:billing"]
+    assert len(billing_push) == 1 and len(billing_push[0].args) == 3
+
+
+@pytest.mark.asyncio
+async def test_top_users_reads_leaderboards_without_scan():
+    client, pipe = _redis()
+    pipe.execute.side_effect = [
+        [-2, []],  # union key missing
+        [3, True, [(b"u2", 50.0), (b"u1", 20.0)]],
+        [42, [(b"u2", 50.0)]],  # still fresh on the next dashboard refresh
+    ]
+    client.scan_iter = MagicMock(side_effect=AssertionError("SCAN must not be used"))
+    tracker = TokenTracker(client, flush_interval_ms=0)
+
+    top = await tracker.get_top_users(days=7, limit=2)
+
+    assert top == [{"user_id": "u2", "total_tokens": 50}, {"user_id": "u1", "total_tokens": 20}]
+    keys = pipe.zunionstore.call_args.args[1]
+    assert len(keys) == 7 and all(k.startswith("leaderboard:tokens:") for k in keys)
+
+    assert await tracker.get_top_users(days=7, limit=1) == [{"user_id": "u2", "total_tokens": 50}]
+    pipe.zunionstore.assert_called_once()
@@ -0,0 +1,129 @@
+# Test: per-connection WebSocket outbound queues
+
+import asyncio
+import json
+
+import pytest
+
+from app.core.websocket import ConnectionManager, ConnectionWriter, SLOW_CONSUMER_CLOSE_CODE
+
+
+class FakeWebSocket:
+    def __init__(self, user_id, block=False, fail=False):
+        self.user_id = user_id
+        self.sent = []
+        self.closed_with = None
+        self.gate = asyncio.Event()
+        if not block:
+            self.gate.set()
+        self.fail = fail
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.fail:
+            raise ConnectionResetError("peer gone")
+        await self.gate.wait()
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_slow_member_does_not_delay_group_and_payload_is_shared():
+    manager = ConnectionManager()
+    slow, fast = FakeWebSocket("slow", block=True), FakeWebSocket("fast")
+    await manager.connect(slow, "g1", "slow")
+    await manager.connect(fast, "g1", "fast")
+
+    await asyncio.wait_for(manager._broadcast_local({"type": "message", "content": "hi"}, "g1"), timeout=0.1)
+    await _settle()
+
+    assert [json.loads(t)["content"] for t in fast.sent] == ["hi"]
+    assert slow.sent == [] and slow.outbound.depth == 0  # picked up by its writer, send in progress
+    await manager._broadcast_local({"type": "message", "content": "again"}, "g1")
+    await _settle()
+    assert slow.outbound._queue[0].text is fast.sent[-1]  # serialized once, shared by both queues
+
+    slow.gate.set()
+    await _settle()
+    assert [json.loads(t)["content"] for t in slow.sent] == ["hi", "again"]
+    manager.disconnect(slow, "g1", "slow")
+    manager.disconnect(fast, "g1", "fast")
+
+
+@pytest.mark.asyncio
+async def test_coalesce_and_drop_policies_bound_the_queue():
+    ws = FakeWebSocket("u1", block=True)
+    writer = ConnectionWriter(ws, on_evict=lambda _: None, max_queue=3, policy="coalesce")
+    writer.enqueue("blocking-head")
+    await _settle()  # writer is now stuck sending the head
+
+    for i in range(5):
+        writer.enqueue(json.dumps({"type": "typing", "i": i}), coalesce_key="typing:u2")
+    writer.enqueue("m1")
+    writer.enqueue("m2")
+    writer.enqueue("m3")  # full: oldest (the coalesced typing frame) is dropped
+    assert [e.text for e in writer._queue] == ["m1", "m2", "m3"]
+
+    dropping = ConnectionWriter(FakeWebSocket("u3", block=True), on_evict=lambda _: None, max_queue=2, policy="drop")
+    for i in range(4):
+        dropping.enqueue(f"m{i}", coalesce_key="k")
+    await _settle()
+    assert dropping.depth <= 2
+    writer.close()
+    dropping.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_and_dead_sockets_are_evicted(monkeypatch):
+    monkeypatch.setattr("app.core.websocket.settings.WS_SLOW_CONSUMER_POLICY", "disconnect")
+    monkeypatch.setattr("app.core.websocket.settings.WS_SEND_QUEUE_SIZE", 2)
+    manager = ConnectionManager()
+    slow, dead, ok = FakeWebSocket("slow", block=True), FakeWebSocket("dead", fail=True), FakeWebSocket("ok")
+    for ws in (slow, dead, ok):
+        await manager.connect(ws, "g1", ws.user_id)
+
+    for i in range(4):
+        await manager._broadcast_local({"type": "message", "n": i}, "g1")
+        await _settle()
+
+    assert manager.active_connections["g1"] == [ok]
+    assert slow.closed_with == SLOW_CONSUMER_CLOSE_CODE
+    assert len(ok.sent) == 4
+
+    await manager._kick_local("g1", "ok", "spam")
+    await asyncio.sleep(0.01)
+    assert json.loads(ok.sent[-1])["message"] == "Kicked: spam" and ok.closed_with == 4001
+    assert "g1" not in manager.active_connections
+
+
+@pytest.mark.asyncio
+async def test_evict_close_task_is_held_until_done():
+    release = asyncio.Event()
+    ws = FakeWebSocket("slow")
+
+    async def slow_close(code=1000):
+        await release.wait()
+        ws.closed_with = code
+
+    ws.close = slow_close
+    evicted = []
+    writer = ConnectionWriter(ws, evicted.append, policy="disconnect", max_queue=1)
+
+    writer.evict("slow_consumer", close_code=SLOW_CONSUMER_CLOSE_CODE)
+    del writer
+    (task,) = ConnectionWriter._closing
+    assert evicted == [ws] and not task.done()
+
+    release.set()
+    await _settle()
+    assert ws.closed_with == SLOW_CONSUMER_CLOSE_CODE
+    assert ConnectionWriter._closing == set()
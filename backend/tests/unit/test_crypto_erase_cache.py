@@ -0,0 +1,170 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.compliance.crypto_erase import CryptoEraseManager, DEKCache
+
+
+class FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.broker.subscribers.setdefault(channel, []).append(self)
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=1.0):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        for subscribers in self.broker.subscribers.values():
+            if self in subscribers:
+                subscribers.remove(self)
+
+
+class FakeRedis:
+    """In-process pub/sub shared by caches standing in for separate processes."""
+
+    def __init__(self):
+        self.subscribers = {}
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    async def publish(self, channel, payload):
+        for pubsub in self.subscribers.get(channel, []):
+            pubsub.queue.put_nowait({"data": payload})
+        return len(self.subscribers.get(channel, []))
+
+
+def _db_with_keys(keys):
+    """Each execute() returns the active keys among those requested."""
+    db = MagicMock()
+    db.commit = AsyncMock()
+    db.refresh = AsyncMock()
+
+    async def execute(stmt):
+        active = [k for k in keys if k.is_active]
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = active
+        result.scalar_one_or_none.return_value = active[0] if active else None
+        return result
+
+    db.execute = AsyncMock(side_effect=execute)
+    return db
+
+
+def _user_key(manager, user_id):
+    import os
+    return SimpleNamespace(
+        user_id=user_id, key_id=f"key-{user_id}", is_active=True, destroyed_at=None,
+        encrypted_key=manager._encrypt_key(os.urandom(32)),
+    )
+
+
+@pytest.mark.asyncio
+async def test_decrypt_many_groups_by_user_and_reuses_cached_dek():
+    cache = DEKCache(ttl_seconds=60, max_entries=10, redis_client=FakeRedis())
+    manager = CryptoEraseManager(db=None, dek_cache=cache)
+    alice, bob = _user_key(manager, "alice"), _user_key(manager, "bob")
+    manager.db = _db_with_keys([alice, bob])
+
+    blobs = await manager.encrypt_many([("alice", "a1"), ("bob", "b1"), ("alice", "a2")])
+    assert [key_id for _, key_id in blobs] == ["key-alice", "key-bob", "key-alice"]
+    assert manager.db.execute.await_count == 1
+
+    decrypted = await manager.decrypt_many([
+        ("alice", blobs[0][0]), ("bob", blobs[1][0]), ("alice", blobs[2][0]),
+    ])
+    assert decrypted == ["a1", "b1", "a2"]
+    # Both DEKs came from the process cache
+    assert manager.db.execute.await_count == 1
+    await cache.stop()
+
+
+@pytest.mark.asyncio
+async def test_destroy_invalidates_cached_dek_in_other_processes():
+    redis = FakeRedis()
+    cache_a = DEKCache(ttl_seconds=60, max_entries=10, redis_client=redis)
+    cache_b = DEKCache(ttl_seconds=60, max_entries=10, redis_client=redis)
+    worker = CryptoEraseManager(db=None, dek_cache=cache_a)
+    key = _user_key(worker, "alice")
+    worker.db = _db_with_keys([key])
+    eraser = CryptoEraseManager(db=_db_with_keys([key]), dek_cache=cache_b)
+
+    blob, _ = await worker.encrypt_payload("alice", "secret")
+    assert len(cache_a) == 1
+
+    await eraser.destroy_user_key("alice")
+    await asyncio.sleep(0.05)
+
+    assert len(cache_a) == 0
+    assert await worker.decrypt_payload("alice", blob) is None
+    await cache_a.stop()
+    await cache_b.stop()
+
+
+@pytest.mark.asyncio
+async def test_cache_bypassed_without_invalidation_channel():
+    cache = DEKCache(ttl_seconds=60, max_entries=10, redis_client=None)
+    manager = CryptoEraseManager(db=None, dek_cache=cache)
+    key = _user_key(manager, "alice")
+    manager.db = _db_with_keys([key])
+
+    blob, _ = await manager.encrypt_payload("alice", "secret")
+    assert await manager.decrypt_payload("alice", blob) == "secret"
+    # No subscription means destroys elsewhere could not reach us: nothing cached
+    assert len(cache) == 0
+    assert manager.db.execute.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_lookup_racing_an_invalidation_is_not_cached():
+    cache = DEKCache(ttl_seconds=60, max_entries=1, redis_client=FakeRedis())
+    assert await cache.ensure_listener()
+
+    generation = cache.generation
+    cache.invalidate("alice")
+    cache.put("alice", "key-alice", MagicMock(), generation)
+    assert cache.get("alice") is None
+
+    cache.put("alice", "key-alice", MagicMock(), cache.generation)
+    cache.put("bob", "key-bob", MagicMock(), cache.generation)
+    assert len(cache) == 1 and cache.get("bob") is not None
+    await cache.stop()
+
+
+def test_listener_rebinds_per_event_loop_and_closes_old_subscription():
+    redis = FakeRedis()
+    cache = DEKCache(ttl_seconds=60, max_entries=10, redis_client=redis)
+    subscribers = redis.subscribers.setdefault("persona:dek:invalidate", [])
+    listeners = []
+
+    async def task_body():
+        # One Celery task: a fresh event loop per asyncio.run
+        assert await cache.ensure_listener()
+        assert len(subscribers) == 1
+        # Nothing cached under a previous loop survives the rebind
+        assert cache.get("alice") is None
+        listeners.append(cache._listener_task)
+        cache.put("alice", "key-alice", MagicMock(), cache.generation)
+
+    asyncio.run(task_body())
+    # asyncio.run cancelled the listener, which closed its pubsub on its own loop
+    assert listeners[0].done() and subscribers == []
+
+    asyncio.run(task_body())
+    assert listeners[1] is not listeners[0] and subscribers == []
+
+    # A loop closed without cancelling its tasks: the stale pubsub is closed on rebind
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(cache.ensure_listener())
+    stale = cache._pubsub
+    loop.close()
+    asyncio.run(task_body())
+    assert stale not in subscribers